@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import JSONResponse, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from typing import List, Optional, Dict, Any
@@ -8,6 +9,17 @@ from datetime import datetime
 from backend.db.base import get_db
 from backend.models.models import Device, TestScenario, User, Configuration, JsonTemplate
 from backend.auth.auth import require_role, get_current_user
+from backend.services.config_backup import collect_backup, restore_backup
+from backend.services.config_validation import (
+    InvalidSchema,
+    check_schema,
+    describe,
+    device_config_violations,
+    violations,
+)
+from backend.services.device_config import effective_config, etag, etag_matches, layer_versions
+from backend.services.events import event_stream, publish_on_commit
+from backend.services.jobs import enqueue
 
 router = APIRouter(prefix="/fleet-config", tags=["Fleet Configuration Management"])
 
@@ -202,6 +214,8 @@ def create_system_config(
     )
 
     db.add(db_config)
+    db.flush()
+    publish_on_commit(db, "fleet-config", "system_config.created", {"id": db_config.id})
     db.commit()
     db.refresh(db_config)
 
@@ -354,6 +368,7 @@ def update_system_config(
 
     setattr(config, "updated_by", current_user.id)
 
+    publish_on_commit(db, "fleet-config", "system_config.updated", {"id": config_id})
     db.commit()
     db.refresh(config)
 
@@ -411,6 +426,7 @@ def delete_system_config(
         )
 
     db.delete(config)
+    publish_on_commit(db, "fleet-config", "system_config.deleted", {"id": config_id})
     db.commit()
 
     return {"message": "System configuration deleted successfully"}
@@ -452,8 +468,15 @@ def update_device_config(
     if not device:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Device not found")
 
+    found = device_config_violations(db, device, config_update.configuration)
+    if found:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=describe(found)
+        )
+
     # Update device configuration using setattr to avoid SQLAlchemy issues
     setattr(device, "configuration", config_update.configuration)
+    publish_on_commit(db, "fleet-config", "device_config.updated", {"id": device_id})
     db.commit()
     db.refresh(device)
 
@@ -464,6 +487,28 @@ def update_device_config(
     }
 
 
+@router.get("/device-configs/{device_id}/effective")
+def get_effective_device_config(
+    device_id: int,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Merged configuration of a device: template, device type, customer, device (any user).
+
+    Devices poll it with the last ``ETag`` in ``If-None-Match``; while no
+    layer changed the answer is a 304 without a body.
+    """
+    versions = layer_versions(db, device_id)
+    if versions is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Device not found")
+
+    headers = {"ETag": etag(versions), "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return JSONResponse(effective_config(db, versions), headers=headers)
+
+
 # Test Scenario Configuration Management
 @router.get("/test-scenario-configs")
 def get_test_scenario_configs(
@@ -507,6 +552,12 @@ def create_test_scenario_config(
             detail=f"Test scenario with name '{scenario_config.scenario_name}' already exists",
         )
 
+    found = violations(db, "scenario", scenario_config.test_type, scenario_config.parameters)
+    if found:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=describe(found)
+        )
+
     db_scenario = TestScenario(
         name=scenario_config.scenario_name,
         device_type=scenario_config.test_type,
@@ -515,13 +566,15 @@ def create_test_scenario_config(
     )
 
     db.add(db_scenario)
+    db.flush()
+    publish_on_commit(db, "fleet-config", "test_scenario.created", {"id": db_scenario.id})
     db.commit()
     db.refresh(db_scenario)
 
     return {
         "message": "Test scenario configuration created successfully",
         "scenario_id": db_scenario.id,
-        "scenario_name": db_scenario.scenario_name,
+        "scenario_name": db_scenario.name,
     }
 
 
@@ -554,6 +607,7 @@ def update_test_scenario_config(
     for field, value in update_data.items():
         setattr(scenario, field, value)
 
+    publish_on_commit(db, "fleet-config", "test_scenario.updated", {"id": scenario_id})
     db.commit()
     db.refresh(scenario)
 
@@ -576,12 +630,24 @@ def delete_test_scenario_config(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Test scenario not found")
 
     db.delete(scenario)
+    publish_on_commit(db, "fleet-config", "test_scenario.deleted", {"id": scenario_id})
     db.commit()
 
     return {"message": "Test scenario configuration deleted successfully"}
 
 
 # Dashboard and Statistics
+@router.get("/events")
+async def stream_events(
+    request: Request,
+    current_user: User = Depends(require_role("configurator")),
+    db: Session = Depends(get_db),
+):
+    """Server-Sent Events with configuration changes (Configurator only)."""
+    db.close()  # the stream stays open for hours; do not hold a connection
+    return event_stream(request, "fleet-config")
+
+
 @router.get("/dashboard")
 def get_config_dashboard(
     current_user: User = Depends(require_role("configurator")), db: Session = Depends(get_db)
@@ -615,36 +681,20 @@ def get_config_dashboard(
 # Configuration Backup and Restore
 @router.post("/backup")
 def backup_configurations(
-    current_user: User = Depends(require_role("configurator")), db: Session = Depends(get_db)
+    background: bool = Query(False, description="Run as a background job (202 + job id)"),
+    current_user: User = Depends(require_role("configurator")),
+    db: Session = Depends(get_db),
 ):
     """Create backup of all configurations (Configurator only)."""
-    # Get all device configurations
-    devices = db.query(Device).all()
-    device_configs = [
-        {"id": d.id, "configuration": d.configuration if d.configuration is not None else {}}
-        for d in devices
-    ]
+    if background:
+        job = enqueue(db, "config.backup", created_by=current_user.id)
+        db.commit()
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"message": "Configuration backup queued", "job_id": job.id},
+        )
 
-    # Get all test scenario configurations
-    scenarios = db.query(TestScenario).all()
-    scenario_configs = [
-        {"id": s.id, "parameters": s.parameters or {}, "expected_results": s.expected_results or {}}
-        for s in scenarios
-    ]
-
-    # Get all system configurations from Configuration table
-    system_configs = db.query(Configuration).filter(Configuration.component == "FCM").all()
-    system_configs_data = [
-        {"id": c.id, "config_key": c.config_key, "config_value": c.config_value}
-        for c in system_configs
-    ]
-
-    backup_data = {
-        "backup_timestamp": datetime.now().isoformat(),
-        "device_configurations": device_configs,
-        "test_scenario_configurations": scenario_configs,
-        "system_configurations": system_configs_data,
-    }
+    backup_data = collect_backup(db)
 
     return {
         "message": "Configuration backup created successfully",
@@ -656,45 +706,28 @@ def backup_configurations(
 @router.post("/restore")
 def restore_configurations(
     backup_data: Dict[str, Any],
+    background: bool = Query(False, description="Run as a background job (202 + job id)"),
     current_user: User = Depends(require_role("configurator")),
     db: Session = Depends(get_db),
 ):
     """Restore configurations from backup (Configurator only)."""
-    try:
-        # Restore device configurations
-        if "device_configurations" in backup_data:
-            for device_config in backup_data["device_configurations"]:
-                device = db.query(Device).filter(Device.id == device_config["id"]).first()
-                if device:
-                    setattr(device, "configuration", device_config["configuration"])
-
-        # Restore test scenario configurations
-        if "test_scenario_configurations" in backup_data:
-            for scenario_config in backup_data["test_scenario_configurations"]:
-                scenario = (
-                    db.query(TestScenario).filter(TestScenario.id == scenario_config["id"]).first()
-                )
-                if scenario:
-                    scenario.parameters = scenario_config["parameters"]
-                    scenario.expected_results = scenario_config["expected_results"]
-
-        # Restore system configurations
-        if "system_configurations" in backup_data:
-            for system_config in backup_data["system_configurations"]:
-                config = (
-                    db.query(Configuration)
-                    .filter(
-                        Configuration.id == system_config["id"], Configuration.component == "FCM"
-                    )
-                    .first()
-                )
-                if config:
-                    # Restore both config_value and config_key for complete state recovery
-                    setattr(config, "config_value", system_config["config_value"])
-                    if "config_key" in system_config:
-                        setattr(config, "config_key", system_config["config_key"])
-                    setattr(config, "updated_by", current_user.id)
+    if background:
+        job = enqueue(
+            db,
+            "config.restore",
+            payload={"backup_data": backup_data},
+            priority=10,
+            created_by=current_user.id,
+        )
+        db.commit()
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"message": "Configuration restore queued", "job_id": job.id},
+        )
 
+    try:
+        restore_backup(db, backup_data, current_user.id)
+        publish_on_commit(db, "fleet-config", "configs.restored", {})
         db.commit()
 
         return {
@@ -766,6 +799,15 @@ class JsonTemplateResponse(BaseModel):
         from_attributes = True
 
 
+def _check_template_schema(schema: Optional[Dict[str, Any]]) -> None:
+    try:
+        check_schema(schema)
+    except InvalidSchema as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid JSON schema: {exc}"
+        )
+
+
 # JSON Templates CRUD Endpoints
 @router.get("/json-templates", response_model=List[JsonTemplateResponse])
 def get_json_templates(
@@ -816,6 +858,7 @@ def create_json_template(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Template with name '{template.name}' already exists",
         )
+    _check_template_schema(template.schema)
 
     db_template = JsonTemplate(
         name=template.name,
@@ -829,6 +872,8 @@ def create_json_template(
     )
 
     db.add(db_template)
+    db.flush()
+    publish_on_commit(db, "fleet-config", "json_template.created", {"id": db_template.id})
     db.commit()
     db.refresh(db_template)
 
@@ -849,9 +894,12 @@ def update_json_template(
 
     # Update fields
     update_data = template_update.dict(exclude_unset=True)
+    if "schema" in update_data:
+        _check_template_schema(update_data["schema"])
     for field, value in update_data.items():
         setattr(template, field, value)
 
+    publish_on_commit(db, "fleet-config", "json_template.updated", {"id": template_id})
     db.commit()
     db.refresh(template)
 
@@ -870,6 +918,40 @@ def delete_json_template(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="JSON template not found")
 
     db.delete(template)
+    publish_on_commit(db, "fleet-config", "json_template.deleted", {"id": template_id})
     db.commit()
 
     return {"message": "JSON template deleted successfully", "template_id": template_id}
+
+
+@router.post("/json-templates/{template_id}/validate-devices")
+def validate_devices_against_template(
+    template_id: int,
+    current_user: User = Depends(require_role("configurator")),
+    db: Session = Depends(get_db),
+):
+    """Queue a check of every device of the template's category against its schema.
+
+    The job result lists the devices whose effective configuration does not
+    match (Configurator only).
+    """
+    template = db.query(JsonTemplate).filter(JsonTemplate.id == template_id).first()
+    if not template:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="JSON template not found")
+    if template.template_type != "device_config":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only device_config templates apply to devices",
+        )
+
+    job = enqueue(
+        db,
+        "templates.validate_devices",
+        payload={"template_id": template_id},
+        created_by=current_user.id,
+    )
+    db.commit()
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={"message": "Device validation queued", "job_id": job.id},
+    )
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from typing import List, Optional, Dict, Any
@@ -7,7 +7,8 @@ from datetime import datetime
 
 from backend.db.base import get_db
 from backend.models.models import Device, Customer, User
-from backend.auth.auth import require_role, get_current_user
+from backend.auth.auth import require_role
+from backend.services.events import event_stream, publish_on_commit
 
 router = APIRouter(prefix="/fleet-data", tags=["Fleet Data Management"])
 
@@ -158,6 +159,10 @@ def create_device(
 
     db_device = Device(**device.model_dump())
     db.add(db_device)
+    db.flush()
+    publish_on_commit(
+        db, "fleet-data", "device.created", {"id": db_device.id, "status": db_device.status}
+    )
     db.commit()
     db.refresh(db_device)
     return db_device
@@ -218,6 +223,7 @@ def update_device(
     for field, value in update_data.items():
         setattr(device, field, value)
 
+    publish_on_commit(db, "fleet-data", "device.updated", {"id": device_id, **update_data})
     db.commit()
     db.refresh(device)
     return device
@@ -235,6 +241,7 @@ def delete_device(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Device not found")
 
     db.delete(device)
+    publish_on_commit(db, "fleet-data", "device.deleted", {"id": device_id})
     db.commit()
     return {"message": "Device deleted successfully"}
 
@@ -279,6 +286,8 @@ def create_customer(
 
     db_customer = Customer(**customer.model_dump())
     db.add(db_customer)
+    db.flush()
+    publish_on_commit(db, "fleet-data", "customer.created", {"id": db_customer.id})
     db.commit()
     db.refresh(db_customer)
     return db_customer
@@ -322,6 +331,7 @@ def update_customer(
     for field, value in update_data.items():
         setattr(customer, field, value)
 
+    publish_on_commit(db, "fleet-data", "customer.updated", {"id": customer_id, **update_data})
     db.commit()
     db.refresh(customer)
     return customer
@@ -347,10 +357,22 @@ def delete_customer(
         )
 
     db.delete(customer)
+    publish_on_commit(db, "fleet-data", "customer.deleted", {"id": customer_id})
     db.commit()
     return {"message": "Customer deleted successfully"}
 
 
+@router.get("/events")
+async def stream_events(
+    request: Request,
+    current_user: User = Depends(require_role("manager")),
+    db: Session = Depends(get_db),
+):
+    """Server-Sent Events with device and customer changes (Manager only)."""
+    db.close()  # the stream stays open for hours; do not hold a connection
+    return event_stream(request, "fleet-data")
+
+
 # Dashboard Statistics
 @router.get("/dashboard")
 def get_dashboard_stats(
@@ -1,13 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Path, Query, Request, status
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func, desc, and_, or_
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from pydantic import BaseModel, Field, validator
 
+from backend.core.config import settings
+from backend.core.file_ranges import RangeFileResponse
 from backend.db.base import get_db
-from backend.auth.auth import require_role
+from backend.auth.auth import get_current_user, require_role
 from backend.models.models import (
+    Artifact,
     User,
     Software,
     SoftwareVersion,
@@ -15,9 +19,39 @@ from backend.models.models import (
     SoftwareInstallation,
     Device,
 )
+from backend.services.artifacts import (
+    ArtifactError,
+    UploadConflict,
+    append_to_upload,
+    complete_upload,
+    create_upload,
+    get_upload,
+    object_path,
+    relative_object_path,
+    store_stream,
+)
+from backend.services.events import event_stream, publish_on_commit
+from backend.services.installations import apply_status_reports
+from backend.services.jobs import enqueue
+from backend.services.software_deltas import (
+    build_and_store,
+    delta_dict,
+    installation_package,
+    request_delta,
+    request_neighbour_deltas,
+)
+from backend.services.software_inventory import (
+    inventory_matrix,
+    rebuild_inventory,
+    record_changes,
+    snapshot,
+)
 
 router = APIRouter(prefix="/fleet-software", tags=["Fleet Software Management"])
 
+SHA256_PATTERN = r"^[0-9a-fA-F]{64}$"
+UPLOAD_ID_PATTERN = r"^[0-9a-f]{32}$"
+
 
 # Pydantic models for Software management
 class SoftwareCreate(BaseModel):
@@ -153,6 +187,17 @@ class InstallationRequest(BaseModel):
         return v
 
 
+class InstallationStatusReport(BaseModel):
+    installation_id: int
+    status: str = Field(..., pattern="^(in_progress|completed|failed|rolled_back|cancelled)$")
+    message: Optional[str] = Field(None, max_length=1000)
+    error_message: Optional[str] = None
+
+
+class InstallationStatusBatch(BaseModel):
+    reports: List[InstallationStatusReport] = Field(..., min_length=1, max_length=10000)
+
+
 class InstallationResponse(BaseModel):
     id: int
     device_id: int
@@ -168,11 +213,83 @@ class InstallationResponse(BaseModel):
     device_number: str = ""
     software_name: str = ""
     version_number: str = ""
+    job_id: Optional[int] = None  # background job carrying out a new installation
+    download: Optional[Dict[str, Any]] = None  # full image or delta for the device
 
     class Config:
         from_attributes = True
 
 
+class ArtifactUploadCreate(BaseModel):
+    size: Optional[int] = Field(None, ge=0)
+    sha256: Optional[str] = Field(None, pattern=SHA256_PATTERN)
+
+
+class VersionArtifact(BaseModel):
+    sha256: str = Field(..., pattern=SHA256_PATTERN)
+
+
+class DeltaRequest(BaseModel):
+    source_sha256: str = Field(..., pattern=SHA256_PATTERN)
+    target_sha256: str = Field(..., pattern=SHA256_PATTERN)
+
+
+def _version_summaries(db: Session, software_ids: List[int]) -> Dict[int, tuple]:
+    """Return ``{software_id: (versions_count, latest_version)}`` using grouped queries."""
+    summaries = {software_id: (0, None) for software_id in software_ids}
+    if not software_ids:
+        return summaries
+
+    counts = dict(
+        db.query(SoftwareVersion.software_id, func.count(SoftwareVersion.id))
+        .filter(SoftwareVersion.software_id.in_(software_ids))
+        .group_by(SoftwareVersion.software_id)
+        .all()
+    )
+
+    ranked = (
+        db.query(
+            SoftwareVersion.software_id.label("software_id"),
+            SoftwareVersion.version_number.label("version_number"),
+            func.row_number()
+            .over(
+                partition_by=SoftwareVersion.software_id,
+                order_by=(desc(SoftwareVersion.created_at), desc(SoftwareVersion.id)),
+            )
+            .label("rank"),
+        )
+        .filter(SoftwareVersion.software_id.in_(software_ids))
+        .subquery()
+    )
+    latest = dict(
+        db.query(ranked.c.software_id, ranked.c.version_number).filter(ranked.c.rank == 1).all()
+    )
+
+    for software_id in software_ids:
+        summaries[software_id] = (counts.get(software_id, 0), latest.get(software_id))
+    return summaries
+
+
+def _software_dict(software: Software, versions_count: int, latest_version: Optional[str]):
+    return {
+        "id": software.id,
+        "name": software.name,
+        "description": software.description,
+        "vendor": software.vendor,
+        "category": software.category,
+        "platform": software.platform,
+        "license_type": software.license_type,
+        "repository_url": software.repository_url,
+        "documentation_url": software.documentation_url,
+        "created_by": software.created_by,
+        "created_at": software.created_at,
+        "updated_at": software.updated_at,
+        "is_active": software.is_active,
+        "versions_count": versions_count,
+        "latest_version": latest_version,
+    }
+
+
 # Software CRUD endpoints
 @router.get("/software", response_model=List[SoftwareResponse])
 def get_software_list(
@@ -203,42 +320,9 @@ def get_software_list(
 
     software_list = query.offset(skip).limit(limit).all()
 
-    # Add version count and latest version for each software
-    result = []
-    for software in software_list:
-        versions_count = (
-            db.query(func.count(SoftwareVersion.id))
-            .filter(SoftwareVersion.software_id == software.id)
-            .scalar()
-        )
-
-        latest_version = (
-            db.query(SoftwareVersion.version_number)
-            .filter(SoftwareVersion.software_id == software.id)
-            .order_by(desc(SoftwareVersion.created_at))
-            .first()
-        )
-
-        software_dict = {
-            "id": software.id,
-            "name": software.name,
-            "description": software.description,
-            "vendor": software.vendor,
-            "category": software.category,
-            "platform": software.platform,
-            "license_type": software.license_type,
-            "repository_url": software.repository_url,
-            "documentation_url": software.documentation_url,
-            "created_by": software.created_by,
-            "created_at": software.created_at,
-            "updated_at": software.updated_at,
-            "is_active": software.is_active,
-            "versions_count": versions_count,
-            "latest_version": latest_version[0] if latest_version else None,
-        }
-        result.append(software_dict)
-
-    return result
+    # Version count and latest version for the whole page in two queries
+    summaries = _version_summaries(db, [software.id for software in software_list])
+    return [_software_dict(software, *summaries[software.id]) for software in software_list]
 
 
 @router.post("/software", response_model=SoftwareResponse)
@@ -271,6 +355,8 @@ def create_software(
     )
 
     db.add(db_software)
+    db.flush()
+    publish_on_commit(db, "fleet-software", "software.created", {"id": db_software.id})
     db.commit()
     db.refresh(db_software)
 
@@ -304,37 +390,7 @@ def get_software(
     if not software:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Software not found")
 
-    # Get version count and latest version
-    versions_count = (
-        db.query(func.count(SoftwareVersion.id))
-        .filter(SoftwareVersion.software_id == software.id)
-        .scalar()
-    )
-
-    latest_version = (
-        db.query(SoftwareVersion.version_number)
-        .filter(SoftwareVersion.software_id == software.id)
-        .order_by(desc(SoftwareVersion.created_at))
-        .first()
-    )
-
-    return {
-        "id": software.id,
-        "name": software.name,
-        "description": software.description,
-        "vendor": software.vendor,
-        "category": software.category,
-        "platform": software.platform,
-        "license_type": software.license_type,
-        "repository_url": software.repository_url,
-        "documentation_url": software.documentation_url,
-        "created_by": software.created_by,
-        "created_at": software.created_at,
-        "updated_at": software.updated_at,
-        "is_active": software.is_active,
-        "versions_count": versions_count,
-        "latest_version": latest_version[0] if latest_version else None,
-    }
+    return _software_dict(software, *_version_summaries(db, [software.id])[software.id])
 
 
 @router.put("/software/{software_id}", response_model=SoftwareResponse)
@@ -363,40 +419,11 @@ def update_software(
     for field, value in update_data.items():
         setattr(software, field, value)
 
+    publish_on_commit(db, "fleet-software", "software.updated", {"id": software_id, **update_data})
     db.commit()
     db.refresh(software)
 
-    # Get updated counts
-    versions_count = (
-        db.query(func.count(SoftwareVersion.id))
-        .filter(SoftwareVersion.software_id == software.id)
-        .scalar()
-    )
-
-    latest_version = (
-        db.query(SoftwareVersion.version_number)
-        .filter(SoftwareVersion.software_id == software.id)
-        .order_by(desc(SoftwareVersion.created_at))
-        .first()
-    )
-
-    return {
-        "id": software.id,
-        "name": software.name,
-        "description": software.description,
-        "vendor": software.vendor,
-        "category": software.category,
-        "platform": software.platform,
-        "license_type": software.license_type,
-        "repository_url": software.repository_url,
-        "documentation_url": software.documentation_url,
-        "created_by": software.created_by,
-        "created_at": software.created_at,
-        "updated_at": software.updated_at,
-        "is_active": software.is_active,
-        "versions_count": versions_count,
-        "latest_version": latest_version[0] if latest_version else None,
-    }
+    return _software_dict(software, *_version_summaries(db, [software.id])[software.id])
 
 
 @router.delete("/software/{software_id}")
@@ -412,6 +439,7 @@ def delete_software(
 
     # Soft delete - set is_active to False
     setattr(software, "is_active", False)
+    publish_on_commit(db, "fleet-software", "software.deleted", {"id": software_id})
     db.commit()
 
     return {"message": f"Software '{software.name}' deactivated successfully"}
@@ -441,14 +469,19 @@ def get_software_versions(
         .all()
     )
 
-    # Add additional info for each version
+    # Installation counts for the whole page in one grouped query
+    installation_counts = {}
+    if versions:
+        installation_counts = dict(
+            db.query(SoftwareInstallation.version_id, func.count(SoftwareInstallation.id))
+            .filter(SoftwareInstallation.version_id.in_([version.id for version in versions]))
+            .group_by(SoftwareInstallation.version_id)
+            .all()
+        )
+
     result = []
     for version in versions:
-        installations_count = (
-            db.query(func.count(SoftwareInstallation.id))
-            .filter(SoftwareInstallation.version_id == version.id)
-            .scalar()
-        )
+        installations_count = installation_counts.get(version.id, 0)
 
         version_dict = {
             "id": version.id,
@@ -524,6 +557,13 @@ def create_software_version(
     )
 
     db.add(db_version)
+    db.flush()
+    publish_on_commit(
+        db,
+        "fleet-software",
+        "version.created",
+        {"id": db_version.id, "software_id": software_id, "version_number": version.version_number},
+    )
     db.commit()
     db.refresh(db_version)
 
@@ -586,9 +626,14 @@ def create_installation(
         .first()
     )
 
+    inventory_key = [(installation.device_id, version.software_id)]
+    inventory_before = snapshot(db, inventory_key)
     previous_version = None
+    installed_version = None
     if current_installation:
         previous_version = current_installation.installed_version
+        if current_installation.version_id:
+            installed_version = db.get(SoftwareVersion, current_installation.version_id)
 
     # Create installation record
     db_installation = SoftwareInstallation(
@@ -601,9 +646,10 @@ def create_installation(
         new_version=version.version_number,
     )
 
+    # Flushed, not committed: the record, the inventory change and the job
+    # below are committed together or not at all
     db.add(db_installation)
-    db.commit()
-    db.refresh(db_installation)
+    db.flush()
 
     # Update or create device software record
     if installation.action in ["install", "update"]:
@@ -626,7 +672,32 @@ def create_installation(
                 notes=installation.notes,
             )
             db.add(new_device_software)
-
+        db.flush()
+        record_changes(db, inventory_before, snapshot(db, inventory_key))
+
+    # The worker pool carries the installation out; queued in the same transaction
+    # as the installation record
+    job = enqueue(
+        db,
+        "software.installation",
+        payload={"installation_id": db_installation.id},
+        created_by=current_user.id,
+    )
+    download = None
+    if installation.action != "uninstall":
+        download = installation_package(db, version, installed_version, current_user.id)
+    publish_on_commit(
+        db,
+        "fleet-software",
+        "installation.created",
+        {
+            "id": db_installation.id,
+            "device_id": db_installation.device_id,
+            "version_id": db_installation.version_id,
+            "action": db_installation.action,
+            "status": db_installation.status,
+        },
+    )
     db.commit()
 
     return {
@@ -644,6 +715,8 @@ def create_installation(
         "device_number": device.device_number,
         "software_name": version.software.name,
         "version_number": version.version_number,
+        "job_id": job.id,
+        "download": download,
     }
 
 
@@ -699,6 +772,92 @@ def get_installations(
     return result
 
 
+@router.post("/installations/status-reports")
+def report_installation_statuses(
+    batch: InstallationStatusBatch,
+    current_user: User = Depends(require_role("maker")),
+    db: Session = Depends(get_db),
+):
+    """Apply many installation status reports at once (Maker only).
+
+    Invalid transitions are listed in ``rejected``; the other reports are applied.
+    """
+    result = apply_status_reports(db, [report.model_dump() for report in batch.reports])
+    db.commit()
+    return result
+
+
+@router.post("/installations/{installation_id}/status")
+def report_installation_status(
+    installation_id: int,
+    report: InstallationStatusReport,
+    current_user: User = Depends(require_role("maker")),
+    db: Session = Depends(get_db),
+):
+    """Move one installation to a new status (Maker only)."""
+    if report.installation_id != installation_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Installation id mismatch"
+        )
+    if db.get(SoftwareInstallation, installation_id) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Installation not found")
+    result = apply_status_reports(db, [report.model_dump()])
+    if result["rejected"]:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail=result["rejected"][0]["detail"]
+        )
+    db.commit()
+
+    return {"installation_id": installation_id, "status": report.status}
+
+
+@router.get("/installations/{installation_id}/package")
+def get_installation_package(
+    installation_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """What the device should download: a delta from its previous version when ready."""
+    installation = (
+        db.query(SoftwareInstallation)
+        .options(joinedload(SoftwareInstallation.version))
+        .filter(SoftwareInstallation.id == installation_id)
+        .first()
+    )
+    if not installation:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Installation not found")
+
+    installed_version = None
+    if installation.previous_version:
+        installed_version = (
+            db.query(SoftwareVersion)
+            .filter(
+                SoftwareVersion.software_id == installation.version.software_id,
+                SoftwareVersion.version_number == installation.previous_version,
+            )
+            .first()
+        )
+    package = installation_package(db, installation.version, installed_version, current_user.id)
+    db.commit()
+    if package is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Version has no stored artifact"
+        )
+
+    return package
+
+
+@router.get("/events")
+async def stream_events(
+    request: Request,
+    current_user: User = Depends(require_role("maker")),
+    db: Session = Depends(get_db),
+):
+    """Server-Sent Events with software, version and installation changes (Maker only)."""
+    db.close()  # the stream stays open for hours; do not hold a connection
+    return event_stream(request, "fleet-software")
+
+
 @router.get("/dashboard/stats")
 def get_dashboard_stats(
     current_user: User = Depends(require_role("maker")), db: Session = Depends(get_db)
@@ -745,3 +904,261 @@ def get_dashboard_stats(
             {"status": row[0], "count": row[1]} for row in installations_by_status
         ],
     }
+
+
+@router.get("/inventory")
+def get_software_inventory(
+    current_user: User = Depends(require_role("maker")), db: Session = Depends(get_db)
+):
+    """Devices per software and version, with the count running a non-latest version."""
+    software_ids = [row[0] for row in db.query(Software.id).filter(Software.is_active == True)]
+    summaries = _version_summaries(db, software_ids)
+    matrix = inventory_matrix(
+        db, {software_id: latest for software_id, (_, latest) in summaries.items()}
+    )
+
+    return {
+        "software": matrix,
+        "devices": sum(item["devices"] for item in matrix),
+        "outdated": sum(item["outdated"] for item in matrix),
+    }
+
+
+@router.post("/inventory/rebuild")
+def rebuild_software_inventory(
+    background: bool = Query(False, description="Run as a background job (202 + job id)"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Recompute the software inventory from the device software records (admin only)."""
+    if str(current_user.role) not in ["admin", "superuser"]:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
+
+    if background:
+        job = enqueue(db, "software.rebuild_inventory", created_by=current_user.id)
+        db.commit()
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"message": "Inventory rebuild queued", "job_id": job.id},
+        )
+    result = rebuild_inventory(db)
+    db.commit()
+
+    return result
+
+
+# Artifact store endpoints
+def _artifact_dict(artifact: Artifact, deduplicated: bool = False) -> Dict[str, Any]:
+    return {
+        "sha256": artifact.sha256,
+        "size": artifact.size,
+        "created_at": artifact.created_at,
+        "download_url": f"{settings.api_v1_str}/fleet-software/artifacts/{artifact.sha256}",
+        "deduplicated": deduplicated,
+    }
+
+
+def _upload_dict(upload) -> Dict[str, Any]:
+    return {
+        "upload_id": upload.id,
+        "status": upload.status,
+        "offset": upload.bytes_received,
+        "size": upload.expected_size,
+        "sha256": upload.artifact_sha256 or upload.expected_sha256,
+    }
+
+
+def _artifact_http_error(db: Session, error: ArtifactError) -> HTTPException:
+    db.rollback()
+    if isinstance(error, UploadConflict):
+        return HTTPException(
+            status_code=error.status_code,
+            detail={
+                "message": error.message,
+                "offset": error.offset,
+                "status": error.upload_status,
+            },
+            headers={"Upload-Offset": str(error.offset)},
+        )
+    return HTTPException(status_code=error.status_code, detail=error.message)
+
+
+def _check_content_length(request: Request) -> None:
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > settings.artifact_max_size_mb * 1024 * 1024:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Artifact larger than {settings.artifact_max_size_mb} MB",
+        )
+
+
+@router.post("/artifacts", status_code=status.HTTP_201_CREATED)
+async def upload_artifact(
+    request: Request,
+    sha256: Optional[str] = Query(None, pattern=SHA256_PATTERN, description="Expected SHA-256"),
+    current_user: User = Depends(require_role("maker")),
+    db: Session = Depends(get_db),
+):
+    """Store the raw request body as an artifact (Maker only); identical content is kept once."""
+    _check_content_length(request)
+    try:
+        artifact, created = await store_stream(db, request.stream(), current_user.id, sha256)
+    except ArtifactError as error:
+        raise _artifact_http_error(db, error)
+    db.commit()
+
+    return _artifact_dict(artifact, deduplicated=not created)
+
+
+@router.post("/artifacts/uploads", status_code=status.HTTP_201_CREATED)
+def start_artifact_upload(
+    upload: ArtifactUploadCreate,
+    current_user: User = Depends(require_role("maker")),
+    db: Session = Depends(get_db),
+):
+    """Start a resumable upload; send the data with PATCH and an Upload-Offset header."""
+    try:
+        db_upload = create_upload(db, current_user.id, upload.size, upload.sha256)
+    except ArtifactError as error:
+        raise _artifact_http_error(db, error)
+    db.commit()
+
+    return _upload_dict(db_upload)
+
+
+@router.get("/artifacts/uploads/{upload_id}")
+def get_artifact_upload(
+    upload_id: str = Path(..., pattern=UPLOAD_ID_PATTERN),
+    current_user: User = Depends(require_role("maker")),
+    db: Session = Depends(get_db),
+):
+    """Status of an upload; ``offset`` is where an interrupted upload resumes."""
+    try:
+        upload = get_upload(db, upload_id)
+    except ArtifactError as error:
+        raise _artifact_http_error(db, error)
+
+    return _upload_dict(upload)
+
+
+@router.patch("/artifacts/uploads/{upload_id}")
+async def append_artifact_upload(
+    request: Request,
+    upload_id: str = Path(..., pattern=UPLOAD_ID_PATTERN),
+    upload_offset: int = Header(..., ge=0),
+    current_user: User = Depends(require_role("maker")),
+    db: Session = Depends(get_db),
+):
+    """Append the request body at Upload-Offset (409 with the current offset on mismatch)."""
+    _check_content_length(request)
+    try:
+        upload = await append_to_upload(db, upload_id, upload_offset, request.stream())
+    except ArtifactError as error:
+        raise _artifact_http_error(db, error)
+
+    return _upload_dict(upload)
+
+
+@router.post("/artifacts/uploads/{upload_id}/complete")
+async def complete_artifact_upload(
+    upload_id: str = Path(..., pattern=UPLOAD_ID_PATTERN),
+    current_user: User = Depends(require_role("maker")),
+    db: Session = Depends(get_db),
+):
+    """Verify the upload's size and SHA-256 and add it to the store."""
+    try:
+        artifact, created = await complete_upload(db, upload_id, current_user.id)
+    except ArtifactError as error:
+        raise _artifact_http_error(db, error)
+
+    return _artifact_dict(artifact, deduplicated=not created)
+
+
+@router.api_route("/artifacts/{sha256}", methods=["GET", "HEAD"])
+def download_artifact(
+    request: Request,
+    sha256: str = Path(..., pattern=SHA256_PATTERN),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Download an artifact; supports Range requests and If-None-Match."""
+    sha256 = sha256.lower()
+    artifact = db.query(Artifact).filter(Artifact.sha256 == sha256).first()
+    if not artifact:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Artifact not found")
+
+    accel_redirect = None
+    if settings.artifact_accel_redirect_prefix:
+        prefix = settings.artifact_accel_redirect_prefix.rstrip("/")
+        accel_redirect = f"{prefix}/{relative_object_path(sha256)}"
+    return RangeFileResponse(
+        object_path(sha256),
+        request.headers,
+        etag=sha256,
+        filename=sha256,
+        accel_redirect=accel_redirect,
+        method=request.method,
+    )
+
+
+@router.post("/software/{software_id}/versions/{version_id}/artifact")
+def attach_version_artifact(
+    software_id: int,
+    version_id: int,
+    body: VersionArtifact,
+    current_user: User = Depends(require_role("maker")),
+    db: Session = Depends(get_db),
+):
+    """Point a version's file fields at a stored artifact (Maker only)."""
+    version = (
+        db.query(SoftwareVersion)
+        .filter(SoftwareVersion.id == version_id, SoftwareVersion.software_id == software_id)
+        .first()
+    )
+    if not version:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Version not found")
+    artifact = db.query(Artifact).filter(Artifact.sha256 == body.sha256.lower()).first()
+    if not artifact:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Artifact not found")
+
+    artifact_data = _artifact_dict(artifact)
+    version.file_path = relative_object_path(artifact.sha256)
+    version.file_size = artifact.size
+    version.checksum = artifact.sha256
+    version.download_url = artifact_data["download_url"]
+    request_neighbour_deltas(db, version, current_user.id)
+    db.commit()
+
+    return {
+        "message": "Artifact attached to version",
+        "version_id": version.id,
+        "artifact": artifact_data,
+    }
+
+
+@router.post("/deltas")
+def create_delta(
+    body: DeltaRequest,
+    background: bool = Query(True, description="Build in a background job (202 + job)"),
+    current_user: User = Depends(require_role("maker")),
+    db: Session = Depends(get_db),
+):
+    """Get or build the binary delta between two artifacts (Maker only)."""
+    source_sha256, target_sha256 = body.source_sha256.lower(), body.target_sha256.lower()
+    if source_sha256 == target_sha256:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Identical artifacts")
+    found = db.query(Artifact.sha256).filter(Artifact.sha256.in_([source_sha256, target_sha256]))
+    if found.count() != 2:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Artifact not found")
+
+    delta = request_delta(db, source_sha256, target_sha256, current_user.id)
+    if delta.status == "pending" and background:
+        db.commit()
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"message": "Delta build queued", "delta": delta_dict(delta)},
+        )
+    build_and_store(db, delta, current_user.id)
+    db.commit()
+
+    return {"delta": delta_dict(delta)}
@@ -3,17 +3,65 @@ Fleet Workshop Manager API Router
 Handles repairs, maintenance, and parts management
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
-from typing import List, Optional
-from pydantic import BaseModel
-from datetime import datetime, timedelta
+from sqlalchemy import func, or_, and_
+from typing import List, Optional, Union
+from pydantic import BaseModel, Field, validator
+from datetime import date, datetime
 from backend.db.base import get_db
-from backend.models.models import Repair, Maintenance, Part, Device, User
-from backend.auth.auth import get_current_user
-
-router = APIRouter(prefix="/api/v1/fleet-workshop", tags=["Fleet Workshop Manager"])
+from backend.models.models import (
+    Repair,
+    Maintenance,
+    Part,
+    PartForecast,
+    PartReservation,
+    Device,
+    User,
+)
+from backend.auth.auth import get_current_user, require_role
+from backend.services.events import event_stream, publish_on_commit
+from backend.services.jobs import enqueue
+from backend.services.maintenance import (
+    complete_maintenance,
+    maintenance_calendar,
+    next_occurrence,
+    sync_due_status,
+)
+from backend.services.parts_forecast import (
+    below_reorder_point,
+    compute_forecast,
+    reorder_suggestions,
+)
+from backend.services.parts_stock import (
+    InsufficientStock,
+    aggregate_items,
+    change_stock,
+    consume_for_repair,
+    release_reservations,
+    reserve_parts,
+    uncovered_parts,
+)
+from backend.services.parts_usage import (
+    parse_parts,
+    parts_consumption,
+    record_maintenance_usage,
+    record_repair_usage,
+    remove_repair_usage,
+    repair_costs,
+)
+
+router = APIRouter(prefix="/fleet-workshop", tags=["Fleet Workshop Manager"])
+
+# Longest /calendar window (a year view plus slack)
+MAX_CALENDAR_DAYS = 400
+
+# Analytics periods are months, YYYY-MM
+PERIOD_PATTERN = r"^\d{4}-(0[1-9]|1[0-2])$"
+
+# Repair fields that change its recorded cost
+REPAIR_COST_FIELDS = {"parts_used", "actual_cost", "labor_hours", "completed_at"}
 
 # Pydantic Models for Request/Response
 
@@ -24,7 +72,7 @@ class RepairCreate(BaseModel):
     priority: str = "medium"  # low, medium, high, critical
     description: str
     problem_description: Optional[str] = None
-    parts_used: Optional[dict] = None
+    parts_used: Optional[Union[List[dict], dict]] = None
     cost_estimate: Optional[int] = None
     assigned_to: Optional[int] = None
     scheduled_date: Optional[datetime] = None
@@ -38,7 +86,7 @@ class RepairUpdate(BaseModel):
     description: Optional[str] = None
     problem_description: Optional[str] = None
     solution_description: Optional[str] = None
-    parts_used: Optional[dict] = None
+    parts_used: Optional[Union[List[dict], dict]] = None
     labor_hours: Optional[int] = None
     cost_estimate: Optional[int] = None
     actual_cost: Optional[int] = None
@@ -57,7 +105,7 @@ class MaintenanceCreate(BaseModel):
     title: str
     description: Optional[str] = None
     checklist: Optional[dict] = None
-    parts_required: Optional[dict] = None
+    parts_required: Optional[Union[List[dict], dict]] = None
     estimated_duration: Optional[int] = None
     technician_id: Optional[int] = None
     next_due: Optional[datetime] = None
@@ -72,7 +120,7 @@ class MaintenanceUpdate(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
     checklist: Optional[dict] = None
-    parts_required: Optional[dict] = None
+    parts_required: Optional[Union[List[dict], dict]] = None
     estimated_duration: Optional[int] = None
     actual_duration: Optional[int] = None
     technician_id: Optional[int] = None
@@ -81,6 +129,19 @@ class MaintenanceUpdate(BaseModel):
     completion_notes: Optional[str] = None
 
 
+class PartQuantity(BaseModel):
+    part_id: int
+    quantity: int = Field(..., gt=0)
+
+
+class RepairPartsRequest(BaseModel):
+    items: List[PartQuantity] = []
+
+
+class StockAdjustment(BaseModel):
+    delta: int  # received (+) or written off (-)
+
+
 class PartCreate(BaseModel):
     part_number: str
     name: str
@@ -109,6 +170,8 @@ class PartUpdate(BaseModel):
     supplier: Optional[str] = None
     unit_price: Optional[int] = None
     currency: Optional[str] = None
+    # Accepted only to be rejected: stock changes go through POST /parts/{id}/adjust,
+    # an absolute value here would overwrite concurrent adjustments
     stock_quantity: Optional[int] = None
     min_stock_level: Optional[int] = None
     max_stock_level: Optional[int] = None
@@ -120,6 +183,10 @@ class PartUpdate(BaseModel):
     barcode: Optional[str] = None
     notes: Optional[str] = None
 
+    @validator("stock_quantity")
+    def validate_stock_quantity(cls, v):
+        raise ValueError("Stock is changed through POST /parts/{part_id}/adjust")
+
 
 # Dashboard and Statistics
 
@@ -130,21 +197,23 @@ async def get_dashboard(
 ):
     """Get workshop dashboard statistics"""
 
-    # Count repairs by status
-    pending_repairs = db.query(Repair).filter(Repair.status == "pending").count()
-    in_progress_repairs = db.query(Repair).filter(Repair.status == "in_progress").count()
-    completed_repairs = db.query(Repair).filter(Repair.status == "completed").count()
-
-    # Count maintenance by status
-    scheduled_maintenance = db.query(Maintenance).filter(Maintenance.status == "scheduled").count()
-    overdue_maintenance = db.query(Maintenance).filter(Maintenance.status == "overdue").count()
-    completed_maintenance = db.query(Maintenance).filter(Maintenance.status == "completed").count()
+    # Count repairs and maintenance by status (overdue is kept current by the
+    # maintenance.refresh job, so no date scan is needed here)
+    repair_counts = dict(
+        db.query(Repair.status, func.count(Repair.id)).group_by(Repair.status).all()
+    )
+    maintenance_counts = dict(
+        db.query(Maintenance.status, func.count(Maintenance.id))
+        .group_by(Maintenance.status)
+        .all()
+    )
 
     # Parts statistics
     total_parts = db.query(Part).filter(Part.status == "active").count()
     low_stock_parts = (
         db.query(Part)
-        .filter(and_(Part.status == "active", Part.stock_quantity <= Part.min_stock_level))
+        .outerjoin(PartForecast, PartForecast.part_id == Part.id)
+        .filter(and_(Part.status == "active", below_reorder_point()))
         .count()
     )
 
@@ -156,9 +225,9 @@ async def get_dashboard(
 
     return {
         "repairs": {
-            "pending": pending_repairs,
-            "in_progress": in_progress_repairs,
-            "completed": completed_repairs,
+            "pending": repair_counts.get("pending", 0),
+            "in_progress": repair_counts.get("in_progress", 0),
+            "completed": repair_counts.get("completed", 0),
             "recent": [
                 {
                     "id": r.id,
@@ -172,9 +241,9 @@ async def get_dashboard(
             ],
         },
         "maintenance": {
-            "scheduled": scheduled_maintenance,
-            "overdue": overdue_maintenance,
-            "completed": completed_maintenance,
+            "scheduled": maintenance_counts.get("scheduled", 0),
+            "overdue": maintenance_counts.get("overdue", 0),
+            "completed": maintenance_counts.get("completed", 0),
             "recent": [
                 {
                     "id": m.id,
@@ -191,6 +260,16 @@ async def get_dashboard(
     }
 
 
+@router.get("/events")
+async def stream_events(
+    request: Request, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)
+):
+    """Server-Sent Events with repair, maintenance and parts changes"""
+
+    db.close()  # the stream stays open for hours; do not hold a connection
+    return event_stream(request, "fleet-workshop")
+
+
 # Repairs Endpoints
 
 
@@ -237,6 +316,13 @@ async def create_repair(
     db_repair = Repair(**repair.dict(), reported_by=current_user.id)
 
     db.add(db_repair)
+    db.flush()
+    publish_on_commit(
+        db,
+        "fleet-workshop",
+        "repair.created",
+        {"id": db_repair.id, "device_id": db_repair.device_id, "status": db_repair.status},
+    )
     db.commit()
     db.refresh(db_repair)
 
@@ -270,7 +356,9 @@ async def update_repair(
         raise HTTPException(status_code=404, detail="Repair not found")
 
     # Update fields
-    for field, value in repair_update.dict(exclude_unset=True).items():
+    previous_status = repair.status
+    changes = repair_update.dict(exclude_unset=True)
+    for field, value in changes.items():
         setattr(repair, field, value)
 
     # Auto-set timestamps based on status changes
@@ -279,12 +367,130 @@ async def update_repair(
     elif repair_update.status == "completed" and not repair.completed_at:
         repair.completed_at = datetime.utcnow()
 
+    # Closing a repair consumes its reserved parts, plus parts_used sent with it
+    # that were not reserved; cancelling returns them
+    if repair_update.status != previous_status:
+        if repair_update.status == "completed":
+            extra = {}
+            if "parts_used" in changes:
+                extra = uncovered_parts(db, repair.id, parse_parts(changes["parts_used"]))
+            try:
+                consume_for_repair(db, repair, extra, current_user.id)
+            except InsufficientStock as error:
+                raise _stock_conflict(db, error)
+        elif repair_update.status == "cancelled":
+            release_reservations(db, repair)
+
+    # The usage ledger holds completed repairs only
+    if repair.status == "completed":
+        if previous_status != "completed" or changes.keys() & REPAIR_COST_FIELDS:
+            record_repair_usage(db, repair)
+    elif previous_status == "completed":
+        remove_repair_usage(db, repair.id)
+
+    publish_on_commit(db, "fleet-workshop", "repair.updated", {"id": repair_id, **changes})
     db.commit()
     db.refresh(repair)
 
     return {"message": "Repair updated successfully", "repair": repair}
 
 
+def _get_repair_or_404(db: Session, repair_id: int) -> Repair:
+    repair = db.query(Repair).filter(Repair.id == repair_id).first()
+    if not repair:
+        raise HTTPException(status_code=404, detail="Repair not found")
+    return repair
+
+
+def _stock_conflict(db: Session, error: InsufficientStock) -> HTTPException:
+    db.rollback()
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail={"message": "Insufficient stock", "shortages": error.shortages},
+    )
+
+
+@router.get("/repairs/{repair_id}/parts")
+async def get_repair_parts(
+    repair_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)
+):
+    """Get the parts reserved for and consumed by a repair"""
+
+    _get_repair_or_404(db, repair_id)
+    reservations = (
+        db.query(PartReservation)
+        .filter(PartReservation.repair_id == repair_id)
+        .order_by(PartReservation.id)
+        .all()
+    )
+
+    return {"reservations": reservations}
+
+
+@router.post("/repairs/{repair_id}/parts/reserve")
+async def reserve_repair_parts(
+    repair_id: int,
+    request: RepairPartsRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Reserve parts for a repair (all or nothing, 409 with shortages if stock is missing)"""
+
+    repair = _get_repair_or_404(db, repair_id)
+    if not request.items:
+        raise HTTPException(status_code=400, detail="No parts to reserve")
+
+    quantities = aggregate_items((item.part_id, item.quantity) for item in request.items)
+    try:
+        reserved_ids = [r.id for r in reserve_parts(db, repair, quantities, current_user.id)]
+    except InsufficientStock as error:
+        raise _stock_conflict(db, error)
+    db.commit()
+
+    reservations = db.query(PartReservation).filter(PartReservation.id.in_(reserved_ids)).all()
+    return {"message": "Parts reserved successfully", "reservations": reservations}
+
+
+@router.post("/repairs/{repair_id}/parts/release")
+async def release_repair_parts(
+    repair_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)
+):
+    """Return all parts still reserved for a repair to stock"""
+
+    repair = _get_repair_or_404(db, repair_id)
+    released = release_reservations(db, repair)
+    db.commit()
+
+    return {
+        "message": "Parts released successfully",
+        "released": [
+            {"part_id": part_id, "quantity": quantity} for part_id, quantity in released.items()
+        ],
+    }
+
+
+@router.post("/repairs/{repair_id}/parts/consume")
+async def consume_repair_parts(
+    repair_id: int,
+    request: RepairPartsRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Consume a repair's reserved parts plus any extra parts taken from stock in one batch"""
+
+    repair = _get_repair_or_404(db, repair_id)
+    extra = aggregate_items((item.part_id, item.quantity) for item in request.items)
+    try:
+        parts_used = consume_for_repair(db, repair, extra, current_user.id)
+    except InsufficientStock as error:
+        raise _stock_conflict(db, error)
+    if repair.status == "completed":
+        record_repair_usage(db, repair)
+    db.commit()
+
+    return {"message": "Parts consumed successfully", "parts_used": parts_used}
+
+
 # Maintenance Endpoints
 
 
@@ -329,8 +535,21 @@ async def create_maintenance(
 
     # Create maintenance
     db_maintenance = Maintenance(**maintenance.dict(), created_by=current_user.id)
+    if db_maintenance.next_due is None:
+        db_maintenance.next_due = next_occurrence(
+            maintenance.schedule_type, maintenance.frequency_value, datetime.utcnow()
+        )
+    db_maintenance.status = "scheduled"
+    sync_due_status(db_maintenance)
 
     db.add(db_maintenance)
+    db.flush()
+    publish_on_commit(
+        db,
+        "fleet-workshop",
+        "maintenance.created",
+        {"id": db_maintenance.id, "device_id": db_maintenance.device_id},
+    )
     db.commit()
     db.refresh(db_maintenance)
 
@@ -351,32 +570,149 @@ async def update_maintenance(
         raise HTTPException(status_code=404, detail="Maintenance not found")
 
     # Update fields
-    for field, value in maintenance_update.dict(exclude_unset=True).items():
+    was_completed = maintenance.status == "completed"
+    changes = maintenance_update.dict(exclude_unset=True)
+    for field, value in changes.items():
         setattr(maintenance, field, value)
 
-    # Auto-calculate next due date if completed
-    if (
-        maintenance_update.status == "completed"
-        and maintenance.schedule_type
-        and maintenance.frequency_value
-    ):
-        if maintenance.schedule_type == "days":
-            maintenance.next_due = datetime.utcnow() + timedelta(days=maintenance.frequency_value)
-        elif maintenance.schedule_type == "weeks":
-            maintenance.next_due = datetime.utcnow() + timedelta(weeks=maintenance.frequency_value)
-        elif maintenance.schedule_type == "months":
-            maintenance.next_due = datetime.utcnow() + timedelta(
-                days=maintenance.frequency_value * 30
-            )
-
-        maintenance.last_performed = datetime.utcnow()
-
+    # Completing an item computes its next occurrence right away; the
+    # maintenance.refresh job only has to flip items that fall due later
+    if maintenance_update.status == "completed" and not was_completed:
+        complete_maintenance(maintenance, changes.get("last_performed"))
+        record_maintenance_usage(db, maintenance)
+    elif "next_due" not in changes and changes.keys() & {
+        "last_performed",
+        "schedule_type",
+        "frequency_value",
+    }:
+        next_due = next_occurrence(
+            maintenance.schedule_type, maintenance.frequency_value, maintenance.last_performed
+        )
+        if next_due is not None:
+            maintenance.next_due = next_due
+    sync_due_status(maintenance)
+
+    publish_on_commit(
+        db,
+        "fleet-workshop",
+        "maintenance.updated",
+        {"id": maintenance_id, **changes, "status": maintenance.status},
+    )
     db.commit()
     db.refresh(maintenance)
 
     return {"message": "Maintenance updated successfully", "maintenance": maintenance}
 
 
+@router.get("/calendar")
+async def get_maintenance_calendar(
+    date_from: date = Query(..., alias="from"),
+    date_to: date = Query(..., alias="to"),
+    device_id: Optional[int] = None,
+    maintenance_type: Optional[str] = None,
+    include_occurrences: bool = False,
+    limit: int = Query(1000, ge=1, le=10000),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Maintenance occurrences per day between from and to (inclusive), recurrences expanded.
+
+    With include_occurrences the earliest `limit` occurrences are listed too.
+    """
+    if date_to < date_from:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    if (date_to - date_from).days > MAX_CALENDAR_DAYS:
+        raise HTTPException(
+            status_code=400, detail=f"Calendar range is limited to {MAX_CALENDAR_DAYS} days"
+        )
+
+    return maintenance_calendar(
+        db,
+        date_from,
+        date_to,
+        device_id=device_id,
+        maintenance_type=maintenance_type,
+        include_occurrences=include_occurrences,
+        occurrence_limit=limit,
+    )
+
+
+# Analytics Endpoints
+
+
+@router.get("/analytics/parts-consumption")
+async def get_parts_consumption(
+    period_from: str = Query(..., alias="from", pattern=PERIOD_PATTERN),
+    period_to: str = Query(..., alias="to", pattern=PERIOD_PATTERN),
+    group_by: str = Query("customer", pattern="^(customer|part|device_type)$"),
+    customer_id: Optional[int] = None,
+    part_id: Optional[int] = None,
+    device_type: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Parts quantity and cost per month (YYYY-MM, inclusive) and customer, part or device type"""
+    if period_to < period_from:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+
+    return {
+        "from": period_from,
+        "to": period_to,
+        "group_by": group_by,
+        "items": parts_consumption(
+            db,
+            period_from,
+            period_to,
+            group_by=group_by,
+            customer_id=customer_id,
+            part_id=part_id,
+            device_type=device_type,
+        ),
+    }
+
+
+@router.get("/analytics/repair-costs")
+async def get_repair_costs(
+    period_from: str = Query(..., alias="from", pattern=PERIOD_PATTERN),
+    period_to: str = Query(..., alias="to", pattern=PERIOD_PATTERN),
+    group_by: str = Query("device_type", pattern="^(device_type|customer)$"),
+    monthly: bool = False,
+    customer_id: Optional[int] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Completed repairs and their average cost (labour plus parts) per device type or customer"""
+    if period_to < period_from:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+
+    return {
+        "from": period_from,
+        "to": period_to,
+        "group_by": group_by,
+        "items": repair_costs(
+            db,
+            period_from,
+            period_to,
+            group_by=group_by,
+            monthly=monthly,
+            customer_id=customer_id,
+        ),
+    }
+
+
+@router.post("/analytics/rebuild")
+async def rebuild_analytics(
+    current_user: User = Depends(require_role("admin")), db: Session = Depends(get_db)
+):
+    """Recompute the usage rollups from the ledger in a background job (admin only)"""
+    job = enqueue(db, "analytics.rebuild_usage", created_by=current_user.id)
+    db.commit()
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={"message": "Usage rollup rebuild queued", "job_id": job.id},
+    )
+
+
 # Parts Endpoints
 
 
@@ -400,7 +736,10 @@ async def get_parts(
     if status:
         query = query.filter(Part.status == status)
     if low_stock:
-        query = query.filter(Part.stock_quantity <= Part.min_stock_level)
+        # At or below the forecast reorder point (min_stock_level until forecast)
+        query = query.outerjoin(PartForecast, PartForecast.part_id == Part.id).filter(
+            below_reorder_point()
+        )
     if search:
         query = query.filter(
             or_(
@@ -430,12 +769,45 @@ async def create_part(
     db_part = Part(**part.dict(), created_by=current_user.id)
 
     db.add(db_part)
+    db.flush()
+    publish_on_commit(db, "fleet-workshop", "part.created", {"id": db_part.id})
     db.commit()
     db.refresh(db_part)
 
     return {"message": "Part created successfully", "part": db_part}
 
 
+@router.get("/parts/reorder-suggestions")
+async def get_reorder_suggestions(
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Parts at or below their reorder point with suggested order quantities"""
+
+    return {"suggestions": reorder_suggestions(db, limit)}
+
+
+@router.post("/parts/forecast")
+async def forecast_parts(
+    background: bool = Query(False, description="Run as a background job (202 + job id)"),
+    current_user: User = Depends(require_role("admin")),
+    db: Session = Depends(get_db),
+):
+    """Recompute reorder points and days of stock for all parts (admin only)"""
+    if background:
+        job = enqueue(db, "parts.forecast", created_by=current_user.id)
+        db.commit()
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"message": "Parts forecast queued", "job_id": job.id},
+        )
+
+    result = compute_forecast(db)
+    db.commit()
+    return {"message": "Parts forecast updated", **result}
+
+
 @router.get("/parts/{part_id}")
 async def get_part(
     part_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)
@@ -463,15 +835,40 @@ async def update_part(
         raise HTTPException(status_code=404, detail="Part not found")
 
     # Update fields
-    for field, value in part_update.dict(exclude_unset=True).items():
+    changes = part_update.dict(exclude_unset=True)
+    for field, value in changes.items():
         setattr(part, field, value)
 
+    publish_on_commit(db, "fleet-workshop", "part.updated", {"id": part_id, **changes})
     db.commit()
     db.refresh(part)
 
     return {"message": "Part updated successfully", "part": part}
 
 
+@router.post("/parts/{part_id}/adjust")
+async def adjust_part_stock(
+    part_id: int,
+    adjustment: StockAdjustment,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Atomically add received stock or write stock off (never below zero)"""
+
+    part = db.query(Part).filter(Part.id == part_id).first()
+    if not part:
+        raise HTTPException(status_code=404, detail="Part not found")
+
+    try:
+        change_stock(db, {part_id: adjustment.delta})
+    except InsufficientStock as error:
+        raise _stock_conflict(db, error)
+    db.commit()
+    db.refresh(part)
+
+    return {"message": "Stock adjusted successfully", "part": part}
+
+
 @router.delete("/parts/{part_id}")
 async def delete_part(
     part_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)
@@ -483,6 +880,7 @@ async def delete_part(
         raise HTTPException(status_code=404, detail="Part not found")
 
     part.status = "inactive"
+    publish_on_commit(db, "fleet-workshop", "part.deleted", {"id": part_id})
     db.commit()
 
     return {"message": "Part deleted successfully"}
@@ -0,0 +1,104 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from backend.auth.auth import get_current_user, require_role
+from backend.db.base import get_db
+from backend.models.models import Job, User
+from backend.services.jobs import enqueue, job_dict, utcnow
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+def _is_admin(user: User) -> bool:
+    return str(user.role) in ["admin", "superuser"]
+
+
+def _get_job(db: Session, job_id: int, current_user: User) -> Job:
+    job = db.query(Job).filter(Job.id == job_id).first()
+    # Users only see the jobs they started unless they're admin/superuser
+    if not job or (job.created_by != current_user.id and not _is_admin(current_user)):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+
+@router.get("/")
+def get_jobs(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    status: Optional[str] = Query(None),
+    job_type: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> List[dict]:
+    """List background jobs, newest first (own jobs; all jobs for admin/superuser)."""
+    query = db.query(Job)
+    if not _is_admin(current_user):
+        query = query.filter(Job.created_by == current_user.id)
+    if status:
+        query = query.filter(Job.status == status)
+    if job_type:
+        query = query.filter(Job.job_type == job_type)
+    jobs = query.order_by(Job.id.desc()).offset(skip).limit(limit).all()
+    return [job_dict(job, include_result=False) for job in jobs]
+
+
+@router.get("/{job_id}")
+def get_job(
+    job_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)
+):
+    """Get a background job with its progress, payload and result."""
+    return job_dict(_get_job(db, job_id, current_user))
+
+
+@router.post("/{job_id}/cancel")
+def cancel_job(
+    job_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)
+):
+    """Cancel a job that has not started yet."""
+    _get_job(db, job_id, current_user)
+    cancelled = db.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status == "queued")
+        .values(status="cancelled", finished_at=utcnow())
+    ).rowcount
+    db.commit()
+    if not cancelled:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="Only queued jobs can be cancelled"
+        )
+    return job_dict(_get_job(db, job_id, current_user))
+
+
+@router.post("/{job_id}/retry")
+def retry_job(
+    job_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)
+):
+    """Queue a failed or cancelled job again with a fresh attempt budget."""
+    _get_job(db, job_id, current_user)
+    requeued = db.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status.in_(["failed", "cancelled"]))
+        .values(status="queued", attempts=0, error=None, run_after=utcnow(), finished_at=None)
+    ).rowcount
+    db.commit()
+    if not requeued:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Only failed or cancelled jobs can be retried",
+        )
+    return job_dict(_get_job(db, job_id, current_user))
+
+
+@router.post("/purge", status_code=status.HTTP_202_ACCEPTED)
+def purge_jobs(
+    days: Optional[int] = Query(None, ge=0),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_role("admin")),
+):
+    """Queue deletion of finished jobs older than ``days`` (admin only)."""
+    payload = {"days": days} if days is not None else {}
+    job = enqueue(db, "jobs.purge", payload=payload, priority=-10, created_by=current_user.id)
+    db.commit()
+    return {"message": "Job purge queued", "job_id": job.id}
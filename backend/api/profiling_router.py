@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from typing import List
+
+from backend.auth.auth import require_role
+from backend.core.config import settings
+from backend.core.profiling import list_profiles, load_profile
+from backend.models.models import User
+
+router = APIRouter(prefix="/profiles", tags=["profiling"])
+
+
+@router.get("/")
+def get_profiles(current_user: User = Depends(require_role("superuser"))) -> List[dict]:
+    """List stored request profiles, newest first (Superuser only)."""
+    return list_profiles(settings.profile_output_dir)
+
+
+@router.get("/{profile_id}")
+def get_profile(
+    profile_id: str,
+    format: str = Query("json", pattern="^(json|folded)$"),
+    current_user: User = Depends(require_role("superuser")),
+):
+    """Get a request profile with its SQL timeline, or only the folded stacks (Superuser only)."""
+    profile = load_profile(settings.profile_output_dir, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    if format == "folded":
+        return PlainTextResponse(profile["folded"])
+    return profile
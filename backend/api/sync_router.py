@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from backend.auth.auth import get_current_user
+from backend.db.base import get_db
+from backend.models.models import User
+from backend.services.change_log import ENTITIES, changes_since
+
+router = APIRouter(prefix="/sync", tags=["sync"])
+
+
+@router.get("")
+def sync(
+    since: int = Query(0, ge=0, description="`next` of the previous sync (0 = everything)"),
+    limit: int = Query(1000, ge=1, le=10000),
+    entities: Optional[str] = Query(
+        None, description=f"Comma separated subset of: {', '.join(ENTITIES)}"
+    ),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Changes since a sequence number, folded to the latest state per entity.
+
+    Upserts carry the current row in ``data``; deletes only the id. Call again
+    with ``since=next`` while ``has_more``; on ``reset`` drop the local copy.
+    """
+    selected = None
+    if entities:
+        selected = [name.strip() for name in entities.split(",") if name.strip()]
+        unknown = sorted(set(selected) - set(ENTITIES))
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown entities: {', '.join(unknown)}",
+            )
+    return changes_since(db, since, limit, selected)
@@ -0,0 +1,219 @@
+"""
+Fingerprinted static asset pipeline.
+
+``build_assets`` copies every JS/CSS file under ``pages/`` and ``static/`` to
+``dist/assets`` with a content hash in its file name, minifies it when the
+optional ``rjsmin``/``rcssmin`` packages are available and writes ``.gz`` (and
+``.br`` when ``brotli`` is installed) siblings next to it. A ``manifest.json``
+maps logical paths (``pages/cm/cm.js``) to the fingerprinted file.
+
+At runtime templates call ``asset_url("pages/cm/cm.js")``; when the manifest
+is present this resolves to ``/assets/pages/cm/cm.<hash>.js``, which is served
+by ``ImmutableStaticFiles`` with ``Cache-Control: immutable``. Without a build
+the helper falls back to the original ``/pages/...`` URL.
+"""
+import gzip
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, PathLike, StaticFiles
+from starlette.types import Scope
+
+from backend.core.compression import brotli, parse_accept_encoding
+
+try:  # optional minifiers
+    import rjsmin
+except ImportError:  # pragma: no cover - depends on the environment
+    rjsmin = None
+
+try:
+    import rcssmin
+except ImportError:  # pragma: no cover - depends on the environment
+    rcssmin = None
+
+
+ASSET_SOURCE_DIRS = ["pages", "static"]
+ASSET_EXTENSIONS = {".js", ".css"}
+ASSET_OUTPUT_DIR = "dist/assets"
+ASSET_URL_PREFIX = "/assets"
+MANIFEST_NAME = "manifest.json"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_MEDIA_TYPES = {".js": "application/javascript", ".css": "text/css"}
+
+
+def _minify(source: str, extension: str) -> str:
+    if extension == ".js" and rjsmin is not None:
+        return rjsmin.jsmin(source)
+    if extension == ".css" and rcssmin is not None:
+        return rcssmin.cssmin(source)
+    return source
+
+
+def _iter_sources(root: Path, source_dirs: Iterable[str], output_dir: Path) -> Iterable[Path]:
+    for source_dir in source_dirs:
+        base = root / source_dir
+        if not base.is_dir():
+            continue
+        for path in sorted(base.rglob("*")):
+            if path.suffix not in ASSET_EXTENSIONS or not path.is_file():
+                continue
+            if output_dir in path.parents:
+                continue
+            yield path
+
+
+def build_assets(
+    root: str = ".",
+    output_dir: str = ASSET_OUTPUT_DIR,
+    source_dirs: Optional[Iterable[str]] = None,
+    minify: bool = True,
+) -> Dict[str, str]:
+    """Build fingerprinted, precompressed assets and write the manifest.
+
+    Args:
+        root: Project root containing the source directories
+        output_dir: Target directory (relative to root)
+        source_dirs: Directories to scan, defaults to ``pages`` and ``static``
+        minify: Minify JS/CSS when the optional minifiers are installed
+
+    Returns:
+        The manifest mapping logical paths to fingerprinted paths
+    """
+    root_path = Path(root).resolve()
+    out_path = (root_path / output_dir).resolve()
+    out_path.mkdir(parents=True, exist_ok=True)
+
+    manifest: Dict[str, str] = {}
+    for source in _iter_sources(root_path, source_dirs or ASSET_SOURCE_DIRS, out_path):
+        logical = source.relative_to(root_path).as_posix()
+        content = source.read_text(encoding="utf-8")
+        if minify:
+            content = _minify(content, source.suffix)
+        data = content.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()[:12]
+
+        hashed = Path(logical).with_name(f"{source.stem}.{digest}{source.suffix}").as_posix()
+        target = out_path / hashed
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(data)
+        # mtime=0 keeps the .gz byte-identical between builds
+        target.with_name(target.name + ".gz").write_bytes(gzip.compress(data, 9, mtime=0))
+        if brotli is not None:
+            target.with_name(target.name + ".br").write_bytes(brotli.compress(data, quality=11))
+        manifest[logical] = hashed
+
+    # Replaced in one step, so a running server never reads a half-written manifest
+    staging = out_path / f"{MANIFEST_NAME}.tmp"
+    staging.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    os.replace(staging, out_path / MANIFEST_NAME)
+    return manifest
+
+
+class AssetManifest:
+    """Resolves logical asset paths to fingerprinted URLs.
+
+    The manifest is re-read when the file changes (``build_assets`` replaces
+    it), so a ``make assets`` on a running server takes effect without a
+    restart.
+    """
+
+    def __init__(self, output_dir: str = ASSET_OUTPUT_DIR, url_prefix: str = ASSET_URL_PREFIX):
+        self.output_dir = output_dir
+        self.url_prefix = url_prefix
+        self._entries: Optional[Dict[str, str]] = None
+        self._version: Optional[tuple] = None
+
+    @property
+    def entries(self) -> Dict[str, str]:
+        try:
+            stat = os.stat(os.path.join(self.output_dir, MANIFEST_NAME))
+            version = (stat.st_ino, stat.st_mtime_ns)
+        except OSError:
+            version = None
+        if self._entries is None or version != self._version:
+            self.reload()
+            self._version = version
+        return self._entries
+
+    @property
+    def version(self) -> Optional[tuple]:
+        """``(st_ino, st_mtime_ns)`` of the loaded manifest, ``None`` if absent."""
+        self.entries
+        return self._version
+
+    def reload(self) -> None:
+        manifest_path = os.path.join(self.output_dir, MANIFEST_NAME)
+        try:
+            with open(manifest_path) as fh:
+                self._entries = json.load(fh)
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def url(self, logical_path: str) -> str:
+        logical_path = logical_path.lstrip("/")
+        hashed = self.entries.get(logical_path)
+        if hashed is None:
+            return f"/{logical_path}"
+        return f"{self.url_prefix}/{hashed}"
+
+
+manifest = AssetManifest()
+
+
+def asset_url(logical_path: str) -> str:
+    """Jinja helper: ``{{ asset_url('pages/cm/cm.js') }}``."""
+    return manifest.url(logical_path)
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """StaticFiles serving precompressed variants with long-lived caching.
+
+    Files are expected to be fingerprinted, so every response is marked
+    ``immutable``. When the client accepts brotli or gzip and a ``.br``/``.gz``
+    sibling exists, that file is sent with the matching ``Content-Encoding``.
+    """
+
+    def file_response(
+        self,
+        full_path: PathLike,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        full_path = str(full_path)
+        media_type = _MEDIA_TYPES.get(os.path.splitext(full_path)[1])
+        accepted = parse_accept_encoding(request_headers.get("accept-encoding", ""))
+
+        content_encoding = None
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if accepted.get(encoding, 0) <= 0:
+                continue
+            try:
+                stat_result = os.stat(full_path + suffix)
+            except OSError:
+                continue
+            full_path += suffix
+            content_encoding = encoding
+            break
+
+        response = FileResponse(
+            full_path,
+            status_code=status_code,
+            stat_result=stat_result,
+            method=scope["method"],
+            media_type=media_type,
+        )
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        response.headers["Vary"] = "Accept-Encoding"
+        if content_encoding:
+            response.headers["Content-Encoding"] = content_encoding
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -0,0 +1,225 @@
+"""
+Response compression middleware.
+
+Compresses HTTP responses with brotli (when the optional ``brotli`` package is
+installed) or gzip, depending on the client's ``Accept-Encoding``. Buffered
+responses below ``minimum_size`` are passed through untouched; streamed
+responses (``StreamingResponse``) are compressed chunk by chunk and flushed
+after every chunk so that long-running exports keep reaching the client.
+"""
+import zlib
+from typing import Iterable, List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:  # brotli is optional - gzip is always available
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+
+DEFAULT_CONTENT_TYPES = [
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+]
+
+# Responses that must never carry a body or an encoding
+_SKIP_STATUSES = {204, 206, 304}
+
+
+def parse_accept_encoding(header: str) -> dict:
+    """Parse an ``Accept-Encoding`` header into ``{coding: q}``."""
+    codings = {}
+    for part in header.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        coding, _, params = part.partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        codings[coding.strip().lower()] = q
+    return codings
+
+
+class _Compressor:
+    """Thin wrapper giving gzip and brotli the same incremental interface."""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._impl = brotli.Compressor(quality=brotli_quality)
+        else:
+            # wbits=31 -> gzip container
+            self._impl = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._impl.process(data) + self._impl.flush()
+        return self._impl.compress(data) + self._impl.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._impl.finish()
+        return self._impl.flush(zlib.Z_FINISH)
+
+
+def compress_bytes(
+    data: bytes, encoding: str, gzip_level: int = 6, brotli_quality: int = 4
+) -> bytes:
+    """Compress a complete payload in one go (used for buffered responses)."""
+    if encoding == "br":
+        return brotli.compress(data, quality=brotli_quality)
+    compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+class CompressionMiddleware:
+    """ASGI middleware for gzip/brotli response compression.
+
+    Args:
+        app: Wrapped ASGI application
+        minimum_size: Buffered responses smaller than this (bytes) are not compressed
+        gzip_level: zlib compression level (1-9)
+        brotli_quality: Brotli quality (0-11), only used when brotli is installed
+        content_types: Allowlist of media types; entries ending in ``/`` match a prefix
+        enable_brotli: Set to False to always prefer gzip
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        content_types: Optional[Iterable[str]] = None,
+        enable_brotli: bool = True,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.content_types: List[str] = list(content_types or DEFAULT_CONTENT_TYPES)
+        self.enable_brotli = enable_brotli and brotli is not None
+
+    def select_encoding(self, accept_encoding: str) -> Optional[str]:
+        """Pick the best supported encoding for the given ``Accept-Encoding``."""
+        codings = parse_accept_encoding(accept_encoding)
+        if self.enable_brotli and codings.get("br", 0) > 0:
+            return "br"
+        if codings.get("gzip", 0) > 0 or codings.get("*", 0) > 0:
+            return "gzip"
+        return None
+
+    def is_compressible(self, content_type: str) -> bool:
+        media_type = content_type.split(";", 1)[0].strip().lower()
+        if not media_type:
+            return False
+        for allowed in self.content_types:
+            if allowed.endswith("/") and media_type.startswith(allowed):
+                return True
+            if media_type == allowed:
+                return True
+        return False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self.select_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    """Per-request state machine deciding whether and how to compress."""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send) -> None:
+        self.middleware = middleware
+        self.encoding = encoding
+        self._send = send
+        self.start_message: Optional[Message] = None
+        self.compressor: Optional[_Compressor] = None
+        self.passthrough = False
+
+    async def send(self, message: Message) -> None:
+        message_type = message["type"]
+
+        if message_type == "http.response.start":
+            # Hold the start message until we have seen the first body chunk
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            self.passthrough = (
+                message["status"] in _SKIP_STATUSES
+                or "content-encoding" in headers
+                or not self.middleware.is_compressible(headers.get("content-type", ""))
+            )
+            return
+
+        if message_type != "http.response.body":
+            await self._send(message)
+            return
+
+        if self.passthrough:
+            await self._flush_start()
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            if not more_body:
+                await self._send_buffered(body)
+                return
+            self._begin_streaming()
+
+        chunk = self.compressor.compress(body) if body else b""
+        if not more_body:
+            chunk += self.compressor.finish()
+        await self._flush_start()
+        await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    async def _flush_start(self) -> None:
+        if self.start_message is not None:
+            await self._send(self.start_message)
+            self.start_message = None
+
+    async def _send_buffered(self, body: bytes) -> None:
+        if len(body) < self.middleware.minimum_size:
+            await self._flush_start()
+            await self._send({"type": "http.response.body", "body": body})
+            return
+
+        compressed = compress_bytes(
+            body, self.encoding, self.middleware.gzip_level, self.middleware.brotli_quality
+        )
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        headers["Content-Encoding"] = self.encoding
+        headers["Content-Length"] = str(len(compressed))
+        headers.add_vary_header("Accept-Encoding")
+        await self._flush_start()
+        await self._send({"type": "http.response.body", "body": compressed})
+
+    def _begin_streaming(self) -> None:
+        self.compressor = _Compressor(
+            self.encoding, self.middleware.gzip_level, self.middleware.brotli_quality
+        )
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        headers["Content-Encoding"] = self.encoding
+        if "content-length" in headers:
+            del headers["Content-Length"]
+        headers.add_vary_header("Accept-Encoding")
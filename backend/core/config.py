@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pydantic_settings import BaseSettings
 from typing import Optional
 
@@ -19,6 +20,144 @@ class Settings(BaseSettings):
     # CORS
     backend_cors_origins: list = ["*"]  # Allow all origins for Replit
 
+    # Modules enabled on this deployment (comma separated codes, empty = all),
+    # e.g. "fwm,fdm" for a workshop-only node
+    enabled_modules: list = [
+        code.strip() for code in os.getenv("ENABLED_MODULES", "").split(",") if code.strip()
+    ]
+
+    # Page templates: bytecode cache directory (unset = Jinja's private per-user
+    # directory, "" disables; must be owned by the process user), reload on
+    # template change and optional caching of rendered pages without user context
+    template_bytecode_cache_dir: Optional[str] = os.getenv("TEMPLATE_BYTECODE_CACHE_DIR")
+    template_auto_reload: bool = os.getenv("TEMPLATE_AUTO_RELOAD", "true").lower() == "true"
+    template_page_cache: bool = os.getenv("TEMPLATE_PAGE_CACHE", "false").lower() == "true"
+
+    # Per-route request metrics (/metrics endpoint and Server-Timing header);
+    # /metrics requires METRICS_TOKEN as a bearer token, or a loopback client if unset
+    metrics_enabled: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    metrics_server_timing: bool = os.getenv("METRICS_SERVER_TIMING", "false").lower() == "true"
+    metrics_token: Optional[str] = os.getenv("METRICS_TOKEN") or None
+
+    # Slow-query log and N+1 detector: statements slower than SLOW_QUERY_MS and
+    # statement shapes repeated more than N_PLUS_ONE_THRESHOLD times per request
+    # are logged; request query counts are sent in X-Query-* headers
+    query_log_enabled: bool = os.getenv("QUERY_LOG_ENABLED", "true").lower() == "true"
+    slow_query_ms: float = float(os.getenv("SLOW_QUERY_MS", "200"))
+    n_plus_one_threshold: int = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+    query_log_headers: bool = os.getenv("QUERY_LOG_HEADERS", "false").lower() == "true"
+
+    # On-demand profiling of superuser requests (X-Profile: 1 or ?__profile=1);
+    # only the newest PROFILE_MAX_FILES profiles are kept
+    profiling_enabled: bool = os.getenv("PROFILING_ENABLED", "true").lower() == "true"
+    profile_output_dir: str = os.getenv(
+        "PROFILE_OUTPUT_DIR", os.path.join(tempfile.gettempdir(), "fleet-profiles")
+    )
+    profile_sample_interval_ms: float = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "1"))
+    profile_max_files: int = int(os.getenv("PROFILE_MAX_FILES", "100"))
+
+    # Background job queue (scripts/worker.py): worker threads per process, idle
+    # poll interval, running time after which a job's worker is presumed dead,
+    # base retry backoff, per-type concurrency limits ("config.restore=1,...")
+    # and how long finished jobs are kept by the jobs.purge job
+    job_worker_threads: int = int(os.getenv("JOB_WORKER_THREADS", "4"))
+    job_poll_interval_s: float = float(os.getenv("JOB_POLL_INTERVAL_S", "1"))
+    job_lock_timeout_s: float = float(os.getenv("JOB_LOCK_TIMEOUT_S", "600"))
+    job_retry_backoff_s: float = float(os.getenv("JOB_RETRY_BACKOFF_S", "10"))
+    job_concurrency: dict = {
+        name.strip(): int(limit)
+        for name, _, limit in (
+            item.partition("=") for item in os.getenv("JOB_CONCURRENCY", "").split(",")
+        )
+        if name.strip() and limit.strip()
+    }
+    job_retention_days: int = int(os.getenv("JOB_RETENTION_DAYS", "14"))
+    # software.installation jobs only dispatch to the device, which reports the
+    # outcome; true also completes them without a device (demos, development)
+    installation_simulate_completion: bool = (
+        os.getenv("INSTALLATION_SIMULATE_COMPLETION", "false").lower() == "true"
+    )
+
+    # Cadence of the periodic maintenance.refresh job run by the workers
+    # (next_due / overdue state of maintenance items, 0 disables)
+    maintenance_refresh_interval_s: float = float(
+        os.getenv("MAINTENANCE_REFRESH_INTERVAL_S", "60")
+    )
+
+    # Parts stock forecast (parts.forecast job): days of consumption history,
+    # supplier lead time in days, safety factor z (1.65 ~ 95% service level)
+    # and how often the workers recompute it (0 disables)
+    parts_forecast_history_days: int = int(os.getenv("PARTS_FORECAST_HISTORY_DAYS", "90"))
+    parts_forecast_lead_time_days: int = int(os.getenv("PARTS_FORECAST_LEAD_TIME_DAYS", "14"))
+    parts_forecast_service_z: float = float(os.getenv("PARTS_FORECAST_SERVICE_Z", "1.65"))
+    parts_forecast_interval_s: float = float(os.getenv("PARTS_FORECAST_INTERVAL_S", "3600"))
+
+    # Software artifact store (backend/services/artifacts.py): storage
+    # directory, largest accepted file, hours after which unfinished uploads
+    # are removed, and an nginx internal location serving ARTIFACT_STORE_DIR
+    # (e.g. "/protected-artifacts") to hand downloads over via X-Accel-Redirect
+    artifact_store_dir: str = os.getenv("ARTIFACT_STORE_DIR", "./artifacts")
+    artifact_max_size_mb: int = int(os.getenv("ARTIFACT_MAX_SIZE_MB", "2048"))
+    artifact_upload_ttl_h: float = float(os.getenv("ARTIFACT_UPLOAD_TTL_H", "24"))
+    artifact_accel_redirect_prefix: str = os.getenv("ARTIFACT_ACCEL_REDIRECT_PREFIX", "")
+
+    # Binary deltas between software versions: processes building them and
+    # the largest delta worth keeping, relative to the full image
+    delta_processes: int = int(os.getenv("DELTA_PROCESSES", "2"))
+    delta_max_ratio: float = float(os.getenv("DELTA_MAX_RATIO", "0.5"))
+
+    # Idempotency-Key header on mutating requests (backend/core/idempotency.py):
+    # hours a key is remembered and the largest request/response body kept
+    idempotency_enabled: bool = os.getenv("IDEMPOTENCY_ENABLED", "true").lower() == "true"
+    idempotency_ttl_h: float = float(os.getenv("IDEMPOTENCY_TTL_H", "24"))
+    idempotency_max_body_kb: int = int(os.getenv("IDEMPOTENCY_MAX_BODY_KB", "1024"))
+
+    # Admission control (backend/core/rate_limit.py): "rate/burst" token
+    # buckets per user and route (0 = unlimited) by active role, for requests
+    # without a token (per client address; behind a reverse proxy list it in
+    # RATE_LIMIT_TRUSTED_PROXIES so X-Forwarded-For is used), concurrent
+    # requests per route template, and where the state lives (memory,
+    # sqlite:///path or redis://host:port/db)
+    rate_limit_enabled: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    rate_limit_default: str = os.getenv("RATE_LIMIT_DEFAULT", "10/50")
+    rate_limit_anonymous: str = os.getenv("RATE_LIMIT_ANONYMOUS", "5/30")
+    rate_limit_roles: str = os.getenv("RATE_LIMIT_ROLES", "admin=50/200,superuser=0")
+    rate_limit_concurrency: str = os.getenv(
+        "RATE_LIMIT_CONCURRENCY",
+        "/api/v1/fleet-config/backup=2,/api/v1/fleet-config/restore=1,"
+        "/api/v1/fleet-config/device-configs=4",
+    )
+    rate_limit_backend: str = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    rate_limit_trusted_proxies: str = os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "")
+
+    # Change events streamed to the module pages (backend/services/events.py):
+    # events kept for reconnecting clients, events a slow client may fall
+    # behind before it is disconnected, seconds between heartbeats
+    events_buffer_size: int = int(os.getenv("EVENTS_BUFFER_SIZE", "1000"))
+    events_queue_size: int = int(os.getenv("EVENTS_QUEUE_SIZE", "1000"))
+    events_heartbeat_s: float = float(os.getenv("EVENTS_HEARTBEAT_S", "15"))
+
+    # Merged device configurations (backend/services/device_config.py) kept
+    # in memory, keyed by the versions of their layers
+    effective_config_cache_size: int = int(os.getenv("EFFECTIVE_CONFIG_CACHE_SIZE", "10000"))
+
+    # Compiled JSON template schemas (backend/services/config_validation.py)
+    # kept in memory, one per template version
+    schema_cache_size: int = int(os.getenv("SCHEMA_CACHE_SIZE", "1000"))
+
+    # Response compression
+    compression_enabled: bool = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+    compression_minimum_size: int = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))
+    compression_gzip_level: int = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+    compression_brotli_quality: int = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+    compression_brotli_enabled: bool = (
+        os.getenv("COMPRESSION_BROTLI_ENABLED", "true").lower() == "true"
+    )
+    compression_content_types: list = os.getenv(
+        "COMPRESSION_CONTENT_TYPES",
+        "application/json,application/javascript,application/xml,image/svg+xml,text/",
+    ).split(",")
+
     class Config:
         case_sensitive = True
 
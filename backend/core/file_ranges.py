@@ -0,0 +1,145 @@
+"""
+File responses with HTTP Range support for large downloads.
+
+``RangeFileResponse`` serves a file or a single byte range of it (``206``,
+``Content-Range``; ``416`` when unsatisfiable; multiple ranges and stale
+``If-Range`` validators get the whole file, as RFC 9110 allows). The body
+is never loaded into memory:
+
+- if the ASGI server offers the ``http.response.zerocopysend`` extension the
+  file descriptor is handed over and the kernel copies it (``sendfile``)
+- otherwise the range is streamed in ``chunk_size`` reads from a thread
+
+Behind nginx, ``accel_redirect`` replaces the body with an
+``X-Accel-Redirect`` header so nginx serves the file itself with
+``sendfile`` and its own Range handling.
+"""
+import os
+from typing import Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+ZERO_COPY_EXTENSION = "http.response.zerocopysend"
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """``(start, end)`` (inclusive) of a single ``bytes=`` range, ``None`` for the whole file.
+
+    Raises ``ValueError`` when the range cannot be satisfied.
+    """
+    if not header:
+        return None
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    first, _, last = (part.strip() for part in ranges.partition("-"))
+    if not (first or last) or not all(part.isdigit() for part in (first, last) if part):
+        return None  # malformed: ignored
+    if not first:  # suffix range: the last N bytes
+        if int(last) == 0 or size == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if last and end < start:
+        return None
+    if start >= size:
+        raise ValueError("Unsatisfiable range")
+    return start, min(end, size - 1)
+
+
+class RangeFileResponse(Response):
+    chunk_size = 256 * 1024
+
+    def __init__(
+        self,
+        path: str,
+        request_headers: Headers,
+        etag: str,
+        media_type: str = "application/octet-stream",
+        filename: Optional[str] = None,
+        cache_control: str = "private, max-age=31536000, immutable",
+        accel_redirect: Optional[str] = None,
+        method: str = "GET",
+    ) -> None:
+        self.path = path
+        self.send_body = method != "HEAD"
+        self.accel_redirect = accel_redirect
+        self.start, self.length = 0, 0
+        size = os.stat(path).st_size
+        etag = f'"{etag}"'
+
+        headers = {
+            "accept-ranges": "bytes",
+            "etag": etag,
+            "cache-control": cache_control,
+        }
+        if filename:
+            headers["content-disposition"] = f'attachment; filename="{filename}"'
+        super().__init__(status_code=200, headers=headers, media_type=media_type)
+
+        if request_headers.get("if-none-match") in (etag, "*"):
+            self.status_code = 304
+            del self.headers["content-length"]
+            return
+        if accel_redirect:
+            # nginx answers Range requests itself
+            self.headers["x-accel-redirect"] = accel_redirect
+            del self.headers["content-length"]
+            return
+
+        if_range = request_headers.get("if-range")
+        try:
+            byte_range = None
+            if if_range is None or if_range == etag:
+                byte_range = parse_range(request_headers.get("range"), size)
+        except ValueError:
+            self.status_code = 416
+            self.headers["content-range"] = f"bytes */{size}"
+            return
+
+        if byte_range is None:
+            self.length = size
+        else:
+            self.status_code = 206
+            self.start, end = byte_range
+            self.length = end - self.start + 1
+            self.headers["content-range"] = f"bytes {self.start}-{end}/{size}"
+        self.headers["content-length"] = str(self.length)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send(
+            {"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers}
+        )
+        if not self.send_body or self.status_code not in (200, 206) or self.accel_redirect:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if ZERO_COPY_EXTENSION in scope.get("extensions", {}):
+            with open(self.path, "rb") as file:
+                await send(
+                    {
+                        "type": ZERO_COPY_EXTENSION,
+                        "file": file,
+                        "offset": self.start,
+                        "count": self.length,
+                    }
+                )
+            return
+
+        remaining = self.length
+        async with await anyio.open_file(self.path, "rb") as file:
+            await file.seek(self.start)
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send(
+                    {"type": "http.response.body", "body": chunk, "more_body": remaining > 0}
+                )
+        if remaining or not self.length:  # empty file, or it shrank underneath us
+            await send({"type": "http.response.body", "body": b""})
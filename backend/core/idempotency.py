@@ -0,0 +1,274 @@
+"""
+``Idempotency-Key`` support for mutating requests.
+
+A client that may retry a ``POST``/``PUT``/``PATCH``/``DELETE`` (creating
+an installation, a repair or a device over a flaky network) sends a unique
+``Idempotency-Key`` header. ``IdempotencyMiddleware`` records the key in
+``idempotency_keys`` before the handler runs and the response once it has
+finished:
+
+- a retry of a finished request gets the stored response back with
+  ``Idempotent-Replayed: true``; the handler does not run again
+- a retry while the first request is still running gets ``409``
+- reusing a key for a different request (method, path, query or body)
+  gets ``422``
+
+Keys are scoped to the authenticated user (or the ``Authorization`` header
+when it is not a valid token) and kept for ``IDEMPOTENCY_TTL_H``; the
+``idempotency.cleanup`` job deletes expired ones. ``5xx`` and ``429``
+responses are not kept, so such requests can be retried. Requests without
+a ``Content-Length`` or with a body above ``IDEMPOTENCY_MAX_BODY_KB``
+(artifact uploads) and responses above it are passed through without
+idempotency.
+"""
+import hashlib
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, insert, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from backend.auth.auth import verify_token
+from backend.db.base import SessionLocal
+from backend.models.models import IdempotencyKey
+from backend.services.jobs import utcnow
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+REPLAYED_HEADER = "idempotent-replayed"
+MUTATING_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+# Response headers that describe one particular response and are not replayed
+NOT_REPLAYED = {b"date", b"server", b"server-timing", b"x-profile-id", b"x-request-id"}
+# A key still "processing" after this long belongs to a request that died with its worker
+PROCESSING_TIMEOUT = timedelta(minutes=5)
+
+
+def _principal(headers: Headers) -> str:
+    authorization = headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    payload = verify_token(token) if scheme.lower() == "bearer" and token else None
+    if payload:
+        return f"user:{payload['username']}"
+    if not authorization:
+        return "anonymous"
+    return "auth:" + hashlib.sha256(authorization.encode()).hexdigest()
+
+
+def _fingerprint(scope: Scope, body: bytes) -> str:
+    digest = hashlib.sha256()
+    for part in (scope["method"], scope["path"], scope.get("query_string", b"").decode()):
+        digest.update(part.encode() + b"\0")
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def claim_key(
+    session_factory, principal: str, key: str, fingerprint: str, ttl_h: float
+) -> Optional[IdempotencyKey]:
+    """Record ``key`` as in progress; returns the existing record when it is already known."""
+    now = utcnow()
+    with session_factory() as db:
+        db.execute(
+            delete(IdempotencyKey).where(
+                IdempotencyKey.principal == principal,
+                IdempotencyKey.key == key,
+                or_(
+                    IdempotencyKey.expires_at < now,
+                    and_(
+                        IdempotencyKey.status == "processing",
+                        IdempotencyKey.created_at < now - PROCESSING_TIMEOUT,
+                    ),
+                ),
+            )
+        )
+        try:
+            db.execute(
+                insert(IdempotencyKey).values(
+                    principal=principal,
+                    key=key,
+                    fingerprint=fingerprint,
+                    status="processing",
+                    created_at=now,
+                    expires_at=now + timedelta(hours=ttl_h),
+                )
+            )
+            db.commit()
+            return None
+        except IntegrityError:
+            db.rollback()
+        existing = db.scalar(
+            select(IdempotencyKey).where(
+                IdempotencyKey.principal == principal, IdempotencyKey.key == key
+            )
+        )
+        db.expunge_all()
+        return existing
+
+
+def store_response(
+    session_factory,
+    principal: str,
+    key: str,
+    status_code: Optional[int],
+    headers: List[Tuple[bytes, bytes]],
+    body: Optional[bytes],
+) -> None:
+    """Keep the response of a claimed key, or release the key when it must not be replayed."""
+    with session_factory() as db:
+        record = db.scalar(
+            select(IdempotencyKey).where(
+                IdempotencyKey.principal == principal, IdempotencyKey.key == key
+            )
+        )
+        if record is None:
+            return
+        if status_code is None or status_code >= 500 or status_code == 429 or body is None:
+            db.delete(record)
+        else:
+            record.status = "completed"
+            record.response_status = status_code
+            record.response_headers = [
+                [name.decode("latin-1"), value.decode("latin-1")]
+                for name, value in headers
+                if name.lower() not in NOT_REPLAYED
+            ]
+            record.response_body = body
+        db.commit()
+
+
+def purge_expired(db: Session) -> Dict[str, int]:
+    """Delete expired keys; the caller commits."""
+    deleted = db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at < utcnow()))
+    return {"deleted": deleted.rowcount}
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware replaying the stored response of a repeated ``Idempotency-Key``."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        ttl_h: float = 24,
+        max_body_kb: int = 1024,
+        session_factory=SessionLocal,
+    ) -> None:
+        self.app = app
+        self.ttl_h = ttl_h
+        self.max_body = max_body_kb * 1024
+        self.session_factory = session_factory
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in MUTATING_METHODS:
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        key = headers.get(IDEMPOTENCY_HEADER)
+        length = headers.get("content-length", "0" if scope["method"] == "DELETE" else "")
+        if not key or not length.isdigit() or int(length) > self.max_body:
+            await self.app(scope, receive, send)
+            return
+        if len(key) > 255:
+            response = JSONResponse({"detail": "Idempotency-Key longer than 255"}, status_code=400)
+            await response(scope, receive, send)
+            return
+
+        body, more_body = b"", True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        principal, fingerprint = _principal(headers), _fingerprint(scope, body)
+        existing = await run_in_threadpool(
+            claim_key, self.session_factory, principal, key, fingerprint, self.ttl_h
+        )
+        if existing is not None:
+            await self._reply_existing(existing, fingerprint, scope, receive, send)
+            return
+
+        body_sent = False
+
+        async def replay_body() -> Message:
+            nonlocal body_sent
+            if body_sent:
+                return await receive()
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        status_code: Optional[int] = None
+        response_headers: List[Tuple[bytes, bytes]] = []
+        chunks: Optional[List[bytes]] = []
+        size = 0
+        stored = False
+
+        async def store() -> None:
+            nonlocal stored
+            stored = True
+            await run_in_threadpool(
+                store_response,
+                self.session_factory,
+                principal,
+                key,
+                status_code,
+                response_headers,
+                b"".join(chunks) if chunks is not None else None,
+            )
+
+        async def capture(message: Message) -> None:
+            nonlocal status_code, response_headers, chunks, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                response_headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body" and chunks is not None:
+                size += len(message.get("body", b""))
+                if size > self.max_body:
+                    chunks = None
+                else:
+                    chunks.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    # Stored before the client sees the end, so a retry finds it
+                    await store()
+            else:
+                chunks = None  # not a plain body (e.g. sendfile), never replayed
+            await send(message)
+
+        try:
+            await self.app(scope, replay_body, capture)
+        finally:
+            if not stored:
+                status_code = None  # failed before the response was complete: release
+                await store()
+
+    async def _reply_existing(
+        self, record: IdempotencyKey, fingerprint: str, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        if record.fingerprint != fingerprint:
+            response = JSONResponse(
+                {"detail": "Idempotency-Key was used for a different request"}, status_code=422
+            )
+            await response(scope, receive, send)
+            return
+        if record.status != "completed":
+            response = JSONResponse(
+                {"detail": "A request with this Idempotency-Key is still being processed"},
+                status_code=409,
+                headers={"Retry-After": "1"},
+            )
+            await response(scope, receive, send)
+            return
+
+        headers = [
+            (name.encode("latin-1"), value.encode("latin-1"))
+            for name, value in record.response_headers or []
+        ]
+        headers.append((REPLAYED_HEADER.encode(), b"true"))
+        await send(
+            {"type": "http.response.start", "status": record.response_status, "headers": headers}
+        )
+        await send({"type": "http.response.body", "body": record.response_body or b""})
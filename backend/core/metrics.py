@@ -0,0 +1,291 @@
+"""
+Per-route request metrics.
+
+``MetricsMiddleware`` measures every HTTP request and, together with the
+SQLAlchemy cursor listeners installed by ``instrument_engine``, records per
+route template (``/api/v1/fleet-data/devices/{device_id}``, not the raw URL):
+
+- latency histogram
+- time spent in the database
+- number of SQL statements (histogram, to spot N+1 patterns)
+- rows written by INSERT/UPDATE/DELETE (``cursor.rowcount``; drivers do not
+  report the rows a SELECT returns, SQLite gives 0 or -1)
+
+Results are exposed in Prometheus text format by ``render_prometheus`` and
+per response in a ``Server-Timing`` header. Metrics are kept in-process, so
+with several workers each worker reports its own series.
+
+``scrape_allowed`` guards the ``/metrics`` endpoint: with ``METRICS_TOKEN``
+set the scraper must send it as a bearer token, without one only loopback
+clients are served. Behind a reverse proxy every client looks local, so set
+a token there.
+"""
+import hmac
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+QUERY_COUNT_BUCKETS = [0, 1, 2, 5, 10, 20, 50, 100, 250]
+
+UNMATCHED_ROUTE = "<unmatched>"
+LOOPBACK_HOSTS = {"127.0.0.1", "::1", "localhost"}
+
+
+class RequestStats:
+    """Database activity of the request currently being handled."""
+
+    __slots__ = ("db_time", "queries", "rows_written")
+
+    def __init__(self) -> None:
+        self.db_time = 0.0
+        self.queries = 0
+        self.rows_written = 0
+
+
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar(
+    "fleet_request_stats", default=None
+)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    """Stats of the request being handled in this context, if any."""
+    return _current_request.get()
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets: List[float]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.total += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class _RouteMetrics:
+    __slots__ = ("latency", "queries", "db_time", "rows_written", "statuses")
+
+    def __init__(self) -> None:
+        self.latency = _Histogram(LATENCY_BUCKETS)
+        self.queries = _Histogram(QUERY_COUNT_BUCKETS)
+        self.db_time = 0.0
+        self.rows_written = 0
+        self.statuses: Dict[int, int] = {}
+
+
+class MetricsRegistry:
+    """Thread-safe in-process store of per-route metrics."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._routes: Dict[Tuple[str, str], _RouteMetrics] = {}
+
+    def observe(
+        self, method: str, route: str, status: int, duration: float, stats: RequestStats
+    ) -> None:
+        with self._lock:
+            metrics = self._routes.get((method, route))
+            if metrics is None:
+                metrics = self._routes[(method, route)] = _RouteMetrics()
+            metrics.latency.observe(duration)
+            metrics.queries.observe(stats.queries)
+            metrics.db_time += stats.db_time
+            metrics.rows_written += stats.rows_written
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._routes.clear()
+
+    def snapshot(self) -> Dict[Tuple[str, str], dict]:
+        """Plain-dict copy of the metrics, keyed by (method, route)."""
+        with self._lock:
+            return {
+                key: {
+                    "count": m.latency.count,
+                    "latency_sum": m.latency.total,
+                    "db_time": m.db_time,
+                    "queries": int(m.queries.total),
+                    "rows_written": m.rows_written,
+                    "statuses": dict(m.statuses),
+                }
+                for key, m in self._routes.items()
+            }
+
+    def render_prometheus(self) -> str:
+        """Render all series in Prometheus text exposition format (0.0.4)."""
+        lines: List[str] = []
+        with self._lock:
+            items = sorted(self._routes.items())
+
+            lines.append("# HELP fleet_http_request_duration_seconds Request latency per route")
+            lines.append("# TYPE fleet_http_request_duration_seconds histogram")
+            for (method, route), m in items:
+                _histogram_lines(
+                    lines, "fleet_http_request_duration_seconds", method, route, m.latency
+                )
+
+            lines.append("# HELP fleet_http_request_queries SQL statements per request")
+            lines.append("# TYPE fleet_http_request_queries histogram")
+            for (method, route), m in items:
+                _histogram_lines(lines, "fleet_http_request_queries", method, route, m.queries)
+
+            lines.append("# HELP fleet_http_request_db_seconds_total Time spent in the database")
+            lines.append("# TYPE fleet_http_request_db_seconds_total counter")
+            for (method, route), m in items:
+                lines.append(
+                    f"fleet_http_request_db_seconds_total{_labels(method, route)} {m.db_time:.6f}"
+                )
+
+            lines.append(
+                "# HELP fleet_http_request_db_rows_written_total Rows inserted, updated or deleted"
+            )
+            lines.append("# TYPE fleet_http_request_db_rows_written_total counter")
+            for (method, route), m in items:
+                labels = _labels(method, route)
+                lines.append(f"fleet_http_request_db_rows_written_total{labels} {m.rows_written}")
+
+            lines.append("# HELP fleet_http_requests_total Requests per route and status code")
+            lines.append("# TYPE fleet_http_requests_total counter")
+            for (method, route), m in items:
+                for status, count in sorted(m.statuses.items()):
+                    labels = _labels(method, route, status=str(status))
+                    lines.append(f"fleet_http_requests_total{labels} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(method: str, route: str, **extra: str) -> str:
+    pairs = [("method", method), ("route", route)] + list(extra.items())
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _histogram_lines(
+    lines: List[str], name: str, method: str, route: str, histogram: _Histogram
+) -> None:
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        lines.append(f"{name}_bucket{_labels(method, route, le=f'{bound:g}')} {count}")
+    lines.append(f"{name}_bucket{_labels(method, route, le='+Inf')} {histogram.count}")
+    lines.append(f"{name}_sum{_labels(method, route)} {histogram.total:.6f}")
+    lines.append(f"{name}_count{_labels(method, route)} {histogram.count}")
+
+
+metrics_registry = MetricsRegistry()
+
+
+def scrape_allowed(
+    authorization: Optional[str], client_host: Optional[str], token: Optional[str]
+) -> bool:
+    """Whether a ``/metrics`` request may read the metrics."""
+    if token:
+        scheme, _, credentials = (authorization or "").partition(" ")
+        return scheme.lower() == "bearer" and hmac.compare_digest(
+            credentials.strip().encode(), token.encode()
+        )
+    return client_host in LOOPBACK_HOSTS
+
+
+def route_template(scope: Scope) -> str:
+    """Route template of a handled request, falling back to the mount path."""
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path
+    root_path = scope.get("root_path", "")
+    if root_path:
+        return f"{root_path}/{{path}}"
+    return UNMATCHED_ROUTE
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("fleet_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("fleet_query_start")
+    if not starts:
+        return
+    duration = time.perf_counter() - starts.pop()
+    stats = _current_request.get()
+    if stats is None:
+        return
+    stats.db_time += duration
+    stats.queries += 1
+    writes = context is not None and (context.isinsert or context.isupdate or context.isdelete)
+    if writes and cursor.rowcount and cursor.rowcount > 0:
+        stats.rows_written += cursor.rowcount
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Attach the cursor listeners feeding per-request DB stats (idempotent)."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route metrics and a ``Server-Timing`` header."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        registry: MetricsRegistry = metrics_registry,
+        server_timing: bool = False,
+        exclude_paths: Optional[List[str]] = None,
+    ) -> None:
+        self.app = app
+        self.registry = registry
+        self.server_timing = server_timing
+        self.exclude_paths = set(exclude_paths or [])
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.server_timing:
+                    elapsed = (time.perf_counter() - start) * 1000
+                    headers = MutableHeaders(scope=message)
+                    headers.append(
+                        "Server-Timing",
+                        f'app;dur={elapsed:.1f}, db;dur={stats.db_time * 1000:.1f};'
+                        f'desc="{stats.queries} queries"',
+                    )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_request.reset(token)
+            self.registry.observe(
+                scope["method"],
+                route_template(scope),
+                status_code,
+                time.perf_counter() - start,
+                stats,
+            )
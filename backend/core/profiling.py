@@ -0,0 +1,325 @@
+"""
+On-demand request profiling for superusers.
+
+A request sent with the ``X-Profile: 1`` header (or ``?__profile=1``) by a
+user passing ``require_role("superuser")`` runs under a sampling profiler.
+The profile is stored as JSON in ``PROFILE_OUTPUT_DIR`` and its id returned in
+the ``X-Profile-Id`` response header; it contains
+
+- ``folded``: stacks in collapsed ("folded") format, one ``frame;frame;... N``
+  line per unique stack, usable with flamegraph.pl, inferno or speedscope
+- ``sql``: the SQL timeline of the request (offset, duration, statement)
+
+Requests without the flag only pay for one header lookup; the flag is ignored
+for anyone who is not a superuser. The sampler only records stacks running
+code of the profiled request: on the event loop those passing through the
+request's middleware frame, in the thread pool those of a worker running a
+call made from the request's context. Only the newest ``PROFILE_MAX_FILES``
+profiles are kept.
+"""
+import json
+import os
+import sys
+import sysconfig
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import Context, ContextVar
+from types import CodeType, FrameType
+from typing import Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders, QueryParams
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from backend.auth.auth import get_current_user, require_role
+from backend.db.base import SessionLocal
+
+PROFILE_HEADER = "x-profile"
+PROFILE_QUERY_PARAM = "__profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+# Leaf frames of threads that are parked rather than doing work (runners.py is
+# the innermost Python frame of an idle uvloop event loop)
+_IDLE_FILES = ("threading.py", "selectors.py", "queue.py", "base_events.py", "runners.py")
+_PATH_PREFIXES = tuple(
+    path + os.sep
+    for path in (sysconfig.get_paths()["purelib"], sysconfig.get_paths()["stdlib"], os.getcwd())
+)
+
+
+def _worker_run_code() -> Optional[CodeType]:
+    # Frame of the thread pool worker loop; its ``context`` local is the context
+    # the current call was submitted from (run_in_threadpool copies the caller's)
+    try:
+        from anyio._backends._asyncio import WorkerThread
+    except ImportError:  # pragma: no cover - other anyio backends
+        return None
+    return WorkerThread.run.__code__
+
+
+_WORKER_RUN_CODE = _worker_run_code()
+
+
+class SamplingProfiler:
+    """Background thread sampling the Python stacks of other threads.
+
+    ``owns`` receives the frames of a stack, innermost first, and decides
+    whether it is recorded; without it every busy thread is.
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.001,
+        owns: Optional[Callable[[List[FrameType]], bool]] = None,
+    ) -> None:
+        self.interval = interval
+        self.owns = owns
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.is_set():
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or frame.f_code.co_filename.endswith(_IDLE_FILES):
+                    continue
+                frames = []
+                while frame is not None:
+                    frames.append(frame)
+                    frame = frame.f_back
+                if self.owns is not None and not self.owns(frames):
+                    continue
+                stack = [
+                    f"{_short_path(f.f_code.co_filename)}:{f.f_code.co_name}" for f in frames
+                ]
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+
+    def folded(self) -> str:
+        """Collapsed-stack output, heaviest stacks first."""
+        return "\n".join(f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common())
+
+
+def _short_path(filename: str) -> str:
+    for prefix in _PATH_PREFIXES:
+        if filename.startswith(prefix):
+            return filename[len(prefix) :]
+    return filename
+
+
+class ProfileSession:
+    """Profile of a single request: sampled stacks plus its SQL timeline."""
+
+    def __init__(self, interval: float, root_frame: Optional[FrameType] = None) -> None:
+        self.id = uuid.uuid4().hex[:16]
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.root_frame = root_frame
+        self.profiler = SamplingProfiler(interval, owns=self.owns)
+        self.sql: List[Dict] = []
+
+    def owns(self, frames: List[FrameType]) -> bool:
+        """Whether a sampled stack is running code of this request."""
+        for frame in frames:
+            if frame is self.root_frame:
+                return True
+            if frame.f_code is _WORKER_RUN_CODE:
+                context = frame.f_locals.get("context")
+                return isinstance(context, Context) and context.get(_current_profile) is self
+        return False
+
+    def record_query(self, start: float, duration: float, statement: str) -> None:
+        self.sql.append(
+            {
+                "offset_ms": round((start - self.started) * 1000, 3),
+                "duration_ms": round(duration * 1000, 3),
+                "statement": statement,
+            }
+        )
+
+
+_current_profile: ContextVar[Optional[ProfileSession]] = ContextVar(
+    "fleet_request_profile", default=None
+)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_profile.get() is not None:
+        conn.info.setdefault("fleet_profile_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    session = _current_profile.get()
+    starts = conn.info.get("fleet_profile_start")
+    if session is None or not starts:
+        return
+    start = starts.pop()
+    session.record_query(start, time.perf_counter() - start, statement)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Attach the listeners recording the SQL timeline of profiled requests."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def profile_requested(scope: Scope) -> bool:
+    """Whether the request asks to be profiled (header or query flag)."""
+    for name, value in scope["headers"]:
+        if name == PROFILE_HEADER.encode("latin-1"):
+            return value not in (b"", b"0", b"false")
+    query_string = scope.get("query_string", b"")
+    if PROFILE_QUERY_PARAM.encode() in query_string:
+        return QueryParams(query_string).get(PROFILE_QUERY_PARAM) not in (None, "", "0", "false")
+    return False
+
+
+def _is_superuser(authorization: Optional[str]) -> bool:
+    if not authorization or " " not in authorization:
+        return False
+    scheme, token = authorization.split(" ", 1)
+    db = SessionLocal()
+    try:
+        user = get_current_user(HTTPAuthorizationCredentials(scheme=scheme, credentials=token), db)
+        require_role("superuser")(current_user=user)
+        return True
+    except HTTPException:
+        return False
+    finally:
+        db.close()
+
+
+def profile_path(output_dir: str, profile_id: str) -> str:
+    return os.path.join(output_dir, f"{profile_id}.json")
+
+
+def _profile_files(output_dir: str) -> List[Tuple[float, str]]:
+    """(mtime, path) of the stored profiles, newest first."""
+    if not os.path.isdir(output_dir):
+        return []
+    files = []
+    for name in os.listdir(output_dir):
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(output_dir, name)
+        try:
+            files.append((os.path.getmtime(path), path))
+        except OSError:
+            continue
+    return sorted(files, reverse=True)
+
+
+def list_profiles(output_dir: str) -> List[Dict]:
+    """Summaries of stored profiles, newest first; unreadable files are skipped."""
+    summaries = []
+    for _, path in _profile_files(output_dir):
+        try:
+            with open(path) as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            continue
+        if not isinstance(data, dict):
+            continue
+        data.pop("folded", None)
+        data.pop("sql", None)
+        summaries.append(data)
+    return summaries
+
+
+def prune_profiles(output_dir: str, keep: int) -> None:
+    """Delete all but the ``keep`` newest profiles."""
+    for _, path in _profile_files(output_dir)[max(keep, 0) :]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def load_profile(output_dir: str, profile_id: str) -> Optional[Dict]:
+    if not profile_id.isalnum():
+        return None
+    try:
+        with open(profile_path(output_dir, profile_id)) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+class ProfilingMiddleware:
+    """ASGI middleware running flagged superuser requests under the sampler."""
+
+    def __init__(
+        self, app: ASGIApp, output_dir: str, interval_ms: float = 1.0, max_files: int = 100
+    ) -> None:
+        self.app = app
+        self.output_dir = output_dir
+        self.interval = interval_ms / 1000
+        self.max_files = max_files
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not profile_requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        authorization = Headers(scope=scope).get("authorization")
+        if not await run_in_threadpool(_is_superuser, authorization):
+            await self.app(scope, receive, send)
+            return
+
+        session = ProfileSession(self.interval, root_frame=sys._getframe())
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(scope=message)[PROFILE_ID_HEADER] = session.id
+            await send(message)
+
+        token = _current_profile.set(session)
+        session.profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            session.profiler.stop()
+            session.duration = time.perf_counter() - session.started
+            _current_profile.reset(token)
+            await run_in_threadpool(self._save, scope, session, status_code)
+
+    def _save(self, scope: Scope, session: ProfileSession, status_code: int) -> None:
+        os.makedirs(self.output_dir, exist_ok=True)
+        data = {
+            "id": session.id,
+            "method": scope["method"],
+            "path": scope["path"],
+            "status": status_code,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "duration_ms": round(session.duration * 1000, 3),
+            "samples": session.profiler.samples,
+            "interval_ms": self.interval * 1000,
+            "query_count": len(session.sql),
+            "folded": session.profiler.folded(),
+            "sql": session.sql,
+        }
+        with open(profile_path(self.output_dir, session.id), "w") as fh:
+            json.dump(data, fh)
+        prune_profiles(self.output_dir, self.max_files)
@@ -0,0 +1,178 @@
+"""
+Slow-query log and N+1 detector.
+
+``QueryRecorder`` hooks the SQLAlchemy engine and, for every statement executed
+while an HTTP request is being handled:
+
+- normalises it to a fingerprint (literals and bind parameters replaced by
+  ``?``, ``IN (...)`` lists and multi-row ``VALUES`` collapsed), so the same
+  statement shape with different values is counted once
+- logs it on the ``backend.core.query_log`` logger when it runs longer than
+  the slow-query threshold, with the shape (types, not values) of its bound
+  parameters and the originating route
+
+At the end of each request, ``QueryRecorderMiddleware`` flags requests where a
+single fingerprint ran more than ``n_plus_one_threshold`` times - the typical
+"one query per row" loop - and reports the request totals in
+``X-Query-Count`` / ``X-Query-Max-Repeat`` headers, which the query-budget
+pytest plugin (``tests/query_budget.py``) uses to fail tests over budget.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from backend.core.metrics import route_template
+
+logger = logging.getLogger(__name__)
+
+QUERY_COUNT_HEADER = "X-Query-Count"
+QUERY_REPEAT_HEADER = "X-Query-Max-Repeat"
+
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_PLACEHOLDER_RE = re.compile(r"%\(\w+\)s|%s|:\w+|\$\d+|\?")
+_NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])")
+_IN_LIST_RE = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.I)
+_VALUES_RE = re.compile(r"\bVALUES\s*(\([^()]*\))(?:\s*,\s*\([^()]*\))+", re.I)
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """Normalise a SQL statement so statements differing only in values match."""
+    sql = _COMMENT_RE.sub(" ", statement)
+    sql = _STRING_RE.sub("?", sql)
+    sql = _PLACEHOLDER_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _WHITESPACE_RE.sub(" ", sql).strip()
+    sql = _IN_LIST_RE.sub("IN (...)", sql)
+    sql = _VALUES_RE.sub(r"VALUES \1, ...", sql)
+    return sql
+
+
+def parameter_shape(parameters: Any, executemany: bool = False) -> str:
+    """Describe bound parameters by type only, never by value."""
+    if executemany and isinstance(parameters, (list, tuple)):
+        first = parameter_shape(parameters[0]) if parameters else "()"
+        return f"{first} x{len(parameters)}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{k}: {type(v).__name__}" for k, v in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(type(v).__name__ for v in parameters) + ")"
+    return type(parameters).__name__
+
+
+class RequestQueries:
+    """Statements executed while handling one request."""
+
+    __slots__ = ("scope", "count", "fingerprints")
+
+    def __init__(self, scope: Scope) -> None:
+        self.scope = scope
+        self.count = 0
+        self.fingerprints: Counter = Counter()
+
+    @property
+    def route(self) -> str:
+        return f"{self.scope.get('method', '')} {route_template(self.scope)}"
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Fingerprints executed more than ``threshold`` times, most frequent first."""
+        return [(fp, n) for fp, n in self.fingerprints.most_common() if n > threshold]
+
+    @property
+    def max_repeat(self) -> int:
+        most_common = self.fingerprints.most_common(1)
+        return most_common[0][1] if most_common else 0
+
+
+_current_queries: ContextVar[Optional[RequestQueries]] = ContextVar(
+    "fleet_request_queries", default=None
+)
+
+
+class QueryRecorder:
+    """Engine listener logging slow statements and repeated statement shapes."""
+
+    def __init__(self, slow_query_ms: float = 200.0, n_plus_one_threshold: int = 10) -> None:
+        self.slow_query_ms = slow_query_ms
+        self.n_plus_one_threshold = n_plus_one_threshold
+
+    def install(self, engine: Engine) -> None:
+        """Attach the recorder to ``engine`` (idempotent)."""
+        if not event.contains(engine, "before_cursor_execute", self._before_cursor_execute):
+            event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("fleet_query_log_start", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("fleet_query_log_start")
+        if not starts:
+            return
+        duration_ms = (time.perf_counter() - starts.pop()) * 1000
+        request = _current_queries.get()
+        if request is None:
+            return
+
+        shape = fingerprint(statement)
+        request.count += 1
+        request.fingerprints[shape] += 1
+
+        if duration_ms >= self.slow_query_ms:
+            logger.warning(
+                "Slow query (%.1f ms) in %s: %s params=%s",
+                duration_ms,
+                request.route,
+                shape,
+                parameter_shape(parameters, executemany),
+            )
+
+    def finish_request(self, request: RequestQueries) -> None:
+        """Report statement shapes repeated more than the N+1 threshold."""
+        for shape, count in request.repeated(self.n_plus_one_threshold):
+            logger.warning(
+                "Possible N+1 in %s: statement executed %d times (%d queries total): %s",
+                request.route,
+                count,
+                request.count,
+                shape,
+            )
+
+
+class QueryRecorderMiddleware:
+    """ASGI middleware scoping recorded statements to the current request."""
+
+    def __init__(self, app: ASGIApp, recorder: QueryRecorder, headers: bool = True) -> None:
+        self.app = app
+        self.recorder = recorder
+        self.headers = headers
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request = RequestQueries(scope)
+        token = _current_queries.set(request)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and self.headers:
+                headers = MutableHeaders(scope=message)
+                headers[QUERY_COUNT_HEADER] = str(request.count)
+                headers[QUERY_REPEAT_HEADER] = str(request.max_repeat)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_queries.reset(token)
+            self.recorder.finish_request(request)
@@ -0,0 +1,358 @@
+"""
+Admission control: per-user, per-route rate limits and concurrency limits.
+
+``admission_control`` is an application-wide dependency, so it runs after
+routing and sees the route template. Every request takes a token from the
+bucket of its user (the ``sub`` of the bearer token, which is what
+``get_current_user`` loads; the client address without one) and route
+(method + template); the budget depends on the token's active role:
+
+- ``RATE_LIMIT_DEFAULT`` / ``RATE_LIMIT_ROLES`` (``admin=50/100,...``):
+  ``rate/burst`` - tokens refilled per second and bucket size, ``0`` means
+  unlimited
+- ``RATE_LIMIT_ANONYMOUS`` for requests without a valid token, per client
+  address
+
+Routes listed in ``RATE_LIMIT_CONCURRENCY`` (``template=limit``) also
+admit at most ``limit`` requests at a time across all users; a slot is held
+until the response has been sent (or for ``SLOT_TTL_S`` if the process
+dies). A rejected request gets ``429`` with ``Retry-After``.
+
+State lives in the process by default, so every worker enforces the budget
+on its own. ``RATE_LIMIT_BACKEND`` shares it between workers:
+``sqlite:///path/to/file.db`` (one file on the same host) or
+``redis://host:6379/0`` (needs the ``redis`` package).
+
+The client address is the peer of the connection. Behind a reverse proxy
+that is the proxy, so all anonymous clients would share one bucket: list the
+proxies in ``RATE_LIMIT_TRUSTED_PROXIES`` (addresses or networks) and the
+address is taken from ``X-Forwarded-For`` instead - the rightmost entry not
+added by a trusted proxy, as anything left of it is client-supplied. (uvicorn
+started with ``--proxy-headers --forwarded-allow-ips`` already rewrites the
+peer address the same way.)
+"""
+import ipaddress
+import math
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple, Union
+
+from fastapi import HTTPException, Request, status
+from starlette.concurrency import run_in_threadpool
+
+try:  # redis is optional - only needed for RATE_LIMIT_BACKEND=redis://...
+    import redis
+except ImportError:  # pragma: no cover - depends on the environment
+    redis = None
+
+from backend.auth.auth import verify_token
+from backend.core.config import settings
+
+SLOT_TTL_S = 3600
+Budget = Tuple[float, float]  # (tokens per second, burst)
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+def parse_budget(value: str) -> Budget:
+    """``"10/50"`` -> ``(10.0, 50.0)``; a single number is both rate and burst."""
+    rate, _, burst = value.strip().partition("/")
+    return float(rate), float(burst or rate)
+
+
+def parse_mapping(value: str) -> Dict[str, str]:
+    """``"a=1,b=2"`` -> ``{"a": "1", "b": "2"}``."""
+    pairs = (item.partition("=") for item in value.split(",") if "=" in item)
+    return {name.strip(): setting.strip() for name, _, setting in pairs}
+
+
+def parse_networks(value: str) -> List[Network]:
+    """``"10.0.0.1,172.16.0.0/12"`` -> networks; a single address is a one-host network."""
+    items = (item.strip() for item in value.split(","))
+    return [ipaddress.ip_network(item, strict=False) for item in items if item]
+
+
+def _trusted(address: str, networks: List[Network]) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in networks)
+
+
+def client_address(request: Request, trusted_proxies: List[Network]) -> str:
+    """Address of the client, looking through ``X-Forwarded-For`` of trusted proxies."""
+    address = request.client.host if request.client else "unknown"
+    if not trusted_proxies or not _trusted(address, trusted_proxies):
+        return address
+    forwarded = [
+        item.strip()
+        for header in request.headers.getlist("x-forwarded-for")
+        for item in header.split(",")
+        if item.strip()
+    ]
+    for hop in reversed(forwarded):
+        address = hop
+        if not _trusted(hop, trusted_proxies):
+            break
+    return address
+
+
+class MemoryBackend:
+    """Buckets and slots of this process."""
+
+    blocking = False
+    max_keys = 100_000
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._slots: Dict[str, Dict[str, float]] = {}
+
+    def take(self, key: str, rate: float, burst: float) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            self._buckets[key] = (tokens - 1 if not wait else tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+        return wait
+
+    def _prune(self, now: float) -> None:
+        # Buckets idle for a minute are full again for any sensible budget
+        self._buckets = {
+            key: state for key, state in self._buckets.items() if now - state[1] < 60
+        }
+
+    def acquire(self, key: str, limit: int) -> Optional[str]:
+        now = time.monotonic()
+        with self._lock:
+            slots = self._slots.setdefault(key, {})
+            for token in [token for token, expires in slots.items() if expires < now]:
+                del slots[token]
+            if len(slots) >= limit:
+                return None
+            token = uuid.uuid4().hex
+            slots[token] = now + SLOT_TTL_S
+            return token
+
+    def release(self, key: str, token: str) -> None:
+        with self._lock:
+            self._slots.get(key, {}).pop(token, None)
+
+
+class SQLiteBackend:
+    """Buckets and slots in an SQLite file shared by the workers of one host."""
+
+    blocking = True
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS slots "
+                "(token TEXT PRIMARY KEY, key TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_slots_key ON slots (key, expires)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, rate: float, burst: float) -> float:
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated FROM buckets WHERE key = ?", (key,)
+            ).fetchone()
+            tokens, updated = row if row else (burst, now)
+            tokens = min(burst, tokens + max(now - updated, 0) * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                (key, tokens - 1 if not wait else tokens, now),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def acquire(self, key: str, limit: int) -> Optional[str]:
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM slots WHERE key = ? AND expires < ?", (key, now))
+            (used,) = conn.execute("SELECT COUNT(*) FROM slots WHERE key = ?", (key,)).fetchone()
+            token = None
+            if used < limit:
+                token = uuid.uuid4().hex
+                conn.execute(
+                    "INSERT INTO slots (token, key, expires) VALUES (?, ?, ?)",
+                    (token, key, now + SLOT_TTL_S),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return token
+
+    def release(self, key: str, token: str) -> None:
+        self._connect().execute("DELETE FROM slots WHERE token = ?", (token,))
+
+
+class RedisBackend:
+    """Buckets and slots in Redis, updated atomically by Lua scripts."""
+
+    blocking = True
+    TAKE = """
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(now - updated, 0) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+    ACQUIRE = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[2]) then return 0 end
+redis.call('ZADD', KEYS[1], ARGV[3], ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return 1
+"""
+
+    def __init__(self, url: str) -> None:
+        if redis is None:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis:// needs the redis package")
+        self.client = redis.Redis.from_url(url)
+        self._take = self.client.register_script(self.TAKE)
+        self._acquire = self.client.register_script(self.ACQUIRE)
+
+    def take(self, key: str, rate: float, burst: float) -> float:
+        return float(self._take(keys=[f"ratelimit:{key}"], args=[rate, burst, time.time()]))
+
+    def acquire(self, key: str, limit: int) -> Optional[str]:
+        now, token = time.time(), uuid.uuid4().hex
+        args = [now, limit, now + SLOT_TTL_S, token, SLOT_TTL_S]
+        return token if self._acquire(keys=[f"ratelimit-slots:{key}"], args=args) else None
+
+    def release(self, key: str, token: str) -> None:
+        self.client.zrem(f"ratelimit-slots:{key}", token)
+
+
+def create_backend(url: str):
+    if url.startswith("sqlite:///"):
+        return SQLiteBackend(url[len("sqlite:///") :])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    return MemoryBackend()
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        backend,
+        default: Budget,
+        anonymous: Budget,
+        roles: Dict[str, Budget],
+        concurrency: Dict[str, int],
+        trusted_proxies: Optional[List[Network]] = None,
+    ) -> None:
+        self.backend = backend
+        self.default = default
+        self.anonymous = anonymous
+        self.roles = roles
+        self.concurrency = concurrency
+        self.trusted_proxies = trusted_proxies or []
+
+    async def _call(self, method, *args):
+        if self.backend.blocking:
+            return await run_in_threadpool(method, *args)
+        return method(*args)
+
+    def identify(self, request: Request) -> Tuple[str, Budget]:
+        """Bucket owner and budget of a request."""
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        payload = verify_token(token) if scheme.lower() == "bearer" and token else None
+        if payload is None:
+            return f"ip:{client_address(request, self.trusted_proxies)}", self.anonymous
+        role = payload.get("active_role") or next(iter(payload.get("roles") or []), None)
+        return f"user:{payload['username']}", self.roles.get(role, self.default)
+
+    async def check_rate(self, request: Request, route: str) -> None:
+        owner, (rate, burst) = self.identify(request)
+        if rate <= 0:
+            return
+        wait = await self._call(self.backend.take, f"{owner}|{request.method} {route}", rate, burst)
+        if wait > 0:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+
+    async def acquire(self, route: str) -> Optional[str]:
+        limit = self.concurrency.get(route)
+        if not limit:
+            return None
+        token = await self._call(self.backend.acquire, route, limit)
+        if token is None:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many concurrent requests for this resource",
+                headers={"Retry-After": "1"},
+            )
+        return token
+
+    async def release(self, route: str, token: str) -> None:
+        await self._call(self.backend.release, route, token)
+
+
+rate_limiter = RateLimiter(
+    create_backend(settings.rate_limit_backend),
+    default=parse_budget(settings.rate_limit_default),
+    anonymous=parse_budget(settings.rate_limit_anonymous),
+    roles={
+        role: parse_budget(budget)
+        for role, budget in parse_mapping(settings.rate_limit_roles).items()
+    },
+    concurrency={
+        route: int(limit) for route, limit in parse_mapping(settings.rate_limit_concurrency).items()
+    },
+    trusted_proxies=parse_networks(settings.rate_limit_trusted_proxies),
+)
+
+
+async def admission_control(request: Request):
+    """App-wide dependency applying the rate and concurrency limits of the matched route."""
+    route = request.scope.get("route")
+    template = getattr(route, "path", None)
+    if template is None:
+        yield
+        return
+    await rate_limiter.check_rate(request, template)
+    token = await rate_limiter.acquire(template)
+    try:
+        yield
+    finally:
+        if token is not None:
+            await rate_limiter.release(template, token)
@@ -1,4 +1,18 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, JSON
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    Integer,
+    String,
+    Boolean,
+    DateTime,
+    Float,
+    Text,
+    ForeignKey,
+    JSON,
+    Index,
+    LargeBinary,
+    UniqueConstraint,
+)
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from backend.db.base import Base
@@ -203,8 +217,53 @@ class SoftwareVersion(Base):
     installations = relationship("SoftwareInstallation", back_populates="version")
 
 
+class Artifact(Base):
+    """Content-addressed software binary (backend/services/artifacts.py)."""
+
+    __tablename__ = "artifacts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String(64), unique=True, nullable=False, index=True)
+    size = Column(BigInteger, nullable=False)
+    created_by = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class ArtifactUpload(Base):
+    __tablename__ = "artifact_uploads"
+
+    id = Column(String(32), primary_key=True)  # random hex upload id
+    status = Column(String(20), nullable=False, default="open")  # open, receiving, completed
+    bytes_received = Column(BigInteger, nullable=False, default=0)
+    expected_size = Column(BigInteger)
+    expected_sha256 = Column(String(64))
+    artifact_sha256 = Column(String(64))  # set on completion
+    created_by = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), index=True)
+
+
+class ArtifactDelta(Base):
+    """Binary delta between two artifacts (backend/services/software_deltas.py)."""
+
+    __tablename__ = "artifact_deltas"
+    __table_args__ = (UniqueConstraint("source_sha256", "target_sha256"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    source_sha256 = Column(String(64), nullable=False)
+    target_sha256 = Column(String(64), nullable=False, index=True)
+    # pending, ready, unneeded (delta not much smaller than the image), failed
+    status = Column(String(20), nullable=False, default="pending")
+    delta_sha256 = Column(String(64))  # the delta file, itself an artifact
+    size = Column(BigInteger)
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    completed_at = Column(DateTime(timezone=True))
+
+
 class DeviceSoftware(Base):
     __tablename__ = "device_software"
+    __table_args__ = (Index("ix_device_software_device_software", "device_id", "software_id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     device_id = Column(Integer, ForeignKey("devices.id"), nullable=False)
@@ -225,16 +284,27 @@ class DeviceSoftware(Base):
     version = relationship("SoftwareVersion")
 
 
+class SoftwareInventory(Base):
+    __tablename__ = "software_inventory"
+    __table_args__ = (UniqueConstraint("software_id", "installed_version", "installation_status"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    software_id = Column(Integer, ForeignKey("software.id"), nullable=False)
+    installed_version = Column(String(50), nullable=False, default="")  # "" = unknown
+    installation_status = Column(String(50), nullable=False)
+    devices = Column(Integer, nullable=False, default=0)
+
+
 class SoftwareInstallation(Base):
     __tablename__ = "software_installations"
 
     id = Column(Integer, primary_key=True, index=True)
-    device_id = Column(Integer, ForeignKey("devices.id"), nullable=False)
+    device_id = Column(Integer, ForeignKey("devices.id"), nullable=False, index=True)
     version_id = Column(Integer, ForeignKey("software_versions.id"), nullable=False)
     action = Column(String(50), nullable=False)  # install, update, uninstall, rollback
     status = Column(
         String(50), default="pending"
-    )  # pending, in_progress, completed, failed, cancelled
+    )  # pending, in_progress, completed, failed, cancelled, rolled_back
     initiated_by = Column(Integer, ForeignKey("users.id"))
     started_at = Column(DateTime(timezone=True), server_default=func.now())
     completed_at = Column(DateTime(timezone=True))
@@ -311,6 +381,8 @@ class Repair(Base):
 
 class Maintenance(Base):
     __tablename__ = "maintenance"
+    # Scheduler bulk updates and dashboards select by status and due date
+    __table_args__ = (Index("ix_maintenance_status_next_due", "status", "next_due"),)
 
     id = Column(Integer, primary_key=True, index=True)
     device_id = Column(Integer, ForeignKey("devices.id"), nullable=False)
@@ -322,7 +394,7 @@ class Maintenance(Base):
     )  # daily, weekly, monthly, quarterly, yearly, hours_based, cycles_based
     frequency_value = Column(Integer)  # number of days/hours/cycles between maintenance
     last_performed = Column(DateTime(timezone=True))
-    next_due = Column(DateTime(timezone=True))
+    next_due = Column(DateTime(timezone=True), index=True)  # calendar range queries
     status = Column(
         String(50), default="scheduled"
     )  # scheduled, overdue, in_progress, completed, skipped
@@ -358,7 +430,7 @@ class Part(Base):
     supplier = Column(String(255))
     unit_price = Column(Integer)  # in cents
     currency = Column(String(3), default="PLN")
-    stock_quantity = Column(Integer, default=0)
+    stock_quantity = Column(Integer, default=0)  # free stock; reservations are already deducted
     min_stock_level = Column(Integer, default=0)
     max_stock_level = Column(Integer)
     location = Column(String(255))  # warehouse location
@@ -375,3 +447,169 @@ class Part(Base):
 
     # Relationships
     creator = relationship("User", foreign_keys=[created_by])
+
+
+
+class PartReservation(Base):
+    __tablename__ = "part_reservations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    part_id = Column(Integer, ForeignKey("parts.id"), nullable=False, index=True)
+    repair_id = Column(Integer, ForeignKey("repairs.id"), index=True)
+    quantity = Column(Integer, nullable=False)
+    status = Column(String(20), nullable=False, default="reserved")  # reserved, consumed, released
+    created_by = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    # Relationships
+    part = relationship("Part")
+    repair = relationship("Repair")
+
+
+# Parts usage ledger and monthly rollups (backend/services/parts_usage.py)
+
+
+class PartUsage(Base):
+    __tablename__ = "part_usage"
+    __table_args__ = (Index("ix_part_usage_period_customer", "period", "customer_id"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    part_id = Column(Integer, ForeignKey("parts.id"), nullable=False, index=True)
+    quantity = Column(Integer, nullable=False)
+    unit_price = Column(Integer, default=0)  # in cents, at the time of use
+    total_cost = Column(Integer, default=0)  # in cents
+    repair_id = Column(Integer, ForeignKey("repairs.id"), index=True)
+    maintenance_id = Column(Integer, ForeignKey("maintenance.id"), index=True)
+    device_id = Column(Integer, ForeignKey("devices.id"), index=True)
+    customer_id = Column(Integer, ForeignKey("customers.id"))
+    device_type = Column(String(100))
+    period = Column(String(7), nullable=False)  # YYYY-MM
+    used_at = Column(DateTime(timezone=True))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class RepairCost(Base):
+    __tablename__ = "repair_costs"
+
+    repair_id = Column(Integer, ForeignKey("repairs.id"), primary_key=True)
+    device_id = Column(Integer, ForeignKey("devices.id"), index=True)
+    customer_id = Column(Integer, ForeignKey("customers.id"))
+    device_type = Column(String(100))
+    period = Column(String(7), nullable=False, index=True)  # YYYY-MM of completion
+    actual_cost = Column(Integer, default=0)  # in cents
+    parts_cost = Column(Integer, default=0)  # in cents
+    labor_hours = Column(Integer, default=0)
+
+
+class PartUsageMonthly(Base):
+    __tablename__ = "part_usage_monthly"
+    __table_args__ = (
+        UniqueConstraint("period", "customer_id", "device_type", "part_id"),
+        Index("ix_part_usage_monthly_part", "part_id", "period"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    period = Column(String(7), nullable=False)
+    customer_id = Column(Integer, nullable=False, default=0)  # 0 = no customer
+    device_type = Column(String(100), nullable=False, default="")
+    part_id = Column(Integer, nullable=False)
+    quantity = Column(Integer, nullable=False, default=0)
+    parts_cost = Column(Integer, nullable=False, default=0)  # in cents
+    lines = Column(Integer, nullable=False, default=0)
+
+
+class RepairCostMonthly(Base):
+    __tablename__ = "repair_cost_monthly"
+    __table_args__ = (UniqueConstraint("period", "customer_id", "device_type"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    period = Column(String(7), nullable=False)
+    customer_id = Column(Integer, nullable=False, default=0)  # 0 = no customer
+    device_type = Column(String(100), nullable=False, default="")
+    repairs = Column(Integer, nullable=False, default=0)
+    actual_cost = Column(Integer, nullable=False, default=0)  # in cents
+    parts_cost = Column(Integer, nullable=False, default=0)  # in cents
+    labor_hours = Column(Integer, nullable=False, default=0)
+
+
+class PartForecast(Base):
+    """Latest stock forecast of a part (backend/services/parts_forecast.py)."""
+
+    __tablename__ = "part_forecasts"
+
+    part_id = Column(Integer, ForeignKey("parts.id"), primary_key=True)
+    daily_usage = Column(Float, nullable=False, default=0)  # mean of the history window
+    usage_stddev = Column(Float, nullable=False, default=0)
+    scheduled_demand = Column(Integer, nullable=False, default=0)  # maintenance in lead time
+    daily_demand = Column(Float, nullable=False, default=0)  # usage + scheduled per day
+    reorder_point = Column(Integer, nullable=False, index=True)
+    order_up_to = Column(Integer, nullable=False)
+    computed_at = Column(DateTime(timezone=True), nullable=False)
+
+
+# Background Jobs
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+    # Workers claim the highest-priority due job: status + priority + run_after
+    __table_args__ = (Index("ix_jobs_claim", "status", "priority", "run_after"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_type = Column(String(100), nullable=False, index=True)  # software.installation, ...
+    status = Column(
+        String(20), nullable=False, default="queued"
+    )  # queued, running, succeeded, failed, cancelled
+    priority = Column(Integer, nullable=False, default=0)  # higher runs first
+    payload = Column(JSON)
+    result = Column(JSON)
+    error = Column(Text)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    progress = Column(Integer, default=0)  # percent
+    progress_message = Column(String(255))
+    run_after = Column(DateTime(timezone=True), nullable=False)  # not claimed before (backoff)
+    locked_by = Column(String(100))  # worker id while running
+    locked_at = Column(DateTime(timezone=True))
+    created_by = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+
+    # Relationships
+    creator = relationship("User", foreign_keys=[created_by])
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (UniqueConstraint("principal", "key"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    principal = Column(String(120), nullable=False)  # user:<username>, auth:<sha256>, anonymous
+    key = Column(String(255), nullable=False)
+    fingerprint = Column(String(64), nullable=False)  # SHA-256 of method, path, query and body
+    status = Column(String(20), nullable=False, default="processing")  # processing, completed
+    response_status = Column(Integer)
+    response_headers = Column(JSON)  # [[name, value], ...]
+    response_body = Column(LargeBinary)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+# Change-data log (backend/services/change_log.py)
+
+
+class ChangeLog(Base):
+    __tablename__ = "change_log"
+    __table_args__ = (
+        # Latest change per entity (sync, compaction)
+        Index("ix_change_log_entity", "entity", "entity_id", "seq"),
+        {"sqlite_autoincrement": True},  # a seq is never reused, even after compaction
+    )
+
+    seq = Column(Integer, primary_key=True)
+    entity = Column(String(50), nullable=False)  # device, customer, configuration, ...
+    entity_id = Column(Integer, nullable=False)
+    op = Column(String(10), nullable=False)  # upsert, delete
+    changed_at = Column(DateTime(timezone=True), nullable=False)
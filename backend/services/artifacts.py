@@ -0,0 +1,354 @@
+"""
+Content-addressed store for software binaries (firmware images, packages).
+
+Files live under ``ARTIFACT_STORE_DIR/objects/ab/cd/<sha256>`` and are stored
+once whatever the number of versions or uploads referring to them. Bodies are
+never held in memory: request chunks are collected into ``CHUNK_SIZE``
+blocks that a worker thread hashes (SHA-256) and appends to a temporary file,
+which is moved into place once the digest is known.
+
+Two ways in:
+
+- one request, ``store_stream()``, for clients that can send the whole file
+  (``Transfer-Encoding: chunked`` is fine)
+- a resumable upload: ``create_upload()``, then ``append_to_upload()`` with
+  the byte offset the client resumes from (``Upload-Offset``, as in tus), and
+  ``complete_upload()``. An interrupted request keeps what was received; the
+  hash state stays in memory between requests and is rebuilt from the
+  partial file when a request lands on another process. Only one request
+  appends at a time (``open`` -> ``receiving`` compare-and-set); a request
+  that died mid-way loses the claim after ``RECEIVE_TIMEOUT``.
+
+Stale uploads are removed by the ``artifacts.cleanup`` job after
+``ARTIFACT_UPLOAD_TTL_H``.
+"""
+import hashlib
+import os
+import secrets
+import threading
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+import anyio
+from sqlalchemy import and_, delete, insert, or_, select, update
+from sqlalchemy.orm import Session
+from starlette.requests import ClientDisconnect
+
+from backend.core.config import settings
+from backend.models.models import Artifact, ArtifactUpload
+from backend.services.jobs import utcnow
+
+CHUNK_SIZE = 1024 * 1024
+RECEIVE_TIMEOUT = timedelta(minutes=15)
+
+# upload id -> (bytes hashed, hash state) of uploads appended to by this process
+_hash_states: Dict[str, Tuple[int, "hashlib._Hash"]] = {}
+_hash_states_lock = threading.Lock()
+
+
+class ArtifactError(Exception):
+    status_code = 400
+
+    def __init__(self, message: str) -> None:
+        super().__init__(message)
+        self.message = message
+
+
+class UploadNotFound(ArtifactError):
+    status_code = 404
+
+
+class UploadConflict(ArtifactError):
+    """The upload is busy, finished, or the client's offset is not the stored one."""
+
+    status_code = 409
+
+    def __init__(self, message: str, upload: ArtifactUpload) -> None:
+        super().__init__(message)
+        self.offset = upload.bytes_received
+        self.upload_status = upload.status
+
+
+class ArtifactTooLarge(ArtifactError):
+    status_code = 413
+
+
+class ChecksumMismatch(ArtifactError):
+    status_code = 422
+
+
+def max_size() -> int:
+    return settings.artifact_max_size_mb * 1024 * 1024
+
+
+def relative_object_path(sha256: str) -> str:
+    return "/".join(("objects", sha256[:2], sha256[2:4], sha256))
+
+
+def object_path(sha256: str) -> str:
+    return os.path.join(settings.artifact_store_dir, *relative_object_path(sha256).split("/"))
+
+
+def _upload_path(name: str) -> str:
+    return os.path.join(settings.artifact_store_dir, "uploads", f"{name}.part")
+
+
+def temp_path(prefix: str) -> str:
+    """A fresh path on the store's filesystem for a file to be passed to ``store_file()``."""
+    path = _upload_path(f"{prefix}-{secrets.token_hex(16)}")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def _write(file, hasher, block: bytearray) -> None:
+    hasher.update(block)
+    file.write(block)
+
+
+async def _receive(
+    stream: AsyncIterator[bytes], file, hasher, received: int, limit: int
+) -> Tuple[int, bool]:
+    """Hash and append ``stream`` to ``file``; returns ``(bytes written, complete)``.
+
+    A client disconnect ends the stream; what arrived until then is written.
+    """
+    block = bytearray()
+    complete = True
+    try:
+        async for chunk in stream:
+            if received + len(block) + len(chunk) > limit:
+                raise ArtifactTooLarge(f"Artifact larger than {limit} bytes")
+            block += chunk
+            if len(block) >= CHUNK_SIZE:
+                await anyio.to_thread.run_sync(_write, file, hasher, block)
+                received += len(block)
+                block.clear()
+    except ClientDisconnect:
+        complete = False
+    if block:
+        await anyio.to_thread.run_sync(_write, file, hasher, block)
+        received += len(block)
+    await anyio.to_thread.run_sync(file.flush)
+    return received, complete
+
+
+def _insert_artifact(db: Session, sha256: str, size: int, user_id: Optional[int]) -> bool:
+    """Insert the ``Artifact`` row unless it exists; True if inserted."""
+    values = {"sha256": sha256, "size": size, "created_by": user_id}
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        statement = dialect_insert(Artifact).values(values)
+        statement = statement.on_conflict_do_nothing(index_elements=["sha256"])
+        return bool(db.execute(statement).rowcount)
+    if db.scalar(select(Artifact.id).where(Artifact.sha256 == sha256)) is not None:
+        return False
+    db.execute(insert(Artifact).values(values))
+    return True
+
+
+def store_file(
+    db: Session, path: str, sha256: str, size: int, user_id: Optional[int]
+) -> Tuple[Artifact, bool]:
+    """Move a complete file (e.g. from ``temp_path()``) into the store; the caller commits.
+
+    Returns ``(artifact, created)``.
+    """
+    target = object_path(sha256)
+    if os.path.exists(target):
+        os.unlink(path)
+    else:
+        with open(path, "rb") as file:
+            os.fsync(file.fileno())
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+    created = _insert_artifact(db, sha256, size, user_id)
+    return db.scalar(select(Artifact).where(Artifact.sha256 == sha256)), created
+
+
+def _check_digest(expected: Optional[str], sha256: str) -> None:
+    if expected and expected.lower() != sha256:
+        raise ChecksumMismatch(f"SHA-256 mismatch: expected {expected.lower()}, got {sha256}")
+
+
+async def store_stream(
+    db: Session,
+    stream: AsyncIterator[bytes],
+    user_id: Optional[int],
+    expected_sha256: Optional[str] = None,
+) -> Tuple[Artifact, bool]:
+    """Store a request body in one go; the caller commits."""
+    path = temp_path("direct")
+    hasher = hashlib.sha256()
+    try:
+        with open(path, "wb") as file:
+            size, complete = await _receive(stream, file, hasher, 0, max_size())
+        if not complete:
+            raise ArtifactError("Upload interrupted, nothing stored")
+        sha256 = hasher.hexdigest()
+        _check_digest(expected_sha256, sha256)
+    except BaseException:
+        if os.path.exists(path):
+            os.unlink(path)
+        raise
+    return store_file(db, path, sha256, size, user_id)
+
+
+def create_upload(
+    db: Session,
+    user_id: Optional[int],
+    expected_size: Optional[int] = None,
+    expected_sha256: Optional[str] = None,
+) -> ArtifactUpload:
+    """Start a resumable upload; the caller commits."""
+    if expected_size is not None and expected_size > max_size():
+        raise ArtifactTooLarge(f"Artifact larger than {max_size()} bytes")
+    upload = ArtifactUpload(
+        id=secrets.token_hex(16),
+        status="open",
+        bytes_received=0,
+        expected_size=expected_size,
+        expected_sha256=expected_sha256.lower() if expected_sha256 else None,
+        created_by=user_id,
+        updated_at=utcnow(),
+    )
+    path = _upload_path(upload.id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "wb").close()
+    db.add(upload)
+    db.flush()
+    return upload
+
+
+def _claim_upload(db: Session, upload_id: str, offset: int) -> ArtifactUpload:
+    """Move an open upload at ``offset`` to ``receiving`` (committed), or raise."""
+    now = utcnow()
+    claimed = db.execute(
+        update(ArtifactUpload)
+        .where(
+            ArtifactUpload.id == upload_id,
+            ArtifactUpload.bytes_received == offset,
+            or_(
+                ArtifactUpload.status == "open",
+                and_(
+                    ArtifactUpload.status == "receiving",
+                    ArtifactUpload.updated_at < now - RECEIVE_TIMEOUT,
+                ),
+            ),
+        )
+        .values(status="receiving", updated_at=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    upload = db.get(ArtifactUpload, upload_id)
+    if upload is None or not os.path.exists(_upload_path(upload_id)):
+        raise UploadNotFound("Upload not found")
+    if not claimed:
+        if upload.status != "open":
+            raise UploadConflict(f"Upload is {upload.status}", upload)
+        raise UploadConflict(f"Upload continues at offset {upload.bytes_received}", upload)
+    return upload
+
+
+def _release_upload(db: Session, upload: ArtifactUpload, received: int, status: str) -> None:
+    upload.bytes_received = received
+    upload.status = status
+    upload.updated_at = utcnow()
+    db.commit()
+
+
+def _resume_hasher(upload_id: str, offset: int):
+    """Hash state of the first ``offset`` bytes of an upload."""
+    with _hash_states_lock:
+        cached = _hash_states.pop(upload_id, None)
+    if cached is not None and cached[0] == offset:
+        return cached[1]
+    hasher = hashlib.sha256()
+    remaining = offset
+    with open(_upload_path(upload_id), "rb") as file:
+        while remaining > 0:
+            block = file.read(min(CHUNK_SIZE, remaining))
+            if not block:
+                break
+            hasher.update(block)
+            remaining -= len(block)
+    return hasher
+
+
+async def append_to_upload(
+    db: Session, upload_id: str, offset: int, stream: AsyncIterator[bytes]
+) -> ArtifactUpload:
+    """Append a request body at ``offset``; commits (also if the client disconnects)."""
+    upload = _claim_upload(db, upload_id, offset)
+    limit = min(upload.expected_size or max_size(), max_size())
+    received = offset
+    try:
+        hasher = await anyio.to_thread.run_sync(_resume_hasher, upload_id, offset)
+        with open(_upload_path(upload_id), "r+b") as file:
+            # Drop anything an interrupted request wrote past the recorded offset
+            file.truncate(offset)
+            file.seek(offset)
+            received, _ = await _receive(stream, file, hasher, offset, limit)
+    except BaseException:
+        _release_upload(db, upload, offset, "open")
+        raise
+    with _hash_states_lock:
+        _hash_states[upload_id] = (received, hasher)
+    _release_upload(db, upload, received, "open")
+    return upload
+
+
+def get_upload(db: Session, upload_id: str) -> ArtifactUpload:
+    upload = db.get(ArtifactUpload, upload_id)
+    if upload is None:
+        raise UploadNotFound("Upload not found")
+    return upload
+
+
+async def complete_upload(
+    db: Session, upload_id: str, user_id: Optional[int]
+) -> Tuple[Artifact, bool]:
+    """Verify and store a finished upload; commits."""
+    upload = get_upload(db, upload_id)
+    upload = _claim_upload(db, upload_id, upload.bytes_received)
+    received = upload.bytes_received
+    if upload.expected_size is not None and received != upload.expected_size:
+        _release_upload(db, upload, received, "open")
+        raise UploadConflict(
+            f"Upload incomplete: {received} of {upload.expected_size} bytes", upload
+        )
+
+    hasher = await anyio.to_thread.run_sync(_resume_hasher, upload_id, received)
+    sha256 = hasher.hexdigest()
+    try:
+        _check_digest(upload.expected_sha256, sha256)
+    except ChecksumMismatch:
+        # The content is wrong and cannot be fixed by resuming: start over
+        os.unlink(_upload_path(upload_id))
+        db.delete(upload)
+        db.commit()
+        raise
+
+    artifact, created = store_file(db, _upload_path(upload_id), sha256, received, user_id)
+    upload.artifact_sha256 = sha256
+    _release_upload(db, upload, received, "completed")
+    return artifact, created
+
+
+def cleanup_uploads(db: Session, now: Optional[datetime] = None) -> Dict[str, int]:
+    """Delete uploads untouched for ``ARTIFACT_UPLOAD_TTL_H`` and their partial files."""
+    cutoff = (now or utcnow()) - timedelta(hours=settings.artifact_upload_ttl_h)
+    stale = db.scalars(select(ArtifactUpload.id).where(ArtifactUpload.updated_at < cutoff)).all()
+    for upload_id in stale:
+        try:
+            os.unlink(_upload_path(upload_id))
+        except FileNotFoundError:
+            pass
+        with _hash_states_lock:
+            _hash_states.pop(upload_id, None)
+    if stale:
+        db.execute(delete(ArtifactUpload).where(ArtifactUpload.id.in_(stale)))
+    return {"uploads_removed": len(stale)}
@@ -0,0 +1,233 @@
+"""
+Append-only change-data log and delta sync.
+
+Every insert, update and delete of the synced entities (``ENTITIES``) adds
+a ``change_log`` row - entity, id, ``upsert``/``delete`` and an increasing
+``seq`` - in the same transaction as the change itself: ORM writes are
+picked up by a ``before_commit`` hook of the session, set-based writes that
+bypass the ORM (``change_stock``) call ``record_changes``. On PostgreSQL the
+writers of the log are serialised with a transaction-level advisory lock,
+so sequence numbers become visible in commit order and a client never
+skips a change committed late.
+
+``changes_since`` folds the log after a client's last ``seq`` into the
+latest operation per entity and loads the current rows of the upserted
+ones, so a sync costs what changed since, not the size of the fleet.
+
+``compact`` (``changes.compact`` job, daily) deletes the rows superseded by
+a later change of the same entity and ``backfill`` logs rows written by
+bulk loaders (seeding, synthetic fleets) that never went through the ORM.
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import and_, delete, event, func, insert, inspect, literal, select, text
+from sqlalchemy.orm import Session
+
+from backend.models.models import (
+    ChangeLog,
+    Configuration,
+    Customer,
+    Device,
+    JsonTemplate,
+    Part,
+    TestScenario,
+)
+from backend.services.jobs import utcnow
+
+ENTITIES = {
+    "device": Device,
+    "customer": Customer,
+    "configuration": Configuration,
+    "test_scenario": TestScenario,
+    "json_template": JsonTemplate,
+    "part": Part,
+}
+ENTITY_NAMES = {model: name for name, model in ENTITIES.items()}
+LOAD_CHUNK = 500
+# pg_advisory_xact_lock key of the change log writers
+ADVISORY_LOCK_KEY = 0x6368616E6765
+
+
+def _write(db: Session, rows: List[dict]) -> None:
+    if not rows:
+        return
+    connection = db.connection()
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+    now = utcnow()
+    connection.execute(insert(ChangeLog), [dict(row, changed_at=now) for row in rows])
+
+
+def record_changes(db: Session, entity: str, ids: Iterable[int], op: str = "upsert") -> None:
+    """Log a set-based write of ``ids`` that bypassed the ORM; the caller commits."""
+    _write(db, [{"entity": entity, "entity_id": entity_id, "op": op} for entity_id in ids])
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed(session: Session, flush_context) -> None:
+    # Changes are collected per flush and written once, right before the commit
+    pending = session.info.setdefault("change_log", {})
+    for obj in session.new:
+        name = ENTITY_NAMES.get(type(obj))
+        if name:
+            pending[(name, obj.id)] = "upsert"
+    for obj in session.dirty:
+        name = ENTITY_NAMES.get(type(obj))
+        if name and session.is_modified(obj, include_collections=False):
+            pending[(name, obj.id)] = "upsert"
+    for obj in session.deleted:
+        name = ENTITY_NAMES.get(type(obj))
+        if name:
+            pending[(name, inspect(obj).identity[0])] = "delete"
+
+
+@event.listens_for(Session, "before_commit")
+def _write_collected(session: Session) -> None:
+    session.flush()  # the flush a commit would do, so its changes are collected too
+    pending = session.info.pop("change_log", None)
+    if pending:
+        _write(
+            session,
+            [
+                {"entity": name, "entity_id": entity_id, "op": op}
+                for (name, entity_id), op in pending.items()
+            ],
+        )
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_collected(session: Session, previous_transaction) -> None:
+    if previous_transaction.parent is None:
+        session.info.pop("change_log", None)
+
+
+def head(db: Session) -> int:
+    """Highest ``seq`` written so far (0 for an empty log)."""
+    return db.scalar(select(func.coalesce(func.max(ChangeLog.seq), 0)))
+
+
+def latest_seq(entity: str, id_column):
+    """Scalar subquery: ``seq`` of the latest change of the row ``id_column`` (0 for none)."""
+    return (
+        select(func.coalesce(func.max(ChangeLog.seq), 0))
+        .where(ChangeLog.entity == entity, ChangeLog.entity_id == id_column)
+        .scalar_subquery()
+    )
+
+
+def _row_dict(obj) -> dict:
+    return {attr.key: getattr(obj, attr.key) for attr in inspect(type(obj)).column_attrs}
+
+
+def _load(db: Session, entity: str, ids: Sequence[int]) -> Dict[int, dict]:
+    model = ENTITIES[entity]
+    rows = {}
+    for start in range(0, len(ids), LOAD_CHUNK):
+        chunk = ids[start : start + LOAD_CHUNK]
+        for obj in db.scalars(select(model).where(model.id.in_(chunk))):
+            rows[obj.id] = _row_dict(obj)
+    return rows
+
+
+def changes_since(
+    db: Session, since: int, limit: int, entities: Optional[Sequence[str]] = None
+) -> Dict:
+    """Latest change per entity after ``since``, oldest first, at most ``limit`` of them.
+
+    ``next`` is the ``since`` of the following call; with ``has_more`` the
+    client should call again right away. A ``since`` beyond the log (a new
+    database) starts over from 0 with ``reset``: the client drops its copy.
+    """
+    upper = head(db)
+    reset = since > upper
+    if reset:
+        since = 0
+    conditions = [ChangeLog.seq > since, ChangeLog.seq <= upper]
+    if entities is not None:
+        conditions.append(ChangeLog.entity.in_(entities))
+    latest = (
+        select(func.max(ChangeLog.seq).label("seq"))
+        .where(*conditions)
+        .group_by(ChangeLog.entity, ChangeLog.entity_id)
+        .order_by(func.max(ChangeLog.seq))
+        .limit(limit + 1)
+        .subquery()
+    )
+    rows = db.execute(
+        select(ChangeLog.seq, ChangeLog.entity, ChangeLog.entity_id, ChangeLog.op)
+        .join(latest, latest.c.seq == ChangeLog.seq)
+        .order_by(ChangeLog.seq)
+    ).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    upserted = defaultdict(list)
+    for row in rows:
+        if row.op == "upsert":
+            upserted[row.entity].append(row.entity_id)
+    current = {entity: _load(db, entity, ids) for entity, ids in upserted.items()}
+
+    changes = []
+    for row in rows:
+        data = current.get(row.entity, {}).get(row.entity_id)
+        if row.op == "upsert" and data is None:
+            continue  # deleted by a change not committed when the log was read
+        change = {"seq": row.seq, "entity": row.entity, "id": row.entity_id, "op": row.op}
+        if data is not None:
+            change["data"] = data
+        changes.append(change)
+
+    return {
+        "since": since,
+        "next": rows[-1].seq if has_more else upper,
+        "has_more": has_more,
+        "reset": reset,
+        "changes": changes,
+    }
+
+
+def backfill(db: Session) -> Dict[str, int]:
+    """Log an ``upsert`` for every row whose latest change is not one; the caller commits.
+
+    A row whose latest change is a ``delete`` reuses the id of a deleted one.
+    """
+    now = utcnow()
+    counts = {}
+    for name, model in ENTITIES.items():
+        latest_op = (
+            select(ChangeLog.op)
+            .where(ChangeLog.entity == name, ChangeLog.entity_id == model.id)
+            .order_by(ChangeLog.seq.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        result = db.execute(
+            insert(ChangeLog).from_select(
+                ["entity", "entity_id", "op", "changed_at"],
+                select(literal(name), model.id, literal("upsert"), literal(now))
+                .where(func.coalesce(latest_op, "") != "upsert")
+                .order_by(model.id),
+            )
+        )
+        counts[name] = result.rowcount
+    return counts
+
+
+def compact(db: Session) -> Dict[str, int]:
+    """Backfill, then delete the changes superseded by a later one of the same entity."""
+    backfilled = sum(backfill(db).values())
+    newer = ChangeLog.__table__.alias("newer")
+    superseded = (
+        select(newer.c.seq)
+        .where(
+            and_(
+                newer.c.entity == ChangeLog.entity,
+                newer.c.entity_id == ChangeLog.entity_id,
+                newer.c.seq > ChangeLog.seq,
+            )
+        )
+        .exists()
+    )
+    deleted = db.execute(delete(ChangeLog).where(superseded)).rowcount
+    return {"backfilled": backfilled, "deleted": deleted}
@@ -0,0 +1,78 @@
+"""
+Configuration backup and restore.
+
+Shared by the ``/fleet-config/backup`` and ``/fleet-config/restore`` endpoints
+(inline) and the ``config.backup`` / ``config.restore`` background jobs.
+"""
+from datetime import datetime
+from typing import Any, Dict
+
+from sqlalchemy.orm import Session
+
+from backend.models.models import Configuration, Device, TestScenario
+
+
+def collect_backup(db: Session) -> Dict[str, Any]:
+    """Snapshot of device, test scenario and FCM system configurations."""
+    # Get all device configurations
+    devices = db.query(Device).all()
+    device_configs = [
+        {"id": d.id, "configuration": d.configuration if d.configuration is not None else {}}
+        for d in devices
+    ]
+
+    # Get all test scenario configurations
+    scenarios = db.query(TestScenario).all()
+    scenario_configs = [
+        {"id": s.id, "parameters": s.parameters or {}, "expected_results": s.expected_results or {}}
+        for s in scenarios
+    ]
+
+    # Get all system configurations from Configuration table
+    system_configs = db.query(Configuration).filter(Configuration.component == "FCM").all()
+    system_configs_data = [
+        {"id": c.id, "config_key": c.config_key, "config_value": c.config_value}
+        for c in system_configs
+    ]
+
+    return {
+        "backup_timestamp": datetime.now().isoformat(),
+        "device_configurations": device_configs,
+        "test_scenario_configurations": scenario_configs,
+        "system_configurations": system_configs_data,
+    }
+
+
+def restore_backup(db: Session, backup_data: Dict[str, Any], user_id: int) -> None:
+    """Apply a backup made by ``collect_backup`` (the caller commits)."""
+    # Restore device configurations
+    if "device_configurations" in backup_data:
+        for device_config in backup_data["device_configurations"]:
+            device = db.query(Device).filter(Device.id == device_config["id"]).first()
+            if device:
+                setattr(device, "configuration", device_config["configuration"])
+
+    # Restore test scenario configurations
+    if "test_scenario_configurations" in backup_data:
+        for scenario_config in backup_data["test_scenario_configurations"]:
+            scenario = (
+                db.query(TestScenario).filter(TestScenario.id == scenario_config["id"]).first()
+            )
+            if scenario:
+                scenario.parameters = scenario_config["parameters"]
+                scenario.expected_results = scenario_config["expected_results"]
+
+    # Restore system configurations
+    if "system_configurations" in backup_data:
+        for system_config in backup_data["system_configurations"]:
+            config = (
+                db.query(Configuration)
+                .filter(Configuration.id == system_config["id"], Configuration.component == "FCM")
+                .first()
+            )
+            if config:
+                # Restore both config_value and config_key for complete state recovery
+                setattr(config, "config_value", system_config["config_value"])
+                if "config_key" in system_config:
+                    setattr(config, "config_key", system_config["config_key"])
+                setattr(config, "updated_by", user_id)
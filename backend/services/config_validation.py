@@ -0,0 +1,401 @@
+"""
+Validation against the ``schema`` of the JSON templates.
+
+- device configurations: the active ``device_config`` templates whose
+  ``category`` is the device type, checked against the effective
+  configuration the device gets (backend/services/device_config.py), so
+  template defaults count and a device only overrides what it needs,
+- test scenarios: the active ``scenario`` templates whose ``category`` is
+  the scenario's test type, checked against its parameters.
+
+Schemas are compiled once per template version - the latest change-log
+``seq`` of the template - and kept in an LRU of ``SCHEMA_CACHE_SIZE``
+entries, so a check costs an index lookup and the validation itself. With
+``jsonschema`` installed the whole specification of the schema's draft is
+enforced; without it a built-in validator covers the common keywords
+(``type``, ``enum``, ``const``, ``properties``, ``required``,
+``additionalProperties``, ``items``, ``minItems``/``maxItems``,
+``minimum``/``maximum`` and their exclusive forms,
+``minLength``/``maxLength``, ``pattern``) and ignores the others.
+
+``validate_devices`` (job ``templates.validate_devices``) checks every
+device of a template's category, reading the devices in keyset chunks and
+resolving the layers below the device once for all of them.
+"""
+import operator
+import re
+from itertools import islice
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+try:  # jsonschema is optional - the built-in validator covers the common keywords
+    import jsonschema
+except ImportError:  # pragma: no cover - depends on the environment
+    jsonschema = None
+
+from backend.core.config import settings
+from backend.models.models import Device, JsonTemplate
+from backend.services.change_log import latest_seq
+from backend.services.device_config import LRUCache, merge, preview_config, shared_layers
+
+ERROR_LIMIT = 20  # errors reported per checked document
+REPORT_LIMIT = 1000  # devices listed in a bulk validation report
+CHUNK = 1000
+
+Path = Tuple[Any, ...]
+Check = Callable[[Any, Path], Iterator[Tuple[Path, str]]]
+
+
+class InvalidSchema(ValueError):
+    """A template ``schema`` that is not a valid JSON Schema."""
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_integer(value: Any) -> bool:
+    if isinstance(value, float):
+        return value.is_integer()
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+_TYPES: Dict[str, Callable[[Any], bool]] = {
+    "object": lambda value: isinstance(value, dict),
+    "array": lambda value: isinstance(value, list),
+    "string": lambda value: isinstance(value, str),
+    "boolean": lambda value: isinstance(value, bool),
+    "null": lambda value: value is None,
+    "number": _is_number,
+    "integer": _is_integer,
+}
+
+_BOUNDS = (
+    ("minimum", operator.lt, "less than the minimum of"),
+    ("maximum", operator.gt, "greater than the maximum of"),
+    ("exclusiveMinimum", operator.le, "less than or equal to the minimum of"),
+    ("exclusiveMaximum", operator.ge, "greater than or equal to the maximum of"),
+)
+
+
+def _no_errors(value: Any, path: Path) -> Iterator[Tuple[Path, str]]:
+    return iter(())
+
+
+def _compile(schema: Any) -> Check:
+    """Built-in validator of ``schema`` as nested closures, checked as it is compiled."""
+    if schema is True:
+        return _no_errors
+    if schema is False:
+
+        def check_false(value, path):
+            yield path, f"False schema does not allow {value!r}"
+
+        return check_false
+    if not isinstance(schema, dict):
+        raise InvalidSchema(f"{schema!r} is not of type 'object', 'boolean'")
+
+    checks: List[Check] = []
+
+    if "type" in schema:
+        names = schema["type"] if isinstance(schema["type"], list) else [schema["type"]]
+        unknown = [name for name in names if not isinstance(name, str) or name not in _TYPES]
+        if unknown:
+            raise InvalidSchema(f"Unknown type {unknown[0]!r}")
+        tests = [_TYPES[name] for name in names]
+        expected = ", ".join(repr(name) for name in names)
+
+        def check_type(value, path):
+            if not any(test(value) for test in tests):
+                yield path, f"{value!r} is not of type {expected}"
+
+        checks.append(check_type)
+
+    if "enum" in schema:
+        options = schema["enum"]
+        if not isinstance(options, list):
+            raise InvalidSchema("'enum' must be an array")
+
+        def check_enum(value, path):
+            if value not in options:
+                yield path, f"{value!r} is not one of {options!r}"
+
+        checks.append(check_enum)
+
+    if "const" in schema:
+        constant = schema["const"]
+
+        def check_const(value, path):
+            if value != constant:
+                yield path, f"{constant!r} was expected"
+
+        checks.append(check_const)
+
+    for keyword, exceeds, text in _BOUNDS:
+        limit = schema.get(keyword)
+        if limit is None or isinstance(limit, bool):  # draft 4 boolean exclusive* flags
+            continue
+        if not _is_number(limit):
+            raise InvalidSchema(f"{keyword!r} must be a number")
+
+        def check_bound(value, path, limit=limit, exceeds=exceeds, text=text):
+            if _is_number(value) and exceeds(value, limit):
+                yield path, f"{value!r} is {text} {limit!r}"
+
+        checks.append(check_bound)
+
+    for keyword, kind, too_short in (
+        ("minLength", str, True),
+        ("maxLength", str, False),
+        ("minItems", list, True),
+        ("maxItems", list, False),
+    ):
+        size = schema.get(keyword)
+        if size is None:
+            continue
+        if not isinstance(size, int) or isinstance(size, bool) or size < 0:
+            raise InvalidSchema(f"{keyword!r} must be a non-negative integer")
+
+        def check_size(value, path, size=size, kind=kind, too_short=too_short):
+            if isinstance(value, kind) and (len(value) < size if too_short else len(value) > size):
+                yield path, f"{value!r} is too {'short' if too_short else 'long'}"
+
+        checks.append(check_size)
+
+    if "pattern" in schema:
+        try:
+            pattern = re.compile(schema["pattern"])
+        except (re.error, TypeError) as exc:
+            raise InvalidSchema(f"Invalid 'pattern': {exc}") from exc
+
+        def check_pattern(value, path):
+            if isinstance(value, str) and not pattern.search(value):
+                yield path, f"{value!r} does not match {pattern.pattern!r}"
+
+        checks.append(check_pattern)
+
+    if "items" in schema:
+        items = schema["items"]
+        if isinstance(items, list):  # tuple validation
+            positional = [_compile(item) for item in items]
+
+            def check_items(value, path):
+                if isinstance(value, list):
+                    for index, (item, check) in enumerate(zip(value, positional)):
+                        yield from check(item, path + (index,))
+
+        else:
+            each = _compile(items)
+
+            def check_items(value, path):
+                if isinstance(value, list):
+                    for index, item in enumerate(value):
+                        yield from each(item, path + (index,))
+
+        checks.append(check_items)
+
+    if "required" in schema:
+        required = schema["required"]
+        if not isinstance(required, list) or not all(isinstance(name, str) for name in required):
+            raise InvalidSchema("'required' must be an array of strings")
+
+        def check_required(value, path):
+            if isinstance(value, dict):
+                for name in required:
+                    if name not in value:
+                        yield path, f"{name!r} is a required property"
+
+        checks.append(check_required)
+
+    properties = schema.get("properties", {})
+    if not isinstance(properties, dict):
+        raise InvalidSchema("'properties' must be an object")
+    compiled_properties = {name: _compile(subschema) for name, subschema in properties.items()}
+    additional = schema.get("additionalProperties", True)
+    check_additional = None if additional is False else _compile(additional)
+    if compiled_properties or additional is not True:
+
+        def check_properties(value, path):
+            if not isinstance(value, dict):
+                return
+            unexpected = []
+            for name, item in value.items():
+                check = compiled_properties.get(name)
+                if check is not None:
+                    yield from check(item, path + (name,))
+                elif check_additional is None:
+                    unexpected.append(name)
+                else:
+                    yield from check_additional(item, path + (name,))
+            if unexpected:
+                names = ", ".join(repr(name) for name in unexpected)
+                verb = "was" if len(unexpected) == 1 else "were"
+                yield path, f"Additional properties are not allowed ({names} {verb} unexpected)"
+
+        checks.append(check_properties)
+
+    if not checks:
+        return _no_errors
+
+    def check_all(value, path):
+        for check in checks:
+            yield from check(value, path)
+
+    return check_all
+
+
+def _format_path(path: Path) -> str:
+    text = "$"
+    for part in path:
+        text += f"[{part}]" if isinstance(part, int) else f".{part}"
+    return text
+
+
+class CompiledSchema:
+    """A template schema checked and prepared once; ``errors()`` validates a document."""
+
+    def __init__(self, schema: Any) -> None:
+        if schema is None:
+            schema = {}
+        if jsonschema is not None:
+            validator_class = jsonschema.validators.validator_for(schema)
+            try:
+                validator_class.check_schema(schema)
+            except jsonschema.SchemaError as exc:
+                raise InvalidSchema(exc.message) from exc
+            validator = validator_class(schema)
+            self._iter_errors = lambda instance: (
+                (tuple(error.absolute_path), error.message)
+                for error in validator.iter_errors(instance)
+            )
+        else:
+            check = _compile(schema)
+            self._iter_errors = lambda instance: check(instance, ())
+
+    def errors(self, instance: Any, limit: int = ERROR_LIMIT) -> List[Dict[str, str]]:
+        """At most ``limit`` violations of ``instance``, each a ``path`` and a ``message``."""
+        return [
+            {"path": _format_path(path), "message": message}
+            for path, message in islice(self._iter_errors(instance), limit)
+        ]
+
+
+cache = LRUCache(settings.schema_cache_size)
+
+
+def compiled_schema(db: Session, template_id: int, seq: int) -> CompiledSchema:
+    """Compiled schema of a template version; raises ``InvalidSchema``."""
+    key = (template_id, seq)
+    compiled = cache.get(key)
+    if compiled is None:
+        schema = db.scalar(select(JsonTemplate.schema).where(JsonTemplate.id == template_id))
+        compiled = CompiledSchema(schema)
+        cache.put(key, compiled)
+    return compiled
+
+
+def check_schema(schema: Any) -> None:
+    """Raise ``InvalidSchema`` for a schema a template cannot be saved with."""
+    CompiledSchema(schema)
+
+
+def violations(
+    db: Session, template_type: str, category: Optional[str], instance: Any
+) -> List[Dict[str, Any]]:
+    """Violations of ``instance`` against every active template of the type and category."""
+    if not category:
+        return []
+    templates = db.execute(
+        select(JsonTemplate.id, JsonTemplate.name, latest_seq("json_template", JsonTemplate.id))
+        .where(
+            JsonTemplate.template_type == template_type,
+            JsonTemplate.category == category,
+            JsonTemplate.is_active.is_(True),
+        )
+        .order_by(JsonTemplate.id)
+    ).all()
+    found = []
+    for template_id, name, seq in templates:
+        try:
+            errors = compiled_schema(db, template_id, seq).errors(instance)
+        except InvalidSchema as exc:
+            errors = [{"path": "$", "message": f"Template schema is invalid: {exc}"}]
+        found.extend({"template_id": template_id, "template": name, **error} for error in errors)
+    return found
+
+
+def device_config_violations(
+    db: Session, device: Device, configuration: Dict[str, Any]
+) -> List[Dict[str, Any]]:
+    """Violations of the effective configuration ``device`` would get with ``configuration``."""
+    effective = preview_config(db, device.id, configuration)
+    return violations(db, "device_config", device.device_type, effective)
+
+
+def describe(found: List[Dict[str, Any]], limit: int = 5) -> str:
+    """One-line summary of violations for an error ``detail``."""
+    templates = ", ".join(repr(name) for name in dict.fromkeys(e["template"] for e in found))
+    shown = "; ".join(f"{error['path']}: {error['message']}" for error in found[:limit])
+    more = f" (and {len(found) - limit} more)" if len(found) > limit else ""
+    return f"Does not match JSON template {templates}: {shown}{more}"
+
+
+def validate_devices(
+    db: Session, template_id: int, progress: Optional[Callable[[int, str], None]] = None
+) -> Dict[str, Any]:
+    """Check the effective configuration of every device of a template's category."""
+    template = db.execute(
+        select(
+            JsonTemplate.name,
+            JsonTemplate.category,
+            latest_seq("json_template", JsonTemplate.id),
+        ).where(JsonTemplate.id == template_id)
+    ).first()
+    if template is None:
+        return {"template_id": template_id, "skipped": True}
+    name, category, seq = template
+    validator = compiled_schema(db, template_id, seq)
+    base, customers = shared_layers(db, category)
+    total = db.scalar(select(func.count(Device.id)).where(Device.device_type == category))
+
+    checked = invalid = 0
+    reported = []
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(Device.id, Device.device_number, Device.customer_id, Device.configuration)
+            .where(Device.device_type == category, Device.id > last_id)
+            .order_by(Device.id)
+            .limit(CHUNK)
+        ).all()
+        if not rows:
+            break
+        for device_id, device_number, customer_id, configuration in rows:
+            effective = base
+            if customer_id in customers:
+                effective = merge(effective, customers[customer_id])
+            if isinstance(configuration, dict):
+                effective = merge(effective, configuration)
+            errors = validator.errors(effective)
+            if errors:
+                invalid += 1
+                if len(reported) < REPORT_LIMIT:
+                    reported.append(
+                        {"device_id": device_id, "device_number": device_number, "errors": errors}
+                    )
+        checked += len(rows)
+        last_id = rows[-1][0]
+        if progress and total:
+            progress(min(99, checked * 100 // total), f"{checked} of {total} devices checked")
+
+    return {
+        "template_id": template_id,
+        "template": name,
+        "category": category,
+        "checked": checked,
+        "invalid": invalid,
+        "violations": reported,
+        "truncated": invalid > len(reported),
+    }
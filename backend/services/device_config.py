@@ -0,0 +1,268 @@
+"""
+Effective configuration of a device: its configuration layers merged.
+
+From the lowest layer up:
+
+1. ``template`` - ``default_values`` of the active ``device_config`` JSON
+   templates whose ``category`` is the device type, by id,
+2. ``device_type`` - the active FCM system config of type
+   ``device_settings`` named after the device type
+   (key ``device_settings.active.mask_tester``),
+3. ``customer`` - the active ``device_settings`` system config named
+   ``customer.<customer_id>`` (key ``device_settings.active.customer.12``),
+4. ``device`` - ``Device.configuration``.
+
+Dicts are merged key by key; any other value of a higher layer replaces
+the lower one.
+
+``layer_versions`` finds the rows of the layers and their versions - the
+latest change-log ``seq`` of each row (backend/services/change_log.py) -
+with index lookups that load no JSON. The merged result is cached in an
+LRU of ``EFFECTIVE_CONFIG_CACHE_SIZE`` entries keyed by these versions, so
+a change to any layer, or a template or system config starting or
+stopping to apply, is a different key: nothing is invalidated by hand and
+nothing stale is served, the entries of old versions age out. The ETag is
+a hash of the same key, so a poll with a matching ``If-None-Match`` costs
+the lookups and nothing else.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from backend.core.config import settings
+from backend.models.models import Configuration, Device, JsonTemplate
+from backend.services.change_log import latest_seq
+
+SYSTEM_CONFIG_TYPE = "device_settings"
+CUSTOMER_PREFIX = "customer."
+LAYERS = ("template", "device_type", "customer", "device")
+
+# (device id, ((layer, row id, seq), ...)), lowest layer first
+LayerVersions = Tuple[int, Tuple[Tuple[str, int, int], ...]]
+
+
+class LRUCache:
+    """Thread-safe mapping keeping the ``size`` most recently used entries."""
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+cache = LRUCache(settings.effective_config_cache_size)
+
+
+def system_config_keys(device_type: Optional[str], customer_id: Optional[int]) -> Dict[str, str]:
+    """Keys of the FCM system configs of a device, mapped to their layer."""
+    keys = {}
+    if device_type:
+        keys[f"{SYSTEM_CONFIG_TYPE}.active.{device_type}"] = "device_type"
+    if customer_id is not None:
+        keys[f"{SYSTEM_CONFIG_TYPE}.active.{CUSTOMER_PREFIX}{customer_id}"] = "customer"
+    return keys
+
+
+def layer_versions(db: Session, device_id: int) -> Optional[LayerVersions]:
+    """Rows making up the configuration of a device and their versions; None for no device."""
+    device = db.execute(
+        select(Device.device_type, Device.customer_id, latest_seq("device", Device.id)).where(
+            Device.id == device_id
+        )
+    ).first()
+    if device is None:
+        return None
+    device_type, customer_id, device_seq = device
+
+    layers = []
+    if device_type:
+        templates = db.execute(
+            select(JsonTemplate.id, latest_seq("json_template", JsonTemplate.id))
+            .where(
+                JsonTemplate.template_type == "device_config",
+                JsonTemplate.category == device_type,
+                JsonTemplate.is_active.is_(True),
+            )
+            .order_by(JsonTemplate.id)
+        ).all()
+        layers.extend(("template", row_id, seq) for row_id, seq in templates)
+
+    keys = system_config_keys(device_type, customer_id)
+    if keys:
+        configs = db.execute(
+            select(
+                Configuration.config_key,
+                Configuration.id,
+                latest_seq("configuration", Configuration.id),
+            ).where(Configuration.component == "FCM", Configuration.config_key.in_(keys))
+        ).all()
+        configs = sorted(configs, key=lambda row: LAYERS.index(keys[row.config_key]))
+        layers.extend((keys[key], row_id, seq) for key, row_id, seq in configs)
+
+    layers.append(("device", device_id, device_seq))
+    return device_id, tuple(layers)
+
+
+def etag(versions: LayerVersions) -> str:
+    """Quoted strong ETag of the configuration built from ``versions``."""
+    return '"' + hashlib.sha256(repr(versions).encode()).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], tag: str) -> bool:
+    """Whether an ``If-None-Match`` header names ``tag`` (weak comparison, as for GET)."""
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or tag in [value.removeprefix("W/") for value in candidates]
+
+
+def merge(base: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, Any]:
+    """``override`` on top of ``base``: nested dicts merged, other values replaced."""
+    merged = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def _system_config_data(value: Any) -> Any:
+    # Entries created through the API wrap the value with their metadata
+    if isinstance(value, dict) and "metadata" in value:
+        return value.get("data", {})
+    return value
+
+
+def _load_layers(db: Session, versions: LayerVersions) -> Dict[Tuple[str, int], Any]:
+    device_id, layers = versions
+    ids = {layer: [row_id for name, row_id, _ in layers if name == layer] for layer in LAYERS}
+    values = {}
+    if ids["template"]:
+        for row_id, value in db.execute(
+            select(JsonTemplate.id, JsonTemplate.default_values).where(
+                JsonTemplate.id.in_(ids["template"])
+            )
+        ):
+            values[("template", row_id)] = value
+    config_ids = ids["device_type"] + ids["customer"]
+    if config_ids:
+        for row_id, value in db.execute(
+            select(Configuration.id, Configuration.config_value).where(
+                Configuration.id.in_(config_ids)
+            )
+        ):
+            data = _system_config_data(value)
+            values[("device_type" if row_id in ids["device_type"] else "customer", row_id)] = data
+    values[("device", device_id)] = db.scalar(
+        select(Device.configuration).where(Device.id == device_id)
+    )
+    return values
+
+
+def _merge_layers(layers, values) -> Tuple[Dict[str, Any], list]:
+    configuration: Dict[str, Any] = {}
+    applied = []
+    for layer, row_id, _ in layers:
+        value = values.get((layer, row_id))
+        if isinstance(value, dict):
+            configuration = merge(configuration, value)
+            applied.append({"layer": layer, "id": row_id})
+    return configuration, applied
+
+
+def effective_config(db: Session, versions: LayerVersions) -> Dict[str, Any]:
+    """Merged configuration of the device of ``versions``; shared, do not modify it."""
+    cached = cache.get(versions)
+    if cached is not None:
+        return cached
+
+    device_id, layers = versions
+    configuration, applied = _merge_layers(layers, _load_layers(db, versions))
+    result = {"device_id": device_id, "configuration": configuration, "layers": applied}
+    cache.put(versions, result)
+    return result
+
+
+def preview_config(
+    db: Session, device_id: int, configuration: Optional[Dict[str, Any]]
+) -> Optional[Dict[str, Any]]:
+    """Merged configuration the device would have with ``configuration`` as its own layer."""
+    versions = layer_versions(db, device_id)
+    if versions is None:
+        return None
+    values = _load_layers(db, versions)
+    values[("device", device_id)] = configuration
+    return _merge_layers(versions[1], values)[0]
+
+
+def shared_layers(db: Session, device_type: str) -> Tuple[Dict[str, Any], Dict[int, Any]]:
+    """Layers below the device for resolving many devices of a type at once.
+
+    Returns the template and device type layers merged, and the customer
+    layer of every customer that has one; a device's configuration is then
+    ``merge(merge(base, customers.get(customer_id, {})), device.configuration)``.
+    """
+    base: Dict[str, Any] = {}
+    for value in db.scalars(
+        select(JsonTemplate.default_values)
+        .where(
+            JsonTemplate.template_type == "device_config",
+            JsonTemplate.category == device_type,
+            JsonTemplate.is_active.is_(True),
+        )
+        .order_by(JsonTemplate.id)
+    ):
+        if isinstance(value, dict):
+            base = merge(base, value)
+    type_key = next(iter(system_config_keys(device_type, None)))
+    value = _system_config_data(
+        db.scalar(
+            select(Configuration.config_value).where(
+                Configuration.component == "FCM", Configuration.config_key == type_key
+            )
+        )
+    )
+    if isinstance(value, dict):
+        base = merge(base, value)
+
+    prefix = f"{SYSTEM_CONFIG_TYPE}.active.{CUSTOMER_PREFIX}"
+    customers = {}
+    for key, value in db.execute(
+        select(Configuration.config_key, Configuration.config_value).where(
+            Configuration.component == "FCM",
+            Configuration.config_key.startswith(prefix, autoescape=True),
+        )
+    ):
+        customer_id = key[len(prefix) :]
+        value = _system_config_data(value)
+        if customer_id.isdigit() and isinstance(value, dict):
+            customers[int(customer_id)] = value
+    return base, customers
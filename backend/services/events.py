@@ -0,0 +1,202 @@
+"""
+In-process change events streamed to the module pages as Server-Sent Events.
+
+Routers and the services they call record what changed with
+``publish_on_commit(db, module, name, data)``: ``name`` is
+``<entity>.<created|updated|deleted>`` and ``data`` the entity id plus the
+fields a page needs to decide what to re-fetch, e.g. ``device.updated``
+``{"id": 7, "status": "maintenance"}``. The events reach the ``bus`` when
+the session commits and are dropped when it rolls back, so a client never
+hears about a change that did not happen.
+
+``GET /api/v1/<module>/events`` streams the events of one module
+(``event_stream``). The pages re-fetch only the section an event touches
+instead of reloading on timers, so an idle open tab costs no queries; a
+comment line every ``EVENTS_HEARTBEAT_S`` keeps proxies from closing the
+connection. The last ``EVENTS_BUFFER_SIZE`` events are kept, so a client
+reconnecting with ``Last-Event-ID`` gets what it missed; when that is gone
+(or the server restarted) it gets a ``reset`` event and reloads everything.
+A client falling more than ``EVENTS_QUEUE_SIZE`` events behind is
+disconnected and catches up the same way.
+
+The bus lives in the web process: changes made by the job worker
+(``scripts/worker.py``) are not streamed.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional, Set
+
+from sqlalchemy import event as orm_event
+from sqlalchemy.orm import Session
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+
+from backend.core.config import settings
+
+PENDING_KEY = "pending_events"
+RETRY_MS = 3000
+
+
+@dataclass
+class Event:
+    seq: int
+    module: str
+    name: str
+    data: Dict[str, Any]
+    epoch: str
+
+    @property
+    def id(self) -> str:
+        return f"{self.epoch}-{self.seq}"
+
+    def encode(self) -> bytes:
+        payload = json.dumps(self.data, default=str, separators=(",", ":"))
+        return f"id: {self.id}\nevent: {self.name}\ndata: {payload}\n\n".encode()
+
+
+class Subscription:
+    """Queue of one stream, filled on its own event loop."""
+
+    def __init__(self, module: str, loop: asyncio.AbstractEventLoop, size: int) -> None:
+        self.module = module
+        self.loop = loop
+        self.size = size
+        self.queue: "asyncio.Queue[Optional[Event]]" = asyncio.Queue()
+        self.overflowed = False
+
+    def deliver(self, event: Event) -> None:
+        if self.overflowed:
+            return
+        if self.queue.qsize() >= self.size:
+            self.overflowed = True
+            self.queue.put_nowait(None)  # tells the stream to close
+        else:
+            self.queue.put_nowait(event)
+
+
+class EventBus:
+    def __init__(self, buffer_size: int = 1000, queue_size: int = 1000) -> None:
+        # Ids are "<epoch>-<seq>", so ids from before a restart are recognised
+        self.epoch = str(int(time.time() * 1000))
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._buffer: Deque[Event] = deque(maxlen=buffer_size)
+        self._subscribers: Set[Subscription] = set()
+
+    @property
+    def last_id(self) -> str:
+        return f"{self.epoch}-{self._seq}"
+
+    def publish(self, module: str, name: str, data: Dict[str, Any]) -> Event:
+        """Number and buffer an event and hand it to the streams of its module (thread-safe)."""
+        with self._lock:
+            self._seq += 1
+            event = Event(self._seq, module, name, data, self.epoch)
+            self._buffer.append(event)
+            subscribers = [sub for sub in self._subscribers if sub.module == module]
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:  # its loop is closed
+                self.unsubscribe(subscription)
+        return event
+
+    def subscribe(self, module: str) -> Subscription:
+        """Start receiving the events of ``module``; call from the event loop of the stream."""
+        subscription = Subscription(module, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def replay(self, module: str, last_event_id: str) -> Optional[List[Event]]:
+        """Events of ``module`` after ``last_event_id``, or None when some are no longer kept."""
+        epoch, _, seq = last_event_id.partition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        after = int(seq)
+        with self._lock:
+            if after > self._seq:
+                return None
+            if self._buffer and self._buffer[0].seq > after + 1:
+                return None
+            return [event for event in self._buffer if event.seq > after and event.module == module]
+
+
+bus = EventBus(settings.events_buffer_size, settings.events_queue_size)
+
+
+def publish_on_commit(db: Session, module: str, name: str, data: Dict[str, Any]) -> None:
+    """Publish an event once the current transaction of ``db`` commits."""
+    if not db.in_transaction():
+        db.begin()  # so a rollback before anything was executed still drops the event
+    db.info.setdefault(PENDING_KEY, []).append((module, name, data))
+
+
+@orm_event.listens_for(Session, "after_commit")
+def _publish_pending(session: Session) -> None:
+    for module, name, data in session.info.pop(PENDING_KEY, []):
+        bus.publish(module, name, data)
+
+
+@orm_event.listens_for(Session, "after_soft_rollback")
+def _drop_pending(session: Session, previous_transaction) -> None:
+    if previous_transaction.parent is None:
+        session.info.pop(PENDING_KEY, None)
+
+
+def _control(name: str, event_id: str) -> bytes:
+    return f"id: {event_id}\nevent: {name}\ndata: {{}}\n\n".encode()
+
+
+def event_stream(request: Request, module: str) -> StreamingResponse:
+    """``text/event-stream`` response with the events of ``module``; call from an async route.
+
+    The first message is ``ready`` (a new client), the missed events (a
+    client sending ``Last-Event-ID``) or ``reset`` (missed events are gone).
+    """
+    last_event_id = request.headers.get("last-event-id")
+    # Subscribed before replaying, so nothing published in between is lost
+    subscription = bus.subscribe(module)
+    current_id = bus.last_id
+    backlog = bus.replay(module, last_event_id) if last_event_id else []
+    heartbeat = settings.events_heartbeat_s
+
+    async def body():
+        try:
+            yield f"retry: {RETRY_MS}\n\n".encode()
+            seen = 0
+            if backlog is None:
+                yield _control("reset", current_id)
+            elif backlog:
+                for event in backlog:
+                    yield event.encode()
+                seen = backlog[-1].seq
+            else:
+                yield _control("ready", current_id)
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield b": heartbeat\n\n"
+                    continue
+                if event is None:
+                    break
+                if event.seq > seen:
+                    yield event.encode()
+        finally:
+            bus.unsubscribe(subscription)
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,236 @@
+"""
+Software installation state machine and batched status reports.
+
+An installation moves ``pending -> in_progress -> completed | failed |
+rolled_back``; ``pending`` may also be ``cancelled`` or fail before it
+starts, a failed installation may still be rolled back and repeated
+``in_progress`` reports carry progress messages. ``completed``,
+``cancelled`` and ``rolled_back`` are final.
+
+``apply_status_reports`` applies many reports at once: the reports are
+folded per installation and checked against the state machine in Python,
+then written chunk by chunk with one ``executemany`` UPDATE on
+``software_installations`` and one ``executemany`` UPDATE per resulting
+device state on ``device_software``, so the two tables change in the same
+transaction and a fleet reporting in bulk costs a handful of statements
+per chunk instead of a request and commit per device. A device software
+row only follows the newest installation made for it, and the software
+inventory is updated with the resulting changes. Each chunk is announced
+as one ``installation.updated`` event listing the installations it moved.
+"""
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, case, func, select, update
+from sqlalchemy.orm import Session
+
+from backend.models.models import DeviceSoftware, SoftwareInstallation, SoftwareVersion
+from backend.services.events import publish_on_commit
+from backend.services.software_inventory import record_changes, snapshot
+
+TRANSITIONS = {
+    "pending": {"in_progress", "failed", "cancelled"},
+    "in_progress": {"in_progress", "completed", "failed", "rolled_back"},
+    "failed": {"rolled_back"},
+    "completed": set(),
+    "cancelled": set(),
+    "rolled_back": set(),
+}
+FINAL_STATUSES = ("completed", "cancelled", "rolled_back")
+CHUNK_SIZE = 500
+
+
+def allowed(current: Optional[str], new: str) -> bool:
+    return new in TRANSITIONS.get(current or "pending", set())
+
+
+def _device_state(action: str, status: str) -> Optional[str]:
+    """``device_software.installation_status`` after an installation reaches ``status``."""
+    if status == "in_progress":
+        return "installing"
+    if status == "completed":
+        return "not_installed" if action == "uninstall" else "installed"
+    if status in ("failed", "rolled_back"):
+        return status
+    return None
+
+
+def _sync_device_software(db: Session, state: str, rows: List[dict], now: datetime) -> None:
+    """One ``executemany`` UPDATE of the device software rows the installations in ``rows`` own.
+
+    A row only follows the newest installation made for it.
+    """
+    table = DeviceSoftware.__table__
+    newer = SoftwareInstallation.__table__.alias("newer")
+    newer_version = SoftwareVersion.__table__.alias("newer_version")
+    superseded = (
+        select(newer.c.id)
+        .join(newer_version, newer_version.c.id == newer.c.version_id)
+        .where(
+            newer.c.device_id == table.c.device_id,
+            newer_version.c.software_id == table.c.software_id,
+            newer.c.id > bindparam("b_installation_id"),
+        )
+        .exists()
+    )
+    values = {"installation_status": state, "last_updated": now}
+    if state == "installed":
+        values.update(
+            version_id=bindparam("b_version_id"),
+            installed_version=bindparam("b_new_version"),
+            installation_date=now,
+        )
+    elif state == "rolled_back":
+        # Back to the version the installation replaced (nothing for a fresh install)
+        previous = SoftwareVersion.__table__.alias("previous")
+        values.update(
+            installed_version=bindparam("b_previous_version"),
+            version_id=select(previous.c.id)
+            .where(
+                previous.c.software_id == table.c.software_id,
+                previous.c.version_number == bindparam("b_previous_version"),
+            )
+            .limit(1)
+            .scalar_subquery(),
+            installation_status=case(
+                (bindparam("b_previous_version").is_(None), "not_installed"), else_="installed"
+            ),
+        )
+    db.execute(
+        update(table)
+        .where(
+            table.c.device_id == bindparam("b_device_id"),
+            table.c.software_id == bindparam("b_software_id"),
+            ~superseded,
+        )
+        .values(**values),
+        rows,
+    )
+
+
+def _echo(item: dict) -> dict:
+    return {"installation_id": item["installation_id"], "status": item["status"]}
+
+
+def _apply_chunk(
+    db: Session, reports: Dict[int, List[dict]], now: datetime
+) -> Tuple[int, List[dict]]:
+    rows = db.execute(
+        select(
+            SoftwareInstallation.id,
+            SoftwareInstallation.status,
+            SoftwareInstallation.action,
+            SoftwareInstallation.device_id,
+            SoftwareInstallation.version_id,
+            SoftwareInstallation.previous_version,
+            SoftwareInstallation.new_version,
+            SoftwareVersion.software_id,
+        )
+        .join(SoftwareVersion, SoftwareVersion.id == SoftwareInstallation.version_id)
+        .where(SoftwareInstallation.id.in_(list(reports)))
+        .with_for_update()
+    ).all()
+    current = {row.id: row for row in rows}
+
+    rejected, changes = [], []
+    device_states: Dict[str, List[dict]] = defaultdict(list)
+    for installation_id, items in reports.items():
+        row = current.get(installation_id)
+        if row is None:
+            rejected.extend({**_echo(item), "detail": "Installation not found"} for item in items)
+            continue
+        status, error, log = row.status or "pending", None, ""
+        for item in items:
+            if not allowed(status, item["status"]):
+                rejected.append(
+                    {**_echo(item), "detail": f"Cannot go from {status} to {item['status']}"}
+                )
+                continue
+            status = item["status"]
+            error = item.get("error_message") or error
+            message = item.get("message") or item.get("error_message")
+            log += f"[{now.isoformat()}] {status}" + (f": {message}" if message else "") + "\n"
+        if not log:
+            continue
+        changes.append(
+            {
+                "b_id": installation_id,
+                "b_status": status,
+                "b_error": error,
+                "b_completed_at": now if status in FINAL_STATUSES + ("failed",) else None,
+                "b_log": log,
+            }
+        )
+        state = _device_state(row.action, status)
+        if state:
+            device_states[state].append(
+                {
+                    "b_installation_id": installation_id,
+                    "b_device_id": row.device_id,
+                    "b_software_id": row.software_id,
+                    "b_version_id": row.version_id,
+                    "b_new_version": row.new_version,
+                    "b_previous_version": row.previous_version,
+                }
+            )
+
+    if changes:
+        table = SoftwareInstallation.__table__
+        db.execute(
+            update(table)
+            .where(table.c.id == bindparam("b_id"))
+            .values(
+                status=bindparam("b_status"),
+                error_message=func.coalesce(bindparam("b_error"), table.c.error_message),
+                completed_at=func.coalesce(bindparam("b_completed_at"), table.c.completed_at),
+                installation_log=func.coalesce(table.c.installation_log, "") + bindparam("b_log"),
+            ),
+            changes,
+        )
+        publish_on_commit(
+            db,
+            "fleet-software",
+            "installation.updated",
+            {
+                "installations": [
+                    {
+                        "id": change["b_id"],
+                        "device_id": current[change["b_id"]].device_id,
+                        "status": change["b_status"],
+                    }
+                    for change in changes
+                ]
+            },
+        )
+    pairs = {
+        (row["b_device_id"], row["b_software_id"])
+        for device_rows in device_states.values()
+        for row in device_rows
+    }
+    before = snapshot(db, pairs)
+    for state, device_rows in device_states.items():
+        _sync_device_software(db, state, device_rows, now)
+    record_changes(db, before, snapshot(db, pairs))
+    return len(changes), rejected
+
+
+def apply_status_reports(db: Session, reports: Iterable[dict]) -> Dict:
+    """Apply ``{installation_id, status, message?, error_message?}`` reports; the caller commits.
+
+    Reports for the same installation are applied in order. Invalid ones are
+    returned in ``rejected`` and do not stop the rest of the batch.
+    """
+    now = datetime.now()
+    grouped: Dict[int, List[dict]] = defaultdict(list)
+    for item in reports:
+        grouped[item["installation_id"]].append(item)
+
+    applied, rejected = 0, []
+    ids = list(grouped)
+    for start in range(0, len(ids), CHUNK_SIZE):
+        chunk = {key: grouped[key] for key in ids[start : start + CHUNK_SIZE]}
+        chunk_applied, chunk_rejected = _apply_chunk(db, chunk, now)
+        applied += chunk_applied
+        rejected.extend(chunk_rejected)
+    return {"applied": applied, "rejected": rejected}
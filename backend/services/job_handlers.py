@@ -0,0 +1,145 @@
+"""
+Built-in background job types.
+
+- ``software.installation``: dispatches a ``SoftwareInstallation`` to its
+  device, moving it from ``pending`` to ``in_progress``; the device reports
+  the outcome (``INSTALLATION_SIMULATE_COMPLETION`` completes it right away
+  instead), see ``backend/services/installations.py``
+- ``config.backup`` / ``config.restore``: the Fleet Config backup endpoints
+  with ``?background=true``
+- ``jobs.purge``: deletes finished jobs older than ``JOB_RETENTION_DAYS``
+- ``maintenance.refresh`` (periodic): maintenance ``next_due`` and overdue
+  state, see ``backend/services/maintenance.py``
+- ``analytics.rebuild_usage``: recomputes the parts-usage rollups, see
+  ``backend/services/parts_usage.py``
+- ``parts.forecast`` (periodic): reorder points and days of stock, see
+  ``backend/services/parts_forecast.py``
+- ``artifacts.cleanup`` (periodic): removes abandoned artifact uploads
+- ``software.rebuild_inventory`` (periodic): recomputes the software
+  inventory, see ``backend/services/software_inventory.py``
+- ``idempotency.cleanup`` (periodic): deletes expired ``Idempotency-Key``
+  records, see ``backend/core/idempotency.py``
+- ``software.delta``: builds a binary delta between two software artifacts,
+  see ``backend/services/software_deltas.py``
+- ``changes.compact`` (periodic): drops superseded change log rows and logs
+  rows bulk-loaded outside the ORM, see ``backend/services/change_log.py``
+- ``templates.validate_devices``: checks the configuration of every device
+  of a JSON template's category against its schema, see
+  ``backend/services/config_validation.py``
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+
+from backend.core.config import settings
+from backend.core.idempotency import purge_expired
+from backend.models.models import ArtifactDelta, Job, SoftwareInstallation
+from backend.services.artifacts import cleanup_uploads
+from backend.services.change_log import compact as compact_change_log
+from backend.services.config_backup import collect_backup, restore_backup
+from backend.services.config_validation import validate_devices
+from backend.services.installations import allowed, apply_status_reports
+from backend.services.jobs import FINISHED_STATUSES, JobContext, job_handler, utcnow
+from backend.services.maintenance import refresh_maintenance_schedule
+from backend.services.parts_forecast import compute_forecast
+from backend.services.parts_usage import rebuild_rollups
+from backend.services.software_deltas import build_and_store, delta_dict
+from backend.services.software_inventory import rebuild_inventory
+
+
+@job_handler("software.installation", max_attempts=5)
+def run_installation(db: Session, ctx: JobContext) -> Optional[dict]:
+    installation = db.get(SoftwareInstallation, ctx.payload["installation_id"])
+    if installation is None or not allowed(installation.status, "in_progress"):
+        return {"skipped": True}
+
+    message = f"{installation.action} dispatched to the device (attempt {ctx.attempt})"
+    report = {"installation_id": installation.id, "status": "in_progress", "message": message}
+    apply_status_reports(db, [report])
+    if not settings.installation_simulate_completion:
+        return {"installation_id": installation.id, "status": "in_progress"}
+
+    db.commit()
+    ctx.progress(50, f"{installation.action} in progress")
+    result = apply_status_reports(db, [{**report, "status": "completed", "message": None}])
+    if result["rejected"]:  # the device reported an outcome in the meantime
+        return {"installation_id": installation.id, "skipped": True}
+    return {"installation_id": installation.id, "status": "completed"}
+
+
+@job_handler("config.backup", concurrency=1)
+def run_config_backup(db: Session, ctx: JobContext) -> Optional[dict]:
+    backup_data = collect_backup(db)
+    return {
+        "backup_id": f"backup_{int(datetime.now().timestamp())}",
+        "backup_data": backup_data,
+    }
+
+
+@job_handler("config.restore", concurrency=1, max_attempts=1)
+def run_config_restore(db: Session, ctx: JobContext) -> Optional[dict]:
+    restore_backup(db, ctx.payload["backup_data"], ctx.created_by)
+    return {"restored_at": datetime.now().isoformat()}
+
+
+@job_handler("jobs.purge", concurrency=1)
+def run_jobs_purge(db: Session, ctx: JobContext) -> Optional[dict]:
+    days = ctx.payload.get("days", settings.job_retention_days)
+    deleted = db.execute(
+        delete(Job).where(
+            Job.status.in_(FINISHED_STATUSES),
+            Job.finished_at < utcnow() - timedelta(days=days),
+        )
+    ).rowcount
+    return {"deleted": deleted}
+
+
+@job_handler("maintenance.refresh", concurrency=1, max_attempts=1)
+def run_maintenance_refresh(db: Session, ctx: JobContext) -> Optional[dict]:
+    return refresh_maintenance_schedule(db)
+
+
+@job_handler("analytics.rebuild_usage", concurrency=1, max_attempts=1)
+def run_usage_rebuild(db: Session, ctx: JobContext) -> Optional[dict]:
+    return rebuild_rollups(db)
+
+
+@job_handler("parts.forecast", concurrency=1, max_attempts=1)
+def run_parts_forecast(db: Session, ctx: JobContext) -> Optional[dict]:
+    return compute_forecast(db)
+
+
+@job_handler("artifacts.cleanup", concurrency=1, max_attempts=1)
+def run_artifacts_cleanup(db: Session, ctx: JobContext) -> Optional[dict]:
+    return cleanup_uploads(db)
+
+
+@job_handler("software.rebuild_inventory", concurrency=1, max_attempts=1)
+def run_inventory_rebuild(db: Session, ctx: JobContext) -> Optional[dict]:
+    return rebuild_inventory(db)
+
+
+@job_handler("idempotency.cleanup", concurrency=1, max_attempts=1)
+def run_idempotency_cleanup(db: Session, ctx: JobContext) -> Optional[dict]:
+    return purge_expired(db)
+
+
+@job_handler("software.delta", concurrency=settings.delta_processes, max_attempts=2)
+def run_software_delta(db: Session, ctx: JobContext) -> Optional[dict]:
+    delta = db.get(ArtifactDelta, ctx.payload["delta_id"])
+    if delta is None:
+        return {"skipped": True}
+    build_and_store(db, delta, ctx.created_by)
+    return delta_dict(delta)
+
+
+@job_handler("changes.compact", concurrency=1, max_attempts=1)
+def run_change_log_compaction(db: Session, ctx: JobContext) -> Optional[dict]:
+    return compact_change_log(db)
+
+
+@job_handler("templates.validate_devices", concurrency=1, max_attempts=1)
+def run_device_validation(db: Session, ctx: JobContext) -> Optional[dict]:
+    return validate_devices(db, ctx.payload["template_id"], ctx.progress)
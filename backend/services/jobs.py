@@ -0,0 +1,445 @@
+"""
+Persistent background job queue and worker pool.
+
+Request handlers ``enqueue()`` slow work as a row in the ``jobs`` table - in
+the same transaction as the data it belongs to - and return immediately.
+Worker processes (``scripts/worker.py``) run a ``WorkerPool`` of threads that
+claim due jobs highest ``priority`` first:
+
+- PostgreSQL: ``SELECT ... FOR UPDATE SKIP LOCKED``, so workers never wait on
+  each other's rows
+- other databases (SQLite): the conditional ``UPDATE ... WHERE status =
+  'queued'`` is a compare-and-set; a worker losing the race just tries again
+
+A failing job is retried with exponential backoff (``run_after``) until
+``max_attempts``. The pool refreshes ``locked_at`` of its running jobs every
+quarter of ``JOB_LOCK_TIMEOUT_S`` (as does ``JobContext.progress()``), so only
+jobs whose worker died go unrefreshed that long and are re-queued; a worker
+that lost its lock anyway does not record the outcome over the new run.
+Handlers are registered with ``@job_handler`` and may limit how many jobs of
+their type run at once (approximate across processes, exact within one) and
+report progress through ``JobContext.progress()``.
+Periodic jobs (``WorkerPool(periodic={job_type: seconds})``) are enqueued on
+a fixed cadence unless one of the same type is still queued or running.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.orm import Session, sessionmaker
+
+from backend.core.config import settings
+from backend.models.models import Job
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class JobHandler:
+    """A registered job type: the function running it and its limits."""
+
+    def __init__(
+        self, job_type: str, func: Callable, concurrency: Optional[int], max_attempts: int
+    ) -> None:
+        self.job_type = job_type
+        self.func = func
+        self.concurrency = settings.job_concurrency.get(job_type, concurrency)
+        self.max_attempts = max_attempts
+
+
+_handlers: Dict[str, JobHandler] = {}
+
+
+def job_handler(job_type: str, concurrency: Optional[int] = None, max_attempts: int = 3):
+    """Register ``func(db, ctx) -> Optional[dict]`` as the handler of ``job_type``.
+
+    The handler gets its own session (committed by the worker when it
+    returns) and a ``JobContext``; its return value is stored as the result.
+    ``concurrency`` limits running jobs of this type (``JOB_CONCURRENCY``
+    overrides it per deployment).
+    """
+
+    def decorator(func: Callable) -> Callable:
+        _handlers[job_type] = JobHandler(job_type, func, concurrency, max_attempts)
+        return func
+
+    return decorator
+
+
+def registered_handlers() -> Dict[str, JobHandler]:
+    # Importing the handler module registers the built-in job types
+    import backend.services.job_handlers  # noqa: F401
+
+    return _handlers
+
+
+def enqueue(
+    db: Session,
+    job_type: str,
+    payload: Optional[dict] = None,
+    priority: int = 0,
+    max_attempts: Optional[int] = None,
+    delay: float = 0,
+    created_by: Optional[int] = None,
+) -> Job:
+    """Add a job to the session; it becomes visible to workers on commit."""
+    handler = registered_handlers().get(job_type)
+    if max_attempts is None:
+        max_attempts = handler.max_attempts if handler else 3
+    job = Job(
+        job_type=job_type,
+        status="queued",
+        priority=priority,
+        payload=payload or {},
+        max_attempts=max_attempts,
+        progress=0,
+        run_after=utcnow() + timedelta(seconds=delay),
+        created_by=created_by,
+    )
+    db.add(job)
+    db.flush()
+    return job
+
+
+def enqueue_once(db: Session, job_type: str, **kwargs) -> Optional[Job]:
+    """``enqueue`` unless a job of ``job_type`` is already queued or running."""
+    pending = db.execute(
+        select(Job.id).where(Job.job_type == job_type, Job.status.in_(["queued", "running"]))
+    ).first()
+    if pending is not None:
+        return None
+    return enqueue(db, job_type, **kwargs)
+
+
+def job_dict(job: Job, include_result: bool = True) -> dict:
+    data = {
+        "id": job.id,
+        "job_type": job.job_type,
+        "status": job.status,
+        "priority": job.priority,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "progress": job.progress,
+        "progress_message": job.progress_message,
+        "error": job.error,
+        "created_by": job.created_by,
+        "created_at": job.created_at,
+        "run_after": job.run_after,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+    if include_result:
+        data["payload"] = job.payload
+        data["result"] = job.result
+    return data
+
+
+def claim_job(
+    db: Session,
+    worker_id: str,
+    job_types: Optional[Iterable[str]] = None,
+    exclude_types: Iterable[str] = (),
+) -> Optional[Job]:
+    """Atomically move the next due job to ``running`` and return it.
+
+    Job types whose concurrency limit is reached (counting running jobs of
+    all workers) are skipped.
+    """
+    handlers = registered_handlers()
+    limited = {name: h.concurrency for name, h in handlers.items() if h.concurrency}
+    excluded = set(exclude_types)
+    if limited:
+        running = db.execute(
+            select(Job.job_type, func.count(Job.id))
+            .where(Job.status == "running", Job.job_type.in_(list(limited)))
+            .group_by(Job.job_type)
+        ).all()
+        excluded.update(name for name, count in running if count >= limited[name])
+
+    now = utcnow()
+    query = (
+        select(Job.id)
+        .where(Job.status == "queued", Job.run_after <= now)
+        .order_by(Job.priority.desc(), Job.id)
+        .limit(1)
+    )
+    if job_types is not None:
+        query = query.where(Job.job_type.in_(list(job_types)))
+    if excluded:
+        query = query.where(Job.job_type.notin_(list(excluded)))
+    if db.get_bind().dialect.name == "postgresql":
+        query = query.with_for_update(skip_locked=True)
+
+    job_id = db.execute(query).scalar()
+    if job_id is None:
+        db.rollback()
+        return None
+    claimed = db.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status == "queued")
+        .values(
+            status="running",
+            locked_by=worker_id,
+            locked_at=now,
+            started_at=now,
+            attempts=Job.attempts + 1,
+        )
+    )
+    db.commit()
+    if claimed.rowcount != 1:
+        return None
+    return db.get(Job, job_id)
+
+
+def requeue_stale_jobs(db: Session, lock_timeout: float) -> int:
+    """Return jobs of dead workers (running longer than ``lock_timeout``) to the queue."""
+    stale = Job.status == "running", Job.locked_at < utcnow() - timedelta(seconds=lock_timeout)
+    failed = db.execute(
+        update(Job)
+        .where(*stale, Job.attempts >= Job.max_attempts)
+        .values(status="failed", error="Worker lost", locked_by=None, finished_at=utcnow())
+    ).rowcount
+    requeued = db.execute(
+        update(Job).where(*stale).values(status="queued", locked_by=None, run_after=utcnow())
+    ).rowcount
+    db.commit()
+    if failed or requeued:
+        logger.warning("Stale jobs: %d re-queued, %d failed", requeued, failed)
+    return requeued
+
+
+class JobContext:
+    """What a handler knows about its job; ``progress()`` is written immediately."""
+
+    def __init__(self, job: Job, session_factory: sessionmaker) -> None:
+        self.id = job.id
+        self.job_type = job.job_type
+        self.payload = job.payload or {}
+        self.attempt = job.attempts
+        self.created_by = job.created_by
+        self._session_factory = session_factory
+
+    def progress(self, percent: int, message: Optional[str] = None) -> None:
+        """Record progress in its own short transaction (commit handler work first on SQLite)."""
+        with self._session_factory() as db:
+            db.execute(
+                update(Job)
+                .where(Job.id == self.id, Job.status == "running")
+                .values(
+                    progress=max(0, min(100, int(percent))),
+                    progress_message=message,
+                    locked_at=utcnow(),
+                )
+            )
+            db.commit()
+
+
+def heartbeat(db: Session, running: Dict[int, str]) -> int:
+    """Refresh ``locked_at`` of running jobs (id -> worker id) still locked by their worker."""
+    if not running:
+        return 0
+    refreshed = db.execute(
+        update(Job)
+        .where(
+            Job.id.in_(list(running)),
+            Job.status == "running",
+            Job.locked_by.in_(set(running.values())),
+        )
+        .values(locked_at=utcnow())
+    ).rowcount
+    db.commit()
+    return refreshed
+
+
+def run_job(job: Job, session_factory: sessionmaker, worker_id: str) -> str:
+    """Run one claimed job and record its outcome; returns the new status."""
+    handler = registered_handlers().get(job.job_type)
+    ctx = JobContext(job, session_factory)
+    with session_factory() as db:
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for job type {job.job_type!r}")
+            result = handler.func(db, ctx)
+            db.commit()
+        except Exception as exc:
+            db.rollback()
+            logger.exception("Job %s (%s) failed on attempt %d", job.id, job.job_type, job.attempts)
+            error = f"{type(exc).__name__}: {exc}"
+            return _record_failure(db, job, worker_id, error, handler is None)
+
+        # Still ours, or re-queued as stale but not claimed again yet
+        recorded = db.execute(
+            update(Job)
+            .where(
+                Job.id == job.id,
+                or_(
+                    and_(Job.status == "running", Job.locked_by == worker_id),
+                    Job.status == "queued",
+                ),
+            )
+            .values(
+                status="succeeded",
+                result=result,
+                error=None,
+                progress=100,
+                locked_by=None,
+                finished_at=utcnow(),
+            )
+        ).rowcount
+        db.commit()
+        if recorded != 1:
+            logger.warning("Job %s finished after its lock was lost; outcome not recorded", job.id)
+            return "lost"
+        return "succeeded"
+
+
+def _record_failure(db: Session, job: Job, worker_id: str, error: str, permanent: bool) -> str:
+    if permanent or job.attempts >= job.max_attempts:
+        values = dict(status="failed", finished_at=utcnow())
+    else:
+        backoff = settings.job_retry_backoff_s * 2 ** (job.attempts - 1)
+        values = dict(status="queued", run_after=utcnow() + timedelta(seconds=backoff))
+    recorded = db.execute(
+        update(Job)
+        .where(Job.id == job.id, Job.status == "running", Job.locked_by == worker_id)
+        .values(error=error, locked_by=None, **values)
+    ).rowcount
+    db.commit()
+    if recorded != 1:
+        logger.warning("Job %s failed after its lock was lost; outcome not recorded", job.id)
+        return "lost"
+    return values["status"]
+
+
+class WorkerPool:
+    """Threads claiming and running jobs until ``stop()``."""
+
+    def __init__(
+        self,
+        session_factory: sessionmaker,
+        threads: int = 4,
+        job_types: Optional[List[str]] = None,
+        poll_interval: float = 1.0,
+        lock_timeout: float = 600.0,
+        periodic: Optional[Dict[str, float]] = None,
+    ) -> None:
+        self.session_factory = session_factory
+        self.threads = threads
+        self.job_types = job_types
+        self.poll_interval = poll_interval
+        self.lock_timeout = lock_timeout
+        self.periodic = {name: interval for name, interval in (periodic or {}).items() if interval}
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._running: Dict[str, int] = {}
+        self._jobs: Dict[int, str] = {}  # running job id -> worker id
+        self._threads: List[threading.Thread] = []
+        self._heartbeat_stop = threading.Event()
+        self._heartbeat_thread = threading.Thread(
+            target=self._heartbeat, name="job-heartbeat", daemon=True
+        )
+
+    def start(self) -> None:
+        registered_handlers()
+        for index in range(self.threads):
+            thread = threading.Thread(
+                target=self._work, args=(f"{self.name}:{index}",), name=f"job-worker-{index}"
+            )
+            thread.start()
+            self._threads.append(thread)
+        if self.periodic:
+            thread = threading.Thread(target=self._schedule, name="job-scheduler")
+            thread.start()
+            self._threads.append(thread)
+        self._heartbeat_thread.start()
+        logger.info("Job worker pool %s started with %d threads", self.name, self.threads)
+
+    def stop(self, wait: bool = True) -> None:
+        """Stop claiming jobs; with ``wait`` let running jobs finish."""
+        self._stop.set()
+        if wait:
+            self.wait()
+
+    def wait(self) -> None:
+        while any(thread.is_alive() for thread in self._threads):
+            for thread in self._threads:
+                thread.join(timeout=0.5)
+        # Running jobs are refreshed until the last one has finished
+        self._heartbeat_stop.set()
+        if self._heartbeat_thread.is_alive():
+            self._heartbeat_thread.join()
+
+    def _heartbeat(self) -> None:
+        interval = max(self.lock_timeout / 4, 0.05)
+        while not self._heartbeat_stop.wait(interval):
+            with self._lock:
+                running = dict(self._jobs)
+            try:
+                with self.session_factory() as db:
+                    heartbeat(db, running)
+            except Exception:
+                logger.exception("Could not refresh the locks of running jobs")
+
+    def _schedule(self) -> None:
+        next_run = {name: time.monotonic() for name in self.periodic}
+        while not self._stop.is_set():
+            for name, interval in self.periodic.items():
+                if time.monotonic() < next_run[name]:
+                    continue
+                next_run[name] = time.monotonic() + interval
+                try:
+                    with self.session_factory() as db:
+                        enqueue_once(db, name, priority=5)
+                        db.commit()
+                except Exception:
+                    logger.exception("Could not enqueue periodic job %s", name)
+            self._stop.wait(max(0.0, min(next_run.values()) - time.monotonic()))
+
+    def _locally_saturated(self) -> List[str]:
+        with self._lock:
+            return [
+                name
+                for name, count in self._running.items()
+                if _handlers.get(name) and _handlers[name].concurrency
+                and count >= _handlers[name].concurrency
+            ]
+
+    def _work(self, worker_id: str) -> None:
+        is_first = worker_id.endswith(":0")
+        while not self._stop.is_set():
+            try:
+                if is_first:
+                    with self.session_factory() as db:
+                        requeue_stale_jobs(db, self.lock_timeout)
+                with self.session_factory() as db:
+                    job = claim_job(db, worker_id, self.job_types, self._locally_saturated())
+                    if job is not None:
+                        db.expunge(job)
+            except Exception:
+                logger.exception("Job worker %s could not claim a job", worker_id)
+                job = None
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+
+            with self._lock:
+                self._running[job.job_type] = self._running.get(job.job_type, 0) + 1
+                self._jobs[job.id] = worker_id
+            try:
+                status = run_job(job, self.session_factory, worker_id)
+                logger.info("Job %s (%s) %s", job.id, job.job_type, status)
+            finally:
+                with self._lock:
+                    self._running[job.job_type] -= 1
+                    self._jobs.pop(job.id, None)
@@ -0,0 +1,285 @@
+"""
+Maintenance schedule: next occurrences and due/overdue state.
+
+Recurring items (``schedule_type`` daily, weekly, monthly, quarterly, yearly
+or the unit forms days/weeks/months, every ``frequency_value`` periods,
+default 1) get their ``next_due`` from ``last_performed``:
+
+- on the write path, ``complete_maintenance()`` records the completion and
+  computes the next occurrence immediately, ``sync_due_status()`` keeps
+  ``scheduled``/``overdue`` in line with an edited ``next_due``
+- ``refresh_maintenance_schedule()`` - run by the ``maintenance.refresh``
+  job every ``MAINTENANCE_REFRESH_INTERVAL_S`` - fills in missing
+  ``next_due`` values and flips items that fell due to ``overdue`` with a
+  few bulk UPDATEs over the ``(status, next_due)`` index
+
+so dashboards and ``?status=overdue`` read precomputed state. Month steps
+clamp to the end of the month (Jan 31 + 1 month = Feb 28) on both paths:
+PostgreSQL intervals clamp the same way, other databases (SQLite, whose
+date modifiers roll over into the next month) fill ``next_due`` in Python.
+
+``maintenance_calendar()`` expands recurring items into their occurrences in
+a date window for the workshop calendar: one range query over the
+``next_due`` index, and per item the first occurrence in the window is
+computed directly rather than by stepping from ``next_due``.
+"""
+import bisect
+import calendar
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import and_, case, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from backend.models.models import Maintenance
+
+# schedule_type -> (months, days) per frequency_value period
+SCHEDULE_STEPS = {
+    "daily": (0, 1),
+    "weekly": (0, 7),
+    "monthly": (1, 0),
+    "quarterly": (3, 0),
+    "yearly": (12, 0),
+    "days": (0, 1),
+    "weeks": (0, 7),
+    "months": (1, 0),
+}
+
+# Statuses whose due state follows next_due
+OPEN_STATUSES = ("scheduled", "overdue")
+
+
+def _add_months(value: datetime, months: int) -> datetime:
+    if not months:
+        return value
+    month = value.month - 1 + months
+    year = value.year + month // 12
+    month = month % 12 + 1
+    day = min(value.day, calendar.monthrange(year, month)[1])
+    return value.replace(year=year, month=month, day=day)
+
+
+def next_occurrence(
+    schedule_type: Optional[str], frequency_value: Optional[int], after: Optional[datetime]
+) -> Optional[datetime]:
+    """Next due date of a recurring item performed at ``after`` (None if not calendar based)."""
+    step = SCHEDULE_STEPS.get(schedule_type or "")
+    if step is None or after is None:
+        return None
+    periods = frequency_value or 1
+    return _add_months(after, step[0] * periods) + timedelta(days=step[1] * periods)
+
+
+def sync_due_status(maintenance: Maintenance, now: Optional[datetime] = None) -> None:
+    """Set ``scheduled``/``overdue`` of an open item from its ``next_due``."""
+    if maintenance.status not in OPEN_STATUSES or maintenance.next_due is None:
+        return
+    now = now or datetime.utcnow()
+    next_due = maintenance.next_due.replace(tzinfo=None)
+    maintenance.status = "overdue" if next_due < now else "scheduled"
+
+
+def complete_maintenance(maintenance: Maintenance, performed_at: Optional[datetime] = None) -> None:
+    """Record a completion and compute the next occurrence of a recurring item."""
+    maintenance.status = "completed"
+    maintenance.last_performed = performed_at or datetime.utcnow()
+    next_due = next_occurrence(
+        maintenance.schedule_type, maintenance.frequency_value, maintenance.last_performed
+    )
+    if next_due is not None:
+        maintenance.next_due = next_due
+
+
+def _next_due_expression(dialect: str):
+    periods = func.coalesce(Maintenance.frequency_value, 1)
+    months = case(
+        {name: step[0] for name, step in SCHEDULE_STEPS.items()},
+        value=Maintenance.schedule_type,
+        else_=0,
+    )
+    days = case(
+        {name: step[1] for name, step in SCHEDULE_STEPS.items()},
+        value=Maintenance.schedule_type,
+        else_=0,
+    )
+    if dialect == "postgresql":
+        interval = func.make_interval(0, months * periods, 0, days * periods)
+        return Maintenance.last_performed + interval
+    return None
+
+
+def refresh_maintenance_schedule(db: Session, now: Optional[datetime] = None) -> Dict[str, int]:
+    """Bulk-recompute missing ``next_due`` values and due/overdue state; the caller commits."""
+    now = now or datetime.utcnow()
+    recurring = Maintenance.schedule_type.in_(list(SCHEDULE_STEPS))
+    missing = and_(
+        recurring, Maintenance.next_due.is_(None), Maintenance.last_performed.isnot(None)
+    )
+
+    expression = _next_due_expression(db.get_bind().dialect.name)
+    if expression is not None:
+        filled = db.execute(
+            update(Maintenance)
+            .where(missing)
+            .values(next_due=expression)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+    else:
+        filled = 0
+        for item in db.scalars(select(Maintenance).where(missing)):
+            item.next_due = next_occurrence(
+                item.schedule_type, item.frequency_value, item.last_performed
+            )
+            filled += 1
+        db.flush()
+
+    # Open items past their due date, and completed recurring items whose next
+    # occurrence has come and gone
+    overdue = db.execute(
+        update(Maintenance)
+        .where(
+            or_(
+                Maintenance.status == "scheduled",
+                and_(Maintenance.status == "completed", recurring),
+            ),
+            Maintenance.next_due < now,
+        )
+        .values(status="overdue")
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    # Overdue items whose due date was moved into the future
+    rescheduled = db.execute(
+        update(Maintenance)
+        .where(Maintenance.status == "overdue", Maintenance.next_due >= now)
+        .values(status="scheduled")
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    return {"next_due_filled": filled, "overdue": overdue, "rescheduled": rescheduled}
+
+
+# Items that still have an occurrence ahead of them: open ones, and recurring
+# ones whatever their status (a completed recurring item recurs)
+CALENDAR_STATUSES = ("scheduled", "overdue", "in_progress")
+
+
+def expand_occurrences(
+    schedule_type: Optional[str],
+    frequency_value: Optional[int],
+    next_due: datetime,
+    start: datetime,
+    end: datetime,
+) -> Iterator[datetime]:
+    """Occurrences ``next_due + k * step`` (k >= 0) falling in ``[start, end)``."""
+    step = SCHEDULE_STEPS.get(schedule_type or "")
+    if step is None:
+        if start <= next_due < end:
+            yield next_due
+        return
+    periods = frequency_value or 1
+    months, days = step[0] * periods, step[1] * periods
+
+    if months:
+        elapsed = (start.year - next_due.year) * 12 + start.month - next_due.month
+        k = max(0, elapsed // months - 1)
+        while True:
+            # Anchored at next_due so month-end clamping does not drift
+            occurrence = _add_months(next_due, k * months)
+            if occurrence >= end:
+                return
+            if occurrence >= start:
+                yield occurrence
+            k += 1
+    else:
+        interval = timedelta(days=days)
+        k = max(0, -(-(start - next_due) // interval))
+        occurrence = next_due + k * interval
+        while occurrence < end:
+            yield occurrence
+            occurrence += interval
+
+
+def maintenance_calendar(
+    db: Session,
+    start: date,
+    end: date,
+    device_id: Optional[int] = None,
+    maintenance_type: Optional[str] = None,
+    include_occurrences: bool = False,
+    occurrence_limit: int = 1000,
+) -> Dict:
+    """Per-day occurrence counts (and optionally the occurrences) for ``[start, end]``."""
+    window_start = datetime.combine(start, datetime.min.time())
+    window_end = datetime.combine(end + timedelta(days=1), datetime.min.time())
+    recurring = Maintenance.schedule_type.in_(list(SCHEDULE_STEPS))
+
+    query = select(
+        Maintenance.id,
+        Maintenance.device_id,
+        Maintenance.title,
+        Maintenance.maintenance_type,
+        Maintenance.priority,
+        Maintenance.status,
+        Maintenance.schedule_type,
+        Maintenance.frequency_value,
+        Maintenance.next_due,
+    ).where(
+        Maintenance.next_due < window_end,
+        or_(
+            and_(recurring, Maintenance.status != "skipped"),
+            and_(
+                Maintenance.status.in_(CALENDAR_STATUSES),
+                Maintenance.next_due >= window_start,
+            ),
+        ),
+    )
+    if device_id:
+        query = query.where(Maintenance.device_id == device_id)
+    if maintenance_type:
+        query = query.where(Maintenance.maintenance_type == maintenance_type)
+
+    days: Dict[date, Dict] = defaultdict(lambda: {"count": 0, "by_priority": defaultdict(int)})
+    # The earliest occurrence_limit occurrences, kept sorted by (due, id)
+    earliest: List[Tuple[datetime, int, Dict]] = []
+    truncated = False
+    for row in db.execute(query):
+        next_due = row.next_due.replace(tzinfo=None)
+        for occurrence in expand_occurrences(
+            row.schedule_type, row.frequency_value, next_due, window_start, window_end
+        ):
+            day = days[occurrence.date()]
+            day["count"] += 1
+            day["by_priority"][row.priority or "medium"] += 1
+            if not include_occurrences:
+                continue
+            if len(earliest) >= occurrence_limit:
+                truncated = True
+                if (occurrence, row.id) >= earliest[-1][:2]:
+                    continue
+                earliest.pop()
+            item = {
+                "maintenance_id": row.id,
+                "device_id": row.device_id,
+                "title": row.title,
+                "maintenance_type": row.maintenance_type,
+                "priority": row.priority,
+                "status": row.status,
+                "due": occurrence,
+                "is_next": occurrence == next_due,
+            }
+            # (due, id) is unique, so the dicts are never compared
+            bisect.insort(earliest, (occurrence, row.id, item))
+
+    result = {
+        "from": start,
+        "to": end,
+        "total": sum(day["count"] for day in days.values()),
+        "days": [
+            {"date": day, "count": data["count"], "by_priority": dict(data["by_priority"])}
+            for day, data in sorted(days.items())
+        ],
+    }
+    if include_occurrences:
+        result["occurrences"] = [item for _, _, item in earliest]
+        result["truncated"] = truncated
+    return result
@@ -0,0 +1,231 @@
+"""
+Parts stock forecast: reorder points and days of stock per part.
+
+The ``parts.forecast`` job (every ``PARTS_FORECAST_INTERVAL_S``) computes,
+for every active part:
+
+- daily consumption over the last ``PARTS_FORECAST_HISTORY_DAYS`` from the
+  parts-usage ledger (repairs and maintenance), its mean and standard
+  deviation
+- the demand of maintenance due within the lead time (recurrences expanded,
+  overdue items included) from ``parts_required``
+- ``reorder_point = mean * L + z * stddev * sqrt(L) + scheduled``, at least
+  ``min_stock_level``, with ``L = PARTS_FORECAST_LEAD_TIME_DAYS`` and
+  ``z = PARTS_FORECAST_SERVICE_Z``
+- ``order_up_to``: ``max_stock_level`` or the reorder point plus one lead
+  time of consumption
+
+and stores them in ``part_forecasts``. The catalogue is handled as a
+parts x days matrix with NumPy when it is installed (the ``performance``
+extra), otherwise part by part in Python. Reads compare the current free
+stock against the stored reorder point, so ``/parts?low_stock=true`` and the
+reorder suggestions stay exact between runs; parts without a forecast fall
+back to ``min_stock_level``.
+"""
+import math
+import statistics
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, delete, func, insert, or_, select
+from sqlalchemy.orm import Session
+
+try:  # numpy is optional - the forecast falls back to plain Python
+    import numpy
+except ImportError:  # pragma: no cover - depends on the environment
+    numpy = None
+
+from backend.core.config import settings
+from backend.models.models import Maintenance, Part, PartForecast, PartUsage
+from backend.services.maintenance import CALENDAR_STATUSES, SCHEDULE_STEPS, expand_occurrences
+from backend.services.parts_usage import parse_parts
+
+
+def below_reorder_point():
+    """Filter for parts at or below their reorder point (outer join ``PartForecast``)."""
+    return Part.stock_quantity <= func.coalesce(PartForecast.reorder_point, Part.min_stock_level)
+
+
+def _scheduled_demand(db: Session, now: datetime, horizon: datetime) -> Dict[int, int]:
+    """Parts required by maintenance falling due before ``horizon``.
+
+    An overdue item counts once for the work still owed; only its occurrences
+    in ``[now, horizon)`` are added, not every period missed since ``next_due``.
+    """
+    recurring = Maintenance.schedule_type.in_(list(SCHEDULE_STEPS))
+    rows = db.execute(
+        select(
+            Maintenance.schedule_type,
+            Maintenance.frequency_value,
+            Maintenance.next_due,
+            Maintenance.parts_required,
+        ).where(
+            Maintenance.next_due < horizon,
+            Maintenance.parts_required.isnot(None),
+            or_(
+                and_(recurring, Maintenance.status != "skipped"),
+                Maintenance.status.in_(CALENDAR_STATUSES),
+            ),
+        )
+    )
+    demand: Dict[int, int] = defaultdict(int)
+    for row in rows:
+        parts = parse_parts(row.parts_required)
+        if not parts:
+            continue
+        next_due = row.next_due.replace(tzinfo=None)
+        occurrences = int(next_due < now) + sum(
+            1
+            for _ in expand_occurrences(
+                row.schedule_type, row.frequency_value, next_due, now, horizon
+            )
+        )
+        for part_id, quantity in parts.items():
+            demand[part_id] += quantity * occurrences
+    return demand
+
+
+def _forecast_numpy(usage_events, stock_levels, scheduled, days, lead_time, z):
+    rows, columns, quantities = zip(*usage_events) if usage_events else ((), (), ())
+    usage = numpy.zeros((len(stock_levels), days))
+    numpy.add.at(
+        usage, (numpy.array(rows, dtype=int), numpy.array(columns, dtype=int)), quantities
+    )
+    mean = usage.mean(axis=1)
+    stddev = usage.std(axis=1)
+    scheduled = numpy.array(scheduled, dtype=float)
+    min_stock, max_stock = (numpy.array(levels, dtype=float) for levels in zip(*stock_levels))
+
+    reorder_point = numpy.ceil(mean * lead_time + z * stddev * math.sqrt(lead_time) + scheduled)
+    reorder_point = numpy.maximum(reorder_point, min_stock)
+    order_up_to = numpy.maximum(max_stock, reorder_point + numpy.ceil(mean * lead_time))
+    return zip(
+        mean.tolist(),
+        stddev.tolist(),
+        (mean + scheduled / lead_time).tolist(),
+        reorder_point.astype(int).tolist(),
+        order_up_to.astype(int).tolist(),
+    )
+
+
+def _forecast_python(usage_events, stock_levels, scheduled, days, lead_time, z):
+    usage = [[0] * days for _ in stock_levels]
+    for row, column, quantity in usage_events:
+        usage[row][column] += quantity
+    for series, (min_stock, max_stock), demand in zip(usage, stock_levels, scheduled):
+        mean = statistics.fmean(series)
+        stddev = statistics.pstdev(series, mean)
+        reorder_point = math.ceil(mean * lead_time + z * stddev * math.sqrt(lead_time) + demand)
+        reorder_point = max(reorder_point, min_stock)
+        order_up_to = max(max_stock, reorder_point + math.ceil(mean * lead_time))
+        yield mean, stddev, mean + demand / lead_time, int(reorder_point), int(order_up_to)
+
+
+def compute_forecast(db: Session, now: Optional[datetime] = None) -> Dict[str, int]:
+    """Recompute ``part_forecasts`` for all active parts; the caller commits."""
+    now = now or datetime.utcnow()
+    days = max(1, settings.parts_forecast_history_days)
+    lead_time = max(1, settings.parts_forecast_lead_time_days)
+    start = datetime.combine((now - timedelta(days=days - 1)).date(), datetime.min.time())
+
+    parts = db.execute(
+        select(Part.id, Part.min_stock_level, Part.max_stock_level)
+        .where(Part.status == "active")
+        .order_by(Part.id)
+    ).all()
+    db.execute(delete(PartForecast))
+    if not parts:
+        return {"parts": 0, "usage_lines": 0}
+    index = {part.id: row for row, part in enumerate(parts)}
+
+    # One (part row, day, quantity) triple per ledger line of an active part
+    usage_events = []
+    for part_id, used_at, quantity in db.execute(
+        select(PartUsage.part_id, PartUsage.used_at, PartUsage.quantity).where(
+            PartUsage.used_at >= start
+        )
+    ):
+        day = (used_at.replace(tzinfo=None) - start).days
+        if part_id in index and 0 <= day < days:
+            usage_events.append((index[part_id], day, quantity))
+
+    demand = _scheduled_demand(db, now, now + timedelta(days=lead_time))
+    stock_levels = [(part.min_stock_level or 0, part.max_stock_level or 0) for part in parts]
+    scheduled = [demand.get(part.id, 0) for part in parts]
+
+    forecast = _forecast_numpy if numpy is not None else _forecast_python
+    results = forecast(
+        usage_events, stock_levels, scheduled, days, lead_time, settings.parts_forecast_service_z
+    )
+    rows = [
+        {
+            "part_id": part.id,
+            "daily_usage": daily_usage,
+            "usage_stddev": usage_stddev,
+            "scheduled_demand": scheduled_demand,
+            "daily_demand": daily_demand,
+            "reorder_point": reorder_point,
+            "order_up_to": order_up_to,
+            "computed_at": now,
+        }
+        for part, scheduled_demand, (
+            daily_usage,
+            usage_stddev,
+            daily_demand,
+            reorder_point,
+            order_up_to,
+        ) in zip(parts, scheduled, results)
+    ]
+
+    db.execute(insert(PartForecast), rows)
+    return {"parts": len(rows), "usage_lines": len(usage_events)}
+
+
+def days_of_stock(stock_quantity: Optional[int], daily_demand: Optional[float]) -> Optional[float]:
+    """Days the free stock lasts at the forecast demand (None without demand)."""
+    if not daily_demand:
+        return None
+    return round((stock_quantity or 0) / daily_demand, 1)
+
+
+def reorder_suggestions(db: Session, limit: int = 100) -> List[Dict]:
+    """Parts at or below their reorder point, the ones running out first first."""
+    rows = db.execute(
+        select(Part, PartForecast)
+        .outerjoin(PartForecast, PartForecast.part_id == Part.id)
+        .where(Part.status == "active", below_reorder_point())
+    ).all()
+
+    suggestions = []
+    for part, forecast in rows:
+        stock = part.stock_quantity or 0
+        reorder_point = forecast.reorder_point if forecast else part.min_stock_level or 0
+        order_up_to = forecast.order_up_to if forecast else part.max_stock_level or reorder_point
+        quantity = max(order_up_to - stock, 0)
+        suggestions.append(
+            {
+                "part_id": part.id,
+                "part_number": part.part_number,
+                "name": part.name,
+                "supplier": part.supplier,
+                "stock_quantity": stock,
+                "reorder_point": reorder_point,
+                "daily_demand": forecast.daily_demand if forecast else None,
+                "scheduled_demand": forecast.scheduled_demand if forecast else 0,
+                "days_of_stock": days_of_stock(stock, forecast.daily_demand if forecast else None),
+                "suggested_quantity": quantity,
+                "estimated_cost": quantity * (part.unit_price or 0),
+                "forecast_at": forecast.computed_at if forecast else None,
+            }
+        )
+    # Running out soonest first; parts without demand after those, emptiest first
+    suggestions.sort(
+        key=lambda item: (
+            item["days_of_stock"] is None,
+            item["days_of_stock"] or 0,
+            item["stock_quantity"] - item["reorder_point"],
+            item["part_id"],
+        )
+    )
+    return suggestions[:limit]
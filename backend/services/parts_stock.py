@@ -0,0 +1,173 @@
+"""
+Atomic parts stock reservation and consumption.
+
+``Part.stock_quantity`` is the free stock. Every change to it is one
+conditional UPDATE that also checks the stock, so concurrent technicians
+can never drive it negative or lose each other's updates:
+
+    UPDATE parts SET stock_quantity = stock_quantity - CASE id WHEN 1 THEN 2 ... END
+    WHERE id IN (...) AND stock_quantity >= CASE id WHEN 1 THEN 2 ... END
+
+A batch (all parts of a repair) is a single statement; if fewer rows match
+than parts were requested, ``InsufficientStock`` is raised and the caller
+rolls the transaction back. On PostgreSQL the rows are first locked in id
+order (row locks only) so overlapping batches cannot deadlock.
+
+Reserving deducts the stock and records ``PartReservation`` rows for the
+repair; consuming marks them consumed (and deducts any extra parts used);
+releasing puts the quantities back. Every stock change is announced as a
+``part.stock_changed`` event of the workshop module and written to the
+change log (the UPDATE bypasses the ORM).
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import case, select, update
+from sqlalchemy.orm import Session
+
+from backend.models.models import Part, PartReservation, Repair
+from backend.services.change_log import record_changes
+from backend.services.events import publish_on_commit
+
+
+class InsufficientStock(Exception):
+    """Some parts of a batch are missing or do not have enough free stock."""
+
+    def __init__(self, shortages: List[Dict]) -> None:
+        super().__init__("Insufficient stock")
+        self.shortages = shortages
+
+
+def aggregate_items(items: Iterable) -> Dict[int, int]:
+    """Sum quantities per part of ``(part_id, quantity)`` items."""
+    quantities: Dict[int, int] = defaultdict(int)
+    for part_id, quantity in items:
+        quantities[part_id] += quantity
+    return dict(quantities)
+
+
+def change_stock(db: Session, deltas: Dict[int, int]) -> None:
+    """Apply ``{part_id: delta}`` in one conditional UPDATE (stock never drops below zero)."""
+    if not deltas:
+        return
+    ids = sorted(deltas)
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(
+            select(Part.id).where(Part.id.in_(ids)).order_by(Part.id).with_for_update()
+        ).all()
+
+    delta = case(deltas, value=Part.id)
+    changed = db.execute(
+        update(Part)
+        .where(Part.id.in_(ids), Part.stock_quantity + delta >= 0)
+        .values(stock_quantity=Part.stock_quantity + delta)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if changed != len(ids):
+        raise InsufficientStock(_shortages(db, deltas))
+    record_changes(db, "part", ids)
+    publish_on_commit(db, "fleet-workshop", "part.stock_changed", {"ids": ids})
+
+
+def _shortages(db: Session, deltas: Dict[int, int]) -> List[Dict]:
+    stock = dict(db.execute(select(Part.id, Part.stock_quantity).where(Part.id.in_(deltas))).all())
+    return [
+        {"part_id": part_id, "requested": -delta, "available": stock.get(part_id, 0)}
+        for part_id, delta in sorted(deltas.items())
+        if part_id not in stock or (stock[part_id] or 0) + delta < 0
+    ]
+
+
+def reserve_parts(
+    db: Session, repair: Repair, quantities: Dict[int, int], user_id: Optional[int]
+) -> List[PartReservation]:
+    """Deduct the parts from free stock and record them as reserved for ``repair``."""
+    change_stock(db, {part_id: -quantity for part_id, quantity in quantities.items()})
+    reservations = [
+        PartReservation(
+            part_id=part_id,
+            repair_id=repair.id,
+            quantity=quantity,
+            status="reserved",
+            created_by=user_id,
+        )
+        for part_id, quantity in sorted(quantities.items())
+    ]
+    db.add_all(reservations)
+    db.flush()
+    return reservations
+
+
+def release_reservations(db: Session, repair: Repair) -> Dict[int, int]:
+    """Return the repair's reserved parts to free stock; returns ``{part_id: quantity}``."""
+    # Flipping the status first with RETURNING makes a concurrent release a no-op
+    released = db.execute(
+        update(PartReservation)
+        .where(PartReservation.repair_id == repair.id, PartReservation.status == "reserved")
+        .values(status="released")
+        .returning(PartReservation.part_id, PartReservation.quantity)
+        .execution_options(synchronize_session=False)
+    ).all()
+    quantities = aggregate_items(released)
+    change_stock(db, quantities)
+    return quantities
+
+
+def consume_for_repair(
+    db: Session, repair: Repair, extra: Dict[int, int], user_id: Optional[int]
+) -> List[Dict]:
+    """Consume the repair's reservations plus ``extra`` parts taken straight from stock.
+
+    Updates ``Repair.parts_used`` with the repair's total consumption; a repair
+    that consumed nothing through reservations keeps the ``parts_used`` it has.
+    """
+    db.execute(
+        update(PartReservation)
+        .where(PartReservation.repair_id == repair.id, PartReservation.status == "reserved")
+        .values(status="consumed")
+        .execution_options(synchronize_session=False)
+    )
+    if extra:
+        change_stock(db, {part_id: -quantity for part_id, quantity in extra.items()})
+        db.add_all(
+            PartReservation(
+                part_id=part_id,
+                repair_id=repair.id,
+                quantity=quantity,
+                status="consumed",
+                created_by=user_id,
+            )
+            for part_id, quantity in sorted(extra.items())
+        )
+        db.flush()
+
+    consumed = aggregate_items(
+        db.execute(
+            select(PartReservation.part_id, PartReservation.quantity).where(
+                PartReservation.repair_id == repair.id, PartReservation.status == "consumed"
+            )
+        ).all()
+    )
+    if consumed:
+        repair.parts_used = [
+            {"part_id": part_id, "quantity": quantity}
+            for part_id, quantity in sorted(consumed.items())
+        ]
+    return repair.parts_used
+
+
+def uncovered_parts(db: Session, repair_id: int, requested: Dict[int, int]) -> Dict[int, int]:
+    """Quantities of ``requested`` beyond what the repair has reserved or consumed."""
+    held = aggregate_items(
+        db.execute(
+            select(PartReservation.part_id, PartReservation.quantity).where(
+                PartReservation.repair_id == repair_id,
+                PartReservation.status.in_(("reserved", "consumed")),
+            )
+        ).all()
+    )
+    return {
+        part_id: quantity - held.get(part_id, 0)
+        for part_id, quantity in requested.items()
+        if quantity > held.get(part_id, 0)
+    }
@@ -0,0 +1,372 @@
+"""
+Normalized parts-usage ledger and monthly rollups.
+
+Completing a repair or a maintenance item writes its parts as
+``PartUsage`` ledger lines (part, quantity, unit price at the time, device,
+customer and device type denormalized, ``YYYY-MM`` period); a completed
+repair also gets one ``RepairCost`` line. The same transaction adds the
+amounts to the ``PartUsageMonthly`` / ``RepairCostMonthly`` rollups with
+``INSERT ... ON CONFLICT DO UPDATE SET x = x + excluded.x``, so analytics
+read a few indexed rollup rows instead of parsing JSON of every repair.
+
+A repair is recorded once: completing it again (or reopening it) first
+subtracts its previous lines. Maintenance is recurring, so every completion
+adds new lines. ``rebuild_rollups()`` recomputes the rollups from the
+ledgers and backfills completed repairs that predate the ledger.
+"""
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from backend.models.models import (
+    Device,
+    Maintenance,
+    Part,
+    PartUsage,
+    PartUsageMonthly,
+    Repair,
+    RepairCost,
+    RepairCostMonthly,
+)
+
+PART_ROLLUP_KEYS = ("period", "customer_id", "device_type", "part_id")
+PART_ROLLUP_AMOUNTS = ("quantity", "parts_cost", "lines")
+REPAIR_ROLLUP_KEYS = ("period", "customer_id", "device_type")
+REPAIR_ROLLUP_AMOUNTS = ("repairs", "actual_cost", "parts_cost", "labor_hours")
+
+
+def period_of(moment: Optional[datetime]) -> str:
+    return (moment or datetime.utcnow()).strftime("%Y-%m")
+
+
+def parse_parts(value) -> Dict[int, int]:
+    """``{part_id: quantity}`` from the JSON shapes used for parts lists.
+
+    Accepts ``[{"part_id": 1, "quantity": 2}, ...]``, ``{"items": [...]}``
+    and ``{"1": 2, ...}``; malformed entries are skipped.
+    """
+    if isinstance(value, dict) and isinstance(value.get("items"), list):
+        value = value["items"]
+    if isinstance(value, dict):
+        entries: Iterable[Tuple] = value.items()
+    elif isinstance(value, list):
+        entries = [
+            (item.get("part_id"), item.get("quantity", 1))
+            for item in value
+            if isinstance(item, dict)
+        ]
+    else:
+        return {}
+    quantities: Dict[int, int] = defaultdict(int)
+    for part_id, quantity in entries:
+        try:
+            part_id, quantity = int(part_id), int(quantity)
+        except (TypeError, ValueError):
+            continue
+        if quantity > 0:
+            quantities[part_id] += quantity
+    return dict(quantities)
+
+
+def add_to_rollup(db: Session, model, keys: Tuple[str, ...], rows: List[Dict]) -> None:
+    """Add the amounts of ``rows`` to the rollup rows with the same keys (upsert)."""
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    amounts = [name for name in rows[0] if name not in keys]
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        statement = dialect_insert(model).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={name: getattr(model, name) + statement.excluded[name] for name in amounts},
+        )
+        db.execute(statement)
+        return
+
+    for row in rows:
+        changed = db.execute(
+            update(model)
+            .where(*(getattr(model, key) == row[key] for key in keys))
+            .values({name: getattr(model, name) + row[name] for name in amounts})
+        ).rowcount
+        if not changed:
+            db.execute(insert(model).values(row))
+
+
+def _part_rollup_rows(lines: Iterable[Dict], sign: int = 1) -> List[Dict]:
+    totals: Dict[Tuple, Dict] = {}
+    for line in lines:
+        key = (
+            line["period"],
+            line["customer_id"] or 0,
+            line["device_type"] or "",
+            line["part_id"],
+        )
+        row = totals.setdefault(
+            key,
+            dict(zip(PART_ROLLUP_KEYS, key), **{name: 0 for name in PART_ROLLUP_AMOUNTS}),
+        )
+        row["quantity"] += sign * line["quantity"]
+        row["parts_cost"] += sign * (line["total_cost"] or 0)
+        row["lines"] += sign
+    return list(totals.values())
+
+
+def _repair_rollup_row(cost: Dict, sign: int = 1) -> Dict:
+    return {
+        "period": cost["period"],
+        "customer_id": cost["customer_id"] or 0,
+        "device_type": cost["device_type"] or "",
+        "repairs": sign,
+        "actual_cost": sign * (cost["actual_cost"] or 0),
+        "parts_cost": sign * (cost["parts_cost"] or 0),
+        "labor_hours": sign * (cost["labor_hours"] or 0),
+    }
+
+
+def _write_lines(
+    db: Session,
+    quantities: Dict[int, int],
+    device: Optional[Device],
+    period: str,
+    used_at: datetime,
+    **source,
+) -> List[Dict]:
+    if not quantities:
+        return []
+    prices = dict(
+        db.execute(select(Part.id, Part.unit_price).where(Part.id.in_(quantities))).all()
+    )
+    lines = [
+        {
+            "part_id": part_id,
+            "quantity": quantity,
+            "unit_price": prices[part_id] or 0,
+            "total_cost": quantity * (prices[part_id] or 0),
+            "device_id": device.id if device else None,
+            "customer_id": device.customer_id if device else None,
+            "device_type": device.device_type if device else None,
+            "period": period,
+            "used_at": used_at,
+            **source,
+        }
+        # Lines for parts that no longer exist cannot be priced or reported
+        for part_id, quantity in sorted(quantities.items())
+        if part_id in prices
+    ]
+    if lines:
+        db.execute(insert(PartUsage), lines)
+        add_to_rollup(db, PartUsageMonthly, PART_ROLLUP_KEYS, _part_rollup_rows(lines))
+    return lines
+
+
+def remove_repair_usage(db: Session, repair_id: int) -> None:
+    """Subtract a repair's ledger lines from the rollups and delete them."""
+    columns = [PartUsage.part_id, PartUsage.quantity, PartUsage.total_cost, PartUsage.period]
+    columns += [PartUsage.customer_id, PartUsage.device_type]
+    lines = [
+        row._asdict()
+        for row in db.execute(select(*columns).where(PartUsage.repair_id == repair_id))
+    ]
+    add_to_rollup(db, PartUsageMonthly, PART_ROLLUP_KEYS, _part_rollup_rows(lines, sign=-1))
+    db.execute(delete(PartUsage).where(PartUsage.repair_id == repair_id))
+
+    cost = db.get(RepairCost, repair_id)
+    if cost is not None:
+        row = {name: getattr(cost, name) for name in REPAIR_ROLLUP_KEYS + REPAIR_ROLLUP_AMOUNTS[1:]}
+        add_to_rollup(
+            db, RepairCostMonthly, REPAIR_ROLLUP_KEYS, [_repair_rollup_row(row, sign=-1)]
+        )
+        db.delete(cost)
+        db.flush()
+
+
+def record_repair_usage(db: Session, repair: Repair) -> None:
+    """Write the ledger lines of a completed repair (replacing earlier ones)."""
+    remove_repair_usage(db, repair.id)
+    device = db.get(Device, repair.device_id)
+    used_at = repair.completed_at or datetime.utcnow()
+    period = period_of(used_at)
+    lines = _write_lines(
+        db, parse_parts(repair.parts_used), device, period, used_at, repair_id=repair.id
+    )
+
+    cost = {
+        "repair_id": repair.id,
+        "device_id": repair.device_id,
+        "customer_id": device.customer_id if device else None,
+        "device_type": device.device_type if device else None,
+        "period": period,
+        "actual_cost": repair.actual_cost or 0,
+        "parts_cost": sum(line["total_cost"] for line in lines),
+        "labor_hours": repair.labor_hours or 0,
+    }
+    db.add(RepairCost(**cost))
+    db.flush()
+    add_to_rollup(db, RepairCostMonthly, REPAIR_ROLLUP_KEYS, [_repair_rollup_row(cost)])
+
+
+def record_maintenance_usage(db: Session, maintenance: Maintenance) -> None:
+    """Write ledger lines for the parts of one completion of a maintenance item."""
+    used_at = maintenance.last_performed or datetime.utcnow()
+    _write_lines(
+        db,
+        parse_parts(maintenance.parts_required),
+        db.get(Device, maintenance.device_id),
+        period_of(used_at),
+        used_at,
+        maintenance_id=maintenance.id,
+    )
+
+
+def rebuild_rollups(db: Session) -> Dict[str, int]:
+    """Backfill completed repairs missing from the ledger and recompute both rollups."""
+    missing = db.scalars(
+        select(Repair).where(
+            Repair.status == "completed",
+            Repair.id.notin_(select(RepairCost.repair_id)),
+        )
+    ).all()
+    for repair in missing:
+        record_repair_usage(db, repair)
+
+    db.execute(delete(PartUsageMonthly))
+    db.execute(
+        insert(PartUsageMonthly).from_select(
+            list(PART_ROLLUP_KEYS) + list(PART_ROLLUP_AMOUNTS),
+            select(
+                PartUsage.period,
+                func.coalesce(PartUsage.customer_id, 0),
+                func.coalesce(PartUsage.device_type, ""),
+                PartUsage.part_id,
+                func.sum(PartUsage.quantity),
+                func.sum(func.coalesce(PartUsage.total_cost, 0)),
+                func.count(PartUsage.id),
+            ).group_by(
+                PartUsage.period,
+                func.coalesce(PartUsage.customer_id, 0),
+                func.coalesce(PartUsage.device_type, ""),
+                PartUsage.part_id,
+            ),
+        )
+    )
+    db.execute(delete(RepairCostMonthly))
+    db.execute(
+        insert(RepairCostMonthly).from_select(
+            list(REPAIR_ROLLUP_KEYS) + list(REPAIR_ROLLUP_AMOUNTS),
+            select(
+                RepairCost.period,
+                func.coalesce(RepairCost.customer_id, 0),
+                func.coalesce(RepairCost.device_type, ""),
+                func.count(RepairCost.repair_id),
+                func.sum(func.coalesce(RepairCost.actual_cost, 0)),
+                func.sum(func.coalesce(RepairCost.parts_cost, 0)),
+                func.sum(func.coalesce(RepairCost.labor_hours, 0)),
+            ).group_by(
+                RepairCost.period,
+                func.coalesce(RepairCost.customer_id, 0),
+                func.coalesce(RepairCost.device_type, ""),
+            ),
+        )
+    )
+    return {"repairs_backfilled": len(missing)}
+
+
+def parts_consumption(
+    db: Session,
+    period_from: str,
+    period_to: str,
+    group_by: str = "customer",
+    customer_id: Optional[int] = None,
+    part_id: Optional[int] = None,
+    device_type: Optional[str] = None,
+) -> List[Dict]:
+    """Parts consumed per month and customer / part / device type, from the rollup."""
+    group_column = {
+        "customer": PartUsageMonthly.customer_id,
+        "part": PartUsageMonthly.part_id,
+        "device_type": PartUsageMonthly.device_type,
+    }[group_by]
+    query = (
+        select(
+            PartUsageMonthly.period,
+            group_column.label("key"),
+            func.sum(PartUsageMonthly.quantity).label("quantity"),
+            func.sum(PartUsageMonthly.parts_cost).label("parts_cost"),
+        )
+        .where(PartUsageMonthly.period >= period_from, PartUsageMonthly.period <= period_to)
+        .group_by(PartUsageMonthly.period, group_column)
+        .having(func.sum(PartUsageMonthly.lines) > 0)
+        .order_by(PartUsageMonthly.period, group_column)
+    )
+    if customer_id is not None:
+        query = query.where(PartUsageMonthly.customer_id == customer_id)
+    if part_id is not None:
+        query = query.where(PartUsageMonthly.part_id == part_id)
+    if device_type is not None:
+        query = query.where(PartUsageMonthly.device_type == device_type)
+    return [
+        {
+            "period": row.period,
+            group_by: row.key,
+            "quantity": int(row.quantity),
+            "parts_cost": int(row.parts_cost),
+        }
+        for row in db.execute(query)
+    ]
+
+
+def repair_costs(
+    db: Session,
+    period_from: str,
+    period_to: str,
+    group_by: str = "device_type",
+    monthly: bool = False,
+    customer_id: Optional[int] = None,
+) -> List[Dict]:
+    """Repair count and cost per device type or customer (optionally per month)."""
+    group_column = {
+        "device_type": RepairCostMonthly.device_type,
+        "customer": RepairCostMonthly.customer_id,
+    }[group_by]
+    group = [RepairCostMonthly.period, group_column] if monthly else [group_column]
+    columns = group[:-1] + [group_column.label("key")]
+    query = (
+        select(
+            *columns,
+            func.sum(RepairCostMonthly.repairs).label("repairs"),
+            func.sum(RepairCostMonthly.actual_cost).label("actual_cost"),
+            func.sum(RepairCostMonthly.parts_cost).label("parts_cost"),
+            func.sum(RepairCostMonthly.labor_hours).label("labor_hours"),
+        )
+        .where(RepairCostMonthly.period >= period_from, RepairCostMonthly.period <= period_to)
+        .group_by(*group)
+        .having(func.sum(RepairCostMonthly.repairs) > 0)
+        .order_by(*group)
+    )
+    if customer_id is not None:
+        query = query.where(RepairCostMonthly.customer_id == customer_id)
+
+    result = []
+    for row in db.execute(query):
+        repairs = int(row.repairs)
+        total = int(row.actual_cost) + int(row.parts_cost)
+        item = {
+            group_by: row.key,
+            "repairs": repairs,
+            "actual_cost": int(row.actual_cost),
+            "parts_cost": int(row.parts_cost),
+            "labor_hours": int(row.labor_hours),
+            "average_cost": round(total / repairs),
+        }
+        if monthly:
+            item = {"period": row.period, **item}
+        result.append(item)
+    return result
@@ -0,0 +1,455 @@
+"""
+Set-based seeding of default users and sample data.
+
+Used by the startup seeder, ``POST /api/v1/init-data`` and ``scripts/seed.py``.
+Every step reads the existing state with one query and writes missing rows
+with one multi-row ``INSERT``; passwords are not re-hashed per user - all
+seeded accounts share one pre-computed bcrypt hash.
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+
+from backend.auth.auth import generate_qr_code, get_password_hash
+from backend.models.models import (
+    Configuration,
+    Customer,
+    Device,
+    Software,
+    SoftwareVersion,
+    TestScenario,
+    TestStep,
+    User,
+)
+
+DEFAULT_PASSWORD = "pass"
+# bcrypt hash of DEFAULT_PASSWORD, so seeding never pays for bcrypt
+DEFAULT_PASSWORD_HASH = "$2b$12$JRFCSRK/RbpvNLcbT0IhRu272IZCz7uT/WGT6Orv3mrQLWkNhc5/C"
+
+# (username, role, email) of the accounts kept predictable for tests on startup
+STARTUP_USERS = [
+    ("admin", "superuser", "admin@fleetmanagement.com"),
+    ("operator1", "operator", "operator1@fleetmanagement.com"),
+    ("manager1", "manager", "manager1@fleetmanagement.com"),
+    ("configurator", "configurator", "configurator@fleetmanagement.com"),
+    ("maker1", "maker", "maker1@fleet.com"),
+]
+
+# Accounts created by init-data when missing (existing ones are left untouched)
+SAMPLE_USERS = [
+    ("admin", "superuser", "admin@fleetmanagement.com"),
+    ("operator1", "operator", "operator1@fleetmanagement.com"),
+    ("manager1", "manager", "manager1@fleetmanagement.com"),
+    ("configurator1", "configurator", "configurator1@fleetmanagement.com"),
+    ("maker1", "maker", "maker1@fleetmanagement.com"),
+]
+
+SAMPLE_CUSTOMERS = [
+    {
+        "name": "Szpital Wojewódzki w Warszawie",
+        "contact_info": {
+            "email": "kontakt@szpital-warszawa.pl",
+            "phone": "+48 22 123 4567",
+            "address": "ul. Szpitalna 1, 00-001 Warszawa",
+        },
+    },
+    {
+        "name": "Przychodnia Medyczna Poznań",
+        "contact_info": {
+            "email": "recepcja@medyczna-poznan.pl",
+            "phone": "+48 61 234 5678",
+        },
+    },
+    {
+        "name": "Centrum Zdrowia Kraków",
+        "contact_info": {"email": "info@centrum-krakow.pl", "phone": "+48 12 345 6789"},
+    },
+    {
+        "name": "Klinika Prywatna Gdańsk",
+        "contact_info": {
+            "email": "kontakt@klinika-gdansk.pl",
+            "phone": "+48 58 456 7890",
+        },
+    },
+    {
+        "name": "Laboratorium Diagnostyczne Wrocław",
+        "contact_info": {
+            "email": "lab@diagnostyka-wroclaw.pl",
+            "phone": "+48 71 567 8901",
+        },
+    },
+]
+
+# customer_index refers to the n-th customer (by id)
+SAMPLE_DEVICES = [
+    {
+        "device_number": "MT-001",
+        "device_type": "mask_tester",
+        "kind_of_device": "Medical Test Device",
+        "serial_number": "SN2024001",
+        "status": "active",
+        "customer_index": 0,
+        "configuration": {"test_mode": "automatic", "pressure_range": "0-50 mbar"},
+    },
+    {
+        "device_number": "MT-002",
+        "device_type": "mask_tester",
+        "kind_of_device": "Medical Test Device",
+        "serial_number": "SN2024002",
+        "status": "active",
+        "customer_index": 1,
+        "configuration": {"test_mode": "manual", "pressure_range": "0-50 mbar"},
+    },
+    {
+        "device_number": "PS-001",
+        "device_type": "pressure_sensor",
+        "kind_of_device": "Sensor Device",
+        "serial_number": "SN2024003",
+        "status": "active",
+        "customer_index": 2,
+        "configuration": {"sensitivity": "high", "calibration_date": "2024-01-15"},
+    },
+    {
+        "device_number": "FM-001",
+        "device_type": "flow_meter",
+        "kind_of_device": "Flow Measurement",
+        "serial_number": "SN2024004",
+        "status": "maintenance",
+        "customer_index": 3,
+        "configuration": {"flow_range": "0-100 L/min"},
+    },
+    {
+        "device_number": "MT-003",
+        "device_type": "mask_tester",
+        "kind_of_device": "Medical Test Device",
+        "serial_number": "SN2024005",
+        "status": "active",
+        "customer_index": 4,
+        "configuration": {"test_mode": "automatic", "pressure_range": "0-50 mbar"},
+    },
+]
+
+SAMPLE_SCENARIOS = [
+    {
+        "name": "Test Szczelności Maski Standardowy",
+        "description": "Kompletny test szczelności maski z pomiarem ciśnienia",
+        "device_type": "mask_tester",
+        "test_flow": {"mode": "standard", "duration": "300s", "pressure": "30 mbar"},
+        "steps": [
+            {
+                "step_order": 1,
+                "step_name": "Przygotowanie urządzenia",
+                "description": "Sprawdzenie połączeń i kalibracja",
+            },
+            {
+                "step_order": 2,
+                "step_name": "Założenie maski",
+                "description": "Poprawne umieszczenie maski na manekinie",
+            },
+            {
+                "step_order": 3,
+                "step_name": "Test ciśnienia",
+                "description": "Pomiar szczelności przy 30 mbar",
+                "parameters": {"pressure": 30},
+            },
+            {
+                "step_order": 4,
+                "step_name": "Raport końcowy",
+                "description": "Generowanie raportu z wynikami testu",
+            },
+        ],
+    },
+    {
+        "name": "Kalibracja Czujnika Ciśnienia",
+        "description": "Procedura kalibracji czujników ciśnienia",
+        "device_type": "pressure_sensor",
+        "test_flow": {"mode": "calibration", "points": 5},
+        "steps": [
+            {
+                "step_order": 1,
+                "step_name": "Reset urządzenia",
+                "description": "Przywrócenie ustawień fabrycznych",
+                "auto_test": True,
+            },
+            {
+                "step_order": 2,
+                "step_name": "Pomiar punktu zerowego",
+                "description": "Kalibracja przy ciśnieniu atmosferycznym",
+            },
+            {
+                "step_order": 3,
+                "step_name": "Pomiar punktów referencyjnych",
+                "description": "5 punktów kalibracyjnych",
+                "parameters": {"points": [10, 20, 30, 40, 50]},
+            },
+        ],
+    },
+    {
+        "name": "Test Przepływu Szybki",
+        "description": "Szybki test przepływomierza",
+        "device_type": "flow_meter",
+        "test_flow": {"mode": "quick", "duration": "60s"},
+        "steps": [
+            {
+                "step_order": 1,
+                "step_name": "Uruchomienie przepływu",
+                "description": "Start pomiaru przepływu",
+            },
+            {
+                "step_order": 2,
+                "step_name": "Odczyt wartości",
+                "description": "Pomiar w czasie rzeczywistym",
+                "auto_test": True,
+            },
+        ],
+    },
+]
+
+SAMPLE_SOFTWARE = [
+    {
+        "name": "MaskTester Firmware",
+        "description": "Oprogramowanie sterujące dla testerów masek",
+        "vendor": "FleetTech Solutions",
+        "category": "firmware",
+        "platform": "mask_tester",
+        "license_type": "Proprietary",
+        "versions": [
+            {
+                "version_number": "1.0.0",
+                "release_notes": "Pierwsza wersja stabilna",
+                "is_stable": True,
+                "file_path": "/firmware/masktester_v1.0.0.bin",
+            },
+            {
+                "version_number": "1.1.0",
+                "release_notes": "Optymalizacja pomiarów ciśnienia",
+                "is_stable": True,
+                "file_path": "/firmware/masktester_v1.1.0.bin",
+            },
+            {
+                "version_number": "1.2.0-beta",
+                "release_notes": "Nowy interfejs użytkownika (beta)",
+                "is_stable": False,
+                "file_path": "/firmware/masktester_v1.2.0-beta.bin",
+            },
+        ],
+    },
+    {
+        "name": "Pressure Sensor Driver",
+        "description": "Sterownik dla czujników ciśnienia",
+        "vendor": "SensorTech",
+        "category": "driver",
+        "platform": "pressure_sensor",
+        "license_type": "Open Source (MIT)",
+        "versions": [
+            {
+                "version_number": "2.0.1",
+                "release_notes": "Poprawki stabilności",
+                "is_stable": True,
+                "file_path": "/drivers/pressure_sensor_v2.0.1.drv",
+            }
+        ],
+    },
+    {
+        "name": "Flow Meter Calibration Tool",
+        "description": "Narzędzie do kalibracji przepływomierzy",
+        "vendor": "FleetTech Solutions",
+        "category": "tool",
+        "platform": "flow_meter",
+        "license_type": "Proprietary",
+        "versions": [
+            {
+                "version_number": "3.1.0",
+                "release_notes": "Automatyczna kalibracja wielopunktowa",
+                "is_stable": True,
+                "file_path": "/tools/flowmeter_cal_v3.1.0.exe",
+            }
+        ],
+    },
+]
+
+SAMPLE_CONFIGURATIONS = [
+    {
+        "config_key": "cpp_test_timeout",
+        "config_value": {"value": 300, "unit": "seconds"},
+        "component": "CPP",
+    },
+    {"config_key": "cm_max_scenarios", "config_value": {"value": 100}, "component": "CM"},
+    {
+        "config_key": "fdm_backup_interval",
+        "config_value": {"value": 24, "unit": "hours"},
+        "component": "FDM",
+    },
+    {
+        "config_key": "fcm_auto_backup",
+        "config_value": {"enabled": True, "retention_days": 30},
+        "component": "FCM",
+    },
+    {
+        "config_key": "fsm_update_channel",
+        "config_value": {"channel": "stable", "auto_update": False},
+        "component": "FSM",
+    },
+]
+
+
+def password_hash(password: str = DEFAULT_PASSWORD) -> str:
+    """Hash for seeded accounts; the default password uses the pre-computed hash."""
+    return DEFAULT_PASSWORD_HASH if password == DEFAULT_PASSWORD else get_password_hash(password)
+
+
+def _uniform(rows: Iterable[dict], defaults: dict) -> List[dict]:
+    """Give every row the same keys, as a multi-row INSERT binds one column list."""
+    return [{**defaults, **row} for row in rows]
+
+
+def _insert_returning_ids(db: Session, model, rows: List[dict]) -> List[int]:
+    if not rows:
+        return []
+    statement = insert(model).returning(model.id, sort_by_parameter_order=True)
+    return list(db.scalars(statement, rows))
+
+
+def seed_users(
+    db: Session,
+    users: Sequence[Tuple[str, str, str]],
+    hashed_password: str = DEFAULT_PASSWORD_HASH,
+    reset_existing: bool = False,
+) -> Dict[str, int]:
+    """Create missing users in one INSERT and return ``{username: id}``.
+
+    With ``reset_existing`` the role, email, active flag and password of
+    existing accounts are reset in one bulk UPDATE (predictable test accounts).
+    """
+    usernames = [username for username, _, _ in users]
+    existing = dict(
+        db.execute(select(User.username, User.id).where(User.username.in_(usernames))).all()
+    )
+
+    missing = [
+        {
+            "username": username,
+            "password_hash": hashed_password,
+            "email": email,
+            "role": role,
+            "qr_code": generate_qr_code(),
+            "is_active": True,
+        }
+        for username, role, email in users
+        if username not in existing
+    ]
+    if missing:
+        ids = _insert_returning_ids(db, User, missing)
+        existing.update(zip((row["username"] for row in missing), ids))
+
+    if reset_existing:
+        created = {row["username"] for row in missing}
+        resets = [
+            {
+                "id": existing[username],
+                "role": role,
+                "email": email,
+                "is_active": True,
+                "password_hash": hashed_password,
+            }
+            for username, role, email in users
+            if username not in created
+        ]
+        if resets:
+            db.execute(update(User), resets)
+    return existing
+
+
+def seed_sample_data(db: Session) -> Dict[str, int]:
+    """Insert the sample customers, devices, scenarios, software and configuration.
+
+    Each group is only inserted while its table is empty (scenarios: while the
+    admin owns fewer than three), matching the original init-data semantics.
+    Returns the number of rows created per group.
+    """
+    counts: Dict[str, int] = {}
+    user_ids = seed_users(db, SAMPLE_USERS)
+    counts["users"] = len(SAMPLE_USERS)
+    admin_id = user_ids["admin"]
+    maker_id = user_ids["maker1"]
+    configurator_id = user_ids["configurator1"]
+
+    existing = db.execute(
+        select(
+            select(func.count(Customer.id)).scalar_subquery(),
+            select(func.count(Device.id)).scalar_subquery(),
+            select(func.count(TestScenario.id))
+            .where(TestScenario.created_by == admin_id)
+            .scalar_subquery(),
+            select(func.count(Software.id)).scalar_subquery(),
+            select(func.count(Configuration.id)).scalar_subquery(),
+        )
+    ).one()
+    customers, devices, scenarios, software, configurations = existing
+
+    if customers == 0:
+        db.execute(insert(Customer), SAMPLE_CUSTOMERS)
+        counts["customers"] = len(SAMPLE_CUSTOMERS)
+
+    if devices == 0:
+        customer_ids = list(
+            db.scalars(select(Customer.id).order_by(Customer.id).limit(len(SAMPLE_DEVICES)))
+        )
+        rows = [
+            {k: v for k, v in device.items() if k != "customer_index"}
+            | {"customer_id": customer_ids[device["customer_index"]]}
+            for device in SAMPLE_DEVICES
+            if device["customer_index"] < len(customer_ids)
+        ]
+        if rows:
+            db.execute(insert(Device), rows)
+            counts["devices"] = len(rows)
+
+    if scenarios < 3:
+        scenario_rows = [
+            {k: v for k, v in scenario.items() if k != "steps"} | {"created_by": admin_id}
+            for scenario in SAMPLE_SCENARIOS
+        ]
+        scenario_ids = _insert_returning_ids(db, TestScenario, scenario_rows)
+        step_rows = _uniform(
+            (
+                dict(step, scenario_id=scenario_id)
+                for scenario_id, scenario in zip(scenario_ids, SAMPLE_SCENARIOS)
+                for step in scenario["steps"]
+            ),
+            {"parameters": None, "auto_test": False},
+        )
+        db.execute(insert(TestStep), step_rows)
+        counts["scenarios"] = len(SAMPLE_SCENARIOS)
+
+    if software == 0:
+        software_rows = [
+            {k: v for k, v in package.items() if k != "versions"} | {"created_by": maker_id}
+            for package in SAMPLE_SOFTWARE
+        ]
+        software_ids = _insert_returning_ids(db, Software, software_rows)
+        db.execute(
+            insert(SoftwareVersion),
+            [
+                dict(version, software_id=software_id)
+                for software_id, package in zip(software_ids, SAMPLE_SOFTWARE)
+                for version in package["versions"]
+            ],
+        )
+        counts["software"] = len(SAMPLE_SOFTWARE)
+
+    if configurations == 0:
+        db.execute(
+            insert(Configuration),
+            [dict(config, updated_by=configurator_id) for config in SAMPLE_CONFIGURATIONS],
+        )
+        counts["configurations"] = len(SAMPLE_CONFIGURATIONS)
+
+    return counts
+
+
+def seed_default_users(db: Session, password: Optional[str] = None) -> Dict[str, int]:
+    """Create or reset the predictable test accounts (startup seeder)."""
+    hashed = password_hash(password) if password else DEFAULT_PASSWORD_HASH
+    return seed_users(db, STARTUP_USERS, hashed_password=hashed, reset_existing=True)
@@ -0,0 +1,387 @@
+"""
+Binary deltas between software artifacts.
+
+A device updating from one version to another downloads a delta instead of
+the full image when one is ready. Deltas are built for consecutive versions
+of a software as soon as both have an artifact, and on demand for any other
+(installed, target) pair an installation asks for. They are built in a
+process pool (``DELTA_PROCESSES``) by the ``software.delta`` job and stored
+in the artifact store like any other file; a delta larger than
+``DELTA_MAX_RATIO`` of the target is discarded (status ``unneeded``).
+
+Delta format ``fleet-delta/1``::
+
+    b"FLDELTA1"  source SHA-256 (32 bytes)  target SHA-256 (32 bytes)
+    target size (8 bytes, big endian)  LZMA (xz) stream of operations:
+        0x00 <offset varint> <length varint>   copy from the source
+        0x01 <length varint> <bytes>           literal data
+
+The target is cut into ``BLOCK_SIZE`` blocks; each block is found in the
+source by continuing the previous match, through an index of the source's
+aligned blocks, or by a search in a window around the expected position
+(after a run of misses only at exponentially spaced blocks, so new content
+costs little). ``apply_delta()`` is the reference decoder.
+"""
+import hashlib
+import lzma
+import mmap
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from backend.core.config import settings
+from backend.models.models import Artifact, ArtifactDelta, SoftwareVersion
+from backend.services.artifacts import object_path, store_file, temp_path
+from backend.services.jobs import enqueue
+
+DELTA_FORMAT = "fleet-delta/1"
+MAGIC = b"FLDELTA1"
+BLOCK_SIZE = 4096
+RESYNC_WINDOW = 1024 * 1024
+OP_COPY, OP_DATA = 0, 1
+# Literal runs are emitted in pieces of at most this size
+MAX_LITERAL = 1024 * 1024
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _read_varint(stream) -> int:
+    value = shift = 0
+    while True:
+        byte = stream.read(1)
+        if not byte:
+            raise ValueError("Truncated delta")
+        value |= (byte[0] & 0x7F) << shift
+        if byte[0] < 0x80:
+            return value
+        shift += 7
+
+
+class _DeltaTooLarge(Exception):
+    pass
+
+
+class _DeltaWriter:
+    """Coalesces operations and writes them LZMA-compressed, hashing the output."""
+
+    def __init__(self, file, header: bytes, max_size: Optional[int] = None) -> None:
+        self.file = file
+        self.max_size = max_size
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        self.compressor = lzma.LZMACompressor(format=lzma.FORMAT_XZ, preset=6)
+        self.copy_offset = self.copy_length = 0
+        self.literal = bytearray()
+        self._output(header)
+
+    def _output(self, data: bytes) -> None:
+        if data:
+            self.file.write(data)
+            self.hasher.update(data)
+            self.size += len(data)
+            if self.max_size is not None and self.size > self.max_size:
+                raise _DeltaTooLarge()
+
+    def _flush_copy(self) -> None:
+        if self.copy_length:
+            op = bytes([OP_COPY]) + _varint(self.copy_offset) + _varint(self.copy_length)
+            self._output(self.compressor.compress(op))
+            self.copy_length = 0
+
+    def _flush_literal(self) -> None:
+        if self.literal:
+            op = bytes([OP_DATA]) + _varint(len(self.literal))
+            self._output(self.compressor.compress(op))
+            self._output(self.compressor.compress(self.literal))
+            self.literal.clear()
+
+    def copy(self, offset: int, length: int) -> None:
+        self._flush_literal()
+        if self.copy_length and self.copy_offset + self.copy_length == offset:
+            self.copy_length += length
+            return
+        self._flush_copy()
+        self.copy_offset, self.copy_length = offset, length
+
+    def data(self, block: bytes) -> None:
+        self._flush_copy()
+        self.literal += block
+        if len(self.literal) >= MAX_LITERAL:
+            self._flush_literal()
+
+    def close(self) -> Tuple[int, str]:
+        self._flush_copy()
+        self._flush_literal()
+        self._output(self.compressor.flush())
+        return self.size, self.hasher.hexdigest()
+
+
+def _map(file) -> bytes:
+    size = os.fstat(file.fileno()).st_size
+    return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+
+def _find_block(source, index: Dict[int, int], block: bytes, expected: int, misses: int) -> int:
+    """Offset of ``block`` in ``source``, or -1."""
+    length = len(block)
+    if source[expected : expected + length] == block:
+        return expected
+    candidate = index.get(hash(block))
+    if candidate is not None and source[candidate : candidate + length] == block:
+        return candidate
+    if misses & (misses - 1) == 0:  # 0, 1, 2, 4, 8, ... misses in a row
+        start = max(expected - RESYNC_WINDOW, 0)
+        return source.find(block, start, expected + RESYNC_WINDOW + length)
+    return -1
+
+
+def build_delta(
+    source_path: str, target_path: str, out_path: str, max_size: Optional[int] = None
+) -> Optional[Tuple[int, str]]:
+    """Write the delta turning ``source_path`` into ``target_path``; returns ``(size, sha256)``.
+
+    Gives up and returns None as soon as the delta exceeds ``max_size`` bytes.
+    Runs in the delta process pool.
+    """
+    with open(source_path, "rb") as source_file, open(target_path, "rb") as target_file:
+        source, target = _map(source_file), _map(target_file)
+        header = (
+            MAGIC
+            + hashlib.sha256(source).digest()
+            + hashlib.sha256(target).digest()
+            + len(target).to_bytes(8, "big")
+        )
+        index: Dict[int, int] = {}
+        for offset in range(0, len(source) - BLOCK_SIZE + 1, BLOCK_SIZE):
+            index.setdefault(hash(source[offset : offset + BLOCK_SIZE]), offset)
+
+        with open(out_path, "wb") as out:
+            writer = _DeltaWriter(out, header, max_size)
+            expected = misses = 0
+            try:
+                for position in range(0, len(target), BLOCK_SIZE):
+                    block = target[position : position + BLOCK_SIZE]
+                    found = _find_block(source, index, block, expected, misses)
+                    if found >= 0:
+                        writer.copy(found, len(block))
+                        expected, misses = found + len(block), 0
+                    else:
+                        writer.data(block)
+                        expected, misses = expected + len(block), misses + 1
+                return writer.close()
+            except _DeltaTooLarge:
+                return None
+
+
+def apply_delta(source_path: str, delta_path: str, out_path: str) -> None:
+    """Rebuild the target from the source and a ``fleet-delta/1`` file (verified)."""
+    with open(delta_path, "rb") as delta, open(source_path, "rb") as source_file:
+        header = delta.read(len(MAGIC) + 72)
+        if header[: len(MAGIC)] != MAGIC:
+            raise ValueError("Not a fleet delta")
+        source_sha256, target_sha256 = header[8:40], header[40:72]
+        target_size = int.from_bytes(header[72:80], "big")
+        source = _map(source_file)
+        if hashlib.sha256(source).digest() != source_sha256:
+            raise ValueError("Delta was built for a different source")
+
+        hasher = hashlib.sha256()
+        with lzma.open(delta) as ops, open(out_path, "wb") as out:
+            while True:
+                op = ops.read(1)
+                if not op:
+                    break
+                if op[0] == OP_COPY:
+                    offset = _read_varint(ops)
+                    chunk = source[offset : offset + _read_varint(ops)]
+                elif op[0] == OP_DATA:
+                    length = _read_varint(ops)
+                    chunk = ops.read(length)
+                    if len(chunk) != length:
+                        raise ValueError("Truncated delta")
+                else:
+                    raise ValueError("Unknown delta operation")
+                out.write(chunk)
+                hasher.update(chunk)
+                target_size -= len(chunk)
+        if target_size or hasher.digest() != target_sha256:
+            raise ValueError("Delta output does not match the target")
+
+
+def _process_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: the web and job worker processes are multi-threaded
+            _pool = ProcessPoolExecutor(
+                max_workers=max(1, settings.delta_processes),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def version_artifact_sha256(db: Session, version: SoftwareVersion) -> Optional[str]:
+    """SHA-256 of the stored artifact of a version (None for external downloads)."""
+    if not version.checksum:
+        return None
+    sha256 = version.checksum.lower()
+    if db.scalar(select(Artifact.id).where(Artifact.sha256 == sha256)) is None:
+        return None
+    return sha256
+
+
+def request_delta(
+    db: Session, source_sha256: str, target_sha256: str, user_id: Optional[int] = None
+) -> ArtifactDelta:
+    """The delta for a pair of artifacts, queuing its build if it is new; the caller commits."""
+    delta = db.scalar(
+        select(ArtifactDelta).where(
+            ArtifactDelta.source_sha256 == source_sha256,
+            ArtifactDelta.target_sha256 == target_sha256,
+        )
+    )
+    if delta is None:
+        delta = ArtifactDelta(
+            source_sha256=source_sha256, target_sha256=target_sha256, status="pending"
+        )
+        db.add(delta)
+        db.flush()
+        enqueue(db, "software.delta", payload={"delta_id": delta.id}, created_by=user_id)
+    return delta
+
+
+def request_neighbour_deltas(
+    db: Session, version: SoftwareVersion, user_id: Optional[int] = None
+) -> None:
+    """Queue deltas from the previous and to the next version that have artifacts."""
+    sha256 = version_artifact_sha256(db, version)
+    if sha256 is None:
+        return
+    siblings = select(SoftwareVersion).where(
+        SoftwareVersion.software_id == version.software_id,
+        SoftwareVersion.checksum.isnot(None),
+    )
+    previous = db.scalar(
+        siblings.where(SoftwareVersion.id < version.id).order_by(SoftwareVersion.id.desc())
+    )
+    following = db.scalar(
+        siblings.where(SoftwareVersion.id > version.id).order_by(SoftwareVersion.id)
+    )
+    previous_sha256 = previous and version_artifact_sha256(db, previous)
+    if previous_sha256 and previous_sha256 != sha256:
+        request_delta(db, previous_sha256, sha256, user_id)
+    following_sha256 = following and version_artifact_sha256(db, following)
+    if following_sha256 and following_sha256 != sha256:
+        request_delta(db, sha256, following_sha256, user_id)
+
+
+def build_and_store(db: Session, delta: ArtifactDelta, user_id: Optional[int] = None) -> None:
+    """Build a pending delta in the process pool and store it; the caller commits."""
+    if delta.status != "pending":
+        return
+    target_size = db.scalar(select(Artifact.size).where(Artifact.sha256 == delta.target_sha256))
+    out_path = temp_path("delta")
+    try:
+        built = (
+            _process_pool()
+            .submit(
+                build_delta,
+                object_path(delta.source_sha256),
+                object_path(delta.target_sha256),
+                out_path,
+                int(settings.delta_max_ratio * target_size),
+            )
+            .result()
+        )
+    except Exception as error:  # a broken input does not get better by retrying
+        built = None
+        delta.status, delta.error = "failed", str(error) or type(error).__name__
+    else:
+        delta.status = "unneeded"
+    delta.completed_at = datetime.utcnow()
+    if built is None:
+        if os.path.exists(out_path):
+            os.unlink(out_path)
+        return
+
+    size, sha256 = built
+    store_file(db, out_path, sha256, size, user_id)
+    delta.status, delta.delta_sha256, delta.size = "ready", sha256, size
+
+
+def _artifact_url(sha256: str) -> str:
+    return f"{settings.api_v1_str}/fleet-software/artifacts/{sha256}"
+
+
+def delta_dict(delta: ArtifactDelta) -> Dict:
+    return {
+        "id": delta.id,
+        "source_sha256": delta.source_sha256,
+        "target_sha256": delta.target_sha256,
+        "status": delta.status,
+        "format": DELTA_FORMAT,
+        "sha256": delta.delta_sha256,
+        "size": delta.size,
+        "url": _artifact_url(delta.delta_sha256) if delta.delta_sha256 else None,
+        "error": delta.error,
+    }
+
+
+def installation_package(
+    db: Session,
+    version: SoftwareVersion,
+    installed: Optional[SoftwareVersion],
+    user_id: Optional[int] = None,
+) -> Optional[Dict]:
+    """What a device installing ``version`` over ``installed`` should download.
+
+    A ready delta when there is one, otherwise the full artifact (and a delta
+    is requested for the next device making the same jump). None when the
+    version has no stored artifact; the caller commits.
+    """
+    target_sha256 = version_artifact_sha256(db, version)
+    if target_sha256 is None:
+        return None
+    target_size = db.scalar(select(Artifact.size).where(Artifact.sha256 == target_sha256))
+    package = {
+        "type": "full",
+        "url": _artifact_url(target_sha256),
+        "sha256": target_sha256,
+        "size": target_size,
+    }
+
+    source_sha256 = installed and version_artifact_sha256(db, installed)
+    if not source_sha256 or source_sha256 == target_sha256:
+        return package
+    delta = request_delta(db, source_sha256, target_sha256, user_id)
+    if delta.status != "ready":
+        return package
+    return {
+        "type": "delta",
+        "format": DELTA_FORMAT,
+        "url": _artifact_url(delta.delta_sha256),
+        "sha256": delta.delta_sha256,
+        "size": delta.size,
+        "source_sha256": source_sha256,
+        "target_sha256": target_sha256,
+        "target_size": target_size,
+    }
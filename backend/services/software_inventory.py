@@ -0,0 +1,146 @@
+"""
+Fleet software inventory: devices per software, version and status.
+
+``software_inventory`` holds one row per (software, installed version,
+installation status) with its device count. It is maintained in the same
+transaction as every ``device_software`` write: the writer takes a
+``snapshot()`` of the rows it is about to touch, makes its changes and
+passes the before and after snapshots to ``record_changes()``, which adds
+the differences with ``INSERT ... ON CONFLICT DO UPDATE SET devices =
+devices + excluded.devices``.
+
+``inventory_matrix()`` reads only this table, so the version distribution
+and the outdated device count per software do not depend on the size of
+``device_software``. Which version is the latest is decided at read time,
+so publishing a version needs no maintenance. ``rebuild_inventory()``
+(the daily ``software.rebuild_inventory`` job) recomputes the table from
+``device_software``.
+"""
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from backend.models.models import DeviceSoftware, Software, SoftwareInventory
+from backend.services.parts_usage import add_to_rollup
+
+INVENTORY_KEYS = ("software_id", "installed_version", "installation_status")
+NOT_RUNNING = "not_installed"
+
+Snapshot = Dict[int, Tuple[int, str, str]]
+
+
+def snapshot(db: Session, pairs: Iterable[Tuple[int, int]]) -> Snapshot:
+    """``{device_software.id: inventory key}`` for the given ``(device_id, software_id)`` pairs."""
+    pairs = set(pairs)
+    if not pairs:
+        return {}
+    rows = db.execute(
+        select(
+            DeviceSoftware.id,
+            DeviceSoftware.device_id,
+            DeviceSoftware.software_id,
+            DeviceSoftware.installed_version,
+            DeviceSoftware.installation_status,
+        ).where(
+            DeviceSoftware.device_id.in_({device_id for device_id, _ in pairs}),
+            DeviceSoftware.software_id.in_({software_id for _, software_id in pairs}),
+        )
+    )
+    return {
+        row.id: (row.software_id, row.installed_version or "", row.installation_status or "")
+        for row in rows
+        if (row.device_id, row.software_id) in pairs
+    }
+
+
+def record_changes(db: Session, before: Snapshot, after: Snapshot) -> None:
+    """Apply the difference between two snapshots to the inventory; the caller commits."""
+    changes: Counter = Counter()
+    for row_id in before.keys() | after.keys():
+        if before.get(row_id) == after.get(row_id):
+            continue
+        if row_id in before:
+            changes[before[row_id]] -= 1
+        if row_id in after:
+            changes[after[row_id]] += 1
+    rows = [
+        {**dict(zip(INVENTORY_KEYS, key)), "devices": devices}
+        for key, devices in sorted(changes.items())
+        if devices
+    ]
+    add_to_rollup(db, SoftwareInventory, INVENTORY_KEYS, rows)
+
+
+def rebuild_inventory(db: Session) -> Dict[str, int]:
+    """Recompute the inventory from ``device_software``; the caller commits."""
+    db.execute(delete(SoftwareInventory))
+    version = func.coalesce(DeviceSoftware.installed_version, "")
+    status = func.coalesce(DeviceSoftware.installation_status, "")
+    db.execute(
+        insert(SoftwareInventory).from_select(
+            list(INVENTORY_KEYS) + ["devices"],
+            select(
+                DeviceSoftware.software_id, version, status, func.count(DeviceSoftware.id)
+            ).group_by(DeviceSoftware.software_id, version, status),
+        )
+    )
+    rows, devices = db.execute(
+        select(func.count(SoftwareInventory.id), func.sum(SoftwareInventory.devices))
+    ).one()
+    return {"rows": rows, "device_software": devices or 0}
+
+
+def inventory_matrix(db: Session, latest_versions: Dict[int, Optional[str]]) -> List[Dict]:
+    """Version distribution and outdated device count for every active software.
+
+    ``latest_versions`` maps software ids to their latest version number.
+    Devices count while their installation status is anything but
+    ``not_installed``; they are outdated when running another version.
+    """
+    software = db.execute(
+        select(Software.id, Software.name, Software.category)
+        .where(Software.is_active == True)
+        .order_by(Software.name)
+    ).all()
+    cells: Dict[int, Dict[str, Counter]] = defaultdict(lambda: defaultdict(Counter))
+    for row in db.execute(
+        select(
+            SoftwareInventory.software_id,
+            SoftwareInventory.installed_version,
+            SoftwareInventory.installation_status,
+            SoftwareInventory.devices,
+        ).where(SoftwareInventory.devices > 0)
+    ):
+        cells[row.software_id][row.installed_version][row.installation_status] += row.devices
+
+    matrix = []
+    for item in software:
+        latest = latest_versions.get(item.id)
+        versions, running, outdated = [], 0, 0
+        for version, statuses in sorted(cells.get(item.id, {}).items()):
+            devices = sum(count for status, count in statuses.items() if status != NOT_RUNNING)
+            running += devices
+            if version != latest:
+                outdated += devices
+            versions.append(
+                {
+                    "version": version or None,
+                    "latest": version == latest,
+                    "devices": devices,
+                    "statuses": dict(statuses),
+                }
+            )
+        matrix.append(
+            {
+                "software_id": item.id,
+                "name": item.name,
+                "category": item.category,
+                "latest_version": latest,
+                "devices": running,
+                "outdated": outdated,
+                "versions": versions,
+            }
+        )
+    return matrix
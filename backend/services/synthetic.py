@@ -0,0 +1,364 @@
+"""
+Bulk synthetic-fleet generation.
+
+``Generator`` lazily produces reproducible rows (seeded RNG) for customers,
+devices, the software catalogue, installations, repairs and - for the
+Connect++ database - test sessions with sensor readings. Rows carry explicit
+primary keys so foreign keys never need a round trip. ``bulk_insert`` writes
+them in batches with ``COPY ... FROM STDIN`` on PostgreSQL and multi-row
+``INSERT`` elsewhere.
+
+Foreign keys only point at rows that exist: ``fleet_counts`` rejects repairs
+or installations without devices, and test sessions reference the devices,
+test scenarios and operators already present in the Connect++ database.
+
+Used by ``scripts/seed.py`` (staging volumes) and
+``benchmarks/synthetic_fleet.py`` (load-test fleets).
+"""
+import csv
+import io
+import itertools
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import Table, func, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from backend.models.models import (
+    Customer,
+    Device,
+    Repair,
+    Software,
+    SoftwareInstallation,
+    SoftwareVersion,
+)
+
+FLEET_TABLES = [
+    Customer.__table__,
+    Device.__table__,
+    Software.__table__,
+    SoftwareVersion.__table__,
+    SoftwareInstallation.__table__,
+    Repair.__table__,
+]
+
+DEVICE_TYPES = ["mask_tester", "pressure_tester", "flow_meter", "gas_detector", "scba"]
+DEVICE_KINDS = ["PP", "NP", "SP", "FM", "GD"]
+SOFTWARE_CATEGORIES = ["firmware", "application", "driver", "tool"]
+REPAIR_TYPES = ["corrective", "preventive", "upgrade"]
+PRIORITIES = ["low", "medium", "high", "critical"]
+REPAIR_STATUSES = ["pending", "in_progress", "completed", "completed", "completed", "cancelled"]
+INSTALL_STATUSES = ["completed"] * 8 + ["failed", "pending"]
+SENSORS = [("pressure_low", "mbar"), ("pressure_medium", "mbar"), ("pressure_high", "bar")]
+SESSION_REFERENCES = ("devices", "test_scenarios", "users")
+SOFTWARE_COUNT = 50
+VERSIONS_PER_SOFTWARE = 10
+READINGS_PER_SESSION = 1_000
+EPOCH = datetime(2023, 1, 1)
+
+
+class Generator:
+    """Lazily produces rows for each table from a seeded RNG."""
+
+    def __init__(
+        self,
+        seed: int,
+        counts: Dict[str, int],
+        start_ids: Dict[str, int],
+        references: Optional[Dict[str, List[int]]] = None,
+    ):
+        self.rng = random.Random(seed)
+        self.counts = counts
+        self.start = start_ids
+        # Ids of the existing rows test sessions reference, per table (session_references)
+        self.references = references or {}
+
+    def _when(self, days: int = 700) -> datetime:
+        return EPOCH + timedelta(seconds=self.rng.randrange(days * 86400))
+
+    def _pick_id(self, table: str, count_key: str) -> int:
+        return self.start[table] + self.rng.randrange(self.counts[count_key])
+
+    def customers(self) -> Iterator[dict]:
+        for i in range(self.counts["customers"]):
+            cid = self.start["customers"] + i
+            yield {
+                "id": cid,
+                "name": f"Customer {cid:06d}",
+                "contact_info": {"email": f"contact{cid}@example.com", "phone": f"+48{cid:09d}"},
+                "created_at": self._when(),
+            }
+
+    def devices(self) -> Iterator[dict]:
+        rng = self.rng
+        for i in range(self.counts["devices"]):
+            did = self.start["devices"] + i
+            kind = rng.randrange(len(DEVICE_TYPES))
+            yield {
+                "id": did,
+                "device_number": f"SYN-{did:08d}",
+                "device_type": DEVICE_TYPES[kind],
+                "kind_of_device": DEVICE_KINDS[kind],
+                "serial_number": f"SN{rng.randrange(10**10):010d}",
+                "status": "active" if rng.random() < 0.9 else "inactive",
+                "customer_id": self._pick_id("customers", "customers")
+                if self.counts["customers"]
+                else None,
+                "configuration": {"firmware_channel": rng.choice(["stable", "beta"])},
+                "created_at": self._when(),
+            }
+
+    def software(self) -> Iterator[dict]:
+        for i in range(self.counts["software"]):
+            sid = self.start["software"] + i
+            yield {
+                "id": sid,
+                "name": f"Synthetic Package {sid}",
+                "description": "Generated for load testing",
+                "vendor": "Synthetic",
+                "category": SOFTWARE_CATEGORIES[i % len(SOFTWARE_CATEGORIES)],
+                "platform": DEVICE_TYPES[i % len(DEVICE_TYPES)],
+                "license_type": "proprietary",
+                "is_active": True,
+                "created_at": EPOCH,
+            }
+
+    def software_versions(self) -> Iterator[dict]:
+        for i in range(self.counts["software_versions"]):
+            vid = self.start["software_versions"] + i
+            software_index, version_index = divmod(i, VERSIONS_PER_SOFTWARE)
+            yield {
+                "id": vid,
+                "software_id": self.start["software"] + software_index,
+                "version_number": f"1.{version_index}.0",
+                "release_notes": "Synthetic release",
+                "is_stable": version_index % 3 != 2,
+                "is_beta": version_index % 3 == 2,
+                "requires_reboot": False,
+                "created_at": EPOCH + timedelta(days=30 * version_index),
+            }
+
+    def software_installations(self) -> Iterator[dict]:
+        rng = self.rng
+        for i in range(self.counts["installations"]):
+            version_offset = rng.randrange(self.counts["software_versions"])
+            started = self._when()
+            status = rng.choice(INSTALL_STATUSES)
+            yield {
+                "id": self.start["software_installations"] + i,
+                "device_id": self._pick_id("devices", "devices"),
+                "version_id": self.start["software_versions"] + version_offset,
+                "action": "update" if version_offset % VERSIONS_PER_SOFTWARE else "install",
+                "status": status,
+                "started_at": started,
+                "completed_at": started + timedelta(minutes=rng.randrange(1, 30))
+                if status == "completed"
+                else None,
+                "new_version": f"1.{version_offset % VERSIONS_PER_SOFTWARE}.0",
+            }
+
+    def repairs(self) -> Iterator[dict]:
+        rng = self.rng
+        for i in range(self.counts["repairs"]):
+            status = rng.choice(REPAIR_STATUSES)
+            created = self._when()
+            yield {
+                "id": self.start["repairs"] + i,
+                "device_id": self._pick_id("devices", "devices"),
+                "repair_type": rng.choice(REPAIR_TYPES),
+                "priority": rng.choice(PRIORITIES),
+                "status": status,
+                "description": "Synthetic repair",
+                "labor_hours": rng.randrange(0, 12),
+                "cost_estimate": rng.randrange(5_000, 500_000),
+                "created_at": created,
+                "completed_at": created + timedelta(days=rng.randrange(1, 20))
+                if status == "completed"
+                else None,
+            }
+
+    def test_sessions(self) -> Iterator[dict]:
+        rng = self.rng
+        for i in range(self.counts["test_sessions"]):
+            sid = self.start["test_sessions"] + i
+            started = self._when()
+            yield {
+                "id": sid,
+                "session_id": f"SYN-{sid:010d}",
+                "device_id": rng.choice(self.references["devices"]),
+                "scenario_id": rng.choice(self.references["test_scenarios"]),
+                "operator_id": rng.choice(self.references["users"]),
+                "status": "completed",
+                "start_time": started,
+                "end_time": started + timedelta(minutes=15),
+                "total_steps": 10,
+                "result": "PASSED" if rng.random() < 0.95 else "FAILED",
+            }
+
+    def sensor_readings(self) -> Iterator[dict]:
+        rng = self.rng
+        sessions = max(self.counts["test_sessions"], 1)
+        for i in range(self.counts["sensor_readings"]):
+            session_offset = i // READINGS_PER_SESSION % sessions
+            sensor_type, unit = SENSORS[i % len(SENSORS)]
+            yield {
+                "id": self.start["sensor_readings"] + i,
+                "test_session_id": self.start["test_sessions"] + session_offset,
+                "step_id": (i % READINGS_PER_SESSION) // 100,
+                "sensor_type": sensor_type,
+                "sensor_id": f"{sensor_type}-1",
+                "value": round(rng.uniform(-20.0, 300.0), 3),
+                "unit": unit,
+                "timestamp": EPOCH + timedelta(seconds=i),
+            }
+
+
+def _csv_value(value):
+    if value is None:
+        return None
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def bulk_insert(conn: Connection, table: Table, rows: Iterable[dict], batch_size: int) -> int:
+    """Write ``rows`` to ``table`` in batches; COPY on PostgreSQL, multi-row INSERT elsewhere."""
+    total = 0
+    rows = iter(rows)
+    postgres = conn.dialect.name == "postgresql"
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return total
+        if postgres:
+            columns = list(batch[0])
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in batch:
+                writer.writerow([_csv_value(row[c]) for c in columns])
+            buffer.seek(0)
+            cursor = conn.connection.dbapi_connection.cursor()
+            cursor.copy_expert(
+                f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer
+            )
+        else:
+            conn.execute(table.insert(), batch)
+        total += len(batch)
+
+
+def next_id(conn: Connection, table: Table) -> int:
+    return (conn.execute(select(func.max(table.c.id))).scalar() or 0) + 1
+
+
+def reset_sequences(conn: Connection, tables: List[Table]) -> None:
+    if conn.dialect.name != "postgresql":
+        return
+    for table in tables:
+        conn.execute(
+            text(
+                f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                f"(SELECT COALESCE(MAX(id), 1) FROM {table.name}))"
+            )
+        )
+
+
+def fleet_counts(
+    customers: int = 0,
+    devices: int = 0,
+    repairs: int = 0,
+    installations: int = 0,
+    sensor_readings: int = 0,
+) -> Dict[str, int]:
+    """Row counts per generator, including the derived software/session counts.
+
+    Raises ``ValueError`` for repairs or installations without devices to
+    attach them to.
+    """
+    for name, count in (("repairs", repairs), ("installations", installations)):
+        if count and not devices:
+            raise ValueError(f"{name} need devices: pass a device count greater than 0")
+    return {
+        "customers": customers,
+        "devices": devices,
+        "repairs": repairs,
+        "installations": installations,
+        "sensor_readings": sensor_readings,
+        "software": SOFTWARE_COUNT if devices or installations else 0,
+        "software_versions": SOFTWARE_COUNT * VERSIONS_PER_SOFTWARE
+        if devices or installations
+        else 0,
+        "test_sessions": -(-sensor_readings // READINGS_PER_SESSION),
+    }
+
+
+def session_references(conn: Connection) -> Dict[str, List[int]]:
+    """Ids of the devices, test scenarios and operators (users) test sessions may reference."""
+    return {
+        table: list(conn.execute(text(f"SELECT id FROM {table} ORDER BY id")).scalars())
+        for table in SESSION_REFERENCES
+    }
+
+
+def generate_fleet(
+    engine: Engine,
+    counts: Dict[str, int],
+    seed: int = 42,
+    batch_size: int = 10_000,
+    cpp_engine: Optional[Engine] = None,
+    report: Callable[[str], None] = print,
+) -> Dict[str, int]:
+    """Append a synthetic fleet to ``engine`` (and readings to ``cpp_engine``).
+
+    Test sessions reference devices of the Connect++ database; when it is the
+    fleet database itself, the devices generated here count. Raises
+    ``ValueError`` before writing anything when one of the referenced tables
+    would be empty.
+
+    Returns the number of rows written per table.
+    """
+    tables = [(engine, table) for table in FLEET_TABLES]
+    if cpp_engine is not None and counts.get("sensor_readings"):
+        from modules.cpp.backend.app.models.test_models import SensorReading, TestSession
+
+        tables += [(cpp_engine, TestSession.__table__), (cpp_engine, SensorReading.__table__)]
+        # Fail before writing anything when sessions would have nothing to point at
+        with cpp_engine.connect() as conn:
+            references = session_references(conn)
+        if cpp_engine.url == engine.url and counts["devices"]:
+            references.pop("devices")
+        missing = [table for table, ids in references.items() if not ids]
+        if missing:
+            raise ValueError(
+                f"test sessions need existing rows in {', '.join(missing)} "
+                "of the Connect++ database"
+            )
+
+    start_ids = {"test_sessions": 1, "sensor_readings": 1}
+    for table_engine, table in tables:
+        with table_engine.connect() as conn:
+            start_ids[table.name] = next_id(conn, table)
+
+    generator = Generator(seed, counts, start_ids)
+    written = {}
+    for table_engine, table in tables:
+        started = time.perf_counter()
+        if table.name == "test_sessions":
+            with table_engine.connect() as conn:
+                generator.references = session_references(conn)
+        with table_engine.begin() as conn:
+            written[table.name] = bulk_insert(
+                conn, table, getattr(generator, table.name)(), batch_size
+            )
+            reset_sequences(conn, [table])
+        elapsed = time.perf_counter() - started
+        rate = written[table.name] / elapsed if elapsed else 0
+        report(
+            f"  {table.name:<24} {written[table.name]:>12,} rows  {elapsed:8.1f} s  "
+            f"{rate:>12,.0f} rows/s"
+        )
+    return written
@@ -0,0 +1,166 @@
+"""
+Compression benchmark: bytes on the wire and CPU cost per level.
+
+Builds payloads shaped like the largest responses of the API
+(``/fleet-config/backup``, ``/fleet-config/device-configs`` and test report
+``pressure_data``), compresses them with gzip and - if installed - brotli at
+several levels, and prints compressed size, ratio, CPU time and the estimated
+transfer time over slow workshop links.
+
+Usage:
+    python benchmarks/bench_compression.py
+    python benchmarks/bench_compression.py --devices 20000 --json results.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.core.compression import brotli, compress_bytes  # noqa: E402
+
+GZIP_LEVELS = [1, 3, 6, 9]
+BROTLI_QUALITIES = [1, 4, 6, 9, 11]
+# Link speeds in kbit/s: GPRS-ish, slow DSL, typical workshop Wi-Fi
+LINK_SPEEDS_KBPS = [256, 1024, 10240]
+
+
+def device_configs_payload(devices: int) -> bytes:
+    """Shape of GET /fleet-config/device-configs."""
+    rng = random.Random(1)
+    types = ["mask_tester", "pressure_sensor", "flow_meter"]
+    rows = [
+        {
+            "device_id": i,
+            "device_number": f"DEV-{i:06d}",
+            "device_type": types[i % 3],
+            "configuration": {
+                "test_mode": rng.choice(["automatic", "manual"]),
+                "pressure_range": "0-50 mbar",
+                "sensitivity": rng.choice(["low", "medium", "high"]),
+                "calibration_date": (datetime(2024, 1, 1) + timedelta(days=i % 365)).isoformat(),
+            },
+            "status": "active",
+            "last_updated": datetime(2024, 6, 1).isoformat(),
+        }
+        for i in range(devices)
+    ]
+    return json.dumps(rows).encode("utf-8")
+
+
+def backup_payload(devices: int) -> bytes:
+    """Shape of POST /fleet-config/backup."""
+    configs = json.loads(device_configs_payload(devices))
+    data = {
+        "message": "Configuration backup created successfully",
+        "backup_id": "backup_1700000000",
+        "backup_data": {
+            "backup_timestamp": datetime(2024, 6, 1).isoformat(),
+            "device_configurations": [
+                {"id": c["device_id"], "configuration": c["configuration"]} for c in configs
+            ],
+            "test_scenario_configurations": [],
+            "system_configurations": [],
+        },
+    }
+    return json.dumps(data).encode("utf-8")
+
+
+def pressure_data_payload(samples: int) -> bytes:
+    """Shape of a test report with a high-rate pressure_data series."""
+    rng = random.Random(2)
+    start = datetime(2024, 6, 1, 8, 0, 0)
+    series = [
+        {
+            "t": (start + timedelta(milliseconds=10 * i)).isoformat(),
+            "low": round(rng.uniform(0, 5), 3),
+            "medium": round(rng.uniform(10, 20), 3),
+            "high": round(rng.uniform(28, 32), 3),
+        }
+        for i in range(samples)
+    ]
+    return json.dumps({"id": 1, "status": "completed", "pressure_data": series}).encode("utf-8")
+
+
+def measure(payload: bytes, encoding: str, level: int, repeat: int) -> dict:
+    kwargs = {"gzip_level": level} if encoding == "gzip" else {"brotli_quality": level}
+    best = None
+    compressed = b""
+    for _ in range(repeat):
+        start = time.process_time()
+        compressed = compress_bytes(payload, encoding, **kwargs)
+        elapsed = time.process_time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    size = len(compressed)
+    return {
+        "encoding": encoding,
+        "level": level,
+        "bytes": size,
+        "ratio": round(len(payload) / size, 2) if size else 0,
+        "cpu_ms": round(best * 1000, 2),
+        "mb_per_s": round(len(payload) / best / 1e6, 1) if best else 0,
+        "transfer_ms": {
+            str(kbps): round(size * 8 / (kbps * 1000) * 1000, 1) for kbps in LINK_SPEEDS_KBPS
+        },
+    }
+
+
+def run(devices: int, samples: int, repeat: int) -> dict:
+    payloads = {
+        "device_configs": device_configs_payload(devices),
+        "backup": backup_payload(devices),
+        "pressure_data": pressure_data_payload(samples),
+    }
+    results = {}
+    for name, payload in payloads.items():
+        rows = [measure(payload, "gzip", level, repeat) for level in GZIP_LEVELS]
+        if brotli is not None:
+            rows += [measure(payload, "br", q, repeat) for q in BROTLI_QUALITIES]
+        results[name] = {
+            "raw_bytes": len(payload),
+            "raw_transfer_ms": {
+                str(kbps): round(len(payload) * 8 / (kbps * 1000) * 1000, 1)
+                for kbps in LINK_SPEEDS_KBPS
+            },
+            "results": rows,
+        }
+    return results
+
+
+def print_report(results: dict) -> None:
+    speeds = " ".join(f"{k:>9}k" for k in LINK_SPEEDS_KBPS)
+    for name, data in results.items():
+        print(f"\n== {name}: {data['raw_bytes']:,} bytes uncompressed ==")
+        print(f"{'codec':<8}{'lvl':>4}{'bytes':>12}{'ratio':>8}{'cpu ms':>9}{'MB/s':>8}  {speeds}")
+        for row in data["results"]:
+            transfer = " ".join(f"{row['transfer_ms'][str(k)]:>9}ms" for k in LINK_SPEEDS_KBPS)
+            print(
+                f"{row['encoding']:<8}{row['level']:>4}{row['bytes']:>12,}{row['ratio']:>8}"
+                f"{row['cpu_ms']:>9}{row['mb_per_s']:>8}  {transfer}"
+            )
+    if brotli is None:
+        print("\n(brotli not installed - only gzip measured; pip install brotli)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--devices", type=int, default=5000, help="devices in config payloads")
+    parser.add_argument("--samples", type=int, default=30000, help="pressure samples per report")
+    parser.add_argument("--repeat", type=int, default=3, help="repetitions (best time is kept)")
+    parser.add_argument("--json", dest="json_path", help="write raw results to this file")
+    args = parser.parse_args()
+
+    results = run(args.devices, args.samples, args.repeat)
+    print_report(results)
+    if args.json_path:
+        with open(args.json_path, "w") as fh:
+            json.dump(results, fh, indent=2)
+        print(f"\nResults written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Device configuration validation benchmark: throughput of template schemas.
+
+Builds a throwaway SQLite database with one ``device_config`` template and
+``--devices`` devices (a share of them with invalid configurations), then
+measures:
+
+- ``compile_per_document``: compiling the schema for every configuration,
+  what validating without the cache costs,
+- ``compiled``: one compiled schema reused for every configuration,
+- ``validate_devices``: the ``templates.validate_devices`` job end to end -
+  keyset-chunked reads, layer merging and validation.
+
+Uses ``jsonschema`` when installed, the built-in validator otherwise.
+
+Usage:
+    python benchmarks/bench_config_validation.py
+    python benchmarks/bench_config_validation.py --devices 100000 --json results.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from backend.db.base import Base  # noqa: E402
+from backend.models.models import Device, JsonTemplate  # noqa: E402
+from backend.services.config_validation import (  # noqa: E402
+    CompiledSchema,
+    jsonschema,
+    validate_devices,
+)
+
+DEVICE_TYPE = "mask_tester"
+SCHEMA = {
+    "type": "object",
+    "required": ["test_mode", "pressure", "sensitivity"],
+    "properties": {
+        "test_mode": {"enum": ["automatic", "manual"]},
+        "sensitivity": {"type": "string", "enum": ["low", "medium", "high"]},
+        "pressure": {
+            "type": "object",
+            "required": ["min", "max"],
+            "properties": {
+                "min": {"type": "number", "minimum": 0},
+                "max": {"type": "number", "maximum": 50},
+            },
+        },
+        "calibration_date": {"type": "string", "pattern": r"^\d{4}-\d{2}-\d{2}"},
+        "channels": {"type": "array", "items": {"type": "integer"}, "maxItems": 8},
+    },
+}
+DEFAULTS = {"test_mode": "automatic", "pressure": {"min": 0, "max": 30}, "sensitivity": "medium"}
+
+
+def configurations(devices: int, invalid_ratio: float):
+    rng = random.Random(1)
+    for i in range(devices):
+        config = {
+            "sensitivity": rng.choice(["low", "medium", "high"]),
+            "pressure": {"max": rng.randint(20, 50)},
+            "calibration_date": f"2024-{1 + i % 12:02d}-{1 + i % 28:02d}",
+            "channels": list(range(rng.randint(1, 8))),
+        }
+        if rng.random() < invalid_ratio:
+            config["pressure"]["max"] = 80
+            config["sensitivity"] = "extreme"
+        yield config
+
+
+def build_database(path: str, devices: int, invalid_ratio: float):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(JsonTemplate),
+            [
+                {
+                    "id": 1,
+                    "name": "Benchmark template",
+                    "template_type": "device_config",
+                    "category": DEVICE_TYPE,
+                    "schema": SCHEMA,
+                    "default_values": DEFAULTS,
+                    "is_active": True,
+                }
+            ],
+        )
+        batch = []
+        for i, config in enumerate(configurations(devices, invalid_ratio), start=1):
+            batch.append(
+                {
+                    "id": i,
+                    "device_number": f"DEV-{i:06d}",
+                    "device_type": DEVICE_TYPE,
+                    "status": "active",
+                    "configuration": config,
+                }
+            )
+            if len(batch) == 5000:
+                conn.execute(insert(Device), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(Device), batch)
+    return engine
+
+
+def timed(fn) -> tuple:
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def run(devices: int, invalid_ratio: float, sample: int) -> dict:
+    documents = [
+        {**DEFAULTS, **config, "pressure": {**DEFAULTS["pressure"], **config["pressure"]}}
+        for config in configurations(devices, invalid_ratio)
+    ]
+    results = {"devices": devices, "validator": "jsonschema" if jsonschema else "built-in"}
+
+    sampled = documents[:sample]
+    _, elapsed = timed(lambda: [CompiledSchema(SCHEMA).errors(doc) for doc in sampled])
+    results["compile_per_document"] = {
+        "documents": len(sampled),
+        "per_s": round(len(sampled) / elapsed),
+    }
+
+    compiled = CompiledSchema(SCHEMA)
+    invalid, elapsed = timed(lambda: sum(1 for doc in documents if compiled.errors(doc)))
+    results["compiled"] = {
+        "documents": devices,
+        "invalid": invalid,
+        "per_s": round(devices / elapsed),
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = build_database(os.path.join(directory, "bench.db"), devices, invalid_ratio)
+        with Session(engine) as db:
+            report, elapsed = timed(lambda: validate_devices(db, 1))
+        engine.dispose()
+    results["validate_devices"] = {
+        "checked": report["checked"],
+        "invalid": report["invalid"],
+        "seconds": round(elapsed, 2),
+        "per_s": round(report["checked"] / elapsed),
+    }
+    return results
+
+
+def print_report(results: dict) -> None:
+    print(f"{results['devices']:,} configurations, {results['validator']} validator\n")
+    print(f"{'mode':<22}{'documents':>12}{'invalid':>10}{'per second':>14}")
+    for mode in ("compile_per_document", "compiled", "validate_devices"):
+        row = results[mode]
+        count = row.get("documents", row.get("checked"))
+        invalid = row.get("invalid", "")
+        print(f"{mode:<22}{count:>12,}{invalid:>10}{row['per_s']:>14,}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--devices", type=int, default=100000, help="device configurations")
+    parser.add_argument("--invalid", type=float, default=0.05, help="share of invalid configs")
+    parser.add_argument("--sample", type=int, default=5000, help="documents compiled one by one")
+    parser.add_argument("--json", dest="json_path", help="write raw results to this file")
+    args = parser.parse_args()
+
+    results = run(args.devices, args.invalid, args.sample)
+    print_report(results)
+    if args.json_path:
+        with open(args.json_path, "w") as fh:
+            json.dump(results, fh, indent=2)
+        print(f"\nResults written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Import-time benchmark and regression gate for application startup.
+
+Runs ``python -X importtime -c "import main"`` in a fresh interpreter (several
+times, keeping the best run) for each module allowlist and reports the
+cumulative import time of ``main`` together with the slowest imports.
+
+Usage:
+    python benchmarks/bench_import_time.py
+    python benchmarks/bench_import_time.py --modules fwm,fdm --max-ms 1500
+    python benchmarks/bench_import_time.py --save baseline.json
+    python benchmarks/bench_import_time.py --baseline baseline.json --tolerance 0.2
+
+Exit status is 1 when ``--max-ms`` is exceeded or the run is slower than the
+baseline by more than ``--tolerance``, so it can be used as a CI gate.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """Parse ``-X importtime`` output into (module, self_us, cumulative_us)."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, _, rest = line.partition(":")
+        parts = [p.strip() for p in rest.split("|")]
+        if len(parts) != 3:
+            continue
+        try:
+            rows.append((parts[2].strip(), int(parts[0]), int(parts[1])))
+        except ValueError:
+            continue
+    return rows
+
+
+def measure(allowlist: str, runs: int) -> Dict:
+    best = None
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ)
+            env["ENABLED_MODULES"] = allowlist
+            env.setdefault("DATABASE_URL", f"sqlite:///{tmp}/bench.db")
+            proc = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", "import main"],
+                cwd=ROOT,
+                env=env,
+                capture_output=True,
+                text=True,
+            )
+        if proc.returncode != 0:
+            raise RuntimeError(f"import main failed:\n{proc.stderr[-2000:]}")
+        rows = parse_importtime(proc.stderr)
+        total = next((cum for name, _, cum in rows if name == "main"), None)
+        if total is None:
+            raise RuntimeError("could not find 'main' in -X importtime output")
+        if best is None or total < best["total_us"]:
+            slowest = sorted(((name, cum) for name, _, cum in rows), key=lambda r: r[1])[::-1]
+            best = {
+                "allowlist": allowlist or "<all>",
+                "total_us": total,
+                "modules_imported": len(rows),
+                "slowest": [{"module": n, "cumulative_us": c} for n, c in slowest[:15]],
+            }
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure 'import main' time")
+    parser.add_argument(
+        "--modules",
+        action="append",
+        help="ENABLED_MODULES allowlist to measure (repeatable, default: all and fwm,fdm)",
+    )
+    parser.add_argument("--runs", type=int, default=5, help="runs per allowlist (best is kept)")
+    parser.add_argument("--max-ms", type=float, help="fail if any allowlist exceeds this")
+    parser.add_argument("--baseline", help="JSON file produced by --save to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown ratio")
+    parser.add_argument("--save", help="write results to this JSON file")
+    args = parser.parse_args()
+
+    allowlists = args.modules or ["", "fwm,fdm"]
+    results = [measure(allowlist, args.runs) for allowlist in allowlists]
+
+    failed = False
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = {r["allowlist"]: r["total_us"] for r in json.load(fh)}
+
+    for result in results:
+        total_ms = result["total_us"] / 1000
+        print(
+            f"\n== ENABLED_MODULES={result['allowlist']}: {total_ms:.1f} ms "
+            f"({result['modules_imported']} modules) =="
+        )
+        for row in result["slowest"][:10]:
+            print(f"  {row['cumulative_us'] / 1000:>8.1f} ms  {row['module']}")
+
+        if args.max_ms is not None and total_ms > args.max_ms:
+            print(f"  ❌ exceeds budget of {args.max_ms:.0f} ms")
+            failed = True
+        reference = baseline.get(result["allowlist"])
+        if reference and result["total_us"] > reference * (1 + args.tolerance):
+            print(
+                f"  ❌ {result['total_us'] / reference:.2f}x slower than baseline "
+                f"({reference / 1000:.1f} ms)"
+            )
+            failed = True
+
+    if args.save:
+        with open(args.save, "w") as fh:
+            json.dump(results, fh, indent=2)
+        print(f"\nResults written to {args.save}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
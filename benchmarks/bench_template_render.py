@@ -0,0 +1,80 @@
+"""
+Cold page-render benchmark for the shared Jinja environment.
+
+Simulates the first request after a deploy: a fresh interpreter renders every
+module page once. Runs with an empty bytecode cache (first worker after a
+deploy), with a populated one (every other worker / restart) and with the
+bytecode cache disabled.
+
+Usage:
+    python benchmarks/bench_template_render.py [--runs 5]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAGES = {
+    "home": "static/common/templates",
+    "cpp": "pages/cpp",
+    "cd": "pages/cd",
+    "cm": "pages/cm",
+    "fdm": "pages/fdm",
+    "fcm": "pages/fcm",
+    "fsm": "pages/fsm",
+    "fwm": "pages/fwm",
+}
+
+RENDER_SNIPPET = """
+import json, time
+from modules.templating import get_shared_templates, register_template_directory
+pages = json.loads(%r)
+for prefix, directory in pages.items():
+    register_template_directory(prefix, directory)
+start = time.perf_counter()
+env = get_shared_templates().env
+for prefix in pages:
+    env.get_template(prefix + "/index.html").render({"request": None})
+print(json.dumps({"ms": (time.perf_counter() - start) * 1000}))
+"""
+
+
+def render_once(cache_dir: str) -> float:
+    env = dict(os.environ)
+    env["TEMPLATE_BYTECODE_CACHE_DIR"] = cache_dir
+    proc = subprocess.run(
+        [sys.executable, "-c", RENDER_SNIPPET % json.dumps(PAGES)],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    return json.loads(proc.stdout.strip().splitlines()[-1])["ms"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure cold page-render latency")
+    parser.add_argument("--runs", type=int, default=5, help="runs per scenario (best is kept)")
+    args = parser.parse_args()
+
+    no_cache, cold, warm = [], [], []
+    for _ in range(args.runs):
+        no_cache.append(render_once(""))
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cold.append(render_once(cache_dir))
+            warm.append(render_once(cache_dir))
+
+    print(f"Rendering {len(PAGES)} pages in a fresh process (best of {args.runs}):")
+    print(f"  bytecode cache disabled : {min(no_cache):8.1f} ms")
+    print(f"  empty bytecode cache    : {min(cold):8.1f} ms")
+    print(f"  warm bytecode cache     : {min(warm):8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
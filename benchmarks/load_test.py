@@ -0,0 +1,342 @@
+"""
+Scripted load test producing comparable latency reports.
+
+Runs each scenario for ``--duration`` seconds with ``--concurrency`` workers
+against a running server (fill it first with ``benchmarks/synthetic_fleet.py``)
+and writes a JSON report with count, errors, p50/p95/p99 latency and
+throughput per endpoint, keyed by route template (``GET /api/v1/fleet-data/
+devices``) so reports from different commits can be compared.
+
+Scenarios: login, dashboards, paging, search, installations (add ``--writes``
+to also create installations) and cpp_ws (sensor readings over the Connect++
+WebSocket, needs ``--cpp-url``).
+
+Usage:
+    python benchmarks/load_test.py --save reports/HEAD.json
+    python benchmarks/load_test.py --scenarios paging,search --concurrency 32
+    python benchmarks/load_test.py --baseline reports/main.json --tolerance 0.2
+
+Exit status is 1 when an endpoint's p95 is slower than the baseline by more
+than ``--tolerance``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SEARCH_TERMS = ["valve", "filter", "SN1", "Synthetic", "mask", "seal", "pump"]
+SENSOR_TYPES = ["pressure_low", "pressure_medium", "pressure_high"]
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    """Latencies and errors per endpoint key."""
+
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def add(self, key: str, seconds: float, ok: bool) -> None:
+        self.latencies[key].append(seconds)
+        if not ok:
+            self.errors[key] += 1
+
+    def summary(self, elapsed: float) -> Dict[str, dict]:
+        result = {}
+        for key, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            result[key] = {
+                "count": len(values),
+                "errors": self.errors.get(key, 0),
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p95_ms": round(percentile(values, 95) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2),
+                "mean_ms": round(sum(values) / len(values) * 1000, 2),
+                "max_ms": round(values[-1] * 1000, 2),
+                "throughput_rps": round(len(values) / elapsed, 2) if elapsed else 0.0,
+            }
+        return result
+
+
+class Context:
+    """Shared state of one load-test run."""
+
+    def __init__(self, args: argparse.Namespace, client: httpx.AsyncClient, token: str):
+        self.args = args
+        self.client = client
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.recorder = Recorder()
+        self.rng = random.Random(args.seed)
+        self.api = "/api/v1"
+
+    async def request(
+        self, method: str, route: str, url: str, **kwargs
+    ) -> Optional[httpx.Response]:
+        kwargs.setdefault("headers", self.headers)
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            response, ok = None, False
+        self.recorder.add(f"{method} {route}", time.perf_counter() - start, ok)
+        return response
+
+    def page(self, rows: int, limit: int = 100) -> int:
+        return self.rng.randrange(max(rows // limit, 1)) * limit
+
+
+async def scenario_login(ctx: Context) -> None:
+    route = f"{ctx.api}/auth/login"
+    await ctx.request(
+        "POST",
+        route,
+        route,
+        headers={},
+        data={"username": ctx.args.username, "password": ctx.args.password},
+    )
+
+
+async def scenario_dashboards(ctx: Context) -> None:
+    for path in (
+        "/fleet-data/dashboard",
+        "/fleet-software/dashboard/stats",
+        "/fleet-workshop/dashboard",
+    ):
+        route = ctx.api + path
+        await ctx.request("GET", route, route)
+
+
+async def scenario_paging(ctx: Context) -> None:
+    devices = ctx.args.devices
+    await ctx.request(
+        "GET",
+        f"{ctx.api}/fleet-data/devices",
+        f"{ctx.api}/fleet-data/devices",
+        params={"skip": ctx.page(devices), "limit": 100},
+    )
+    await ctx.request(
+        "GET",
+        f"{ctx.api}/fleet-workshop/repairs",
+        f"{ctx.api}/fleet-workshop/repairs",
+        params={"skip": ctx.page(devices // 10), "limit": 100},
+    )
+    device_id = ctx.rng.randrange(1, devices + 1)
+    await ctx.request(
+        "GET",
+        f"{ctx.api}/fleet-data/devices/{{device_id}}",
+        f"{ctx.api}/fleet-data/devices/{device_id}",
+    )
+
+
+async def scenario_search(ctx: Context) -> None:
+    term = ctx.rng.choice(SEARCH_TERMS)
+    await ctx.request(
+        "GET",
+        f"{ctx.api}/fleet-workshop/parts",
+        f"{ctx.api}/fleet-workshop/parts",
+        params={"search": term, "limit": 50},
+    )
+    await ctx.request(
+        "GET",
+        f"{ctx.api}/fleet-software/software",
+        f"{ctx.api}/fleet-software/software",
+        params={"search": term, "limit": 50},
+    )
+
+
+async def scenario_installations(ctx: Context) -> None:
+    device_id = ctx.rng.randrange(1, ctx.args.devices + 1)
+    route = f"{ctx.api}/fleet-software/installations"
+    await ctx.request("GET", route, route, params={"device_id": device_id, "limit": 50})
+    await ctx.request(
+        "GET", route, route, params={"skip": ctx.page(ctx.args.devices), "limit": 100}
+    )
+    if ctx.args.writes:
+        await ctx.request(
+            "POST",
+            route,
+            route,
+            json={
+                "device_id": device_id,
+                "version_id": ctx.rng.randrange(1, ctx.args.versions + 1),
+                "action": "update",
+            },
+        )
+
+
+async def scenario_cpp_ws(ctx: Context) -> None:
+    import websockets
+
+    session_id = f"LOAD-{ctx.rng.randrange(10**6):06d}"
+    url = f"{ctx.args.cpp_url.rstrip('/')}/api/v1/tests/ws/{session_id}"
+    key = "WS /api/v1/tests/ws/{test_session_id} sensor_reading"
+    try:
+        async with websockets.connect(url) as ws:
+            for _ in range(ctx.args.ws_messages):
+                message = {
+                    "type": "sensor_reading",
+                    "data": {
+                        "sensor_type": ctx.rng.choice(SENSOR_TYPES),
+                        "value": round(ctx.rng.uniform(-20, 300), 3),
+                        "unit": "mbar",
+                    },
+                }
+                start = time.perf_counter()
+                await ws.send(json.dumps(message))
+                reply = json.loads(await ws.recv())
+                ctx.recorder.add(
+                    key, time.perf_counter() - start, reply.get("type") == "sensor_update_confirmed"
+                )
+    except (OSError, websockets.WebSocketException):
+        ctx.recorder.add(key, 0.0, False)
+
+
+SCENARIOS: Dict[str, Callable] = {
+    "login": scenario_login,
+    "dashboards": scenario_dashboards,
+    "paging": scenario_paging,
+    "search": scenario_search,
+    "installations": scenario_installations,
+    "cpp_ws": scenario_cpp_ws,
+}
+
+
+async def run_scenario(ctx: Context, scenario: Callable) -> float:
+    deadline = time.perf_counter() + ctx.args.duration
+
+    async def worker() -> None:
+        while time.perf_counter() < deadline:
+            await scenario(ctx)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(ctx.args.concurrency)))
+    return time.perf_counter() - started
+
+
+async def run(args: argparse.Namespace) -> dict:
+    limits = httpx.Limits(
+        max_connections=args.concurrency, max_keepalive_connections=args.concurrency
+    )
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=30) as client:
+        login = await client.post(
+            "/api/v1/auth/login", data={"username": args.username, "password": args.password}
+        )
+        login.raise_for_status()
+        ctx = Context(args, client, login.json()["access_token"])
+
+        endpoints = {}
+        for name in args.scenarios:
+            if name == "cpp_ws" and not args.cpp_url:
+                print("  cpp_ws skipped (pass --cpp-url)")
+                continue
+            ctx.recorder = Recorder()
+            elapsed = await run_scenario(ctx, SCENARIOS[name])
+            for key, stats in ctx.recorder.summary(elapsed).items():
+                endpoints[key] = dict(stats, scenario=name)
+    return endpoints
+
+
+def git_commit() -> Optional[str]:
+    try:
+        proc = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True
+        )
+    except OSError:
+        return None
+    return proc.stdout.strip() or None
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> bool:
+    failed = False
+    print("\nComparison with baseline (p95):")
+    for key, stats in report["endpoints"].items():
+        reference = baseline.get("endpoints", {}).get(key)
+        if not reference or not reference["p95_ms"]:
+            continue
+        ratio = stats["p95_ms"] / reference["p95_ms"]
+        marker = "❌" if ratio > 1 + tolerance else "  "
+        failed |= ratio > 1 + tolerance
+        print(
+            f"  {marker} {key:<60} {reference['p95_ms']:>9.1f} -> {stats['p95_ms']:>9.1f} ms "
+            f"({ratio:.2f}x)"
+        )
+    return failed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run scripted load-test scenarios")
+    parser.add_argument("--base-url", default="http://localhost:5000")
+    parser.add_argument("--cpp-url", help="Connect++ base URL for cpp_ws, e.g. ws://localhost:8080")
+    parser.add_argument(
+        "--scenarios",
+        default="login,dashboards,paging,search,installations,cpp_ws",
+        type=lambda value: [s for s in value.split(",") if s],
+        help="comma separated scenarios",
+    )
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="pass")
+    parser.add_argument("--devices", type=int, default=1_000, help="fleet size for paging/ids")
+    parser.add_argument("--versions", type=int, default=500, help="software versions for writes")
+    parser.add_argument("--writes", action="store_true", help="include write requests")
+    parser.add_argument("--ws-messages", type=int, default=50, help="readings per WebSocket")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 slowdown ratio")
+    args = parser.parse_args()
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    endpoints = asyncio.run(run(args))
+    report = {
+        "commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "base_url": args.base_url,
+        "duration_s": args.duration,
+        "concurrency": args.concurrency,
+        "endpoints": endpoints,
+    }
+
+    print(f"\n{'endpoint':<62} {'count':>7} {'err':>5} {'p50':>8} {'p95':>8} {'p99':>8} {'rps':>8}")
+    for key, stats in endpoints.items():
+        print(
+            f"{key:<62} {stats['count']:>7} {stats['errors']:>5} {stats['p50_ms']:>8.1f} "
+            f"{stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f} {stats['throughput_rps']:>8.1f}"
+        )
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"\nReport written to {args.save}")
+
+    failed = False
+    if args.baseline:
+        with open(args.baseline) as fh:
+            failed = compare(report, json.load(fh), args.tolerance)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Bulk synthetic-fleet generator for load tests and benchmarks.
+
+Appends a reproducible (``--seed``) fleet to the database using
+``backend/services/synthetic.py``: customers, devices, software catalogue,
+installations, repairs and - in the Connect++ database - test sessions with
+sensor readings (``COPY`` on PostgreSQL, multi-row ``INSERT`` elsewhere).
+
+Scales (rows):
+
+    tiny    1k devices,  100 customers,   1k repairs,  1k installations, 100k readings
+    small  50k devices,   1k customers,  10k repairs, 50k installations,   5M readings
+    full    1M devices,  10k customers, 100k repairs,  1M installations, 100M readings
+
+Usage:
+    python benchmarks/synthetic_fleet.py --scale tiny
+    python benchmarks/synthetic_fleet.py --scale full --database-url postgresql://... \\
+        --cpp-database-url postgresql://...
+    python benchmarks/synthetic_fleet.py --devices 200000 --repairs 0
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import create_engine  # noqa: E402
+
+SCALES = {
+    "tiny": dict(
+        customers=100, devices=1_000, repairs=1_000, installations=1_000, sensor_readings=100_000
+    ),
+    "small": dict(
+        customers=1_000,
+        devices=50_000,
+        repairs=10_000,
+        installations=50_000,
+        sensor_readings=5_000_000,
+    ),
+    "full": dict(
+        customers=10_000,
+        devices=1_000_000,
+        repairs=100_000,
+        installations=1_000_000,
+        sensor_readings=100_000_000,
+    ),
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic fleet for load tests")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="tiny")
+    parser.add_argument("--database-url", help="fleet database (default: DATABASE_URL setting)")
+    parser.add_argument(
+        "--cpp-database-url", help="Connect++ database for test sessions / sensor readings"
+    )
+    for name in SCALES["tiny"]:
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, help=f"override {name} count")
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=42, help="RNG seed (same seed, same data)")
+    args = parser.parse_args()
+
+    from backend.core.config import settings
+    from backend.models.models import Base
+    from backend.services.synthetic import fleet_counts, generate_fleet
+
+    sizes = dict(SCALES[args.scale])
+    for name in sizes:
+        override = getattr(args, name)
+        if override is not None:
+            sizes[name] = override
+
+    try:
+        counts = fleet_counts(**sizes)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    engine = create_engine(args.database_url or settings.database_url)
+    Base.metadata.create_all(bind=engine)
+    cpp_engine = create_engine(args.cpp_database_url) if args.cpp_database_url else None
+
+    print(f"Generating synthetic fleet (scale={args.scale}, seed={args.seed})")
+    started = time.perf_counter()
+    try:
+        generate_fleet(engine, counts, args.seed, args.batch_size, cpp_engine)
+    except ValueError as exc:
+        parser.error(str(exc))
+    if cpp_engine is None and sizes["sensor_readings"]:
+        print("  sensor_readings skipped (pass --cpp-database-url to generate them)")
+    print(f"Done in {time.perf_counter() - started:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,54 +1,114 @@
 """
 Fleet Management System - Modular Architecture
 Module Registry and Loader
+
+Modules are registered with import strings ("package.module:attribute")
+instead of router objects, so nothing is imported until the application
+includes the module. A deployment allowlist (``ENABLED_MODULES``) decides
+which modules are included at all - a workshop-only node never imports the
+FSM/FCM routers or builds their templates.
 """
-from typing import Dict, List, Callable
+import importlib
+from typing import Dict, Iterable, List, Optional
 from fastapi import FastAPI, APIRouter
 
+
+def import_string(spec: str):
+    """Import ``"package.module:attribute"`` and return the attribute."""
+    module_path, _, attribute = spec.partition(":")
+    module = importlib.import_module(module_path)
+    return getattr(module, attribute or "router")
+
+
 class ModuleRegistry:
     """Central registry for all fleet management modules."""
-    
+
     def __init__(self):
         self.modules: Dict[str, dict] = {}
-        self._registered_routers: List[APIRouter] = []
-    
+        self._loaded_routers: Dict[str, APIRouter] = {}
+
     def register_module(
         self,
         code: str,
         name: str,
-        router: APIRouter,
+        router: str,
         role: str,
         description: str = "",
         icon: str = "",
-        color: str = ""
+        color: str = "",
+        path: Optional[str] = None,
+        api_routers: Optional[List[str]] = None,
+        required: bool = False,
     ):
-        """Register a new module with the system."""
+        """Register a new module with the system.
+
+        Args:
+            code: Short module code used in the ``ENABLED_MODULES`` allowlist
+            name: Human readable name, also used as the OpenAPI tag of the pages
+            router: Import string of the page router, e.g. ``"modules.cm:router"``
+            role: Role required to use the module
+            path: Page URL, defaults to ``/<code>``
+            api_routers: Import strings of the module's API routers
+            required: Always included, regardless of the allowlist
+        """
         self.modules[code] = {
             "code": code,
             "name": name,
             "router": router,
+            "api_routers": list(api_routers or []),
             "role": role,
             "description": description,
             "icon": icon,
             "color": color,
-            "path": f"/{code.replace('_', '-')}"
+            "path": path or f"/{code.replace('_', '-')}",
+            "required": required,
         }
-        self._registered_routers.append(router)
-    
+
     def get_module(self, code: str) -> dict:
         """Get module by code."""
         return self.modules.get(code)
-    
+
     def get_all_modules(self) -> Dict[str, dict]:
         """Get all registered modules."""
         return self.modules
-    
-    def get_routers(self) -> List[APIRouter]:
-        """Get all registered routers for FastAPI."""
-        return self._registered_routers
-    
-    def get_navigation_items(self) -> List[dict]:
-        """Get navigation items for all modules."""
+
+    def enabled_modules(self, allowlist: Optional[Iterable[str]] = None) -> List[dict]:
+        """Modules allowed on this deployment (all of them when allowlist is empty)."""
+        allowed = {code.strip() for code in (allowlist or []) if code and code.strip()}
+        return [
+            mod
+            for mod in self.modules.values()
+            if not allowed or mod["required"] or mod["code"] in allowed
+        ]
+
+    def load_router(self, spec: str) -> APIRouter:
+        """Import a router on first use and cache it."""
+        if spec not in self._loaded_routers:
+            self._loaded_routers[spec] = import_string(spec)
+        return self._loaded_routers[spec]
+
+    def get_routers(self, allowlist: Optional[Iterable[str]] = None) -> List[APIRouter]:
+        """Get page routers of enabled modules (imports them on first call)."""
+        return [self.load_router(mod["router"]) for mod in self.enabled_modules(allowlist)]
+
+    def include_modules(
+        self, app: FastAPI, allowlist: Optional[Iterable[str]] = None, api_prefix: str = ""
+    ) -> List[str]:
+        """Include page and API routers of all enabled modules into the app.
+
+        Returns:
+            Codes of the included modules
+        """
+        included = []
+        for mod in self.enabled_modules(allowlist):
+            for spec in mod["api_routers"]:
+                app.include_router(self.load_router(spec), prefix=api_prefix)
+            app.include_router(self.load_router(mod["router"]), tags=[mod["name"]])
+            included.append(mod["code"])
+        return included
+
+    def get_navigation_items(self, allowlist: Optional[Iterable[str]] = None) -> List[dict]:
+        """Get navigation items for enabled modules."""
         return [
             {
                 "code": mod["code"],
@@ -58,7 +118,8 @@ class ModuleRegistry:
                 "role": mod["role"],
                 "color": mod["color"]
             }
-            for mod in self.modules.values()
+            for mod in self.enabled_modules(allowlist)
+            if not mod["required"]
         ]
 
 # Global module registry instance
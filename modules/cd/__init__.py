@@ -1,15 +1,16 @@
 from fastapi import APIRouter, Request
 from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
 from pathlib import Path
 
+from modules.templating import LazyTemplates
+
 router = APIRouter()
 
 # Setup templates directory
 templates_dir = Path("pages/cd")
-templates = Jinja2Templates(directory=str(templates_dir))
+templates = LazyTemplates(directory=str(templates_dir), prefix="cd")
 
 @router.get("/connect-display", response_class=HTMLResponse)
 async def connect_display_page(request: Request):
     """Render Connect Display page"""
-    return templates.TemplateResponse("index.html", {"request": request})
\ No newline at end of file
+    return templates.PageResponse("index.html", {"request": request})
\ No newline at end of file
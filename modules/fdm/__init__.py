@@ -1,15 +1,16 @@
 from fastapi import APIRouter, Request
 from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
 from pathlib import Path
 
+from modules.templating import LazyTemplates
+
 router = APIRouter()
 
 # Setup templates directory
 templates_dir = Path("pages/fdm")
-templates = Jinja2Templates(directory=str(templates_dir))
+templates = LazyTemplates(directory=str(templates_dir), prefix="fdm")
 
 @router.get("/fleet-data-manager", response_class=HTMLResponse)
 async def fleet_data_manager_page(request: Request):
     """Render Fleet Data Manager page"""
-    return templates.TemplateResponse("index.html", {"request": request})
\ No newline at end of file
+    return templates.PageResponse("index.html", {"request": request})
\ No newline at end of file
@@ -4,9 +4,10 @@ Manages device software, versions, and installations
 """
 from fastapi import APIRouter, Request
 from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
 from pathlib import Path
 
+from modules.templating import LazyTemplates
+
 # Module metadata
 MODULE_CODE = "fsm"
 MODULE_NAME = "Fleet Software Manager"
@@ -20,14 +21,14 @@ router = APIRouter(tags=["Fleet Software Manager"])
 
 # Setup templates directory
 templates_dir = Path("pages/fsm")
-templates = Jinja2Templates(directory=str(templates_dir))
+templates = LazyTemplates(directory=str(templates_dir), prefix="fsm")
 
 @router.get("/fleet-software-manager", response_class=HTMLResponse)
 async def fleet_software_manager_page(request: Request):
     """Render Fleet Software Manager page"""
-    return templates.TemplateResponse("index.html", {"request": request})
+    return templates.PageResponse("index.html", {"request": request})
 
 @router.get("/fsm-modular", response_class=HTMLResponse)
 async def fsm_modular_page(request: Request):
     """Render Fleet Software Manager modular version page"""
-    return templates.TemplateResponse("index.html", {"request": request, "modular": True})
+    return templates.PageResponse("index.html", {"request": request, "modular": True})
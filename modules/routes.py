@@ -1,35 +1,95 @@
 """
 Module routes configuration
-This file imports and configures all module routers for the FastAPI application
+This file registers all modules in the ModuleRegistry - the single place where
+page routers and module API routers are wired into the FastAPI application.
+Routers are referenced by import string and only imported for enabled modules.
 """
 from fastapi import FastAPI
 
-# Import module routers
-from static.common import router as common_router
-from modules.cpp import router as cpp_router
-from modules.cd import router as cd_router
-from modules.cm import router as cm_router
-from modules.fdm import router as fdm_router
-from modules.fcm import router as fcm_router
-from modules.fsm import router as fsm_router
-from modules.fwm import router as fwm_router
+from backend.core.config import settings
+from modules import registry
+
+registry.register_module(
+    code="home",
+    name="Home",
+    router="static.common:router",
+    role="",
+    path="/",
+    required=True,
+)
+registry.register_module(
+    code="cpp",
+    name="Connect Plus",
+    router="modules.cpp:router",
+    role="operator",
+    icon="🔗",
+    path="/connect-plus",
+)
+registry.register_module(
+    code="cd",
+    name="Connect Display",
+    router="modules.cd:router",
+    role="operator",
+    icon="📺",
+    path="/connect-display",
+)
+registry.register_module(
+    code="cm",
+    name="Connect Manager",
+    router="modules.cm:router",
+    api_routers=["backend.api.scenarios_router:router"],
+    role="superuser",
+    icon="⚙️",
+    path="/connect-manager",
+)
+registry.register_module(
+    code="fdm",
+    name="Fleet Data Manager",
+    router="modules.fdm:router",
+    api_routers=["backend.api.fleet_data_router:router"],
+    role="manager",
+    icon="📊",
+    path="/fleet-data-manager",
+)
+registry.register_module(
+    code="fcm",
+    name="Fleet Config Manager",
+    router="modules.fcm:router",
+    api_routers=["backend.api.fleet_config_router:router"],
+    role="configurator",
+    icon="🔧",
+    path="/fleet-config-manager",
+)
+registry.register_module(
+    code="fsm",
+    name="Fleet Software Manager",
+    router="modules.fsm:router",
+    api_routers=["backend.api.fleet_software_router:router"],
+    role="maker",
+    icon="💿",
+    color="#27ae60",
+    path="/fleet-software-manager",
+)
+registry.register_module(
+    code="fwm",
+    name="Fleet Workshop Manager",
+    router="modules.fwm:router",
+    api_routers=["backend.api.fleet_workshop_router:router"],
+    role="manager",
+    icon="🔧",
+    path="/fleet-workshop-manager",
+)
 
 
 def include_module_routes(app: FastAPI):
     """
-    Include all module routers in the FastAPI application
-    
+    Include page and API routers of all enabled modules in the FastAPI application
+
     Args:
         app: FastAPI application instance
     """
-    # Include page routers (no prefix - direct URL mapping)
-    app.include_router(common_router, tags=["Home"])
-    app.include_router(cpp_router, tags=["Connect Plus"])
-    app.include_router(cd_router, tags=["Connect Display"])
-    app.include_router(cm_router, tags=["Connect Manager"])
-    app.include_router(fdm_router, tags=["Fleet Data Manager"])
-    app.include_router(fcm_router, tags=["Fleet Config Manager"])
-    app.include_router(fsm_router, tags=["Fleet Software Manager"])
-    app.include_router(fwm_router, tags=["Fleet Workshop Manager"])
-    
-    print("✅ Module routes included successfully")
+    included = registry.include_modules(
+        app, allowlist=settings.enabled_modules, api_prefix=settings.api_v1_str
+    )
+
+    print(f"✅ Module routes included successfully: {', '.join(included)}")
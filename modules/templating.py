@@ -0,0 +1,122 @@
+"""
+Shared Jinja2 environment for module pages.
+
+All modules render through one ``Jinja2Templates`` instance whose
+``PrefixLoader`` maps each module code to its ``pages/<code>`` directory, so
+templates are compiled and cached once per worker instead of once per module.
+Compiled bytecode is stored in a ``FileSystemBytecodeCache`` shared by all
+workers of the same user, which removes most of the compile cost from the
+first request after a deploy. The cache directory is executed from, so one
+not owned by the process user or writable by others is refused.
+
+Pages rendered without per-user context can additionally be cached as final
+HTML (``TEMPLATE_PAGE_CACHE=true``).
+"""
+import logging
+import os
+import stat
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache, FileSystemLoader, PrefixLoader
+from starlette.responses import HTMLResponse
+
+from backend.core.assets import asset_url, manifest
+from backend.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_loader = PrefixLoader({}, delimiter="/")
+_shared_templates: Optional[Jinja2Templates] = None
+_page_cache: Dict[Tuple[str, Hashable], bytes] = {}
+
+
+def register_template_directory(prefix: str, directory: str) -> None:
+    """Make ``directory`` available as ``<prefix>/<template>`` in the shared env."""
+    _loader.mapping[prefix] = FileSystemLoader(directory)
+
+
+def _bytecode_cache(directory: Optional[str]) -> Optional[FileSystemBytecodeCache]:
+    if directory is None:
+        # Jinja's default: a per-user 0700 directory whose owner it checks
+        return FileSystemBytecodeCache()
+    if not directory:
+        return None
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.stat(directory)
+    if info.st_uid != os.getuid() or info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        logger.warning(
+            "Template bytecode cache disabled: %s is not owned by this user "
+            "or is writable by others",
+            directory,
+        )
+        return None
+    return FileSystemBytecodeCache(directory)
+
+
+def get_shared_templates() -> Jinja2Templates:
+    """Return the process-wide templates instance, creating it on first use."""
+    global _shared_templates
+    if _shared_templates is None:
+        templates = Jinja2Templates(
+            directory=".",
+            loader=_loader,
+            bytecode_cache=_bytecode_cache(settings.template_bytecode_cache_dir),
+            auto_reload=settings.template_auto_reload,
+            cache_size=-1,
+        )
+        templates.env.globals["asset_url"] = asset_url
+        _shared_templates = templates
+    return _shared_templates
+
+
+def clear_page_cache() -> None:
+    """Drop all cached page renders."""
+    _page_cache.clear()
+
+
+def _page_cache_key(name: str, context: dict) -> Optional[Tuple[str, Hashable]]:
+    # rendered pages embed fingerprinted asset_url()s, so a rebuild invalidates them
+    extra = tuple(sorted((k, v) for k, v in context.items() if k != "request"))
+    try:
+        hash(extra)
+    except TypeError:
+        return None
+    return name, (manifest.version, extra)
+
+
+class LazyTemplates:
+    """Per-module view on the shared environment.
+
+    Keeps the ``templates.TemplateResponse("index.html", {...})`` call used by
+    the module routers; ``name`` is resolved inside the module's prefix.
+    """
+
+    def __init__(self, directory: str, prefix: str):
+        self.directory = directory
+        self.prefix = prefix
+        register_template_directory(prefix, directory)
+
+    @property
+    def templates(self) -> Jinja2Templates:
+        return get_shared_templates()
+
+    def TemplateResponse(self, name: str, context: dict, *args: Any, **kwargs: Any):
+        return self.templates.TemplateResponse(f"{self.prefix}/{name}", context, *args, **kwargs)
+
+    def PageResponse(self, name: str, context: dict) -> HTMLResponse:
+        """Render a page that has no per-user context, caching the HTML if enabled.
+
+        Only hashable context values besides ``request`` take part in the cache
+        key; pages with unhashable context are rendered every time.
+        """
+        key = _page_cache_key(f"{self.prefix}/{name}", context)
+        if not settings.template_page_cache or key is None:
+            return self.TemplateResponse(name, context)
+
+        body = _page_cache.get(key)
+        if body is None:
+            template = self.templates.get_template(key[0])
+            body = template.render(context).encode("utf-8")
+            _page_cache[key] = body
+        return HTMLResponse(body)
@@ -1,4 +1,5 @@
 let authToken = null;
+let eventStream = null;
 let systemConfigs = [];
 let deviceConfigs = [];
 let testScenarios = [];
@@ -312,11 +313,44 @@ function updateAuthUI() {
         loadDeviceConfigs();
         loadTestScenarios();
         loadJsonTemplates();
+        startEventStream();
     } else {
         document.getElementById('auth-message').innerHTML =
             '<span style="color: #e74c3c;">❌ Niezalogowany</span>';
         document.getElementById('role-switcher').style.display = 'none';
         clearData();
+        stopEventStream();
+    }
+}
+
+// Change events: re-fetch only the lists a change touches
+const reloadDashboard = debounce(loadDashboard);
+const configReloads = {
+    'system_config.': debounce(loadSystemConfigs),
+    'device_config.': debounce(loadDeviceConfigs),
+    'test_scenario.': debounce(loadTestScenarios),
+    'json_template.': debounce(loadJsonTemplates)
+};
+
+function handleConfigEvent(name) {
+    if (name === 'ready') return;
+    const everything = name === 'reset' || name === 'configs.restored';
+    Object.entries(configReloads).forEach(([prefix, reload]) => {
+        if (everything || name.startsWith(prefix)) reload();
+    });
+    reloadDashboard();
+}
+
+function startEventStream() {
+    if (!eventStream) {
+        eventStream = subscribeToEvents('/api/v1/fleet-config/events', getAuthToken, handleConfigEvent);
+    }
+}
+
+function stopEventStream() {
+    if (eventStream) {
+        eventStream.close();
+        eventStream = null;
     }
 }
 
@@ -3,6 +3,7 @@
     let customers = [];
     let currentEditingDevice = null;
     let currentEditingCustomer = null;
+    let eventStream = null;
 
     function getAuthToken() {
         if (!authToken) {
@@ -59,11 +60,45 @@
             loadDevices();
             loadCustomers();
             loadCustomersForSelect();
+            startEventStream();
         } else {
             document.getElementById('auth-message').innerHTML =
                 '<span style="color: #e74c3c;">❌ Niezalogowany</span>';
             document.getElementById('role-switcher').style.display = 'none';
             clearTables();
+            stopEventStream();
+        }
+    }
+
+    // Change events: re-fetch only the sections a change touches
+    const reloadDashboard = debounce(loadDashboard);
+    const reloadDevices = debounce(loadDevices);
+    const reloadCustomers = debounce(() => {
+        loadCustomers();
+        loadCustomersForSelect();
+    });
+
+    function handleFleetDataEvent(name) {
+        if (name === 'ready') return;
+        if (name === 'reset' || name.startsWith('device.')) {
+            reloadDevices();
+        }
+        if (name === 'reset' || name.startsWith('customer.')) {
+            reloadCustomers();
+        }
+        reloadDashboard();
+    }
+
+    function startEventStream() {
+        if (!eventStream) {
+            eventStream = subscribeToEvents('/api/v1/fleet-data/events', getAuthToken, handleFleetDataEvent);
+        }
+    }
+
+    function stopEventStream() {
+        if (eventStream) {
+            eventStream.close();
+            eventStream = null;
         }
     }
 
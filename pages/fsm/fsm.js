@@ -1,6 +1,7 @@
 let authToken = null;
 let currentSoftwareId = null;
 let softwareList = [];
+let eventStream = null;
 
 function getAuthToken() {
     if (!authToken) {
@@ -48,9 +49,48 @@ function updateAuthUI() {
             document.getElementById('role-switcher').style.display = 'none';
         }
         loadDashboard();
+        startEventStream();
     } else {
         document.getElementById('auth-message').innerHTML = '<span style="color: #e74c3c;">❌ Niezalogowany</span>';
         document.getElementById('role-switcher').style.display = 'none';
+        stopEventStream();
+    }
+}
+
+// Change events: re-fetch only the sections a change touches
+const reloadDashboard = debounce(loadDashboard);
+const reloadSoftware = debounce(loadSoftware);
+const reloadVersions = debounce(loadVersions);
+const reloadInstallations = debounce(loadInstallations);
+
+function handleSoftwareEvent(name, data) {
+    if (name === 'reset') {
+        reloadDashboard();
+        reloadSoftware();
+        if (currentSoftwareId) reloadVersions();
+        reloadInstallations();
+    } else if (name.startsWith('software.')) {
+        reloadDashboard();
+        reloadSoftware();
+    } else if (name === 'version.created') {
+        reloadDashboard();
+        if (String(data.software_id) === String(currentSoftwareId)) reloadVersions();
+    } else if (name.startsWith('installation.')) {
+        reloadDashboard();
+        reloadInstallations();
+    }
+}
+
+function startEventStream() {
+    if (!eventStream) {
+        eventStream = subscribeToEvents('/api/v1/fleet-software/events', getAuthToken, handleSoftwareEvent);
+    }
+}
+
+function stopEventStream() {
+    if (eventStream) {
+        eventStream.close();
+        eventStream = null;
     }
 }
 
@@ -42,7 +42,7 @@ async function loadDashboard() {
 
 function displayDashboard(data) {
     document.getElementById('result').innerHTML = `
-                <div style="background: #f8fafc; padding: 20px; border-radius: 8px;">
+                <div id="workshop-dashboard" style="background: #f8fafc; padding: 20px; border-radius: 8px;">
                     <h3 style="margin-top: 0; color: #1f2937;">📊 Dashboard Warsztat</h3>
                     
                     <div style="display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 15px; margin-bottom: 20px;">
@@ -418,11 +418,29 @@ async function submitPart(event) {
     }
 }
 
+// Change events: refresh the dashboard while it is shown (not over an open form)
+let eventStream = null;
+
+const reloadDashboard = debounce(function() {
+    if (document.getElementById('workshop-dashboard')) loadDashboard();
+});
+
+function startEventStream() {
+    if (!eventStream) {
+        eventStream = subscribeToEvents(
+            '/api/v1/fleet-workshop/events',
+            () => localStorage.getItem('auth_token'),
+            name => { if (name !== 'ready') reloadDashboard(); }
+        );
+    }
+}
+
 // Initialize dashboard on successful login
 function updateAuthUI() {
     const token = localStorage.getItem('auth_token');
     if (token) {
         loadDashboard();
+        startEventStream();
     } else {
         document.getElementById('result').innerHTML = '<div style="padding: 20px; text-align: center; color: #6b7280;">Zaloguj się aby zobaczyć panel warsztatowy</div>';
     }
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Build fingerprinted, minified and precompressed JS/CSS assets.
+
+Writes dist/assets/<path>.<hash>.<ext> (+ .gz/.br) and dist/assets/manifest.json,
+which the page templates use through ``asset_url()``.
+
+Usage:
+    python scripts/build_assets.py [--no-minify] [--output dist/assets]
+"""
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from backend.core.assets import ASSET_OUTPUT_DIR, build_assets, rcssmin, rjsmin  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build fingerprinted static assets")
+    parser.add_argument("--output", default=ASSET_OUTPUT_DIR, help="output directory")
+    parser.add_argument("--no-minify", action="store_true", help="skip JS/CSS minification")
+    args = parser.parse_args()
+
+    manifest = build_assets(root=ROOT, output_dir=args.output, minify=not args.no_minify)
+    print(f"✅ Built {len(manifest)} assets into {args.output}")
+    if not args.no_minify and (rjsmin is None or rcssmin is None):
+        print("ℹ️  Install rjsmin/rcssmin to minify (pip install rjsmin rcssmin)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Seed the database without going through the API.
+
+Creates the default accounts and the init-data sample set (set-based, one
+pre-computed password hash), then optionally appends a synthetic fleet of the
+requested size for staging environments.
+
+Usage:
+    python scripts/seed.py
+    python scripts/seed.py --customers 2000 --devices 100000 --repairs 20000 --installations 100000
+    python scripts/seed.py --devices 50000 --password 's3cret' --database-url postgresql://...
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from backend.core.config import settings  # noqa: E402
+from backend.models.models import Base  # noqa: E402
+from backend.services.seeding import seed_default_users, seed_sample_data  # noqa: E402
+from backend.services.synthetic import fleet_counts, generate_fleet  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Seed users, sample data and fleet volume")
+    parser.add_argument("--database-url", help="database to seed (default: DATABASE_URL setting)")
+    parser.add_argument("--password", help="password for the default accounts (default: pass)")
+    parser.add_argument("--customers", type=int, default=0, help="synthetic customers to add")
+    parser.add_argument("--devices", type=int, default=0, help="synthetic devices to add")
+    parser.add_argument("--repairs", type=int, default=0, help="synthetic repairs to add")
+    parser.add_argument(
+        "--installations", type=int, default=0, help="synthetic software installations to add"
+    )
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=42, help="RNG seed for synthetic rows")
+    parser.add_argument("--no-sample-data", action="store_true", help="only add synthetic rows")
+    args = parser.parse_args()
+
+    try:
+        counts = fleet_counts(
+            customers=args.customers,
+            devices=args.devices,
+            repairs=args.repairs,
+            installations=args.installations,
+        )
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    engine = create_engine(args.database_url or settings.database_url)
+    Base.metadata.create_all(bind=engine)
+    started = time.perf_counter()
+
+    with Session(engine) as db:
+        seed_default_users(db, args.password)
+        summary = {} if args.no_sample_data else seed_sample_data(db)
+        db.commit()
+    print(f"🌱 Default users and sample data: {summary or 'already present'}")
+
+    if any(counts.values()):
+        print("🏭 Adding synthetic fleet:")
+        generate_fleet(engine, counts, seed=args.seed, batch_size=args.batch_size)
+
+    print(f"✅ Seeding finished in {time.perf_counter() - started:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Background job worker.
+
+Runs a pool of threads claiming jobs from the ``jobs`` table (see
+``backend/services/jobs.py``) until SIGINT/SIGTERM; running jobs are allowed
+to finish, and enqueues the periodic ``maintenance.refresh`` job every
+``MAINTENANCE_REFRESH_INTERVAL_S``, ``parts.forecast`` every
+``PARTS_FORECAST_INTERVAL_S``, ``artifacts.cleanup`` and
+``idempotency.cleanup`` hourly and ``software.rebuild_inventory``,
+``changes.compact`` and ``jobs.purge`` daily.
+Start as many worker processes as needed - on PostgreSQL they claim jobs
+with ``FOR UPDATE SKIP LOCKED`` and never block each other.
+
+Usage:
+    python scripts/worker.py
+    python scripts/worker.py --threads 8 --types software.installation
+    python scripts/worker.py --purge   # also queue a jobs.purge run on start
+"""
+import argparse
+import logging
+import os
+import signal
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from backend.core.config import settings  # noqa: E402
+from backend.db.base import SessionLocal, engine  # noqa: E402
+from backend.models.models import Base  # noqa: E402
+from backend.services.jobs import WorkerPool, enqueue, registered_handlers  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run background job workers")
+    parser.add_argument("--threads", type=int, default=settings.job_worker_threads)
+    parser.add_argument(
+        "--types",
+        type=lambda value: [t for t in value.split(",") if t],
+        help="comma separated job types to run (default: all registered)",
+    )
+    parser.add_argument("--poll-interval", type=float, default=settings.job_poll_interval_s)
+    parser.add_argument("--purge", action="store_true", help="queue a jobs.purge run on start")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    Base.metadata.create_all(bind=engine)
+
+    unknown = set(args.types or []) - set(registered_handlers())
+    if unknown:
+        parser.error(f"unknown job types: {', '.join(sorted(unknown))}")
+
+    if args.purge:
+        with SessionLocal() as db:
+            enqueue(db, "jobs.purge", priority=-10)
+            db.commit()
+
+    pool = WorkerPool(
+        SessionLocal,
+        threads=args.threads,
+        job_types=args.types,
+        poll_interval=args.poll_interval,
+        lock_timeout=settings.job_lock_timeout_s,
+        periodic={
+            "maintenance.refresh": settings.maintenance_refresh_interval_s,
+            "parts.forecast": settings.parts_forecast_interval_s,
+            "artifacts.cleanup": 3600,
+            "idempotency.cleanup": 3600,
+            "software.rebuild_inventory": 86400,
+            "changes.compact": 86400,
+            "jobs.purge": 86400,
+        },
+    )
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: pool.stop(wait=False))
+    pool.start()
+    pool.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+/**
+ * Fleet Management System - change events of a module (Server-Sent Events)
+ *
+ * The /api/v1/<module>/events streams need the Authorization header, which
+ * EventSource cannot send, so the stream is read with fetch. After a dropped
+ * connection the client reconnects with Last-Event-ID and gets the events it
+ * missed; a "reset" event means they are gone and the page should reload
+ * everything it shows.
+ *
+ *     subscribeToEvents('/api/v1/fleet-workshop/events', getAuthToken, (name, data) => {
+ *         if (name.startsWith('repair.')) reloadRepairs();
+ *     });
+ */
+
+function subscribeToEvents(url, getToken, onEvent) {
+    let lastEventId = null;
+    let retryMs = 3000;
+    let controller = null;
+    let closed = false;
+
+    function dispatch(block) {
+        let name = 'message';
+        const data = [];
+        for (const line of block.split('\n')) {
+            if (!line || line.startsWith(':')) continue;
+            const colon = line.indexOf(':');
+            const field = colon === -1 ? line : line.slice(0, colon);
+            let value = colon === -1 ? '' : line.slice(colon + 1);
+            if (value.startsWith(' ')) value = value.slice(1);
+            if (field === 'id') lastEventId = value;
+            else if (field === 'event') name = value;
+            else if (field === 'data') data.push(value);
+            else if (field === 'retry' && /^\d+$/.test(value)) retryMs = parseInt(value, 10);
+        }
+        if (!data.length) return;
+        let payload = data.join('\n');
+        try {
+            payload = JSON.parse(payload);
+        } catch (error) {
+            // plain text data
+        }
+        onEvent(name, payload);
+    }
+
+    async function connect() {
+        const token = getToken();
+        if (closed || !token) return;
+        controller = new AbortController();
+        const headers = { 'Authorization': `Bearer ${token}`, 'Accept': 'text/event-stream' };
+        if (lastEventId) headers['Last-Event-ID'] = lastEventId;
+        try {
+            const response = await fetch(url, { headers, signal: controller.signal });
+            if (response.status === 401 || response.status === 403) return;
+            if (!response.ok) throw new Error(`HTTP ${response.status}`);
+            const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+            let buffer = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += value.replace(/\r\n?/g, '\n');
+                let end;
+                while ((end = buffer.indexOf('\n\n')) !== -1) {
+                    dispatch(buffer.slice(0, end));
+                    buffer = buffer.slice(end + 2);
+                }
+            }
+        } catch (error) {
+            if (closed) return;
+            console.warn('Event stream interrupted:', error);
+        }
+        if (!closed) setTimeout(connect, retryMs);
+    }
+
+    connect();
+    return {
+        close() {
+            closed = true;
+            if (controller) controller.abort();
+        }
+    };
+}
+
+// Run fn once for a burst of calls (many events -> one reload)
+function debounce(fn, ms = 300) {
+    let timer = null;
+    return function(...args) {
+        clearTimeout(timer);
+        timer = setTimeout(() => fn.apply(this, args), ms);
+    };
+}
@@ -4,6 +4,8 @@ from typing import Dict, Optional
 import time
 import random
 
+pytest_plugins = ["tests.query_budget"]
+
 BASE_URL = "http://localhost:5000"
 API_V1 = f"{BASE_URL}/api/v1"
 
@@ -0,0 +1,98 @@
+"""
+Query-budget pytest plugin.
+
+Reads the ``X-Query-Count`` / ``X-Query-Max-Repeat`` headers the server sends
+(``backend/core/query_log.py``, with ``QUERY_LOG_HEADERS=true`` as ``make test``
+starts it) for every HTTP request a test makes and fails the test when a
+request goes over its budget:
+
+    @pytest.mark.query_budget(max_queries=5, max_repeats=2)
+    def test_software_list(api_url, auth_headers):
+        ...
+
+``max_queries`` limits SQL statements per request, ``max_repeats`` limits how
+often one statement shape may run in a single request (catches N+1 loops that
+grow with page size). ``--query-budget`` / ``--query-repeat-limit`` apply a
+default budget to every test without a marker.
+"""
+import pytest
+import requests
+
+QUERY_COUNT_HEADER = "X-Query-Count"
+QUERY_REPEAT_HEADER = "X-Query-Max-Repeat"
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("query-budget")
+    group.addoption(
+        "--query-budget",
+        type=int,
+        default=None,
+        help="fail tests with a request running more SQL statements than this",
+    )
+    group.addoption(
+        "--query-repeat-limit",
+        type=int,
+        default=None,
+        help="fail tests with a request repeating one statement shape more than this",
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers",
+        "query_budget(max_queries=None, max_repeats=None): per-request SQL query budget",
+    )
+
+
+def _budget(item):
+    marker = item.get_closest_marker("query_budget")
+    max_queries = item.config.getoption("--query-budget")
+    max_repeats = item.config.getoption("--query-repeat-limit")
+    if marker is not None:
+        max_queries = marker.kwargs.get("max_queries", max_queries)
+        max_repeats = marker.kwargs.get("max_repeats", max_repeats)
+    return max_queries, max_repeats
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    max_queries, max_repeats = _budget(item)
+    if max_queries is None and max_repeats is None:
+        yield
+        return
+
+    observed = []
+    original_send = requests.Session.send
+
+    def send(session, request, **kwargs):
+        response = original_send(session, request, **kwargs)
+        if QUERY_COUNT_HEADER in response.headers:
+            observed.append(
+                (
+                    f"{request.method} {request.path_url}",
+                    int(response.headers[QUERY_COUNT_HEADER]),
+                    int(response.headers.get(QUERY_REPEAT_HEADER, 0)),
+                )
+            )
+        return response
+
+    requests.Session.send = send
+    try:
+        outcome = yield
+    finally:
+        requests.Session.send = original_send
+
+    if outcome.excinfo is not None:
+        return
+
+    violations = []
+    for request, queries, repeats in observed:
+        if max_queries is not None and queries > max_queries:
+            violations.append(f"{request}: {queries} queries (budget {max_queries})")
+        if max_repeats is not None and repeats > max_repeats:
+            violations.append(
+                f"{request}: one statement repeated {repeats} times (limit {max_repeats})"
+            )
+    if violations:
+        pytest.fail("Query budget exceeded:\n  " + "\n  ".join(violations), pytrace=False)
@@ -0,0 +1,69 @@
+"""
+Tests for the fingerprinted asset pipeline, built into a temporary directory
+"""
+
+import gzip
+import json
+
+from starlette.applications import Starlette
+from starlette.testclient import TestClient
+
+from backend.core.assets import (
+    IMMUTABLE_CACHE_CONTROL,
+    AssetManifest,
+    ImmutableStaticFiles,
+    build_assets,
+)
+
+
+def _build(tmp_path, script="console.log('fleet');\n"):
+    source = tmp_path / "pages" / "cm"
+    source.mkdir(parents=True, exist_ok=True)
+    (source / "cm.js").write_text(script)
+    (source / "cm.css").write_text("body { color: red; }\n")
+    return build_assets(root=str(tmp_path), output_dir="dist/assets", minify=False)
+
+
+def test_build_writes_fingerprinted_precompressed_files(tmp_path):
+    """Test the build writes hashed files, .gz siblings and the manifest"""
+    manifest = _build(tmp_path)
+    out = tmp_path / "dist" / "assets"
+
+    hashed = manifest["pages/cm/cm.js"]
+    assert hashed.startswith("pages/cm/cm.") and hashed.endswith(".js")
+    assert hashed != "pages/cm/cm.js"
+    assert gzip.decompress((out / f"{hashed}.gz").read_bytes()) == (out / hashed).read_bytes()
+    assert json.loads((out / "manifest.json").read_text()) == manifest
+
+
+def test_asset_url_follows_a_rebuilt_manifest(tmp_path):
+    """Test asset_url resolves through the manifest and picks up a rebuild"""
+    assets = AssetManifest(output_dir=str(tmp_path / "dist" / "assets"))
+    assert assets.url("pages/cm/cm.js") == "/pages/cm/cm.js"  # not built yet
+
+    first = _build(tmp_path)
+    assert assets.url("/pages/cm/cm.js") == f"/assets/{first['pages/cm/cm.js']}"
+
+    second = _build(tmp_path, script="console.log('changed');\n")
+    assert second["pages/cm/cm.js"] != first["pages/cm/cm.js"]
+    assert assets.url("pages/cm/cm.js") == f"/assets/{second['pages/cm/cm.js']}"
+
+
+def test_assets_are_served_immutable_and_precompressed(tmp_path):
+    """Test fingerprinted files are immutable and sent gzip-encoded when accepted"""
+    manifest = _build(tmp_path)
+    app = Starlette()
+    app.mount("/assets", ImmutableStaticFiles(directory=str(tmp_path / "dist" / "assets")))
+    client = TestClient(app)
+    url = f"/assets/{manifest['pages/cm/cm.js']}"
+
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["content-type"].startswith("application/javascript")
+    assert response.text == "console.log('fleet');\n"
+
+    response = client.get(url, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
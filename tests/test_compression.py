@@ -0,0 +1,39 @@
+"""
+E2E tests for response compression middleware
+"""
+
+import requests
+
+
+def test_large_json_is_gzip_compressed(api_url):
+    """Test large JSON responses are compressed when client accepts gzip"""
+    response = requests.get(f"{api_url}/openapi.json", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers.get("content-encoding") == "gzip"
+    assert "Accept-Encoding" in response.headers.get("vary", "")
+    # requests transparently decompresses the body
+    assert "paths" in response.json()
+
+
+def test_no_compression_without_accept_encoding(api_url):
+    """Test responses stay uncompressed for clients that do not accept gzip"""
+    response = requests.get(f"{api_url}/openapi.json", headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+
+
+def test_small_response_not_compressed(base_url):
+    """Test responses below the size threshold are sent as-is"""
+    response = requests.get(f"{base_url}/health", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+
+
+def test_html_page_is_compressed(base_url):
+    """Test module HTML pages are compressed"""
+    response = requests.get(
+        f"{base_url}/connect-manager", headers={"Accept-Encoding": "gzip, deflate"}
+    )
+    assert response.status_code == 200
+    assert response.headers.get("content-encoding") == "gzip"
+    assert "Connect Manager" in response.text
@@ -77,3 +77,19 @@ def test_no_vue_dev_build_in_pages(base_url: str, path: str):
     html = resp.text
     # Ensure we don't reference the dev build anywhere
     assert "vue.global.js" not in html, f"Dev Vue build referenced on {path}"
+
+
+@pytest.mark.parametrize("path", PAGES)
+def test_fingerprinted_assets_are_immutable_and_precompressed(base_url: str, path: str):
+    resp = requests.get(urljoin(base_url, path), timeout=10)
+    assert resp.status_code == 200
+
+    assets = [a for a in _extract_internal_assets(resp.text) if a.startswith("/assets/")]
+    if not assets:
+        pytest.skip("assets not built (run: make assets)")
+
+    for asset in assets:
+        r = requests.get(urljoin(base_url, asset), headers={"Accept-Encoding": "gzip"}, timeout=10)
+        assert r.status_code == 200, f"Asset failed: {asset} on page {path}"
+        assert "immutable" in r.headers.get("cache-control", ""), asset
+        assert r.headers.get("content-encoding") == "gzip", asset
@@ -2,6 +2,8 @@
 E2E tests for Fleet Config Manager module
 """
 
+import time
+
 import pytest
 import requests
 
@@ -129,3 +131,167 @@ def test_backup_endpoint(api_url, configurator_token):
     assert response.status_code == 200
     data = response.json()
     assert "backup_id" in data or "message" in data
+
+
+def test_effective_device_config_merges_layers_and_revalidates(api_url, admin_token):
+    """Test the template, device type and device layers merge and the ETag follows them"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    suffix = f"{pytest.test_run_id}-{time.time_ns()}"
+    device_type = f"e2e_type_{suffix}"
+
+    response = requests.post(
+        f"{api_url}/fleet-config/json-templates",
+        headers=headers,
+        json={
+            "name": f"Effective Config Template {suffix}",
+            "template_type": "device_config",
+            "category": device_type,
+            "default_values": {"pressure": {"min": 1, "max": 5}, "mode": "auto"},
+        },
+    )
+    assert response.status_code == 200
+    response = requests.post(
+        f"{api_url}/fleet-config/system-configs",
+        headers=headers,
+        json={
+            "config_name": device_type,
+            "config_type": "device_settings",
+            "config_value": {"pressure": {"max": 8}},
+        },
+    )
+    assert response.status_code == 200
+    device = requests.post(
+        f"{api_url}/fleet-data/devices",
+        headers=headers,
+        json={"device_number": f"DEV-EFF-{suffix}", "device_type": device_type},
+    ).json()
+    url = f"{api_url}/fleet-config/device-configs/{device['id']}/effective"
+
+    response = requests.get(url, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["configuration"] == {"pressure": {"min": 1, "max": 8}, "mode": "auto"}
+    assert [layer["layer"] for layer in response.json()["layers"]] == ["template", "device_type"]
+    tag = response.headers["ETag"]
+
+    # Nothing changed: 304 without a body
+    response = requests.get(url, headers={**headers, "If-None-Match": tag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    response = requests.put(
+        f"{api_url}/fleet-config/device-configs/{device['id']}",
+        headers=headers,
+        json={"device_id": device["id"], "configuration": {"pressure": {"min": 2}}},
+    )
+    assert response.status_code == 200
+    response = requests.get(url, headers={**headers, "If-None-Match": tag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != tag
+    assert response.json()["configuration"] == {"pressure": {"min": 2, "max": 8}, "mode": "auto"}
+
+    response = requests.get(f"{api_url}/fleet-config/device-configs/0/effective", headers=headers)
+    assert response.status_code == 404
+
+
+def test_device_configs_are_validated_against_the_template_schema(api_url, admin_token):
+    """Test a device configuration breaking its template schema is rejected"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    suffix = f"{pytest.test_run_id}-{time.time_ns()}"
+    device_type = f"e2e_schema_{suffix}"
+
+    response = requests.post(
+        f"{api_url}/fleet-config/json-templates",
+        headers=headers,
+        json={
+            "name": f"Schema Template {suffix}",
+            "template_type": "device_config",
+            "category": device_type,
+            "schema": {"type": "object", "required": ["mode"], "properties": {"mode": {"type": 1}}},
+            "default_values": {"mode": "auto"},
+        },
+    )
+    assert response.status_code == 400  # not a valid JSON schema
+
+    schema = {
+        "type": "object",
+        "required": ["mode"],
+        "properties": {
+            "mode": {"enum": ["auto", "manual"]},
+            "pressure": {"type": "object", "properties": {"max": {"maximum": 10}}},
+        },
+    }
+    template = requests.post(
+        f"{api_url}/fleet-config/json-templates",
+        headers=headers,
+        json={
+            "name": f"Schema Template {suffix}",
+            "template_type": "device_config",
+            "category": device_type,
+            "schema": schema,
+            "default_values": {"mode": "auto"},
+        },
+    ).json()
+    device = requests.post(
+        f"{api_url}/fleet-data/devices",
+        headers=headers,
+        json={"device_number": f"DEV-SCHEMA-{suffix}", "device_type": device_type},
+    ).json()
+    url = f"{api_url}/fleet-config/device-configs/{device['id']}"
+
+    response = requests.put(
+        url,
+        headers=headers,
+        json={"device_id": device["id"], "configuration": {"pressure": {"max": 20}}},
+    )
+    assert response.status_code == 422
+    assert "$.pressure.max" in response.json()["detail"]
+
+    # "mode" is required, the template default provides it
+    response = requests.put(
+        url,
+        headers=headers,
+        json={"device_id": device["id"], "configuration": {"pressure": {"max": 5}}},
+    )
+    assert response.status_code == 200
+
+    response = requests.post(
+        f"{api_url}/fleet-config/json-templates/{template['id']}/validate-devices", headers=headers
+    )
+    assert response.status_code == 202
+    assert "job_id" in response.json()
+
+
+def test_scenario_parameters_are_validated_against_the_template_schema(api_url, admin_token):
+    """Test scenario parameters breaking the scenario template schema are rejected"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    suffix = f"{pytest.test_run_id}-{time.time_ns()}"
+    test_type = f"e2e_scenario_{suffix}"
+    response = requests.post(
+        f"{api_url}/fleet-config/json-templates",
+        headers=headers,
+        json={
+            "name": f"Scenario Template {suffix}",
+            "template_type": "scenario",
+            "category": test_type,
+            "schema": {"required": ["duration"], "properties": {"duration": {"type": "integer"}}},
+            "default_values": {"duration": 60},
+        },
+    )
+    assert response.status_code == 200
+
+    scenario = {"scenario_name": f"Scenario {suffix}", "test_type": test_type}
+    response = requests.post(
+        f"{api_url}/fleet-config/test-scenario-configs",
+        headers=headers,
+        json={**scenario, "parameters": {"duration": "long"}},
+    )
+    assert response.status_code == 422
+    assert "$.duration" in response.json()["detail"]
+
+    response = requests.post(
+        f"{api_url}/fleet-config/test-scenario-configs",
+        headers=headers,
+        json={**scenario, "parameters": {"duration": 30}},
+    )
+    assert response.status_code == 200
+    assert response.json()["scenario_name"] == scenario["scenario_name"]
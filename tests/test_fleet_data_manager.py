@@ -2,6 +2,8 @@
 E2E tests for Fleet Data Manager module
 """
 
+import json
+
 import pytest
 import requests
 import time
@@ -111,3 +113,86 @@ def test_unauthorized_fleet_data_access(api_url, operator_token):
     response = requests.get(f"{api_url}/fleet-data/devices", headers=headers)
     # Operator shouldn't have access to manager endpoints
     assert response.status_code in [401, 403]
+
+
+def test_create_device_with_idempotency_key_is_replayed(api_url, admin_token):
+    """Test a retried create with the same Idempotency-Key replays the first response"""
+    suffix = f"{pytest.test_run_id}-{time.time_ns()}"
+    headers = {"Authorization": f"Bearer {admin_token}", "Idempotency-Key": f"create-{suffix}"}
+    device_data = {"device_number": f"DEV-IDEM-{suffix}", "device_type": "mask_tester"}
+
+    first = requests.post(f"{api_url}/fleet-data/devices", headers=headers, json=device_data)
+    assert first.status_code == 200
+    assert "idempotent-replayed" not in first.headers
+
+    retry = requests.post(f"{api_url}/fleet-data/devices", headers=headers, json=device_data)
+    assert retry.status_code == 200
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert retry.json() == first.json()  # not re-run: a duplicate device_number is a 400
+
+    other = requests.post(
+        f"{api_url}/fleet-data/devices",
+        headers=headers,
+        json={**device_data, "device_number": f"DEV-IDEM-OTHER-{suffix}"},
+    )
+    assert other.status_code == 422
+
+
+def _next_event(lines):
+    """Read one Server-Sent Event as (id, name, data), skipping heartbeats."""
+    fields = {}
+    for line in lines:
+        if not line:
+            if "event" in fields:
+                return fields.get("id"), fields["event"], json.loads(fields.get("data", "null"))
+            fields = {}
+        elif not line.startswith(":"):
+            name, _, value = line.partition(": ")
+            fields[name] = value
+    raise AssertionError("Event stream closed")
+
+
+def test_device_changes_are_streamed_and_replayed(api_url, admin_token):
+    """Test the events stream delivers device changes and replays them after a reconnect"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    suffix = f"{pytest.test_run_id}-{time.time_ns()}"
+
+    with requests.get(
+        f"{api_url}/fleet-data/events", headers=headers, stream=True, timeout=10
+    ) as stream:
+        assert stream.status_code == 200
+        assert stream.headers["content-type"].startswith("text/event-stream")
+        lines = stream.iter_lines(decode_unicode=True)
+        _, name, _ = _next_event(lines)
+        assert name == "ready"
+
+        device = requests.post(
+            f"{api_url}/fleet-data/devices",
+            headers=headers,
+            json={"device_number": f"DEV-SSE-{suffix}", "device_type": "mask_tester"},
+        ).json()
+        while True:
+            event_id, name, data = _next_event(lines)
+            if name == "device.created" and data["id"] == device["id"]:
+                break
+
+    # Changed while disconnected: sent on reconnect with Last-Event-ID
+    response = requests.put(
+        f"{api_url}/fleet-data/devices/{device['id']}",
+        headers=headers,
+        json={"status": "maintenance"},
+    )
+    assert response.status_code == 200
+    with requests.get(
+        f"{api_url}/fleet-data/events",
+        headers={**headers, "Last-Event-ID": event_id},
+        stream=True,
+        timeout=10,
+    ) as stream:
+        lines = stream.iter_lines(decode_unicode=True)
+        while True:
+            _, name, data = _next_event(lines)
+            assert name not in ("ready", "reset")
+            if name == "device.updated" and data["id"] == device["id"]:
+                assert data["status"] == "maintenance"
+                break
@@ -2,6 +2,9 @@
 E2E tests for Fleet Software Manager module
 """
 
+import hashlib
+import os
+
 import pytest
 import requests
 import time
@@ -132,6 +135,38 @@ def test_create_software_version(api_url, auth_headers):
     assert data["version_number"] == "2.0.0"
 
 
+@pytest.mark.query_budget(max_queries=6, max_repeats=1)
+def test_software_list_query_count_does_not_grow_with_rows(api_url, auth_headers):
+    """Test software and version listings run a fixed number of queries (no N+1)"""
+    for i in range(3):
+        software_data = {
+            "name": f"Test Query Budget {int(time.time() * 1000)}-{i}",
+            "description": "For query budget testing",
+            "category": "tool",
+        }
+        software_id = requests.post(
+            f"{api_url}/fleet-software/software", headers=auth_headers, json=software_data
+        ).json()["id"]
+        for version_number in ("1.0.0", "1.1.0"):
+            requests.post(
+                f"{api_url}/fleet-software/software/{software_id}/versions",
+                headers=auth_headers,
+                json={"version_number": version_number},
+            )
+
+    response = requests.get(f"{api_url}/fleet-software/software", headers=auth_headers)
+    assert response.status_code == 200
+    listed = {item["id"]: item for item in response.json()}
+    assert listed[software_id]["versions_count"] == 2
+    assert listed[software_id]["latest_version"] == "1.1.0"
+
+    response = requests.get(
+        f"{api_url}/fleet-software/software/{software_id}/versions", headers=auth_headers
+    )
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+
+
 def test_list_installations(api_url, auth_headers):
     """Test listing all software installations"""
     response = requests.get(f"{api_url}/fleet-software/installations", headers=auth_headers)
@@ -146,3 +181,339 @@ def test_modular_fsm_page_loads(base_url):
     assert response.status_code == 200
     assert "Fleet Software Manager" in response.text
     assert "Modular Version" in response.text
+
+
+def test_artifact_upload_is_deduplicated_and_served_with_ranges(api_url, auth_headers):
+    """Test a one-shot upload is stored by SHA-256 once and served with Range support"""
+    content = os.urandom(3 * 1024 * 1024 + 17)
+    sha256 = hashlib.sha256(content).hexdigest()
+
+    response = requests.post(
+        f"{api_url}/fleet-software/artifacts", headers=auth_headers, data=iter([content])
+    )
+    assert response.status_code == 201
+    artifact = response.json()
+    assert artifact["sha256"] == sha256
+    assert artifact["size"] == len(content)
+    assert artifact["deduplicated"] is False
+
+    response = requests.post(
+        f"{api_url}/fleet-software/artifacts",
+        headers=auth_headers,
+        params={"sha256": sha256},
+        data=content,
+    )
+    assert response.status_code == 201
+    assert response.json()["deduplicated"] is True
+
+    response = requests.post(
+        f"{api_url}/fleet-software/artifacts",
+        headers=auth_headers,
+        params={"sha256": "0" * 64},
+        data=b"something else",
+    )
+    assert response.status_code == 422
+
+    url = f"{api_url}/fleet-software/artifacts/{sha256}"
+    response = requests.get(url, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["accept-ranges"] == "bytes"
+    assert hashlib.sha256(response.content).hexdigest() == sha256
+
+    response = requests.get(url, headers={**auth_headers, "Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 100-199/{len(content)}"
+    assert response.content == content[100:200]
+
+    response = requests.get(url, headers={**auth_headers, "Range": "bytes=-10"})
+    assert response.content == content[-10:]
+
+    response = requests.get(url, headers={**auth_headers, "Range": f"bytes={len(content)}-"})
+    assert response.status_code == 416
+
+    response = requests.get(url, headers={**auth_headers, "If-None-Match": f'"{sha256}"'})
+    assert response.status_code == 304
+
+
+def test_resumable_artifact_upload(api_url, auth_headers):
+    """Test a resumable upload continues from its offset and is verified on completion"""
+    content = os.urandom(2 * 1024 * 1024 + 5)
+    sha256 = hashlib.sha256(content).hexdigest()
+    response = requests.post(
+        f"{api_url}/fleet-software/artifacts/uploads",
+        headers=auth_headers,
+        json={"size": len(content), "sha256": sha256},
+    )
+    assert response.status_code == 201
+    upload_url = f"{api_url}/fleet-software/artifacts/uploads/{response.json()['upload_id']}"
+
+    half = len(content) // 2
+    response = requests.patch(
+        upload_url, headers={**auth_headers, "Upload-Offset": "0"}, data=content[:half]
+    )
+    assert response.status_code == 200
+    assert response.json()["offset"] == half
+
+    # Resending from a stale offset is rejected with the offset to resume from
+    response = requests.patch(
+        upload_url, headers={**auth_headers, "Upload-Offset": "0"}, data=content
+    )
+    assert response.status_code == 409
+    assert response.headers["upload-offset"] == str(half)
+
+    # Completing early is refused
+    response = requests.post(f"{upload_url}/complete", headers=auth_headers)
+    assert response.status_code == 409
+
+    response = requests.patch(
+        upload_url, headers={**auth_headers, "Upload-Offset": str(half)}, data=content[half:]
+    )
+    assert response.json()["offset"] == len(content)
+    response = requests.post(f"{upload_url}/complete", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["sha256"] == sha256
+
+    response = requests.get(
+        f"{api_url}/fleet-software/artifacts/{sha256}",
+        headers={**auth_headers, "Range": "bytes=0-3"},
+    )
+    assert response.content == content[:4]
+
+    software = requests.post(
+        f"{api_url}/fleet-software/software",
+        headers=auth_headers,
+        json={"name": f"Artifact Software {time.time_ns()}", "category": "firmware"},
+    ).json()
+    version = requests.post(
+        f"{api_url}/fleet-software/software/{software['id']}/versions",
+        headers=auth_headers,
+        json={"version_number": "1.0.0"},
+    ).json()
+    response = requests.post(
+        f"{api_url}/fleet-software/software/{software['id']}/versions/{version['id']}/artifact",
+        headers=auth_headers,
+        json={"sha256": sha256},
+    )
+    assert response.status_code == 200
+    versions = requests.get(
+        f"{api_url}/fleet-software/software/{software['id']}/versions", headers=auth_headers
+    ).json()
+    assert versions[0]["checksum"] == sha256
+    assert versions[0]["file_size"] == len(content)
+
+
+def test_installation_downloads_delta_between_versions(api_url, auth_headers, admin_token):
+    """Test a device updating between stored versions is offered a small delta"""
+    v1 = os.urandom(4 * 1024 * 1024)
+    v2 = bytearray(v1)
+    v2[1000:1100] = os.urandom(100)
+    v2 = bytes(v2[: 2 * 1024 * 1024]) + os.urandom(5000) + bytes(v2[2 * 1024 * 1024 :])
+
+    software = requests.post(
+        f"{api_url}/fleet-software/software",
+        headers=auth_headers,
+        json={"name": f"Delta Software {time.time_ns()}", "category": "firmware"},
+    ).json()
+    versions = []
+    for number, content in (("1.0.0", v1), ("1.1.0", v2)):
+        artifact = requests.post(
+            f"{api_url}/fleet-software/artifacts", headers=auth_headers, data=content
+        ).json()
+        version = requests.post(
+            f"{api_url}/fleet-software/software/{software['id']}/versions",
+            headers=auth_headers,
+            json={"version_number": number},
+        ).json()
+        response = requests.post(
+            f"{api_url}/fleet-software/software/{software['id']}/versions/{version['id']}/artifact",
+            headers=auth_headers,
+            json={"sha256": artifact["sha256"]},
+        )
+        assert response.status_code == 200
+        versions.append(version)
+
+    response = requests.post(
+        f"{api_url}/fleet-software/deltas",
+        headers=auth_headers,
+        params={"background": "false"},
+        json={
+            "source_sha256": hashlib.sha256(v1).hexdigest(),
+            "target_sha256": hashlib.sha256(v2).hexdigest(),
+        },
+    )
+    assert response.status_code == 200
+    assert response.json()["delta"]["status"] == "ready"
+
+    device = requests.post(
+        f"{api_url}/fleet-data/devices",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={
+            "device_number": f"DEV-FSM-{pytest.test_run_id}-{time.time_ns()}",
+            "device_type": "mask_tester",
+        },
+    ).json()
+    downloads = []
+    for version in versions:
+        response = requests.post(
+            f"{api_url}/fleet-software/installations",
+            headers=auth_headers,
+            json={"device_id": device["id"], "version_id": version["id"], "action": "install"},
+        )
+        assert response.status_code == 200
+        downloads.append(response.json()["download"])
+
+    assert downloads[0]["type"] == "full"
+    delta = downloads[1]
+    assert delta["type"] == "delta"
+    assert delta["target_sha256"] == hashlib.sha256(v2).hexdigest()
+    assert delta["size"] < len(v2) // 20
+    response = requests.get(
+        f"{api_url}/fleet-software/artifacts/{delta['sha256']}", headers=auth_headers
+    )
+    assert response.status_code == 200
+    assert hashlib.sha256(response.content).hexdigest() == delta["sha256"]
+
+
+def test_installation_status_reports_follow_state_machine(api_url, auth_headers, admin_token):
+    """Test devices report installation progress in bulk through valid transitions only"""
+    software = requests.post(
+        f"{api_url}/fleet-software/software",
+        headers=auth_headers,
+        json={"name": f"Reported Software {time.time_ns()}", "category": "firmware"},
+    ).json()
+    version = requests.post(
+        f"{api_url}/fleet-software/software/{software['id']}/versions",
+        headers=auth_headers,
+        json={"version_number": "1.0.0"},
+    ).json()
+    installation_ids = []
+    for _ in range(2):
+        device = requests.post(
+            f"{api_url}/fleet-data/devices",
+            headers={"Authorization": f"Bearer {admin_token}"},
+            json={
+                "device_number": f"DEV-FSM-{pytest.test_run_id}-{time.time_ns()}",
+                "device_type": "mask_tester",
+            },
+        ).json()
+        response = requests.post(
+            f"{api_url}/fleet-software/installations",
+            headers=auth_headers,
+            json={"device_id": device["id"], "version_id": version["id"], "action": "install"},
+        )
+        installation_ids.append(response.json()["id"])
+    first, second = installation_ids
+
+    response = requests.post(
+        f"{api_url}/fleet-software/installations/status-reports",
+        headers=auth_headers,
+        json={
+            "reports": [
+                {"installation_id": first, "status": "in_progress", "message": "50%"},
+                {"installation_id": first, "status": "completed"},
+                {"installation_id": second, "status": "completed"},
+                {"installation_id": 999999999, "status": "in_progress"},
+            ]
+        },
+    )
+    assert response.status_code == 200
+    result = response.json()
+    assert result["applied"] == 1
+    assert {(item["installation_id"], item["status"]) for item in result["rejected"]} == {
+        (second, "completed"),
+        (999999999, "in_progress"),
+    }
+
+    url = f"{api_url}/fleet-software/installations/{second}/status"
+    for new_status in ("in_progress", "failed"):
+        response = requests.post(
+            url,
+            headers=auth_headers,
+            json={"installation_id": second, "status": new_status, "error_message": "disk full"},
+        )
+        assert response.status_code == 200
+    response = requests.post(
+        url, headers=auth_headers, json={"installation_id": second, "status": "completed"}
+    )
+    assert response.status_code == 409
+
+    installations = requests.get(
+        f"{api_url}/fleet-software/installations", headers=auth_headers, params={"limit": 1000}
+    ).json()
+    by_id = {item["id"]: item for item in installations}
+    assert by_id[first]["status"] == "completed"
+    assert by_id[first]["completed_at"] is not None
+    assert by_id[second]["status"] == "failed"
+    assert by_id[second]["error_message"] == "disk full"
+
+
+def test_software_inventory_matrix_counts_outdated_devices(api_url, auth_headers, admin_token):
+    """Test the inventory matrix follows installations and survives a rebuild"""
+    software = requests.post(
+        f"{api_url}/fleet-software/software",
+        headers=auth_headers,
+        json={"name": f"Inventory Software {time.time_ns()}", "category": "firmware"},
+    ).json()
+    versions = [
+        requests.post(
+            f"{api_url}/fleet-software/software/{software['id']}/versions",
+            headers=auth_headers,
+            json={"version_number": number},
+        ).json()
+        for number in ("1.0.0", "2.0.0")
+    ]
+    installation_ids = []
+    for _ in range(2):
+        device = requests.post(
+            f"{api_url}/fleet-data/devices",
+            headers={"Authorization": f"Bearer {admin_token}"},
+            json={
+                "device_number": f"DEV-FSM-{pytest.test_run_id}-{time.time_ns()}",
+                "device_type": "mask_tester",
+            },
+        ).json()
+        response = requests.post(
+            f"{api_url}/fleet-software/installations",
+            headers=auth_headers,
+            json={"device_id": device["id"], "version_id": versions[0]["id"], "action": "install"},
+        )
+        installation_ids.append(response.json()["id"])
+    requests.post(
+        f"{api_url}/fleet-software/installations/status-reports",
+        headers=auth_headers,
+        json={
+            "reports": [
+                {"installation_id": installation_id, "status": status}
+                for installation_id in installation_ids
+                for status in ("in_progress", "completed")
+            ]
+        },
+    )
+    requests.post(
+        f"{api_url}/fleet-software/installations",
+        headers=auth_headers,
+        json={"device_id": device["id"], "version_id": versions[1]["id"], "action": "update"},
+    )
+
+    def inventory_row():
+        response = requests.get(f"{api_url}/fleet-software/inventory", headers=auth_headers)
+        assert response.status_code == 200
+        rows = [row for row in response.json()["software"] if row["software_id"] == software["id"]]
+        assert len(rows) == 1
+        return rows[0]
+
+    row = inventory_row()
+    assert row["latest_version"] == "2.0.0"
+    assert row["devices"] == 2
+    assert row["outdated"] == 1
+    assert [(item["version"], item["statuses"]) for item in row["versions"]] == [
+        ("1.0.0", {"installed": 1}),
+        ("2.0.0", {"installing": 1}),
+    ]
+
+    response = requests.post(
+        f"{api_url}/fleet-software/inventory/rebuild",
+        headers={"Authorization": f"Bearer {admin_token}"},
+    )
+    assert response.status_code == 200
+    assert inventory_row() == row
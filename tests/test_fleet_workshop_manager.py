@@ -0,0 +1,418 @@
+"""
+E2E tests for Fleet Workshop Manager maintenance scheduling
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+import requests
+
+
+@pytest.fixture(scope="function")
+def device_id(api_url, admin_token):
+    """A fresh device for maintenance tests"""
+    suffix = f"{pytest.test_run_id}-{time.time_ns()}"
+    response = requests.post(
+        f"{api_url}/fleet-data/devices",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={"device_number": f"DEV-FWM-{suffix}", "device_type": "mask_tester"},
+    )
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def _create_part(api_url, headers, stock_quantity):
+    response = requests.post(
+        f"{api_url}/fleet-workshop/parts",
+        headers=headers,
+        json={
+            "part_number": f"PN-E2E-{pytest.test_run_id}-{time.time_ns()}",
+            "name": "E2E valve",
+            "stock_quantity": stock_quantity,
+        },
+    )
+    assert response.status_code == 201
+    return response.json()["part"]["id"]
+
+
+def _create_repair(api_url, headers, device_id):
+    response = requests.post(
+        f"{api_url}/fleet-workshop/repairs",
+        headers=headers,
+        json={"device_id": device_id, "repair_type": "corrective", "description": "E2E repair"},
+    )
+    assert response.status_code == 201
+    return response.json()["repair"]["id"]
+
+
+def _stock(api_url, headers, part_id):
+    response = requests.get(f"{api_url}/fleet-workshop/parts/{part_id}", headers=headers)
+    return response.json()["part"]["stock_quantity"]
+
+
+def test_maintenance_past_due_is_overdue(api_url, admin_token, device_id):
+    """Test maintenance created with a past due date is stored as overdue"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    response = requests.post(
+        f"{api_url}/fleet-workshop/maintenance",
+        headers=headers,
+        json={
+            "device_id": device_id,
+            "maintenance_type": "routine",
+            "title": "E2E overdue check",
+            "next_due": (datetime.utcnow() - timedelta(days=2)).isoformat(),
+        },
+    )
+    assert response.status_code == 201
+    maintenance = response.json()["maintenance"]
+    assert maintenance["status"] == "overdue"
+
+    # Moving the due date into the future makes it scheduled again
+    response = requests.put(
+        f"{api_url}/fleet-workshop/maintenance/{maintenance['id']}",
+        headers=headers,
+        json={"next_due": (datetime.utcnow() + timedelta(days=2)).isoformat()},
+    )
+    assert response.status_code == 200
+    assert response.json()["maintenance"]["status"] == "scheduled"
+
+
+def test_completing_recurring_maintenance_sets_next_due(api_url, admin_token, device_id):
+    """Test completing a weekly maintenance computes its next occurrence"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    response = requests.post(
+        f"{api_url}/fleet-workshop/maintenance",
+        headers=headers,
+        json={
+            "device_id": device_id,
+            "maintenance_type": "scheduled",
+            "schedule_type": "weekly",
+            "title": "E2E weekly check",
+        },
+    )
+    assert response.status_code == 201
+    maintenance = response.json()["maintenance"]
+    assert maintenance["status"] == "scheduled"
+    assert maintenance["next_due"] is not None
+
+    response = requests.put(
+        f"{api_url}/fleet-workshop/maintenance/{maintenance['id']}",
+        headers=headers,
+        json={"status": "completed"},
+    )
+    assert response.status_code == 200
+    completed = response.json()["maintenance"]
+    assert completed["status"] == "completed"
+    last_performed = datetime.fromisoformat(completed["last_performed"])
+    next_due = datetime.fromisoformat(completed["next_due"])
+    assert next_due - last_performed == timedelta(days=7)
+
+
+def test_maintenance_calendar_expands_recurrences(api_url, admin_token, device_id):
+    """Test the calendar lists every weekly occurrence in the window with per-day counts"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    first_due = datetime(2031, 3, 3, 9, 0)
+    response = requests.post(
+        f"{api_url}/fleet-workshop/maintenance",
+        headers=headers,
+        json={
+            "device_id": device_id,
+            "maintenance_type": "scheduled",
+            "schedule_type": "weekly",
+            "title": "E2E calendar check",
+            "next_due": first_due.isoformat(),
+        },
+    )
+    assert response.status_code == 201
+
+    response = requests.get(
+        f"{api_url}/fleet-workshop/calendar",
+        headers=headers,
+        params={
+            "from": "2031-03-01",
+            "to": "2031-03-31",
+            "device_id": device_id,
+            "include_occurrences": "true",
+        },
+    )
+    assert response.status_code == 200
+    calendar = response.json()
+    assert calendar["total"] == 5
+    assert [day["date"] for day in calendar["days"]] == [
+        "2031-03-03",
+        "2031-03-10",
+        "2031-03-17",
+        "2031-03-24",
+        "2031-03-31",
+    ]
+    assert calendar["days"][0]["by_priority"] == {"medium": 1}
+    assert calendar["occurrences"][0]["is_next"] is True
+    assert calendar["truncated"] is False
+
+    response = requests.get(
+        f"{api_url}/fleet-workshop/calendar",
+        headers=headers,
+        params={"from": "2031-03-31", "to": "2031-03-01"},
+    )
+    assert response.status_code == 400
+
+
+def test_reserve_and_consume_parts_for_repair(api_url, admin_token, device_id):
+    """Test reserving deducts free stock, shortages are rejected and completion consumes"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    valve = _create_part(api_url, headers, 5)
+    seal = _create_part(api_url, headers, 1)
+    repair_id = _create_repair(api_url, headers, device_id)
+
+    response = requests.post(
+        f"{api_url}/fleet-workshop/repairs/{repair_id}/parts/reserve",
+        headers=headers,
+        json={"items": [{"part_id": valve, "quantity": 2}, {"part_id": valve, "quantity": 1}]},
+    )
+    assert response.status_code == 200
+    assert _stock(api_url, headers, valve) == 2
+
+    # All or nothing: the seal is short, so the valve is not reserved either
+    response = requests.post(
+        f"{api_url}/fleet-workshop/repairs/{repair_id}/parts/reserve",
+        headers=headers,
+        json={"items": [{"part_id": valve, "quantity": 1}, {"part_id": seal, "quantity": 2}]},
+    )
+    assert response.status_code == 409
+    assert response.json()["detail"]["shortages"] == [
+        {"part_id": seal, "requested": 2, "available": 1}
+    ]
+    assert _stock(api_url, headers, valve) == 2
+
+    response = requests.put(
+        f"{api_url}/fleet-workshop/repairs/{repair_id}", headers=headers, json={"status": "completed"}
+    )
+    assert response.status_code == 200
+    assert response.json()["repair"]["parts_used"] == [{"part_id": valve, "quantity": 3}]
+    assert _stock(api_url, headers, valve) == 2
+
+    response = requests.get(f"{api_url}/fleet-workshop/repairs/{repair_id}/parts", headers=headers)
+    assert [r["status"] for r in response.json()["reservations"]] == ["consumed"]
+
+
+def test_completing_with_parts_used_takes_them_from_stock(api_url, admin_token, device_id):
+    """Test parts_used sent when completing a repair without reservations is deducted and kept"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    part_id = _create_part(api_url, headers, 5)
+    repair_id = _create_repair(api_url, headers, device_id)
+
+    response = requests.put(
+        f"{api_url}/fleet-workshop/repairs/{repair_id}",
+        headers=headers,
+        json={"status": "completed", "parts_used": [{"part_id": part_id, "quantity": 2}]},
+    )
+    assert response.status_code == 200
+    assert response.json()["repair"]["parts_used"] == [{"part_id": part_id, "quantity": 2}]
+    assert _stock(api_url, headers, part_id) == 3
+
+    period = datetime.utcnow().strftime("%Y-%m")
+    response = requests.get(
+        f"{api_url}/fleet-workshop/analytics/parts-consumption",
+        headers=headers,
+        params={"from": period, "to": period, "part_id": part_id, "group_by": "part"},
+    )
+    assert [item["quantity"] for item in response.json()["items"]] == [2]
+
+    # More than the stock holds is refused and nothing changes
+    repair_id = _create_repair(api_url, headers, device_id)
+    response = requests.put(
+        f"{api_url}/fleet-workshop/repairs/{repair_id}",
+        headers=headers,
+        json={"status": "completed", "parts_used": [{"part_id": part_id, "quantity": 4}]},
+    )
+    assert response.status_code == 409
+    assert _stock(api_url, headers, part_id) == 3
+
+
+def test_concurrent_consumption_never_oversells(api_url, admin_token, device_id):
+    """Test concurrent consumption of the last items succeeds exactly as often as stock allows"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    part_id = _create_part(api_url, headers, 5)
+    repairs = [_create_repair(api_url, headers, device_id) for _ in range(10)]
+
+    def consume(repair_id):
+        return requests.post(
+            f"{api_url}/fleet-workshop/repairs/{repair_id}/parts/consume",
+            headers=headers,
+            json={"items": [{"part_id": part_id, "quantity": 1}]},
+        ).status_code
+
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        statuses = list(pool.map(consume, repairs))
+
+    assert statuses.count(200) == 5
+    assert statuses.count(409) == 5
+    assert _stock(api_url, headers, part_id) == 0
+
+    response = requests.post(
+        f"{api_url}/fleet-workshop/parts/{part_id}/adjust", headers=headers, json={"delta": -1}
+    )
+    assert response.status_code == 409
+    response = requests.post(
+        f"{api_url}/fleet-workshop/parts/{part_id}/adjust", headers=headers, json={"delta": 4}
+    )
+    assert response.status_code == 200
+    assert response.json()["part"]["stock_quantity"] == 4
+
+    # Stock cannot be overwritten with an absolute value
+    response = requests.put(
+        f"{api_url}/fleet-workshop/parts/{part_id}", headers=headers, json={"stock_quantity": 9}
+    )
+    assert response.status_code == 422
+    assert _stock(api_url, headers, part_id) == 4
+
+
+def test_completed_repairs_feed_usage_analytics(api_url, admin_token):
+    """Test completing a repair records its parts and cost, and reopening it takes them back"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    device_type = f"analytics-{pytest.test_run_id}-{time.time_ns()}"
+    response = requests.post(
+        f"{api_url}/fleet-data/devices",
+        headers=headers,
+        json={"device_number": f"DEV-FWA-{time.time_ns()}", "device_type": device_type},
+    )
+    assert response.status_code == 200
+    device_id = response.json()["id"]
+    part_id = _create_part(api_url, headers, 10)
+    response = requests.put(
+        f"{api_url}/fleet-workshop/parts/{part_id}", headers=headers, json={"unit_price": 250}
+    )
+    assert response.status_code == 200
+    repair_id = _create_repair(api_url, headers, device_id)
+
+    response = requests.post(
+        f"{api_url}/fleet-workshop/repairs/{repair_id}/parts/reserve",
+        headers=headers,
+        json={"items": [{"part_id": part_id, "quantity": 3}]},
+    )
+    assert response.status_code == 200
+    response = requests.put(
+        f"{api_url}/fleet-workshop/repairs/{repair_id}",
+        headers=headers,
+        json={"status": "completed", "actual_cost": 1000, "labor_hours": 2},
+    )
+    assert response.status_code == 200
+
+    period = datetime.utcnow().strftime("%Y-%m")
+    params = {"from": period, "to": period, "part_id": part_id, "group_by": "device_type"}
+    response = requests.get(
+        f"{api_url}/fleet-workshop/analytics/parts-consumption", headers=headers, params=params
+    )
+    assert response.status_code == 200
+    assert response.json()["items"] == [
+        {"period": period, "device_type": device_type, "quantity": 3, "parts_cost": 750}
+    ]
+
+    def device_type_costs():
+        response = requests.get(
+            f"{api_url}/fleet-workshop/analytics/repair-costs",
+            headers=headers,
+            params={"from": period, "to": period},
+        )
+        assert response.status_code == 200
+        return [item for item in response.json()["items"] if item["device_type"] == device_type]
+
+    assert device_type_costs() == [
+        {
+            "device_type": device_type,
+            "repairs": 1,
+            "actual_cost": 1000,
+            "parts_cost": 750,
+            "labor_hours": 2,
+            "average_cost": 1750,
+        }
+    ]
+
+    response = requests.put(
+        f"{api_url}/fleet-workshop/repairs/{repair_id}",
+        headers=headers,
+        json={"status": "in_progress"},
+    )
+    assert response.status_code == 200
+    assert device_type_costs() == []
+
+    response = requests.get(
+        f"{api_url}/fleet-workshop/analytics/repair-costs",
+        headers=headers,
+        params={"from": "2031-13", "to": period},
+    )
+    assert response.status_code == 422
+
+
+def test_forecast_reorder_suggestions(api_url, admin_token, device_id):
+    """Test the forecast turns consumption and scheduled maintenance into a reorder point"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    part_id = _create_part(api_url, headers, 10)
+    repair_id = _create_repair(api_url, headers, device_id)
+    response = requests.post(
+        f"{api_url}/fleet-workshop/repairs/{repair_id}/parts/consume",
+        headers=headers,
+        json={"items": [{"part_id": part_id, "quantity": 7}]},
+    )
+    assert response.status_code == 200
+    response = requests.put(
+        f"{api_url}/fleet-workshop/repairs/{repair_id}", headers=headers, json={"status": "completed"}
+    )
+    assert response.status_code == 200
+    response = requests.post(
+        f"{api_url}/fleet-workshop/maintenance",
+        headers=headers,
+        json={
+            "device_id": device_id,
+            "maintenance_type": "routine",
+            "title": "E2E forecast check",
+            "next_due": (datetime.utcnow() + timedelta(days=1)).isoformat(),
+            "parts_required": [{"part_id": part_id, "quantity": 2}],
+        },
+    )
+    assert response.status_code == 201
+
+    response = requests.post(f"{api_url}/fleet-workshop/parts/forecast", headers=headers)
+    assert response.status_code == 200
+
+    # 7 used today over a 90-day window: mean 0.078/day, 14-day lead time,
+    # z = 1.65 -> ceil(1.09 + 4.53 + 2 scheduled) = 8
+    response = requests.get(
+        f"{api_url}/fleet-workshop/parts/reorder-suggestions",
+        headers=headers,
+        params={"limit": 1000},
+    )
+    assert response.status_code == 200
+    suggestion = next(s for s in response.json()["suggestions"] if s["part_id"] == part_id)
+    assert suggestion["stock_quantity"] == 3
+    assert suggestion["reorder_point"] == 8
+    assert suggestion["scheduled_demand"] == 2
+    assert suggestion["suggested_quantity"] == 7
+    assert suggestion["days_of_stock"] is not None
+
+    response = requests.get(
+        f"{api_url}/fleet-workshop/parts",
+        headers=headers,
+        params={"low_stock": "true", "limit": 10000},
+    )
+    assert part_id in [part["id"] for part in response.json()["parts"]]
+
+
+def test_analytics_rebuild_requires_admin(api_url, manager_token):
+    """Test only admins can queue a rebuild of the usage rollups"""
+    response = requests.post(
+        f"{api_url}/fleet-workshop/analytics/rebuild",
+        headers={"Authorization": f"Bearer {manager_token}"},
+    )
+    assert response.status_code == 403
+
+
+def test_parts_forecast_requires_admin(api_url, manager_token):
+    """Test only admins can recompute the parts forecast"""
+    response = requests.post(
+        f"{api_url}/fleet-workshop/parts/forecast",
+        headers={"Authorization": f"Bearer {manager_token}"},
+    )
+    assert response.status_code == 403
@@ -0,0 +1,163 @@
+"""
+E2E tests for the background job queue
+"""
+
+import time
+
+import requests
+from sqlalchemy import create_engine, update
+from sqlalchemy.orm import sessionmaker
+
+from backend.models.models import (
+    Base,
+    Device,
+    Job,
+    Software,
+    SoftwareInstallation,
+    SoftwareVersion,
+)
+from backend.services.installations import apply_status_reports
+from backend.services.jobs import (
+    WorkerPool,
+    claim_job,
+    enqueue,
+    job_handler,
+    requeue_stale_jobs,
+    run_job,
+)
+
+
+@job_handler("tests.sleep")
+def _sleep(db, ctx):
+    time.sleep(ctx.payload["seconds"])
+    return {"slept": ctx.payload["seconds"]}
+
+
+def _session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
+
+
+def test_background_backup_is_queued(api_url, configurator_token, operator_token):
+    """Test a background backup returns 202 with a job the owner can inspect and cancel"""
+    headers = {"Authorization": f"Bearer {configurator_token}"}
+    response = requests.post(f"{api_url}/fleet-config/backup?background=true", headers=headers)
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+
+    response = requests.get(f"{api_url}/jobs/{job_id}", headers=headers)
+    assert response.status_code == 200
+    job = response.json()
+    assert job["job_type"] == "config.backup"
+    assert job["status"] == "queued"
+    assert job["progress"] == 0
+
+    response = requests.get(
+        f"{api_url}/jobs/", headers=headers, params={"job_type": "config.backup"}
+    )
+    assert response.status_code == 200
+    assert job_id in [item["id"] for item in response.json()]
+
+    # Other users do not see the job
+    response = requests.get(
+        f"{api_url}/jobs/{job_id}", headers={"Authorization": f"Bearer {operator_token}"}
+    )
+    assert response.status_code == 404
+
+    response = requests.post(f"{api_url}/jobs/{job_id}/cancel", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["status"] == "cancelled"
+
+
+def test_cancel_and_retry_rules(api_url, configurator_token):
+    """Test only queued jobs can be cancelled and only failed/cancelled jobs retried"""
+    headers = {"Authorization": f"Bearer {configurator_token}"}
+    job_id = requests.post(
+        f"{api_url}/fleet-config/backup?background=true", headers=headers
+    ).json()["job_id"]
+
+    response = requests.post(f"{api_url}/jobs/{job_id}/retry", headers=headers)
+    assert response.status_code == 409
+
+    requests.post(f"{api_url}/jobs/{job_id}/cancel", headers=headers)
+    response = requests.post(f"{api_url}/jobs/{job_id}/cancel", headers=headers)
+    assert response.status_code == 409
+
+    response = requests.post(f"{api_url}/jobs/{job_id}/retry", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["status"] == "queued"
+    assert response.json()["attempts"] == 0
+
+    requests.post(f"{api_url}/jobs/{job_id}/cancel", headers=headers)
+
+
+def test_running_job_lock_is_refreshed(tmp_path):
+    """Test a job running longer than the lock timeout is not taken for lost"""
+    factory = _session_factory(tmp_path)
+    with factory() as db:
+        job_id = enqueue(db, "tests.sleep", payload={"seconds": 1.0}).id
+        db.commit()
+
+    pool = WorkerPool(factory, threads=1, poll_interval=0.05, lock_timeout=0.4)
+    pool.start()
+    try:
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            with factory() as db:
+                assert requeue_stale_jobs(db, 0.4) == 0
+                if db.get(Job, job_id).status == "succeeded":
+                    break
+            time.sleep(0.05)
+    finally:
+        pool.stop()
+
+    with factory() as db:
+        job = db.get(Job, job_id)
+        assert job.status == "succeeded"
+        assert job.attempts == 1
+
+
+def test_outcome_is_not_recorded_after_lock_is_lost(tmp_path):
+    """Test a worker whose job was re-claimed does not overwrite the new run"""
+    factory = _session_factory(tmp_path)
+    with factory() as db:
+        enqueue(db, "tests.sleep", payload={"seconds": 0})
+        db.commit()
+        job = claim_job(db, "worker-a")
+        db.expunge(job)
+        db.execute(update(Job).where(Job.id == job.id).values(locked_by="worker-b"))
+        db.commit()
+
+    assert run_job(job, factory, "worker-a") == "lost"
+    with factory() as db:
+        assert db.get(Job, job.id).status == "running"
+        assert db.get(Job, job.id).locked_by == "worker-b"
+
+
+def test_installation_job_leaves_the_outcome_to_the_device(tmp_path):
+    """Test the installation job only dispatches and the device report completes it"""
+    factory = _session_factory(tmp_path)
+    with factory() as db:
+        device = Device(device_number="DEV-JOB-1", device_type="mask_tester")
+        version = SoftwareVersion(software=Software(name="Firmware"), version_number="2.0.0")
+        db.add_all([device, version])
+        db.flush()
+        installation = SoftwareInstallation(
+            device_id=device.id, version_id=version.id, action="install", status="pending"
+        )
+        db.add(installation)
+        db.flush()
+        job = enqueue(db, "software.installation", payload={"installation_id": installation.id})
+        db.commit()
+        job = claim_job(db, "worker-a", ["software.installation"])
+        db.expunge(job)
+        installation_id = installation.id
+
+    assert run_job(job, factory, "worker-a") == "succeeded"
+    with factory() as db:
+        assert db.get(SoftwareInstallation, installation_id).status == "in_progress"
+        report = {"installation_id": installation_id, "status": "completed"}
+        assert apply_status_reports(db, [report])["rejected"] == []
+        db.commit()
+        assert db.get(SoftwareInstallation, installation_id).status == "completed"
@@ -0,0 +1,39 @@
+"""
+Tests for the maintenance schedule refresh, on a temporary SQLite database
+"""
+
+from datetime import datetime
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from backend.models.models import Base, Device, Maintenance
+from backend.services.maintenance import next_occurrence, refresh_maintenance_schedule
+
+
+def test_refresh_clamps_month_ends_like_the_write_path(tmp_path):
+    """Test the bulk refresh computes the same next_due as completing the item"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'maintenance.db'}")
+    Base.metadata.create_all(engine)
+    performed = datetime(2026, 1, 31, 9, 30)
+
+    with Session(engine) as db:
+        device = Device(device_number="DEV-MT-1", device_type="mask_tester")
+        db.add(device)
+        db.flush()
+        item = Maintenance(
+            device_id=device.id,
+            maintenance_type="routine",
+            title="Monthly check",
+            schedule_type="monthly",
+            frequency_value=1,
+            last_performed=performed,
+            status="completed",
+        )
+        db.add(item)
+        db.flush()
+
+        result = refresh_maintenance_schedule(db, now=datetime(2026, 1, 31, 10, 0))
+        assert result["next_due_filled"] == 1
+        assert item.next_due.replace(tzinfo=None) == datetime(2026, 2, 28, 9, 30)
+        assert item.next_due.replace(tzinfo=None) == next_occurrence("monthly", 1, performed)
@@ -0,0 +1,47 @@
+"""
+E2E tests for per-route request metrics
+"""
+
+import requests
+
+from backend.core.metrics import scrape_allowed
+
+
+def test_server_timing_header_reports_db_queries(api_url, admin_token):
+    """Test API responses carry app and DB timings in Server-Timing"""
+    response = requests.get(
+        f"{api_url}/fleet-data/devices", headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    assert response.status_code == 200
+    server_timing = response.headers.get("server-timing", "")
+    assert "app;dur=" in server_timing
+    assert "db;dur=" in server_timing
+    assert "queries" in server_timing
+
+
+def test_metrics_endpoint_groups_by_route_template(base_url, api_url, admin_token):
+    """Test /metrics exposes Prometheus series keyed by route template, not raw URL"""
+    requests.get(
+        f"{api_url}/fleet-data/devices/999999", headers={"Authorization": f"Bearer {admin_token}"}
+    )
+
+    response = requests.get(f"{base_url}/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert "# TYPE fleet_http_request_duration_seconds histogram" in body
+    assert 'route="/api/v1/fleet-data/devices/{device_id}"' in body
+    assert "/fleet-data/devices/999999" not in body
+    assert "fleet_http_request_queries_bucket" in body
+    assert "fleet_http_request_db_seconds_total" in body
+    assert "fleet_http_requests_total" in body
+
+
+def test_metrics_scrape_requires_token_or_loopback():
+    """Test /metrics is served to loopback clients, or to any client with the token"""
+    assert scrape_allowed(None, "127.0.0.1", None)
+    assert scrape_allowed(None, "::1", None)
+    assert not scrape_allowed(None, "10.0.0.7", None)
+    assert scrape_allowed("Bearer s3cret", "10.0.0.7", "s3cret")
+    assert not scrape_allowed("Bearer wrong", "127.0.0.1", "s3cret")
+    assert not scrape_allowed(None, "127.0.0.1", "s3cret")
@@ -2,7 +2,6 @@
 E2E tests for module pages and static files
 """
 
-import pytest
 import requests
 
 
@@ -111,6 +110,14 @@ def test_fsm_js_loads(base_url):
     assert "javascript" in response.headers.get("content-type", "").lower()
 
 
+def test_workshop_api_mounted_under_api_v1(api_url, manager_token):
+    """Test FWM API is served under /api/v1/fleet-workshop like the other module APIs"""
+    headers = {"Authorization": f"Bearer {manager_token}"}
+    response = requests.get(f"{api_url}/fleet-workshop/dashboard", headers=headers)
+    assert response.status_code == 200
+    assert "repairs" in response.json()
+
+
 def test_404_for_nonexistent_module(base_url):
     """Test 404 for non-existent module"""
     response = requests.get(f"{base_url}/nonexistent-module")
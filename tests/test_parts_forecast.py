@@ -0,0 +1,44 @@
+"""
+Tests for the parts forecast, on a temporary SQLite database
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from backend.core.config import settings
+from backend.models.models import Base, Device, Maintenance, Part, PartForecast
+from backend.services.parts_forecast import compute_forecast
+
+
+def test_overdue_recurring_maintenance_counts_once(tmp_path):
+    """Test missed periods of an overdue item are not forecast as upcoming demand"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'forecast.db'}")
+    Base.metadata.create_all(engine)
+    now = datetime(2026, 6, 1, 12, 0)
+    lead_time = settings.parts_forecast_lead_time_days
+
+    with Session(engine) as db:
+        device = Device(device_number="DEV-FC-1", device_type="mask_tester")
+        part = Part(part_number="PN-FC-1", name="Filter", stock_quantity=10, status="active")
+        db.add_all([device, part])
+        db.flush()
+        db.add(
+            Maintenance(
+                device_id=device.id,
+                maintenance_type="routine",
+                title="Daily filter change",
+                schedule_type="daily",
+                frequency_value=1,
+                next_due=now - timedelta(days=100),
+                status="overdue",
+                parts_required=[{"part_id": part.id, "quantity": 1}],
+            )
+        )
+        db.flush()
+
+        compute_forecast(db, now=now)
+        forecast = db.get(PartForecast, part.id)
+        # The overdue change, then one per day of the lead time
+        assert forecast.scheduled_demand == 1 + lead_time
@@ -0,0 +1,107 @@
+"""
+E2E tests for on-demand request profiling
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+import anyio
+import requests
+
+from backend.core.profiling import (
+    ProfileSession,
+    _current_profile,
+    list_profiles,
+    load_profile,
+    prune_profiles,
+)
+
+
+def test_superuser_request_is_profiled(api_url, admin_token):
+    """Test a superuser request flagged with X-Profile stores stacks and the SQL timeline"""
+    headers = {"Authorization": f"Bearer {admin_token}", "X-Profile": "1"}
+    response = requests.get(f"{api_url}/fleet-data/devices", headers=headers)
+    assert response.status_code == 200
+    profile_id = response.headers.get("x-profile-id")
+    assert profile_id
+
+    response = requests.get(
+        f"{api_url}/profiles/{profile_id}", headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    assert response.status_code == 200
+    profile = response.json()
+    assert profile["path"] == "/api/v1/fleet-data/devices"
+    assert profile["query_count"] == len(profile["sql"]) > 0
+    assert "statement" in profile["sql"][0]
+
+    response = requests.get(
+        f"{api_url}/profiles/{profile_id}?format=folded",
+        headers={"Authorization": f"Bearer {admin_token}"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+
+
+def test_profile_flag_ignored_for_non_superuser(api_url, manager_token):
+    """Test the profiling flag has no effect for users without the superuser role"""
+    headers = {"Authorization": f"Bearer {manager_token}", "X-Profile": "1"}
+    response = requests.get(f"{api_url}/fleet-data/devices?__profile=1", headers=headers)
+    assert response.status_code == 200
+    assert "x-profile-id" not in response.headers
+
+    response = requests.get(
+        f"{api_url}/profiles/", headers={"Authorization": f"Bearer {manager_token}"}
+    )
+    assert response.status_code == 403
+
+
+def _spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def _unrelated_spin(seconds):
+    _spin(seconds)
+
+
+def test_sampler_records_only_the_profiled_request():
+    """Test the sampler skips threads not running code of the profiled request"""
+    session = ProfileSession(0.001)
+
+    async def handle_request():
+        token = _current_profile.set(session)
+        session.root_frame = sys._getframe()
+        session.profiler.start()
+        try:
+            await anyio.to_thread.run_sync(_spin, 0.1)
+        finally:
+            session.profiler.stop()
+            _current_profile.reset(token)
+
+    other = threading.Thread(target=_unrelated_spin, args=(0.3,))
+    other.start()
+    anyio.run(handle_request)
+    other.join()
+
+    folded = session.profiler.folded()
+    assert "test_profiling.py:_spin" in folded
+    assert "_unrelated_spin" not in folded
+
+
+def test_profile_listing_skips_corrupt_files_and_prunes(tmp_path):
+    """Test unreadable profiles are skipped and only the newest are kept"""
+    for i in range(3):
+        path = tmp_path / f"p{i}.json"
+        path.write_text(json.dumps({"id": f"p{i}", "folded": "", "sql": []}))
+        os.utime(path, (1000 + i, 1000 + i))
+    (tmp_path / "broken.json").write_text("{not json")
+
+    assert [p["id"] for p in list_profiles(str(tmp_path))] == ["p2", "p1", "p0"]
+    assert load_profile(str(tmp_path), "broken") is None
+
+    prune_profiles(str(tmp_path), keep=2)
+    assert sorted(os.listdir(tmp_path)) == ["broken.json", "p2.json"]
@@ -0,0 +1,44 @@
+"""
+E2E tests for per-user, per-route admission control
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from starlette.requests import Request
+
+from backend.core.rate_limit import client_address, parse_networks
+
+
+def test_polling_one_route_is_rate_limited_per_user(api_url, auth_headers, admin_token):
+    """Test a burst above the role budget gets 429 with Retry-After, other users are unaffected"""
+    url = f"{api_url}/fleet-software/inventory"
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        responses = list(pool.map(lambda _: requests.get(url, headers=auth_headers), range(80)))
+
+    statuses = [response.status_code for response in responses]
+    assert 200 in statuses
+    limited = [response for response in responses if response.status_code == 429]
+    assert limited
+    assert int(limited[0].headers["retry-after"]) >= 1
+
+    # The budget is per user: the superuser still gets through
+    response = requests.get(url, headers={"Authorization": f"Bearer {admin_token}"})
+    assert response.status_code == 200
+
+
+def _request(peer, forwarded=None):
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request({"type": "http", "headers": headers, "client": (peer, 50000)})
+
+
+def test_anonymous_clients_behind_a_trusted_proxy_get_their_own_bucket():
+    """Test X-Forwarded-For names the client only when the peer is a trusted proxy"""
+    proxies = parse_networks("10.0.0.2, 172.16.0.0/12")
+    assert client_address(_request("10.0.0.2", "203.0.113.7"), proxies) == "203.0.113.7"
+    # Entries left of the first untrusted hop are client-supplied and ignored
+    request = _request("10.0.0.2", "198.51.100.1, 203.0.113.7, 172.16.4.1")
+    assert client_address(request, proxies) == "203.0.113.7"
+    # Untrusted peers cannot pick their bucket
+    assert client_address(_request("203.0.113.9", "198.51.100.1"), proxies) == "203.0.113.9"
+    assert client_address(_request("10.0.0.2", "203.0.113.7"), []) == "10.0.0.2"
@@ -0,0 +1,34 @@
+"""
+Tests for synthetic fleet generation, on a temporary SQLite database
+"""
+
+import pytest
+from sqlalchemy import create_engine, select
+
+from backend.models.models import Base, Device, Repair, SoftwareInstallation
+from backend.services.synthetic import fleet_counts, generate_fleet
+
+
+def test_fleet_counts_reject_rows_without_devices():
+    """Test repairs and installations cannot be requested without devices"""
+    with pytest.raises(ValueError, match="repairs"):
+        fleet_counts(repairs=10)
+    with pytest.raises(ValueError, match="installations"):
+        fleet_counts(customers=5, installations=10)
+    assert fleet_counts(customers=5)["software"] == 0
+
+
+def test_generated_foreign_keys_point_at_existing_rows(tmp_path):
+    """Test repairs and installations only reference generated devices"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'fleet.db'}")
+    Base.metadata.create_all(engine)
+    counts = fleet_counts(customers=3, devices=20, repairs=50, installations=40)
+    written = generate_fleet(engine, counts, batch_size=7, report=lambda line: None)
+    assert written["repairs"] == 50
+
+    with engine.connect() as conn:
+        devices = set(conn.execute(select(Device.id)).scalars())
+        referenced = set(conn.execute(select(Repair.device_id)).scalars())
+        referenced |= set(conn.execute(select(SoftwareInstallation.device_id)).scalars())
+    assert len(devices) == 20
+    assert referenced <= devices
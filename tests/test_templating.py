@@ -0,0 +1,41 @@
+"""
+Tests for the template bytecode cache directory checks and the page cache key
+"""
+
+import os
+
+from modules import templating
+from modules.templating import _bytecode_cache, _page_cache_key
+
+
+def test_bytecode_cache_defaults_to_a_private_directory():
+    """Test no configured directory uses Jinja's per-user cache and "" disables it"""
+    cache = _bytecode_cache(None)
+    assert cache is not None
+    assert os.stat(cache.directory).st_uid == os.getuid()
+    assert _bytecode_cache("") is None
+
+
+def test_bytecode_cache_refuses_a_directory_others_can_write(tmp_path):
+    """Test a group/world-writable directory is not used for bytecode"""
+    directory = tmp_path / "jinja"
+    assert _bytecode_cache(str(directory)).directory == str(directory)
+    assert os.stat(directory).st_mode & 0o777 == 0o700
+
+    os.chmod(directory, 0o777)
+    assert _bytecode_cache(str(directory)) is None
+
+
+def test_page_cache_key_changes_when_the_asset_manifest_is_rebuilt(tmp_path, monkeypatch):
+    """Test cached pages are not reused across an asset rebuild"""
+    manifest_path = tmp_path / "manifest.json"
+    monkeypatch.setattr(templating.manifest, "output_dir", str(tmp_path))
+    manifest_path.write_text('{"pages/cm/cm.js": "pages/cm/cm.1111.js"}')
+    before = _page_cache_key("cm/index.html", {"request": object(), "title": "CM"})
+
+    manifest_path.write_text('{"pages/cm/cm.js": "pages/cm/cm.2222.js"}')
+    os.utime(manifest_path, ns=(0, os.stat(manifest_path).st_mtime_ns + 1))
+    after = _page_cache_key("cm/index.html", {"request": object(), "title": "CM"})
+
+    assert before != after
+    assert before[0] == after[0] == "cm/index.html"